@@ -0,0 +1,153 @@
+import numpy as np
+import psutil
+
+from core.correlation import MULTI_STRESS
+import core.fft_correlation as fft_correlation
+import core.fileio as fileio
+
+#Blocking transformation (Flyvbjerg and Petersen) for many correlation series at once with NumPy reshapes and reductions. Gives the
+#same errors as cpu_correlation.block_error, which transforms one chain and one time lag at a time.
+
+def block_errors(xV, xav):
+    '''
+    Plateau error of the average of each series from the blocking transformation
+
+    Args:
+        xV - values of each series, shape (..., n) (for example chains x lags x samples)
+        xav - average of each series, shape (...)
+    Returns:
+        error of the average of each series, shape of xav (nan if n < 2)
+    '''
+    x = np.asarray(xV,dtype=float)
+    xav = np.asarray(xav,dtype=float)[...,np.newaxis]
+    n = x.shape[-1]
+    error = np.full(shape=x.shape[:-1],fill_value=np.nan)
+    if n < 1:
+        return error
+
+    with np.errstate(divide='ignore',invalid='ignore'):
+        #first level (first deviation is not divided by n, same as block_error)
+        dev = (x-xav)**2
+        c0 = dev[...,0] + np.sum(dev[...,1:],axis=-1)/n
+        sa = np.sqrt(c0/(n-1))
+        sb = sa/np.sqrt(2*(n-1))
+
+        #halve the series (average neighbouring values) until the error of a series stops changing within its uncertainty
+        active = np.ones(shape=error.shape,dtype=bool)
+        while True:
+            n = n//2
+            x = np.reshape(x[...,0:2*n],x.shape[:-1]+(n,2))
+            x = (x[...,1] + x[...,0])/2
+            c0 = np.sum((x-xav)**2,axis=-1)/n
+            sap = np.sqrt(c0/(n-1))
+            sbp = sap/np.sqrt(2*(n-1))
+
+            error[active] = sap[active]
+            active &= (np.abs(sa-sap) > sbp+sb)
+            if n <= 4 or not np.any(active):
+                break
+            sa = sap
+            sb = sbp
+
+    return error
+
+
+def lag_errors(data, lags, xav, calc_type):
+    '''
+    Errors of the average stress correlation (calc_type 1) or squared displacement (calc_type 2) of each chain and time lag
+
+    Args:
+        data - stress (column 0, or MULTI_STRESS columns averaged over components) or CoM (columns 0-2) values of each chain at evenly
+               spaced times, shape (Nchains, n, columns)
+        lags - time lags in rows of data
+        xav - average correlation of each chain and time lag, shape (Nchains, len(lags))
+        calc_type - 1 or 2 for stress or MSD, respectively
+    Returns:
+        errors, shape (Nchains, len(lags)) (nan for lags with less than two pairs of rows)
+    '''
+    n_data = data.shape[1]
+    errors = np.full(shape=(data.shape[0],len(lags)),fill_value=np.nan)
+
+    #correlation values of all chains for one lag are transformed at once (the number of pairs depends on the lag)
+    for k in range(0,len(lags)):
+        n = n_data - int(lags[k])
+        if n <= 0:
+            continue
+        if calc_type == 1 and data.shape[2] == MULTI_STRESS:
+            xV = np.zeros(shape=(data.shape[0],n),dtype=float)
+            for d in range(0,MULTI_STRESS):
+                xV += data[:,0:n,d]*data[:,lags[k]:lags[k]+n,d]
+            xV /= MULTI_STRESS
+        elif calc_type == 1:
+            xV = data[:,0:n,0]*data[:,lags[k]:lags[k]+n,0]
+        else:
+            xV = np.zeros(shape=(data.shape[0],n),dtype=float)
+            for d in range(0,3):
+                xV += (data[:,0:n,d]-data[:,lags[k]:lags[k]+n,d])**2
+        errors[:,k] = block_errors(xV,xav[:,k])
+
+    return errors
+
+
+def calc_gt(filename,lags=None,max_mem=None):
+    '''
+    Calculate G(t) and its blocking error from the evenly spaced leading points of a binary stress raw data file (the points of
+    the first time sync, later syncs store every m**x_sync-th point)
+
+    Args:
+        filename - binary stress raw data file (tau_xy of each chain, or MULTI_STRESS components averaged over components)
+        lags - time lags in points of the file (defaults to about 200 lags spaced evenly in log scale)
+        max_mem - memory in bytes used for a block of chains (defaults to half of the available memory)
+    Returns:
+        lag times, G(t) averaged over chains and error (same definition as Gt_result)
+    '''
+    info, time_array, segments = fileio.load_rawdata(filename)
+    nchains = info['nchains']
+    ncomp = info['ncomp']
+
+    #last point spaced evenly with the first two points
+    n = len(time_array)
+    if n > 2:
+        spacing = np.diff(time_array)
+        n = 1 + int(np.argmax(np.append(np.abs(spacing-spacing[0]) > 1e-9*max(1.0,spacing[0]),True)))
+    if lags is None:
+        lags = np.concatenate(([0],np.unique(np.round(np.geomspace(1,max(n-1,1),200)).astype(int))))
+    lags = np.asarray(lags,dtype=np.int64)
+    lags = lags[lags < n-1]
+
+    #each chain in the block needs its values, the zero padded FFT of the correlation averages and a few copies for the errors
+    if max_mem is None:
+        max_mem = 0.5*psutil.virtual_memory().available
+    block_size = int(min(max(max_mem//(12*n*ncomp*8),1),max(nchains,1)))
+
+    average_sum = np.zeros(shape=len(lags),dtype=float)
+    error_sum = np.zeros(shape=len(lags),dtype=float)
+    for first_chain in range(0,nchains,block_size):
+        data = fileio.rawdata_chains(segments,first_chain,first_chain+block_size,n)
+        xav = fft_correlation.lag_averages(data,lags,1)
+        average_sum += np.sum(xav,axis=0)
+        error_sum += np.sum(lag_errors(data,lags,xav,1),axis=0)
+
+    spacing = time_array[1]-time_array[0] if n > 1 else 0.0
+    return lags*spacing, average_sum/nchains, error_sum/(nchains*np.sqrt(nchains))
+
+
+def write_gt(filename,output,lags=None,max_mem=None):
+    '''
+    Calculate G(t) from a binary stress raw data file and write it to a text file (same format as Gt_result)
+
+    Args:
+        filename - binary stress raw data file
+        output - path of the text file
+        lags, max_mem - see calc_gt
+    Returns:
+        G(t) and error over time in the output file
+    '''
+    times, gt, error = calc_gt(filename,lags,max_mem)
+
+    with open(output,'w') as f:
+        f.write('Time, G(t), Error\n')
+        for k in range(0,len(times)):
+            f.write("%d, %.4f, %.4f \n"%(times[k],gt[k],error[k]))
+
+    return
@@ -1,12 +1,18 @@
 import numpy as np
 import math
+import multiprocessing
+import os
 import random as rng
+from multiprocessing import shared_memory
+
+import core.chain_tables as chain_tables
 
 class ensemble_chains(object):
 
-    def __init__(self, config):
+    def __init__(self, config, table_cache=None):
         
         self.beta = config['beta']
+        self.table_cache = table_cache #directory of saved distribution tables (see chain_tables.get_tables)
         self.CD_flag = config['CD_flag']
         self.QN = np.zeros(shape=(config['Nchains'],config['NK'],4),dtype=float)
         self.tau_CD = np.zeros(shape=(config['Nchains'],config['NK']),dtype=float)
@@ -24,42 +30,19 @@ class ensemble_chains(object):
         Returns:
             Z - number of entangled strands in the chain
         '''
-        p = rng.uniform(0.0,1.0)
-        y = p/(1+self.beta)*math.pow(1+(1/self.beta),tNk)
-        z = 1
-        sum1 = 0.0
-        si = float(1.0/self.beta)
-        while sum1 < y:
-            sum1 += si
-            si = si/self.beta*(tNk-z)/z
-            z += 1
+        z_cdf, log_fact = chain_tables.get_tables(tNk,self.beta,self.table_cache)
 
-        return z-1
+        return chain_tables.sample_z(rng.uniform(0.0,1.0),z_cdf,tNk)
 
     
     def z_dist_truncated(self,tNk, z_max):
         '''
-        Determine the number of entangled strands in the chain and 
-        resample from the distribution if total Z is greater than the number of Kuhn steps in the chain
-        '''
-        tz = self.z_dist(tNk)
-        while (tz > z_max):
-            tz = self.z_dist(tNk)
-        return tz
-
-
-    def ratio(self, A, n, i):
-        '''
-        Function to calculate the ratio of two binomail coefficients:
-        ratio = (i-1)(A-n)!(A-i+1)!/((A-n-i+2)!A!)
+        Determine the number of entangled strands in the chain from the distribution truncated at z_max
+        (same as resampling while Z is greater than z_max)
         '''
+        z_cdf, log_fact = chain_tables.get_tables(tNk,self.beta,self.table_cache)
 
-        r = float(i-1)/float(A-n+1)
-        if n > 1:
-            for j in range(0, n-1):
-                r *= (float(A - i + 1 - j) / float(A - j))
-
-        return r
+        return chain_tables.sample_z(rng.uniform(0.0,1.0),z_cdf,z_max)
 
 
     def N_dist(self, ztmp, tNk):
@@ -79,14 +62,10 @@ class ensemble_chains(object):
             tN[0] = tNk
 
         else:
+            z_cdf, log_fact = chain_tables.get_tables(tNk,self.beta,self.table_cache)
             A = tNk-1
             for i in range(ztmp,1,-1):
-                p = rng.uniform(0.0,1.0)
-                Ntmp = 0
-                sumres = 0.0
-                while (p>=sumres) and (Ntmp != (A-i+2)):
-                    Ntmp+=1
-                    sumres += self.ratio(A, Ntmp, i)
+                Ntmp = chain_tables.sample_strand(rng.uniform(0.0,1.0),A,i,log_fact)
                 tN[i-1] = Ntmp
                 A = A - Ntmp
             tN[0] = A + 1
@@ -162,3 +141,197 @@ class ensemble_chains(object):
 
         return
 
+
+    def batch_init(self, Nk, z_max, seed, pcd=None, max_mem=None):
+        '''
+        Initialize all chains in the ensemble with NumPy random number generators (same distributions as chain_init), in chunks of
+        chains whose temporary arrays fit in max_mem. Each chunk draws from a generator seeded with seed plus its first chain.
+
+        Args:
+            Nk - total number of Kuhn steps in each chain
+            z_max - maximum number of entangled strands each chain can have (currently, set to Nk)
+            seed - seed of the NumPy random number generator
+            pcd - probability density for the entanglement to have a characteristic CD lifetime
+            max_mem - memory available for the temporary arrays in bytes (default all chains at once)
+
+        Returns:
+            None - sets Q, N, Z and tau_CD of all chains
+        '''
+        nchains = self.Z.shape[0]
+        chunk = nchains
+        if max_mem is not None:
+            chunk = max(int(max_mem//batch_init_memory(Nk)),1)
+
+        for first in range(0,nchains,chunk):
+            self.batch_init_chains(first,min(first+chunk,nchains),Nk,z_max,np.random.default_rng(seed+first),pcd)
+
+        return
+
+
+    def batch_init_chains(self, first, last, Nk, z_max, gen, pcd=None):
+        '''
+        Initialize chains first to last-1 at once with the NumPy random number generator gen (see batch_init)
+        '''
+        nchains = last-first
+
+        #equilibrium distribution of z_dist is P(Z) ~ binomial(Nk-1,Z-1)/beta**(Z-1), so Z-1 is binomial with p = 1/(1+beta)
+        tz = 1 + gen.binomial(Nk-1, 1.0/(1.0+self.beta), size=nchains)
+        while np.any(tz > z_max):
+            redraw = tz > z_max
+            tz[redraw] = 1 + gen.binomial(Nk-1, 1.0/(1.0+self.beta), size=np.count_nonzero(redraw))
+        self.Z[first:last] = tz
+
+        #N_dist draws the Kuhn steps of the strands uniformly from all partitions of Nk into Z strands, which is the same as
+        #placing the Z-1 slip-links between randomly chosen pairs of neighbouring Kuhn steps
+        link_rank = np.argsort(np.argsort(gen.random(size=(nchains,Nk-1)),axis=1),axis=1)
+        link_before = np.zeros(shape=(nchains,Nk),dtype=np.int64) #slip-link between Kuhn step k-1 and k
+        link_before[:,1:] = link_rank < (tz-1)[:,np.newaxis]
+        strand = np.cumsum(link_before,axis=1) #strand of each Kuhn step
+        tN = np.bincount((strand + Nk*np.arange(nchains)[:,np.newaxis]).ravel(),minlength=nchains*Nk).reshape(nchains,Nk)
+
+        #Q of entangled strands (dangling ends are not part of the distribution)
+        inside = (np.arange(Nk)[np.newaxis,:] >= 1) & (np.arange(Nk)[np.newaxis,:] < (tz-1)[:,np.newaxis])
+        Q = gen.standard_normal(size=(nchains,Nk,3))*np.sqrt(tN/3.0)[:,:,np.newaxis]
+        Q[~inside] = 0.0
+
+        self.QN[first:last,:,0:3] = Q
+        self.QN[first:last,:,3] = tN
+
+        #inverse CD lifetimes of the first Z-1 strands (inf without CD, same as chain_init)
+        strands = np.arange(Nk)[np.newaxis,:] < (tz-1)[:,np.newaxis]
+        tau_CD = np.zeros(shape=(nchains,Nk),dtype=float)
+        if self.CD_flag != 0:
+            tau_CD[strands] = 1.0/pcd.tau_CD_f_t_batch(gen.random(size=np.count_nonzero(strands)))
+        else:
+            tau_CD[strands] = np.inf
+        self.tau_CD[first:last] = tau_CD
+
+        return
+
+
+    def stream_init(self, chainIdx, Nk, z_max, gen, pcd=None):
+        '''
+        Initialize chain chainIdx with its own NumPy random number generator gen (same distributions as chain_init)
+
+        Args:
+            chainIdx - index of the chain in the ensemble for array handling
+            Nk - total number of Kuhn steps in each chain
+            z_max - maximum number of entangled strands each chain can have (currently, set to Nk)
+            gen - random number generator of the chain
+            pcd - probability density for the entanglement to have a characteristic CD lifetime
+
+        Returns:
+            None - sets Q, N, Z and tau_CD of the chain
+        '''
+        #Z-1 is binomial with p = 1/(1+beta), Kuhn steps are partitioned uniformly (see batch_init)
+        tz = 1 + gen.binomial(Nk-1, 1.0/(1.0+self.beta))
+        while tz > z_max:
+            tz = 1 + gen.binomial(Nk-1, 1.0/(1.0+self.beta))
+        self.Z[chainIdx] = tz
+
+        links = np.sort(gen.choice(Nk-1, size=tz-1, replace=False)) + 1
+        tN = np.diff(np.concatenate(([0], links, [Nk])))
+
+        self.QN[chainIdx] = 0.0
+        self.QN[chainIdx,0:tz,3] = tN
+        if tz > 2: #dangling ends not part of distribution
+            self.QN[chainIdx,1:tz-1,0:3] = gen.standard_normal(size=(tz-2,3))*np.sqrt(tN[1:tz-1]/3.0)[:,np.newaxis]
+
+        self.tau_CD[chainIdx] = 0.0
+        if self.CD_flag != 0:
+            self.tau_CD[chainIdx,0:tz-1] = 1.0/pcd.tau_CD_f_t_batch(gen.random(size=tz-1))
+        else:
+            self.tau_CD[chainIdx,0:tz-1] = np.inf
+
+        return
+
+
+    def parallel_init(self, Nk, z_max, seed, pcd=None, workers=None, first=0):
+        '''
+        Initialize all chains in the ensemble on a pool of worker processes. Each chain draws from its own random number stream
+        derived from (seed, chain index), so the conformations do not depend on the number of workers.
+
+        Args:
+            Nk - total number of Kuhn steps in each chain
+            z_max - maximum number of entangled strands each chain can have (currently, set to Nk)
+            seed - seed of the random number streams
+            pcd - probability density for the entanglement to have a characteristic CD lifetime
+            workers - number of worker processes (defaults to the number of CPU cores)
+            first - index of the first chain in the whole ensemble (chains of a shard use the streams of their ensemble index)
+
+        Returns:
+            None - sets Q, N, Z and tau_CD of all chains
+        '''
+        nchains = self.Z.shape[0]
+        if workers is None:
+            workers = os.cpu_count()
+        workers = max(min(workers, nchains), 1)
+
+        if workers == 1:
+            for i in range(0, nchains):
+                self.stream_init(i, Nk, z_max, chain_stream(seed, first+i), pcd)
+            return
+
+        #workers write their chains straight into shared memory, which is then copied to the ensemble arrays
+        buffers = {name: shared_memory.SharedMemory(create=True, size=max(getattr(self,name).nbytes,1)) for name in ('QN','tau_CD','Z')}
+        try:
+            blocks = [(w*nchains//workers, (w+1)*nchains//workers) for w in range(0, workers)]
+            layout = {name: (buffers[name].name, getattr(self,name).shape) for name in buffers}
+            config = {'beta': self.beta, 'CD_flag': self.CD_flag}
+            with multiprocessing.get_context('spawn').Pool(workers) as pool:
+                pool.starmap(init_block, [(layout, config, start, end, first, Nk, z_max, seed, pcd) for start, end in blocks])
+
+            for name in buffers:
+                getattr(self,name)[...] = np.ndarray(getattr(self,name).shape, dtype=float, buffer=buffers[name].buf)
+        finally:
+            for name in buffers:
+                buffers[name].close()
+                buffers[name].unlink()
+
+        return
+
+
+def batch_init_memory(Nk):
+    '''
+    Bytes of the temporary arrays of ensemble_chains.batch_init for each chain (random keys of the slip-link positions and their two
+    argsorts, slip-link flags, strand indices, Kuhn steps of each strand, and Q with its Gaussian draws and scale, up to 12 float64
+    or int64 values for each Kuhn step)
+    '''
+    return 12*8*Nk
+
+
+def chain_stream(seed, chainIdx):
+    '''
+    Random number generator of chain chainIdx (independent streams spawned from the seed)
+    '''
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chainIdx,)))
+
+
+def init_block(layout, config, start, end, first, Nk, z_max, seed, pcd):
+    '''
+    Initialize chains start to end-1 in the shared memory arrays of layout (worker process of ensemble_chains.parallel_init)
+    '''
+    buffers = {name: shared_memory.SharedMemory(name=layout[name][0]) for name in layout}
+    try:
+        chain = ensemble_chains.__new__(ensemble_chains)
+        chain.beta = config['beta']
+        chain.CD_flag = config['CD_flag']
+        for name in layout:
+            setattr(chain, name, np.ndarray(layout[name][1], dtype=float, buffer=buffers[name].buf))
+        for i in range(start, end):
+            chain.stream_init(i, Nk, z_max, chain_stream(seed, first+i), pcd)
+        del chain
+    finally:
+        for name in buffers:
+            buffers[name].close()
+
+    return
+
+
+def chain_order(array, QN_head):
+    '''
+    Copy of a strand array (QN, tau_CD, t_cr or new_Q) with the strands of each chain in chain order, starting from slot QN_head
+    of the chain (strands are stored in a ring of slots during the simulation, see chain_kernel.ring_index)
+    '''
+    slots = (np.asarray(QN_head,dtype=int)[:,None] + np.arange(array.shape[1])[None,:]) % array.shape[1]
+    return array[np.arange(array.shape[0])[:,None],slots]
@@ -0,0 +1,1275 @@
+import math
+from numba import jit
+
+import core.philox_random as philox_random
+
+#Single-chain versions of the ensemble kernels. Each function works on one chain (index i) and is compiled with the generic
+#numba @jit decorator, so the same code runs on host cores (CPU backend) and can be called from inside CUDA kernels.
+
+#Strand storage: the strands of chain i are kept in a ring of QN.shape[1] slots that starts at slot QN_head[i], so strand j is stored at
+#slot ring_index(QN_head[i],j,QN.shape[1]). tau_CD, t_cr (slip-link j is stored with strand j) and new_Q use the same slots, while
+#shift_probs and the rate tree are indexed by strand. Creating or destroying a slip-link at the beginning of the chain moves the head 
+#instead of all strands, and a slip-link inside the chain moves only the strands on its shorter side (see insert_strand and remove_strand).
+
+@jit(nopython=True, error_model='numpy')
+def ring_index(head,j,size):
+    '''
+    Slot of strand j in a ring of size slots starting at slot head (j < size)
+    '''
+    k = head + j
+    if k >= size:
+        k -= size
+    return k
+
+
+@jit(nopython=True, error_model='numpy')
+def apply_flow(QN,i,j,dt,kappa):
+    '''
+    Apply deformation to the strand in slot j of chain i (same as ensemble_kernel.apply_flow)
+    Args:
+        QN - chain conformations and number of Kuhn steps in each strand
+        i - chain index
+        j - slot of the strand (see ring_index)
+        dt - chain time step
+        kappa - strain tensor
+    Returns:
+        None (updates strand orientation in QN)
+    '''
+    Qx = QN[i,j,0]
+    Qy = QN[i,j,1]
+    Qz = QN[i,j,2]
+    QN[i,j,0] = Qx + dt*kappa[0]*Qx + dt*kappa[1]*Qy + dt*kappa[2]*Qz
+    QN[i,j,1] = Qy + dt*kappa[3]*Qx + dt*kappa[4]*Qy + dt*kappa[5]*Qz
+    QN[i,j,2] = Qz + dt*kappa[6]*Qx + dt*kappa[7]*Qy + dt*kappa[8]*Qz
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def calc_strand_prob(i,Z,QN,QN_head,flow,tdt,kappa,tau_CD,shift_probs,CD_flag,CD_create_prefact):
+    '''
+    Calculate probabilities for Kuhn step shuffling and entanglement creation/destruction by CD for all strands of chain i
+
+    Args:
+        i - chain index
+        Z - number of entangled strands for each chain
+        QN - chain conformations and number of Kuhn steps in each strand
+        QN_head - slot of the first strand of each chain (see ring_index)
+        flow - boolean variable to determine whether to apply deformation
+        tdt - time steps of each chain
+        kappa - strain tensor (if flow = True, kappa contains non-zero values)
+        tau_CD - entanglement lifetime for probability of destruction due to constraint dynamics
+        shift_probs - array to store probabilities for chain entanglement process (shuffle, creation, destroy, etc)
+        CD_flag - binary flag for determining whether constraint dynamics are implemented (0 - off, 1 - on)
+        CD_create_prefact - variable used to calculate probability to create entanglement
+    Returns:
+        None
+    '''
+    tz = int(Z[i])
+
+    for j in range(0,tz+1):
+        shift_probs[i,j,0] = shift_probs[i,j,1] = shift_probs[i,j,2] = shift_probs[i,j,3] = 0.0
+
+    #deform all strands before calculating probabilities (the GPU kernel syncs threads for this)
+    if flow:
+        dt = tdt[i]
+        for j in range(0,tz):
+            apply_flow(QN,i,ring_index(QN_head[i],j,QN.shape[1]),dt,kappa)
+
+    for j in range(0,tz-1):
+        strand_prob(i,j,QN,QN_head,tau_CD,shift_probs,CD_flag,CD_create_prefact)
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def strand_prob(i,j,QN,QN_head,tau_CD,shift_probs,CD_flag,CD_create_prefact):
+    '''
+    Calculate probabilities for Kuhn step shuffling and entanglement destruction/creation by CD for strand j of chain i (j < Z-1)
+    '''
+    s = ring_index(QN_head[i],j,QN.shape[1])
+    s1 = ring_index(QN_head[i],j+1,QN.shape[1])
+    N_i = QN[i,s,3]
+    N_ip1 = QN[i,s1,3]
+    Q_i = QN[i,s,0]**2 + QN[i,s,1]**2 + QN[i,s,2]**2
+    Q_ip1 = QN[i,s1,0]**2 + QN[i,s1,1]**2 + QN[i,s1,2]**2
+
+    shift_probs[i,j,0] = shift_probs[i,j,1] = shift_probs[i,j,2] = shift_probs[i,j,3] = 0.0
+
+    if N_ip1 > 1.0:
+        sig1 = 0.75 / (N_i*(N_i+1))
+        sig2 = 0.75 / (N_ip1*(N_ip1-1))
+        if Q_i==0.0:
+            prefactor1 = 1.0
+            f1 = 2.0*N_i+0.5
+        else:
+            prefactor1 = N_i / (N_i + 1)
+            f1 = N_i
+        if Q_ip1 == 0.0:
+            prefactor2 = 1.0
+            f2 = 2.0*N_ip1-0.5
+        else:
+            prefactor2 = N_ip1 / (N_ip1 - 1)
+            f2 = N_ip1
+
+        friction = 2.0 / (f1 + f2)
+        shift_probs[i,j,0] = friction*math.pow(prefactor1*prefactor2,0.75)*math.exp(Q_i*sig1-Q_ip1*sig2)
+
+    if N_i > 1.0:
+        sig1 = 0.75 / (N_i*(N_i-1))
+        sig2 = 0.75 / (N_ip1*(N_ip1+1))
+        if Q_i == 0.0:
+            prefactor1 = 1.0
+            f1 = 2.0*N_i-0.5
+        else:
+            prefactor1 = N_i / (N_i - 1)
+            f1 = N_i
+        if Q_ip1 == 0.0:
+            prefactor2 = 1.0
+            f2 = 2.0*N_ip1+0.5
+        else:
+            prefactor2 = N_ip1 / (N_ip1 + 1)
+            f2 = N_ip1
+
+        friction = 2.0 / (f1 + f2)
+        shift_probs[i,j,1] = friction*math.pow(prefactor1*prefactor2,0.75)*math.exp(-Q_i*sig1+Q_ip1*sig2)
+
+    if CD_flag==1:
+        shift_probs[i,j,2] = tau_CD[i,s]
+        shift_probs[i,j,3] = CD_create_prefact*(N_i-1.0)
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def calc_chainends_prob(i,Z,QN,QN_head,shift_probs,CD_flag,CD_create_prefact,beta,Nk):
+    '''
+    Calculate probabilities for entanglement creation or destruction by SD at the ends of chain i
+
+    Args:
+        i - chain index
+        Z - number of entangled strands for each chain
+        QN - chain conformations and number of Kuhn steps in each strand
+        QN_head - slot of the first strand of each chain (see ring_index)
+        shift_probs - array to store probabilities for chain entanglement process (shuffle, creation, destroy, etc)
+        CD_flag - binary flag for determining whether constraint dynamics are implemented (0 - off, 1 - on)
+        CD_create_prefact - variable used to calculate probability to create entanglement
+        beta - entanglement activity parameter (e.g. beta = 1 for CFSM)
+        Nk - maximum number of Kuhn steps in chain (from input.yaml file)
+    Returns:
+        None
+    '''
+    tz = int(Z[i])
+    first = QN_head[i]
+    last = ring_index(first,tz-1,QN.shape[1])
+
+    shift_probs[i,tz,0] = shift_probs[i,tz,1] = shift_probs[i,tz,2] = shift_probs[i,tz,3] = 0.0
+    shift_probs[i,tz-1,0] = shift_probs[i,tz-1,1] = shift_probs[i,tz-1,2] = shift_probs[i,tz-1,3] = 0.0
+
+    if tz == 1:
+        shift_probs[i,tz-1,1] = (1.0 / (beta*Nk))
+        shift_probs[i,tz,1] = (1.0 / (beta*Nk))
+
+    else:
+        if QN[i,first,3] == 1.0: #destruction by SD at the beginning
+            second = ring_index(first,1,QN.shape[1])
+            if tz == 2:
+                c = QN[i,second,3] + 0.25
+            else:
+                c = QN[i,second,3] * 0.5
+            shift_probs[i,tz,0] = (1.0 / (c+0.75))
+
+        else: #creation by SD at the beginning
+            shift_probs[i,tz,1] = (2.0 / (beta * (QN[i,first,3]+0.5)))
+
+        if QN[i,last,3] == 1.0: #destruction by SD at the end
+            before_last = ring_index(first,tz-2,QN.shape[1])
+            if tz == 2:
+                c = QN[i,before_last,3] + 0.25
+            else:
+                c = QN[i,before_last,3] * 0.5
+            shift_probs[i,tz-1,0] = (1.0 / (c+0.75))
+
+        else: #creation by SD at the end
+            shift_probs[i,tz-1,1] = (2.0 / (beta * (QN[i,last,3]+0.5)))
+
+    if CD_flag==1:
+        shift_probs[i,tz-1,3] = CD_create_prefact*(QN[i,last,3]-1.0)
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def choose_step(i,Z,shift_probs,sum_W_sorted,uniform_x,found_index,found_shift,add_rand,CD_flag):
+    '''
+    Choose the entanglement process applied to chain i (Kuhn step shuffle, entanglement creation/destruction)
+
+    Args:
+        i - chain index
+        Z - number of entangled strands for each chain
+        shift_probs - probabilities for entanglement process
+        sum_W_sorted - sum of all probabilities for each chain
+        uniform_x - uniform random number used to pick the process
+        found_index - strand index at which entanglement process will occur in chain
+        found_shift - value assigned to each chain for which entanglement process that will occur
+        add_rand - fraction of remaining probability for determining number of Kuhn steps during creation of a strand
+        CD_flag - binary flag for determining whether constraint dynamics are implemented (0 - off, 1 - on)
+    '''
+    tz = int(Z[i])
+
+    sum1 = 0.0
+    for j in range(0,tz+1):
+        if CD_flag==1:
+            sum1 += (shift_probs[i,j,0] + shift_probs[i,j,1] + shift_probs[i,j,2] + shift_probs[i,j,3])
+        else:
+            sum1 += (shift_probs[i,j,0] + shift_probs[i,j,1])
+
+    sum_W_sorted[i] = sum1
+    x = sum1*uniform_x
+
+    xFound = yFound = zFound = wFound = False
+    sum2 = 0.0
+    jFound = 0
+    w3 = 0.0
+
+    for j in range(0,tz+1):
+        jFound = j
+        w3 = shift_probs[i,j,3]
+
+        if sum2 < x:
+
+            xFound = (sum2 < x) and (x <= sum2 + shift_probs[i,j,0])
+            sum2 += shift_probs[i,j,0]
+
+            yFound = (sum2 < x) and (x <= sum2 + shift_probs[i,j,1])
+            sum2 += shift_probs[i,j,1]
+
+            if CD_flag==1:
+                zFound = (sum2 < x) and (x <= sum2 + shift_probs[i,j,2])
+                sum2 += shift_probs[i,j,2]
+                wFound = (sum2 < x) and (x <= sum2 + w3)
+                sum2 += w3
+
+        if xFound or yFound or zFound or wFound:
+            break
+
+    ii = jFound
+
+    if xFound:
+        set_jump(i,ii,0,tz,found_index,found_shift)
+    elif yFound:
+        set_jump(i,ii,1,tz,found_index,found_shift)
+    elif zFound:
+        set_jump(i,ii,2,tz,found_index,found_shift)
+    elif wFound:
+        set_jump(i,ii,3,tz,found_index,found_shift)
+        add_rand[i] = float(x - (sum2 - w3)) / float(w3)
+    else:
+        print("Error: no jump found for chain",i)
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def set_jump(i,ii,rate,tz,found_index,found_shift):
+    '''
+    Set jump type and index of chain i from the chosen row ii of shift_probs and the chosen rate in that row 
+    (0 - shuffle left or destroy by SD, 1 - shuffle right or create by SD, 2 - destroy by CD, 3 - create by CD)
+    '''
+    found_index[i] = ii
+    if rate == 0:
+        found_shift[i] = 0
+        if (ii == tz - 1):
+            found_index[i] = ii-1
+            found_shift[i] = 5 #destroy at end by SD
+        if (ii == tz):
+            found_index[i] = 0
+            found_shift[i] = 5 #destroy at beginning by SD
+    elif rate == 1:
+        found_shift[i] = 1
+        if (ii == tz - 1):
+            found_shift[i] = 3 #create at end by SD
+        if (ii == tz):
+            found_index[i] = 0
+            found_shift[i] = 6 #create at beginning by SD
+    elif rate == 2:
+        found_shift[i] = 2 #destroy by CD
+    else:
+        found_shift[i] = 4 #create by CD
+
+    return
+
+
+#Optional rate tree: for each chain, rate_tree[i] holds a binary segment tree over the total rate of each row of shift_probs.
+#Leaves start at index leaves = rate_tree.shape[1]//2 (row j is node leaves+j) and every parent node is the sum of its two children,
+#so the root rate_tree[i,1] is the total rate of the chain. After a Kuhn step shuffle only a few rows change, and the tree is
+#updated in O(log Z) instead of recalculating and searching all rows.
+
+@jit(nopython=True, error_model='numpy')
+def row_rate(i,j,shift_probs,CD_flag):
+    '''
+    Total rate of row j of shift_probs for chain i
+    '''
+    if CD_flag==1:
+        return shift_probs[i,j,0] + shift_probs[i,j,1] + shift_probs[i,j,2] + shift_probs[i,j,3]
+    return shift_probs[i,j,0] + shift_probs[i,j,1]
+
+
+@jit(nopython=True, error_model='numpy')
+def tree_set(i,j,shift_probs,rate_tree,CD_flag):
+    '''
+    Update leaf j of the rate tree of chain i and all partial sums above it
+    '''
+    node = rate_tree.shape[1]//2 + j
+    rate_tree[i,node] = row_rate(i,j,shift_probs,CD_flag)
+    node //= 2
+    while node >= 1:
+        rate_tree[i,node] = rate_tree[i,2*node] + rate_tree[i,2*node+1]
+        node //= 2
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def tree_build(i,Z,shift_probs,rate_tree,CD_flag):
+    '''
+    Build the rate tree of chain i from rows 0..Z of shift_probs (all other leaves are set to 0)
+    '''
+    tz = int(Z[i])
+    leaves = rate_tree.shape[1]//2
+
+    for j in range(0,leaves):
+        if j <= tz:
+            rate_tree[i,leaves+j] = row_rate(i,j,shift_probs,CD_flag)
+        else:
+            rate_tree[i,leaves+j] = 0.0
+
+    for node in range(leaves-1,0,-1):
+        rate_tree[i,node] = rate_tree[i,2*node] + rate_tree[i,2*node+1]
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def calc_rates(i,Z,QN,QN_head,tau_CD,shift_probs,rate_tree,CD_flag,CD_create_prefact,beta,NK):
+    '''
+    Calculate all probabilities of chain i (without deformation) and build its rate tree
+    '''
+    tz = int(Z[i])
+
+    for j in range(0,tz+1):
+        shift_probs[i,j,0] = shift_probs[i,j,1] = shift_probs[i,j,2] = shift_probs[i,j,3] = 0.0
+
+    for j in range(0,tz-1):
+        strand_prob(i,j,QN,QN_head,tau_CD,shift_probs,CD_flag,CD_create_prefact)
+
+    calc_chainends_prob(i,Z,QN,QN_head,shift_probs,CD_flag,CD_create_prefact,beta,NK)
+    tree_build(i,Z,shift_probs,rate_tree,CD_flag)
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def update_rates(i,Z,QN,QN_head,tau_CD,shift_probs,rate_tree,CD_flag,CD_create_prefact,beta,NK,jumpType,jumpIdx):
+    '''
+    Update the probabilities and rate tree of chain i after a jump (without deformation). A shuffle through slip-link jumpIdx only changes 
+    strands jumpIdx-1..jumpIdx+1 and the chain ends. Creation or destruction shifts the strand indices, so all rates are recalculated.
+    '''
+    tz = int(Z[i])
+
+    if jumpType == 0 or jumpType == 1:
+        jstart = jumpIdx-1
+        if jstart < 0:
+            jstart = 0
+        jend = jumpIdx+2
+        if jend > tz-1:
+            jend = tz-1
+        for j in range(jstart,jend):
+            strand_prob(i,j,QN,QN_head,tau_CD,shift_probs,CD_flag,CD_create_prefact)
+            tree_set(i,j,shift_probs,rate_tree,CD_flag)
+
+        calc_chainends_prob(i,Z,QN,QN_head,shift_probs,CD_flag,CD_create_prefact,beta,NK)
+        tree_set(i,tz-1,shift_probs,rate_tree,CD_flag)
+        tree_set(i,tz,shift_probs,rate_tree,CD_flag)
+
+    else:
+        calc_rates(i,Z,QN,QN_head,tau_CD,shift_probs,rate_tree,CD_flag,CD_create_prefact,beta,NK)
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def choose_step_tree(i,Z,shift_probs,rate_tree,sum_W_sorted,uniform_x,found_index,found_shift,add_rand,CD_flag):
+    '''
+    Choose the entanglement process applied to chain i by descending the rate tree (same arguments as choose_step)
+    '''
+    tz = int(Z[i])
+    leaves = rate_tree.shape[1]//2
+
+    sum_W_sorted[i] = rate_tree[i,1]
+    x = rate_tree[i,1]*uniform_x
+
+    if not x > 0.0:
+        print("Error: no jump found for chain",i)
+        return
+
+    #find row, do not step into an empty subtree due to rounding
+    node = 1
+    while node < leaves:
+        if x <= rate_tree[i,2*node] or rate_tree[i,2*node+1] == 0.0:
+            node = 2*node
+        else:
+            x -= rate_tree[i,2*node]
+            node = 2*node+1
+
+    ii = node - leaves
+
+    #find rate in row
+    nrates = 2
+    if CD_flag==1:
+        nrates = 4
+
+    rate = -1
+    for k in range(0,nrates):
+        w = shift_probs[i,ii,k]
+        if w > 0.0:
+            rate = k
+            if x <= w:
+                break
+            x -= w
+
+    if rate == -1:
+        print("Error: no jump found for chain",i)
+        return
+
+    if x > shift_probs[i,ii,rate]:
+        x = shift_probs[i,ii,rate]
+
+    set_jump(i,ii,rate,tz,found_index,found_shift)
+    if rate == 3:
+        add_rand[i] = x / shift_probs[i,ii,3]
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def chain_com(i,Z,QN,QN_head,QN_first,NK):
+    '''
+    Calculate the center of mass of chain i relative to the tracked first entanglement (MSD only)
+
+    Returns:
+        x, y, z components of the chain center of mass
+    '''
+    tz = int(Z[i])
+
+    com_x = com_y = com_z = 0.0
+    temp_x = temp_y = temp_z = 0.0
+    prev_x = prev_y = prev_z = 0.0
+
+    for j in range(0,tz):
+        s = ring_index(QN_head[i],j,QN.shape[1])
+        temp_x += prev_x
+        temp_y += prev_y
+        temp_z += prev_z
+        com_x += (temp_x + QN[i,s,0]/2.0) * QN[i,s,3] / NK
+        com_y += (temp_y + QN[i,s,1]/2.0) * QN[i,s,3] / NK
+        com_z += (temp_z + QN[i,s,2]/2.0) * QN[i,s,3] / NK
+        prev_x = QN[i,s,0]
+        prev_y = QN[i,s,1]
+        prev_z = QN[i,s,2]
+
+    return com_x + QN_first[i,0], com_y + QN_first[i,1], com_z + QN_first[i,2]
+
+
+@jit(nopython=True, error_model='numpy')
+def time_control_munch(i,Z,QN,QN_head,QN_first,NK,obs,chain_time,tdt,result,calc_type,reach_flag,next_sync_time,write_time,time_res,corrLevel,p,g,m):
+    '''
+    Control time of chain i and record stress/MSD values at write_time for the MUnCH correlator (see ensemble_kernel.time_control_munch_kernel).
+    Values are read from the running observables obs if it has columns (see calc_observables).
+    '''
+    if reach_flag[i] != 0:
+        return
+
+    #the next write time may also lie beyond the sync time if the last jump passed both
+    next_write = write_time[i]*time_res*m**corrLevel
+    if (chain_time[i] >= next_sync_time) and (chain_time[i] <= next_write or next_write > next_sync_time):
+
+        #if sync time is reached and stress was recorded, set reach flag to 1
+        reach_flag[i] = 1
+        tdt[i] = 0.0
+        write_time[i] = 1
+        chain_time[i] -= next_sync_time
+
+        return
+
+    if (chain_time[i] > write_time[i]*time_res*m**corrLevel): #if chain time reaches next time to record stress/CoM (every time_res)
+
+        tz = int(Z[i])
+
+        #row of write time write_time (after a jump over several write times, the missed ones are recorded in the following steps)
+        if corrLevel == 0:
+            arr_index = write_time[i]
+        else:
+            arr_index = write_time[i] + p*g
+
+        if calc_type == 1 and obs.shape[1] > 0:
+            store_stress(i,result,arr_index,result.shape[2],obs[i,0],obs[i,1],obs[i,2],obs[i,3],obs[i,4],obs[i,5])
+
+        elif calc_type == 1:
+            equilibrium_stress(i,Z,QN,QN_head,result,arr_index,result.shape[2]) #tau_xy (or all independent components with multi-component G(t))
+
+        elif calc_type == 2:
+            if obs.shape[1] > 0:
+                com_x, com_y, com_z = obs[i,6], obs[i,7], obs[i,8]
+            else:
+                com_x, com_y, com_z = chain_com(i,Z,QN,QN_head,QN_first,NK)
+            result[i,arr_index,0] = com_x
+            result[i,arr_index,1] = com_y
+            result[i,arr_index,2] = com_z
+
+        write_time[i]+=1
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def time_control(i,Z,QN,QN_head,new_Q,QN_first,NK,obs,chain_time,tdt,result,calc_type,flow,flow_off,flow_accum,reach_flag,next_sync_time,max_sync_time,write_time,time_res,result_index):
+    '''
+    Control time of chain i and record stress/MSD values at write_time for the RSVL correlator and flow (see ensemble_kernel.time_control_kernel).
+    Equilibrium values are read from the running observables obs if it has columns (see calc_observables). The flow stress tensor
+    is only calculated at each write time if flow_accum is True (otherwise it is calculated for all chains at the sync time).
+    '''
+    if not flow and not flow_off:
+        for k in range(0,result.shape[2]):
+            result[i,result_index,k] = 0.0
+
+    if reach_flag[i] != 0:
+        return
+
+    if (chain_time[i] >= next_sync_time) and chain_time[i] <= (write_time[i]*time_res):
+
+        #if sync time is reached and stress was recorded, set reach flag to 1
+        reach_flag[i] = 1
+        tdt[i] = 0.0
+
+        return
+
+    if (chain_time[i] > write_time[i]*time_res): #if chain time reaches next time to record stress/CoM (every time_res)
+
+        tz = int(Z[i])
+
+        if flow and flow_accum: #flow stress tensor at write_time, added to the flow accumulators by the caller (see add_flow_sample)
+            flow_stress(i,Z,QN,QN_head,result)
+
+        if not flow and not flow_off:
+
+            #the last value of each row flags a recorded value (used by the RSVL correlator)
+            if calc_type == 1:
+                if obs.shape[1] > 0:
+                    store_stress(i,result,result_index,result.shape[2]-1,obs[i,0],obs[i,1],obs[i,2],obs[i,3],obs[i,4],obs[i,5])
+                else:
+                    equilibrium_stress(i,Z,QN,QN_head,result,result_index,result.shape[2]-1)
+                result[i,result_index,result.shape[2]-1] = 1.0
+
+            elif calc_type == 2:
+                if obs.shape[1] > 0:
+                    com_x, com_y, com_z = obs[i,6], obs[i,7], obs[i,8]
+                else:
+                    com_x, com_y, com_z = chain_com(i,Z,QN,QN_head,QN_first,NK)
+                result[i,result_index,0] = com_x
+                result[i,result_index,1] = com_y
+                result[i,result_index,2] = com_z
+                result[i,result_index,result.shape[2]-1] = 1.0
+
+        if not flow and flow_off: #track equilibrium variables after cessation of flow
+
+            if int((chain_time[i]%max_sync_time)/time_res)==0 and write_time[i] != 0:
+                arr_index = int(max_sync_time/time_res)
+            else:
+                arr_index = int((chain_time[i]%max_sync_time)/time_res)
+
+            stress_xx = stress_yy = stress_zz = stress_xy = stress_yz = stress_xz = 0.0
+            count_new_Q = 0
+            for j in range(0,tz):
+                s = ring_index(QN_head[i],j,QN.shape[1])
+                stress_xx -= (3.0*QN[i,s,0]*QN[i,s,0] / QN[i,s,3]) #tau_xx
+                stress_yy -= (3.0*QN[i,s,1]*QN[i,s,1] / QN[i,s,3]) #tau_yy
+                stress_zz -= (3.0*QN[i,s,2]*QN[i,s,2] / QN[i,s,3]) #tau_zz
+                stress_xy -= (3.0*QN[i,s,0]*QN[i,s,1] / QN[i,s,3]) #tau_xy
+                stress_yz -= (3.0*QN[i,s,1]*QN[i,s,2] / QN[i,s,3]) #tau_yz
+                stress_xz -= (3.0*QN[i,s,0]*QN[i,s,2] / QN[i,s,3]) #tau_xz
+                if j < tz - 1:
+                    if new_Q[i,s] == 1:
+                        count_new_Q+=1
+
+            result[i,arr_index,0] = stress_xx
+            result[i,arr_index,1] = stress_yy
+            result[i,arr_index,2] = stress_zz
+            result[i,arr_index,3] = stress_xy
+            result[i,arr_index,4] = stress_yz
+            result[i,arr_index,5] = stress_xz
+            result[i,arr_index,6] = tz
+            result[i,arr_index,7] = count_new_Q/(tz-1)
+
+        write_time[i]+=1
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def equilibrium_stress(i,Z,QN,QN_head,result,row,ncomp):
+    '''
+    Record the stress of chain i in result[i,row] for G(t): tau_xy (ncomp 1), tau_xy, tau_yz and tau_xz (ncomp 3), or the five
+    independent components of the traceless stress tensor (ncomp 5): tau_xy, tau_yz, tau_xz, (tau_xx-tau_yy)/2 and
+    (tau_xx+tau_yy-2*tau_zz)/(2*sqrt(3)). In equilibrium, the autocorrelation of each of these components is G(t).
+    '''
+    stress_xx = stress_yy = stress_zz = stress_xy = stress_yz = stress_xz = 0.0
+    for j in range(0,int(Z[i])):
+        s = ring_index(QN_head[i],j,QN.shape[1])
+        stress_xy -= (3.0*QN[i,s,0]*QN[i,s,1] / QN[i,s,3]) #tau_xy
+        if ncomp > 1:
+            stress_yz -= (3.0*QN[i,s,1]*QN[i,s,2] / QN[i,s,3]) #tau_yz
+            stress_xz -= (3.0*QN[i,s,0]*QN[i,s,2] / QN[i,s,3]) #tau_xz
+        if ncomp > 3:
+            stress_xx -= (3.0*QN[i,s,0]*QN[i,s,0] / QN[i,s,3]) #tau_xx
+            stress_yy -= (3.0*QN[i,s,1]*QN[i,s,1] / QN[i,s,3]) #tau_yy
+            stress_zz -= (3.0*QN[i,s,2]*QN[i,s,2] / QN[i,s,3]) #tau_zz
+
+    store_stress(i,result,row,ncomp,stress_xx,stress_yy,stress_zz,stress_xy,stress_yz,stress_xz)
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def store_stress(i,result,row,ncomp,stress_xx,stress_yy,stress_zz,stress_xy,stress_yz,stress_xz):
+    '''
+    Store the ncomp stress components recorded for G(t) in result[i,row] (see equilibrium_stress)
+    '''
+    result[i,row,0] = stress_xy
+    if ncomp > 1:
+        result[i,row,1] = stress_yz
+        result[i,row,2] = stress_xz
+    if ncomp > 3:
+        result[i,row,3] = (stress_xx-stress_yy)/2.0
+        result[i,row,4] = (stress_xx+stress_yy-2.0*stress_zz)/(2.0*math.sqrt(3.0))
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def calc_observables(i,Z,QN,QN_head,QN_first,NK,obs):
+    '''
+    Sum the running observables of chain i over all strands: stress tensor tau_xx, tau_yy, tau_zz, tau_xy, tau_yz, tau_xz 
+    (columns 0-5) and center of mass (columns 6-8, same as chain_com). Between sums, they are updated by each jump (see strand_observables).
+    '''
+    for k in range(0,6):
+        obs[i,k] = 0.0
+    for j in range(0,int(Z[i])):
+        s = ring_index(QN_head[i],j,QN.shape[1])
+        obs[i,0] -= (3.0*QN[i,s,0]*QN[i,s,0] / QN[i,s,3]) #tau_xx
+        obs[i,1] -= (3.0*QN[i,s,1]*QN[i,s,1] / QN[i,s,3]) #tau_yy
+        obs[i,2] -= (3.0*QN[i,s,2]*QN[i,s,2] / QN[i,s,3]) #tau_zz
+        obs[i,3] -= (3.0*QN[i,s,0]*QN[i,s,1] / QN[i,s,3]) #tau_xy
+        obs[i,4] -= (3.0*QN[i,s,1]*QN[i,s,2] / QN[i,s,3]) #tau_yz
+        obs[i,5] -= (3.0*QN[i,s,0]*QN[i,s,2] / QN[i,s,3]) #tau_xz
+
+    com_x, com_y, com_z = chain_com(i,Z,QN,QN_head,QN_first,NK)
+    obs[i,6] = com_x
+    obs[i,7] = com_y
+    obs[i,8] = com_z
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def strand_observables(i,first,last,QN,QN_head,QN_first,NK,obs,sign):
+    '''
+    Add sign times the terms of strands first to last of chain i to the running observables (see calc_observables). A jump only changes
+    the strands next to it and keeps their total number of Kuhn steps, so its terms are removed before the jump (sign -1) and added
+    after it (sign 1). The center of mass terms are taken from the start of strand first (QN_first for the first strand, otherwise
+    the origin, which cancels because the start of the strand does not move).
+    '''
+    if first == 0:
+        x = QN_first[i,0]
+        y = QN_first[i,1]
+        z = QN_first[i,2]
+    else:
+        x = y = z = 0.0
+
+    for j in range(first,last+1):
+        s = ring_index(QN_head[i],j,QN.shape[1])
+        obs[i,0] -= sign*(3.0*QN[i,s,0]*QN[i,s,0] / QN[i,s,3]) #tau_xx
+        obs[i,1] -= sign*(3.0*QN[i,s,1]*QN[i,s,1] / QN[i,s,3]) #tau_yy
+        obs[i,2] -= sign*(3.0*QN[i,s,2]*QN[i,s,2] / QN[i,s,3]) #tau_zz
+        obs[i,3] -= sign*(3.0*QN[i,s,0]*QN[i,s,1] / QN[i,s,3]) #tau_xy
+        obs[i,4] -= sign*(3.0*QN[i,s,1]*QN[i,s,2] / QN[i,s,3]) #tau_yz
+        obs[i,5] -= sign*(3.0*QN[i,s,0]*QN[i,s,2] / QN[i,s,3]) #tau_xz
+        obs[i,6] += sign*(x + QN[i,s,0]/2.0) * QN[i,s,3] / NK
+        obs[i,7] += sign*(y + QN[i,s,1]/2.0) * QN[i,s,3] / NK
+        obs[i,8] += sign*(z + QN[i,s,2]/2.0) * QN[i,s,3] / NK
+        x += QN[i,s,0]
+        y += QN[i,s,1]
+        z += QN[i,s,2]
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def flow_stress(i,Z,QN,QN_head,stress):
+    '''
+    Calculate the flow stress tensor of chain i (see ensemble_kernel.calc_flow_stress)
+    '''
+    stress_xx = stress_yy = stress_zz = stress_xy = stress_yz = stress_xz = 0.0
+    for j in range(0,int(Z[i])):
+        s = ring_index(QN_head[i],j,QN.shape[1])
+        stress_xx -= (3.0*QN[i,s,0]*QN[i,s,0] / QN[i,s,3]) #tau_xx
+        stress_yy -= (3.0*QN[i,s,1]*QN[i,s,1] / QN[i,s,3]) #tau_yy
+        stress_zz -= (3.0*QN[i,s,2]*QN[i,s,2] / QN[i,s,3]) #tau_zz
+        stress_xy -= (3.0*QN[i,s,0]*QN[i,s,1] / QN[i,s,3]) #tau_xy
+        stress_yz -= (3.0*QN[i,s,1]*QN[i,s,2] / QN[i,s,3]) #tau_yz
+        stress_xz -= (3.0*QN[i,s,0]*QN[i,s,2] / QN[i,s,3]) #tau_xz
+
+    stress[i,0,0] = stress_xx
+    stress[i,0,1] = stress_yy
+    stress[i,0,2] = stress_zz
+    stress[i,0,3] = stress_xy
+    stress[i,0,4] = stress_yz
+    stress[i,0,5] = stress_xz
+    stress[i,0,6] = Z[i]
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def add_flow_sample(i,stress,flow_sums,w):
+    '''
+    Add the flow stress tensor of chain i recorded at write time w to the flow accumulators (see ensemble_kernel.add_flow_sample)
+
+    Args:
+        stress - flow stress tensor, Z and f_newQ of each chain (see flow_stress)
+        flow_sums - accumulators for each write time (ring of rows indexed by w), columns 0-7 hold the sums of the
+                    8 components, columns 8-15 the sums of squares and column 16 the number of samples
+        w - write time of the sample
+    '''
+    row = w % flow_sums.shape[0]
+    for k in range(0,8):
+        flow_sums[row,k] += stress[i,0,k]
+        flow_sums[row,8+k] += stress[i,0,k]*stress[i,0,k]
+    flow_sums[row,16] += 1.0
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def track_newQ(i,Z,new_Q,QN_head,found_shift,found_index):
+    '''
+    Track fraction of new entanglements of chain i after cessation of flow (see ensemble_kernel.track_newQ). Called before
+    the jump is applied, it moves the entanglements the same way as the strands (see insert_strand and remove_strand).
+    '''
+    jumpIdx = int(found_index[i])
+    jumpType = int(found_shift[i])
+    tz = int(Z[i])
+    size = new_Q.shape[1]
+    head = QN_head[i]
+
+    if jumpType == 4 or jumpType == 6:
+        #shift other entanglements (in place, a single thread owns the chain)
+        if insert_left(jumpIdx,tz):
+            head = ring_index(head,size-1,size)
+            for entIdx in range(0,jumpIdx):
+                new_Q[i,ring_index(head,entIdx,size)] = new_Q[i,ring_index(head,entIdx+1,size)]
+        else:
+            for entIdx in range(tz-1,jumpIdx,-1):
+                new_Q[i,ring_index(head,entIdx,size)] = new_Q[i,ring_index(head,entIdx-1,size)]
+        new_Q[i,ring_index(head,jumpIdx,size)] = 1
+
+    elif jumpType == 3:
+        new_Q[i,ring_index(head,jumpIdx+1,size)] = 0
+        new_Q[i,ring_index(head,jumpIdx,size)] = 1
+
+    elif jumpType == 2 or jumpType == 5:
+        if jumpIdx < tz-2:
+            if remove_left(jumpIdx,tz):
+                #shift the entanglements before jumpIdx +1 (the chain then starts one slot later)
+                for entIdx in range(jumpIdx-1,-1,-1):
+                    new_Q[i,ring_index(head,entIdx+1,size)] = new_Q[i,ring_index(head,entIdx,size)]
+            else:
+                new_Q[i,ring_index(head,jumpIdx,size)] = new_Q[i,ring_index(head,jumpIdx+1,size)]
+                #shift all strands -1 in array for deleted strand
+                for entIdx in range(jumpIdx+1,tz-1):
+                    new_Q[i,ring_index(head,entIdx,size)] = new_Q[i,ring_index(head,entIdx+1,size)]
+        elif jumpIdx == tz-2:
+            new_Q[i,ring_index(head,jumpIdx,size)] = 0
+            new_Q[i,ring_index(head,jumpIdx+1,size)] = 0
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def ft_bin(ft,nbins,ft_log,ft_scale):
+    '''
+    Histogram bin of the entanglement lifetime value ft = log10(t) + 10
+
+    Args:
+        ft - value of f_t for a chain
+        nbins - number of bins in the histogram
+        ft_log - if True, bins are evenly spaced in ft (log-spaced in lifetime), otherwise evenly spaced in lifetime
+        ft_scale - number of bins per unit of ft (or per unit of lifetime if ft_log is False)
+    Returns:
+        bin index, or -1 if ft is not recorded
+    '''
+    if not (ft > 0.0 and ft < 20):
+        return -1
+
+    if ft_log:
+        k = int(math.floor(ft*ft_scale))
+    else:
+        k = int(math.floor(math.pow(10.0,ft-10.0)*ft_scale))
+
+    if k >= nbins:
+        return -1
+
+    return k
+
+
+@jit(nopython=True, error_model='numpy')
+def apply_step(i,Z,QN,QN_head,QN_first,chain_time,time_compensation,sum_W_sorted,found_shift,found_index,tdt,
+               t_cr,f_t,tau_CD,rand_used,add_rand,tau_CD_used_SD,tau_CD_used_CD,tau_CD_gauss_rand_SD,tau_CD_gauss_rand_CD,obs,NK):
+    '''
+    Apply the chosen transition to chain i and update the chain time (see ensemble_kernel.apply_step_kernel). If obs has columns,
+    the running observables are updated with the strands changed by the jump (see strand_observables).
+    '''
+    #chosen process and location along chain
+    jumpIdx = int(found_index[i])
+    jumpType = int(found_shift[i])
+
+    #set time step to be length of time to make single jump
+    tdt[i] = 1.0 / sum_W_sorted[i]
+
+    #Use Kahan summation to update time of chain
+    y = tdt[i] - time_compensation[i]
+    t = chain_time[i] + y
+    time_compensation[i] = (t - chain_time[i] - y)
+    chain_time[i] = t
+
+    rand_used[i]+=1
+
+    #remove the terms of the strands changed by the jump (two for shuffles and destroys, one for creates)
+    use_obs = obs.shape[1] > 0 and jumpType >= 0 and jumpType <= 6
+    if use_obs:
+        if jumpType <= 2 or jumpType == 5:
+            strand_observables(i,jumpIdx,jumpIdx+1,QN,QN_head,QN_first,NK,obs,-1.0)
+        else:
+            strand_observables(i,jumpIdx,jumpIdx,QN,QN_head,QN_first,NK,obs,-1.0)
+
+    #apply jump processes to chain
+    if jumpType == 0 or jumpType == 1:
+        apply_shuffle(i, jumpIdx, jumpType, QN, QN_head)
+
+    if jumpType == 2 or jumpType == 5:
+        apply_destroy(i, jumpIdx, QN, QN_head, QN_first, Z, t_cr, tau_CD, f_t, chain_time)
+
+    if jumpType == 3 or jumpType == 6:
+        k = int(tau_CD_used_SD[i])
+        tau_CD_used_SD[i]+=1
+        apply_create_SD(i, jumpIdx, jumpType, QN, QN_head, QN_first, Z, t_cr, tau_CD, chain_time,
+                        tau_CD_gauss_rand_SD[i,k,0], tau_CD_gauss_rand_SD[i,k,1], tau_CD_gauss_rand_SD[i,k,2], tau_CD_gauss_rand_SD[i,k,3])
+
+    if jumpType == 4:
+        k = int(tau_CD_used_CD[i])
+        tau_CD_used_CD[i]+=1
+        apply_create_CD(i, jumpIdx, QN, QN_head, QN_first, Z, t_cr, tau_CD, add_rand[i],
+                        tau_CD_gauss_rand_CD[i,k,0], tau_CD_gauss_rand_CD[i,k,1], tau_CD_gauss_rand_CD[i,k,2], tau_CD_gauss_rand_CD[i,k,3])
+
+    #add the terms of the new strands (one after destroys, two after creates)
+    if use_obs:
+        if jumpType == 2 or jumpType == 5:
+            strand_observables(i,jumpIdx,jumpIdx,QN,QN_head,QN_first,NK,obs,1.0)
+        else:
+            strand_observables(i,jumpIdx,jumpIdx+1,QN,QN_head,QN_first,NK,obs,1.0)
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def step(i,Z,QN,QN_head,QN_first,NK,flow,flow_off,flow_accum,kappa,tau_CD,shift_probs,rate_tree,obs,CD_flag,CD_create_prefact,beta,sum_W_sorted,uniform_rand,rand_used,
+         found_index,found_shift,add_rand,new_Q,chain_time,time_compensation,tdt,t_cr,f_t,tau_CD_used_SD,tau_CD_used_CD,
+         tau_CD_gauss_rand_SD,tau_CD_gauss_rand_CD,rng_step,seed,chain_offset,discrete,pcd_array,pcd_table_eq,pcd_table_cr,pcd_table_tau,
+         res,calc_type,reach_flag,next_sync_time,max_sync_time,write_time,time_res,munch,corrLevel,p,g,m,result_index):
+    '''
+    Make one step of chain i (same sequence as one iteration of the GPU loop in main.py: calc_strand_prob, calc_chainends_prob,
+    time control, choose_step_kernel, track_newQ and apply_step_kernel). The chain should not have reached the sync time.
+
+    Args:
+        QN_head - slot of the first strand of each chain (see ring_index)
+        flow, flow_off - booleans for deformation and for tracking variables after cessation of flow
+        flow_accum - True if the flow stress tensor is recorded at each write time for the flow accumulators (see time_control)
+        rate_tree - rate tree of each chain (see tree_build), an array with no columns turns the rate tree off. Without deformation,
+                    the probabilities must be up to date before the first step (see calc_rates)
+        obs - running stress and center of mass of each chain, updated by each jump and used to record results (see calc_observables),
+              an array with no columns turns them off. The values must be up to date before the first step and are not used in flow
+        rng_step - number of steps made by each chain for counter-based random numbers (see philox_random), an array with no
+                   entries turns them off and random numbers are read from uniform_rand and tau_CD_gauss_rand_SD/CD. If on, 
+                   only the first entry of each random number array is used and the used counters stay 0
+        seed - key of the counter-based random numbers
+        chain_offset - index of chain 0 in the whole ensemble (a shard or batch), counter-based random numbers of chain i are drawn
+                       for chain chain_offset+i so they do not depend on how the ensemble is split
+        discrete, pcd_array, pcd_table_eq, pcd_table_cr, pcd_table_tau - p_cd statistics for tau_CD of new slip-links (see gpu_random)
+        munch - True if time_control_munch is used to record results, otherwise time_control is used
+        result_index - row of the RSVL result array for this step
+        remaining arguments - see ensemble_kernel (scalar parameters are passed as values instead of arrays)
+    '''
+    use_tree = rate_tree.shape[1] > 0
+
+    #with the rate tree and no deformation, probabilities are updated after each jump (see update_rates)
+    if flow or not use_tree:
+        calc_strand_prob(i,Z,QN,QN_head,flow,tdt,kappa,tau_CD,shift_probs,CD_flag,CD_create_prefact)
+        calc_chainends_prob(i,Z,QN,QN_head,shift_probs,CD_flag,CD_create_prefact,beta,NK)
+        if use_tree:
+            tree_build(i,Z,shift_probs,rate_tree,CD_flag)
+
+    if munch:
+        time_control_munch(i,Z,QN,QN_head,QN_first,NK,obs,chain_time,tdt,res,calc_type,reach_flag,next_sync_time,write_time,time_res,corrLevel,p,g,m)
+    else:
+        time_control(i,Z,QN,QN_head,new_Q,QN_first,NK,obs,chain_time,tdt,res,calc_type,flow,flow_off,flow_accum,reach_flag,next_sync_time,max_sync_time,
+                     write_time,time_res,result_index)
+
+    if reach_flag[i] != 0:
+        return
+
+    use_philox = rng_step.shape[0] > 0
+
+    if use_philox:
+        uniform_rand[i,0] = philox_random.philox_uniform(seed,chain_offset+i,rng_step[i])
+
+    if use_tree:
+        choose_step_tree(i,Z,shift_probs,rate_tree,sum_W_sorted,uniform_rand[i,int(rand_used[i])],found_index,found_shift,add_rand,CD_flag)
+    else:
+        choose_step(i,Z,shift_probs,sum_W_sorted,uniform_rand[i,int(rand_used[i])],found_index,found_shift,add_rand,CD_flag)
+
+    #draw random numbers for a new slip-link only if one is created
+    if use_philox:
+        if found_shift[i] == 3 or found_shift[i] == 6:
+            philox_random.philox_gauss_tauCD(seed,i,chain_offset+i,rng_step[i],discrete,True,CD_flag,tau_CD_gauss_rand_SD,pcd_array,pcd_table_eq,pcd_table_cr,pcd_table_tau)
+        elif found_shift[i] == 4:
+            philox_random.philox_gauss_tauCD(seed,i,chain_offset+i,rng_step[i],discrete,False,CD_flag,tau_CD_gauss_rand_CD,pcd_array,pcd_table_eq,pcd_table_cr,pcd_table_tau)
+
+    if not flow and flow_off:
+        track_newQ(i,Z,new_Q,QN_head,found_shift,found_index)
+
+    apply_step(i,Z,QN,QN_head,QN_first,chain_time,time_compensation,sum_W_sorted,found_shift,found_index,tdt,
+               t_cr,f_t,tau_CD,rand_used,add_rand,tau_CD_used_SD,tau_CD_used_CD,tau_CD_gauss_rand_SD,tau_CD_gauss_rand_CD,obs,NK)
+
+    if use_philox:
+        rng_step[i] += 1
+        rand_used[i] = tau_CD_used_SD[i] = tau_CD_used_CD[i] = 0
+
+    if use_tree and not flow:
+        update_rates(i,Z,QN,QN_head,tau_CD,shift_probs,rate_tree,CD_flag,CD_create_prefact,beta,NK,int(found_shift[i]),int(found_index[i]))
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def apply_shuffle(i, jumpIdx, jumpType, QN, QN_head):
+    '''
+    Shift Kuhn step left/right through slip-link
+    '''
+    s = ring_index(QN_head[i],jumpIdx,QN.shape[1])
+    s1 = ring_index(QN_head[i],jumpIdx+1,QN.shape[1])
+    if jumpType == 0: #shuffling left
+        QN[i,s,3] += 1
+        QN[i,s1,3] -= 1
+    elif jumpType == 1: #shuffling right
+        QN[i,s,3] -= 1
+        QN[i,s1,3] += 1
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def insert_left(jumpIdx, tz):
+    '''
+    True if a new strand jumpIdx is inserted by moving the strands before it (fewer than the tz-jumpIdx strands from jumpIdx on)
+    '''
+    return jumpIdx < tz-jumpIdx
+
+
+@jit(nopython=True, error_model='numpy')
+def remove_left(jumpIdx, tz):
+    '''
+    True if strand jumpIdx+1 is removed by moving the strands before jumpIdx (fewer than the strands after jumpIdx+1)
+    '''
+    return jumpIdx < tz-2-jumpIdx
+
+
+@jit(nopython=True, error_model='numpy')
+def move_strand(i, src, dst, QN, t_cr, tau_CD):
+    '''
+    Copy the strand and slip-link stored in slot src of chain i to slot dst
+    '''
+    for k in range(0,4):
+        QN[i,dst,k] = QN[i,src,k]
+    t_cr[i,dst] = t_cr[i,src]
+    tau_CD[i,dst] = tau_CD[i,src]
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def insert_strand(i, jumpIdx, tz, QN, QN_head, t_cr, tau_CD):
+    '''
+    Make room for a new strand jumpIdx in chain i of tz strands. The old strand jumpIdx becomes strand jumpIdx+1 with its slip-link,
+    the caller sets both strands and slip-link jumpIdx. The strands on the shorter side are moved by one slot (the head moves with
+    the strands before jumpIdx).
+    '''
+    size = QN.shape[1]
+    if insert_left(jumpIdx,tz):
+        head = ring_index(QN_head[i],size-1,size)
+        QN_head[i] = head
+        for j in range(0,jumpIdx):
+            move_strand(i, ring_index(head,j+1,size), ring_index(head,j,size), QN, t_cr, tau_CD)
+    else:
+        head = QN_head[i]
+        for j in range(tz,jumpIdx,-1):
+            move_strand(i, ring_index(head,j-1,size), ring_index(head,j,size), QN, t_cr, tau_CD)
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def remove_strand(i, jumpIdx, tz, QN, QN_head, t_cr, tau_CD):
+    '''
+    Remove slip-link jumpIdx and strand jumpIdx+1 from chain i of tz strands (jumpIdx < tz-2, or tz = 2). Slip-link jumpIdx+1
+    becomes slip-link jumpIdx and the caller sets the joined strand jumpIdx. The strands on the shorter side are moved by one slot
+    (the head moves with the strands before jumpIdx) and the freed slot is set to 0s.
+    '''
+    size = QN.shape[1]
+    head = QN_head[i]
+    if remove_left(jumpIdx,tz):
+        for j in range(jumpIdx-1,-1,-1):
+            move_strand(i, ring_index(head,j,size), ring_index(head,j+1,size), QN, t_cr, tau_CD)
+        free = head
+        QN_head[i] = ring_index(head,1,size)
+    else:
+        for j in range(jumpIdx,tz-1):
+            move_strand(i, ring_index(head,j+1,size), ring_index(head,j,size), QN, t_cr, tau_CD)
+        free = ring_index(head,tz-1,size)
+
+    QN[i,free,0] = QN[i,free,1] = QN[i,free,2] = QN[i,free,3] = 0.0
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def apply_destroy(i, jumpIdx, QN, QN_head, QN_first, Z, t_cr, tau_CD, f_t, chain_time):
+    '''
+    Destroy a slip-link along chain i
+    '''
+    tz = int(Z[i])
+    s = ring_index(QN_head[i],jumpIdx,QN.shape[1])
+    s1 = ring_index(QN_head[i],jumpIdx+1,QN.shape[1])
+
+    cr_time = t_cr[i,s]
+
+    Z[i]-=1
+
+    if cr_time != 0:
+        f_t[i] = math.log10(chain_time[i] - cr_time) + 10
+
+    if jumpIdx == 0:
+        #destroy entanglement at beginning of chain
+
+        #update change to first entanglement location
+        for k in range(0,3):
+            QN_first[i,k] += QN[i,s1,k]
+
+        #destroy first strand and set N
+        N = QN[i,s,3] + QN[i,s1,3]
+
+        #remove the first slip-link (moves the head of the chain)
+        remove_strand(i, jumpIdx, tz, QN, QN_head, t_cr, tau_CD)
+
+        s = QN_head[i]
+        QN[i,s,0] = QN[i,s,1] = QN[i,s,2] = 0.0
+        QN[i,s,3] = N
+
+    elif jumpIdx == tz-2:
+        #destroy entanglement at end of chain
+
+        QN[i,s,3] = QN[i,s,3] + QN[i,s1,3]
+        QN[i,s,0] = QN[i,s,1] = QN[i,s,2] = 0.0
+
+        t_cr[i,s] = 0.0
+        tau_CD[i,s] = 0.0
+
+        QN[i,s1,0] = QN[i,s1,1] = QN[i,s1,2] = QN[i,s1,3] = 0.0
+
+        t_cr[i,s1] = 0.0
+        tau_CD[i,s1] = 0.0
+
+    else:
+        #destroy entanglement at jumpIdx
+        Qx = QN[i,s,0] + QN[i,s1,0]
+        Qy = QN[i,s,1] + QN[i,s1,1]
+        Qz = QN[i,s,2] + QN[i,s1,2]
+        N = QN[i,s,3] + QN[i,s1,3]
+
+        #remove the slip-link by moving the strands on the shorter side
+        remove_strand(i, jumpIdx, tz, QN, QN_head, t_cr, tau_CD)
+
+        s = ring_index(QN_head[i],jumpIdx,QN.shape[1])
+        QN[i,s,0] = Qx
+        QN[i,s,1] = Qy
+        QN[i,s,2] = Qz
+        QN[i,s,3] = N
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def apply_create_SD(i, jumpIdx, jumpType, QN, QN_head, QN_first, Z, t_cr, tau_CD, chain_time, gauss_x, gauss_y, gauss_z, tCD):
+    '''
+    Create a slip-link at an end of chain i due to sliding dynamics (SD)
+    '''
+    tz = int(Z[i])
+
+    Z[i]+=1
+
+    #set new N for new strand
+    new_N = QN[i,ring_index(QN_head[i],jumpIdx,QN.shape[1]),3] - 1.0
+
+    if tz==1:
+        sigma = 0.0
+    else:
+        sigma = math.sqrt(new_N / 3.0)
+
+    #calculate Q for new strand
+    Qx = gauss_x*sigma
+    Qy = gauss_y*sigma
+    Qz = gauss_z*sigma
+
+    if jumpType == 3:
+        #create new strand at end of chain from sliding dynamics
+        s = ring_index(QN_head[i],jumpIdx,QN.shape[1])
+        s1 = ring_index(QN_head[i],jumpIdx+1,QN.shape[1])
+
+        #set strand at end
+        QN[i,s1,0] = QN[i,s1,1] = QN[i,s1,2] = 0.0
+        QN[i,s1,3] = 1.0
+
+        t_cr[i,s1] = 0.0
+        tau_CD[i,s1] = 0.0
+
+        #set new strand at tz-1
+        QN[i,s,0] = Qx
+        QN[i,s,1] = Qy
+        QN[i,s,2] = Qz
+        QN[i,s,3] = new_N
+
+        tau_CD[i,s] = tCD
+        t_cr[i,s] = chain_time[i]
+
+    elif jumpType == 6:
+        #create new strand at beginning of chain from sliding dynamics
+
+        #move the head of the chain one slot back to create new strand
+        insert_strand(i, jumpIdx, tz, QN, QN_head, t_cr, tau_CD)
+        s = ring_index(QN_head[i],jumpIdx,QN.shape[1])
+        s1 = ring_index(QN_head[i],jumpIdx+1,QN.shape[1])
+
+        #create new strand Q and N
+        QN[i,s1,0] = Qx
+        QN[i,s1,1] = Qy
+        QN[i,s1,2] = Qz
+        QN[i,s1,3] = new_N
+
+        #update free end at beginning
+        QN[i,s,3] = 1.0
+        QN[i,s,0] = QN[i,s,1] = QN[i,s,2] = 0.0
+
+        t_cr[i,s] = chain_time[i]
+        tau_CD[i,s] = tCD
+
+        QN_first[i,0] -= Qx
+        QN_first[i,1] -= Qy
+        QN_first[i,2] -= Qz
+
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def apply_create_CD(i, jumpIdx, QN, QN_head, QN_first, Z, t_cr, tau_CD, add_rand, gauss_x, gauss_y, gauss_z, tCD):
+    '''
+    Create a slip-link along chain i due to constraint dynamics (e.g. sliding dynamics of surrounding chains)
+    '''
+    tz = int(Z[i])
+
+    Z[i]+=1
+
+    #strand that is split by the new slip-link
+    s = ring_index(QN_head[i],jumpIdx,QN.shape[1])
+    Q1x = QN[i,s,0]
+    Q1y = QN[i,s,1]
+    Q1z = QN[i,s,2]
+    N1 = QN[i,s,3]
+
+    new_N = math.floor(0.5 + add_rand * (N1 - 2.0)) + 1.0
+
+    sigma = math.sqrt(float(new_N * (N1 - new_N)) / float(3.0 * N1))
+
+    if jumpIdx == tz-1:
+        sigma = math.sqrt(new_N / 3.0)
+
+    ratio_N = new_N / N1
+
+    #make room for the new strand by moving the strands on the shorter side
+    insert_strand(i, jumpIdx, tz, QN, QN_head, t_cr, tau_CD)
+    s = ring_index(QN_head[i],jumpIdx,QN.shape[1])
+    s1 = ring_index(QN_head[i],jumpIdx+1,QN.shape[1])
+
+    if jumpIdx == 0:
+
+        #calculate Q and N for new and previous strand
+        N2 = N1 - new_N
+        sigma = math.sqrt(N2 / 3.0)
+
+        #previous strand is updated
+        QN[i,s1,0] = gauss_x*sigma
+        QN[i,s1,1] = gauss_y*sigma
+        QN[i,s1,2] = gauss_z*sigma
+        QN[i,s1,3] = N2
+
+        #at jump index, create new strand Q and N
+        QN[i,s,3] = new_N
+        QN[i,s,0] = QN[i,s,1] = QN[i,s,2] = 0.0
+
+        #set tau_CD t_cr (creation time of entanglement is 0 for constraint dynamics)
+        tau_CD[i,s] = tCD
+        t_cr[i,s] = 0.0
+
+        QN_first[i,0] -= QN[i,s1,0]
+        QN_first[i,1] -= QN[i,s1,1]
+        QN_first[i,2] -= QN[i,s1,2]
+
+        return
+
+    Qx = gauss_x*sigma + Q1x*ratio_N
+    Qy = gauss_y*sigma + Q1y*ratio_N
+    Qz = gauss_z*sigma + Q1z*ratio_N
+
+    #create new strands Q and N at jumpIdx and jumpIdx+1
+    QN[i,s1,0] = Q1x - Qx
+    QN[i,s1,1] = Q1y - Qy
+    QN[i,s1,2] = Q1z - Qz
+    QN[i,s1,3] = N1 - new_N
+
+    QN[i,s,0] = Qx
+    QN[i,s,1] = Qy
+    QN[i,s,2] = Qz
+    QN[i,s,3] = new_N
+
+    #if create by CD at end of chain, set jumpIdx+1 to free end
+    if jumpIdx == tz-1:
+        QN[i,s1,0] = QN[i,s1,1] = QN[i,s1,2] = 0.0
+
+    #set tau_CD and creation time of new entanglement
+    tau_CD[i,s] = tCD
+    t_cr[i,s] = 0
+
+    return
@@ -0,0 +1,117 @@
+import math
+import os
+import numpy as np
+
+#Tables of the equilibrium distributions used to initialize chains (see chain.ensemble_chains). They are built in log space, so
+#they do not overflow for large NK, and are kept for each (NK, beta) for the lifetime of the process. If a cache directory is
+#given, the tables are also saved there and reused by later runs (for example other sim_IDs).
+
+_tables = {}
+
+def build_tables(Nk, beta):
+    '''
+    Build the tables for chains of Nk Kuhn steps
+
+    Args:
+        Nk - total number of Kuhn steps in the chain
+        beta - entanglement activity
+    Returns:
+        z_cdf - cumulative probability of Z = 1, ..., Nk (P(Z) ~ binomial(Nk-1,Z-1)/beta**(Z-1))
+        log_fact - log(k!) for k = 0, ..., Nk
+    '''
+    log_fact = np.array([math.lgamma(k+1.0) for k in range(0,Nk+1)],dtype=float)
+
+    z = np.arange(1,Nk+1)
+    log_p = log_fact[Nk-1] - log_fact[z-1] - log_fact[Nk-z] - (z-1)*math.log(beta)
+    p = np.exp(log_p - np.max(log_p))
+    z_cdf = np.cumsum(p)/np.sum(p)
+
+    return z_cdf, log_fact
+
+
+def get_tables(Nk, beta, cache_dir=None):
+    '''
+    Tables for chains of Nk Kuhn steps, built once per (Nk, beta) (see build_tables)
+
+    Args:
+        Nk - total number of Kuhn steps in the chain
+        beta - entanglement activity
+        cache_dir - directory of saved tables (None only keeps them in memory)
+    Returns:
+        z_cdf, log_fact - see build_tables (log_fact as a list)
+    '''
+    key = (int(Nk), float(beta))
+    if key in _tables:
+        return _tables[key]
+
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir,'chain_tables_NK%d_beta%s.npz'%(key[0],repr(key[1])))
+    if cache_file is not None and os.path.isfile(cache_file):
+        with np.load(cache_file) as data:
+            tables = (data['z_cdf'], data['log_fact'])
+    else:
+        tables = build_tables(key[0],key[1])
+        if cache_file is not None:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            tmp_file = cache_file + '.tmp'
+            with open(tmp_file,'wb') as f:
+                np.savez(f,z_cdf=tables[0],log_fact=tables[1])
+            os.replace(tmp_file,cache_file)
+
+    #(the log(k!) table is looked up one value at a time, which is faster in a list)
+    tables = (tables[0], tables[1].tolist())
+    _tables[key] = tables
+
+    return tables
+
+
+def sample_z(p, z_cdf, z_max):
+    '''
+    Number of entangled strands for the uniform random number p (inverse of the cumulative distribution, truncated at z_max)
+
+    Args:
+        p - uniform random number
+        z_cdf - cumulative probability of Z (see build_tables)
+        z_max - maximum number of entangled strands
+    Returns:
+        Z
+    '''
+    if z_max < len(z_cdf):
+        p *= z_cdf[z_max-1]
+
+    return min(int(np.searchsorted(z_cdf,p,side='left'))+1,len(z_cdf))
+
+
+def sample_strand(p, A, i, log_fact):
+    '''
+    Number of Kuhn steps of strand i for the uniform random number p, when the first i strands share A+1 Kuhn steps
+    (inverse of the cumulative distribution P(N <= n) = 1 - binomial(A-n,i-1)/binomial(A,i-1))
+
+    Args:
+        p - uniform random number
+        A - Kuhn steps of the first i strands minus 1
+        i - strand index (counted from 1, at least 2)
+        log_fact - log(k!) table (see build_tables)
+    Returns:
+        N - number of Kuhn steps of strand i (1 to A-i+2)
+    '''
+    #P(N > n) = binomial(A-n,i-1)/binomial(A,i-1), so N is the smallest n with log P(N > n) < log(1-p)
+    log_q = math.log1p(-p) + log_fact[A] - log_fact[A-i+1]
+    n_max = A-i+2
+
+    #strands are short on average, so the interval holding N is found by doubling n before bisection (O(log N) evaluations)
+    low = 1
+    high = 1
+    while high < n_max and log_fact[A-high] - log_fact[A-high-i+1] >= log_q:
+        low = high+1
+        high = min(2*high,n_max)
+    while low < high:
+        n = (low+high)//2
+        if log_fact[A-n] - log_fact[A-n-i+1] < log_q:
+            high = n
+        else:
+            low = n+1
+
+    return low
@@ -4,51 +4,50 @@ import math
 #global correlator parameters
 p = 16 
 m = 2
+MULTI_STRESS = 5 #number of stress components recorded for multi-component G(t) (see chain_kernel.equilibrium_stress)
+MAX_LEVELS = 40 #most rsvl correlator levels with ensemble sums (size of the shared memory buffers of update_correlator_ensemble)
 
 @cuda.jit(device=True)
-def add_to_correlator(data,corrLevel,D,temp_D,C,N,A,M,corrtype):
+def add_to_correlator(data,corrLevel,D,H,C,N,A,M,corrtype):
     '''
     Add new stress value to RSVL correlator. 
+    D[corrLevel] is a circular buffer, the newest value is at index H[corrLevel] and the value of time lag j at (H[corrLevel]+j)%p.
+    C and N are the sums of the chain or shared sums of several chains (updated with atomics).
     '''
 
     if corrLevel >= D.shape[0]:
         return 
 
-    for j in range(1,p):
-        for k in range(0,3):
-            temp_D[corrLevel,j,k] = D[corrLevel,j-1,k] #temporarily store shifted data values
-    
-    for j in range(1,p):
-        for k in range(0,3):
-            D[corrLevel,j,k] = temp_D[corrLevel,j,k] #set new data values to shifted values
-
-    for k in range(0,3):
-        D[corrLevel,0,k] = data[k] #put new data value in 0 index
+    #move head back one index (overwrites the oldest value) and put new data value there
+    head = (H[corrLevel]+p-1)%p
+    H[corrLevel] = head
+    for k in range(0,D.shape[2]):
+        D[corrLevel,head,k] = data[k]
     
     if corrLevel == 0: #if corrLevel is 0, run calculation from 0 to p-1
-        for j in range(0,p):
-            N[corrLevel,j] += 1 #correlation counter incremented
-            if corrtype == 1: 
-                stress_corr = D[corrLevel,0,0]*D[corrLevel,j,0] #new correlation value
-                C[corrLevel,j] += stress_corr                  #update running sum
-            if corrtype == 2:
-                msd = (D[corrLevel,0,0]-D[corrLevel,j,0])**2 + (D[corrLevel,0,1]-D[corrLevel,j,1])**2 + (D[corrLevel,0,2]-D[corrLevel,j,2])**2
-                C[corrLevel,j] += msd
-
+        jstart = 0
     else: #if corrLevel > 0, run calculation from p/m to p-1
-        for j in range(int(p/m),p):
-            N[corrLevel,j] += 1 #correlation counter incremented
-            if corrtype == 1:
-                stress_corr = D[corrLevel,0,0]*D[corrLevel,j,0] #new correlation value
-                C[corrLevel,j] += stress_corr                  #update running sum
-            if corrtype == 2:
-                msd = (D[corrLevel,0,0]-D[corrLevel,j,0])**2 + (D[corrLevel,0,1]-D[corrLevel,j,1])**2 + (D[corrLevel,0,2]-D[corrLevel,j,2])**2
-                C[corrLevel,j] += msd
+        jstart = int(p/m)
+
+    for j in range(jstart,p):
+        lag = (head+j)%p #index of value j steps before the new value
+        cuda.atomic.add(N,(corrLevel,j),1.0) #correlation counter incremented
+        if corrtype == 1: 
+            if D.shape[2] == MULTI_STRESS: #average autocorrelation of the independent stress components
+                stress_corr = 0.0
+                for k in range(0,MULTI_STRESS):
+                    stress_corr += D[corrLevel,head,k]*D[corrLevel,lag,k]
+                stress_corr /= MULTI_STRESS
+            else:
+                stress_corr = D[corrLevel,head,0]*D[corrLevel,lag,0] #new correlation value
+            cuda.atomic.add(C,(corrLevel,j),stress_corr)  #update running sum
+        if corrtype == 2:
+            msd = (D[corrLevel,head,0]-D[corrLevel,lag,0])**2 + (D[corrLevel,head,1]-D[corrLevel,lag,1])**2 + (D[corrLevel,head,2]-D[corrLevel,lag,2])**2
+            cuda.atomic.add(C,(corrLevel,j),msd)
     
     if (corrtype == 1) or (corrtype == 2 and M[corrLevel]==0): #add data to accumulator
-        A[corrLevel,0] += data[0] #only updating accumulator if counter is 0 (non-averaging method) for MSD calc
-        A[corrLevel,1] += data[1] 
-        A[corrLevel,2] += data[2]
+        for k in range(0,A.shape[1]): #only updating accumulator if counter is 0 (non-averaging method) for MSD calc
+            A[corrLevel,k] += data[k]
     
     #update counter
     M[corrLevel] += 1
@@ -56,8 +55,34 @@ def add_to_correlator(data,corrLevel,D,temp_D,C,N,A,M,corrtype):
     return
 
 
+@cuda.jit(device=True)
+def update_chain(n,chain_result,D,H,C,N,A,M,corrtype):
+    '''
+    Add the new stress values of one chain to its RSVL correlator (D, H, A and M of the chain, C and N are the sums to update).
+    '''
+    S_corr = D.shape[0]
+
+    for j in range(0,n): #search through result array and find stress values that need to be added
+        result = chain_result[j]
+        if result[result.shape[0]-1] == 1.0: #if last value in results array is 1, add to correlator (1 means stress was recorded for the chain at index j)
+            add_to_correlator(result,0,D,H,C,N,A,M,corrtype)
+
+        for corrLevel in range(0,S_corr): #after updating correlator level 0 with result value (above), check if accumulator needs to be sent to next level
+            if M[corrLevel] == m:
+                if corrtype == 1:
+                    for k in range(0,A.shape[1]):
+                        A[corrLevel,k] /= m
+                    add_to_correlator(A[corrLevel],corrLevel+1,D,H,C,N,A,M,corrtype)
+                if corrtype == 2: 
+                    add_to_correlator(A[corrLevel],corrLevel+1,D,H,C,N,A,M,corrtype)
+                for k in range(0,A.shape[1]):
+                    A[corrLevel,k] = 0.0
+                M[corrLevel] = 0
+    return
+
+
 @cuda.jit
-def update_correlator(n,result_array,D,D_shift,C,N,A,M,corrtype):
+def update_correlator(n,result_array,D,H,C,N,A,M,corrtype):
     '''
     Update the RSVL correlator with new stress values from the result_array.
     '''
@@ -67,25 +92,37 @@ def update_correlator(n,result_array,D,D_shift,C,N,A,M,corrtype):
     if i >= result_array.shape[0]:
         return
 
+    update_chain(n,result_array[i],D[i],H[i],C[i],N[i],A[i],M[i],corrtype[0])
+    return 
+
+
+@cuda.jit
+def update_correlator_ensemble(n,result_array,D,H,C,N,A,M,corrtype):
+    '''
+    Update the RSVL correlator with new stress values from the result_array, the correlation sums of all chains are added to
+    ensemble sums C[0] and N[0] (shape (1, S_corr, p)). Each block first sums its chains in shared memory and then adds them
+    to the ensemble sums with one atomic add per time lag.
+    '''
+    sC = cuda.shared.array(shape=(MAX_LEVELS,p),dtype=float64)
+    sN = cuda.shared.array(shape=(MAX_LEVELS,p),dtype=float64)
     S_corr = D.shape[1]
-    chain_result = result_array[i]
 
-    for j in range(0,n): #search through result array and find stress values that need to be added
-        result = chain_result[j]
-        if result[3] == 1.0: #if last value in results array is 1, add to correlator (1 means stress was recorded for chain i at index j)
-            add_to_correlator(result,0,D[i],D_shift[i],C[i],N[i],A[i],M[i],corrtype[0])
+    for k in range(cuda.threadIdx.x,S_corr*p,cuda.blockDim.x):
+        sC[k//p,k%p] = 0.0
+        sN[k//p,k%p] = 0.0
+    cuda.syncthreads()
+
+    i = cuda.blockIdx.x*cuda.blockDim.x + cuda.threadIdx.x #chain index
+    if i < result_array.shape[0]: #(no return, all threads of the block have to reach syncthreads)
+        update_chain(n,result_array[i],D[i],H[i],sC,sN,A[i],M[i],corrtype[0])
+    cuda.syncthreads()
+
+    for k in range(cuda.threadIdx.x,S_corr*p,cuda.blockDim.x):
+        if sN[k//p,k%p] > 0:
+            cuda.atomic.add(C,(0,k//p,k%p),sC[k//p,k%p])
+            cuda.atomic.add(N,(0,k//p,k%p),sN[k//p,k%p])
+    return
 
-        for corrLevel in range(0,S_corr): #after updating correlator level 0 with result value (above), check if accumulator needs to be sent to next level
-            if M[i,corrLevel] == m:
-                if corrtype[0] == 1:
-                    for k in range(0,3):
-                        A[i,corrLevel,k] /= m
-                    add_to_correlator(A[i,corrLevel],corrLevel+1,D[i],D_shift[i],C[i],N[i],A[i],M[i],corrtype[0])
-                if corrtype[0] == 2: 
-                    add_to_correlator(A[i,corrLevel],corrLevel+1,D[i],D_shift[i],C[i],N[i],A[i],M[i],corrtype[0])
-                A[i,corrLevel,0] = A[i,corrLevel,1] = A[i,corrLevel,2] = 0.0
-                M[i,corrLevel] = 0
-    return 
 
 @cuda.jit
 def coarse_result_array(data,g,calc_type):
@@ -107,12 +144,8 @@ def coarse_result_array(data,g,calc_type):
         return
 
     for j in range(1,p*g+1):
-        if calc_type[0] == 1:
-            data[i,j,0]=data[i,j*m,0]
-        if calc_type[0] == 2:
-            data[i,j,0]=data[i,j*m,0]
-            data[i,j,1]=data[i,j*m,1]
-            data[i,j,2]=data[i,j*m,2]
+        for k in range(0,data.shape[2]): #stress (one or MULTI_STRESS components) or CoM (x, y, z)
+            data[i,j,k]=data[i,j*m,k]
     return
 
 @cuda.jit
@@ -157,6 +190,58 @@ def calc_corr(rawdata, calc_type, num_time_syncs, corrLevel, data_corr, corr_arr
     return
 
 
+@cuda.jit
+def calc_corr_ensemble(rawdata, calc_type, num_time_syncs, corrLevel, data_corr, corr_array, array_index, last_index, time_res, sim_time):
+    '''
+    GPU Kernel to calculate time autocorrelations like calc_corr, but the average correlation and error of all chains are added to the
+    ensemble sums data_corr[0] (shape (1, number of time lags, 2)). Each block sums its chains in shared memory and adds them to
+    the ensemble sums with one atomic add per time lag (arguments see calc_corr).
+    '''
+    block_sum = cuda.shared.array(shape=2,dtype=float64)
+    chain_corr = cuda.local.array(shape=(1,1,2),dtype=float64) #average correlation and error of the chain for one time lag
+
+    i = cuda.blockIdx.x*cuda.blockDim.x + cuda.threadIdx.x #chain index
+    valid = i < rawdata.shape[0] #(no return, all threads of the block have to reach syncthreads)
+    i_data = min(i,rawdata.shape[0]-1)
+    data = rawdata[i_data,0:last_index,:] #raw data for chain i
+    corr = corr_array[i_data,:] #store correlation values for time t and t+lag for chain i
+
+    if corrLevel == 0: #if first correlator level
+        j_start = 0
+        j_stop = p*m
+        j_step = 1
+    else:
+        j_start = p*m**corrLevel
+        j_stop = p*m**(corrLevel+1)
+        j_step = m**corrLevel
+
+    for j in range(j_start,j_stop,j_step):
+        if corrLevel == 0:
+            time_lag = j
+        elif j*time_res[0] <= sim_time:
+            if corrLevel >= num_time_syncs: #if correlator is above last time sync
+                time_lag = int(j/m**(num_time_syncs-1))
+            else:
+                time_lag = int(j/m**corrLevel)
+        else:
+            continue #(same for all threads)
+
+        if cuda.threadIdx.x == 0:
+            block_sum[0] = 0.0
+            block_sum[1] = 0.0
+        cuda.syncthreads()
+        if valid:
+            array_index[i] += 1
+            corr_block(0, data, time_lag, chain_corr, 0, corr, calc_type[0]) #get the average correlation and error for time lag
+            cuda.atomic.add(block_sum,0,chain_corr[0,0,0])
+            cuda.atomic.add(block_sum,1,chain_corr[0,0,1])
+        cuda.syncthreads()
+        if cuda.threadIdx.x == 0: #(thread 0 of every block has a chain)
+            cuda.atomic.add(data_corr,(0,array_index[i],0),block_sum[0])
+            cuda.atomic.add(data_corr,(0,array_index[i],1),block_sum[1])
+    return
+
+
 @cuda.jit(device=True)
 def corr_block(chainIdx, chainData, tj, corr, arr_index, xV, calc_type):
     '''
@@ -169,7 +254,12 @@ def corr_block(chainIdx, chainData, tj, corr, arr_index, xV, calc_type):
     #begin correlation averaging for timelag tj
     xav = 0
     for r in range(0,n):
-        if calc_type==1:
+        if calc_type==1 and chainData.shape[1] == MULTI_STRESS: #average correlation of the independent stress components
+            xV[r] = 0.0
+            for k in range(0,MULTI_STRESS):
+                xV[r] += chainData[r,k]*chainData[int(r+tj),k]
+            xV[r] /= MULTI_STRESS
+        elif calc_type==1:
             xV[r] = chainData[r,0]*chainData[int(r+tj),0] #correlation between time and time + lag
         elif calc_type == 2:
             xV[r] = (chainData[r,0]-chainData[int(r+tj),0])**2+(chainData[r,1]-chainData[int(r+tj),1])**2+(chainData[r,2]-chainData[int(r+tj),2])**2
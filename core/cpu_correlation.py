@@ -0,0 +1,186 @@
+import math
+from numba import jit, njit, prange
+
+from core.correlation import p, m, MULTI_STRESS
+
+#CPU versions of the correlator kernels in correlation (same arguments, without the launch configuration)
+
+@jit(nopython=True)
+def add_to_correlator(data,corrLevel,D,H,C,N,A,M,corrtype):
+    '''
+    Add new stress value to RSVL correlator (circular buffer D[corrLevel] with head index H[corrLevel], see correlation.add_to_correlator).
+    '''
+
+    if corrLevel >= D.shape[0]:
+        return
+
+    #move head back one index (overwrites the oldest value) and put new data value there
+    head = (H[corrLevel]+p-1)%p
+    H[corrLevel] = head
+    for k in range(0,D.shape[2]):
+        D[corrLevel,head,k] = data[k]
+
+    if corrLevel == 0: #if corrLevel is 0, run calculation from 0 to p-1
+        jstart = 0
+    else: #if corrLevel > 0, run calculation from p/m to p-1
+        jstart = int(p/m)
+
+    for j in range(jstart,p):
+        lag = (head+j)%p #index of value j steps before the new value
+        N[corrLevel,j] += 1 #correlation counter incremented
+        if corrtype == 1:
+            if D.shape[2] == MULTI_STRESS: #average autocorrelation of the independent stress components
+                stress_corr = 0.0
+                for k in range(0,MULTI_STRESS):
+                    stress_corr += D[corrLevel,head,k]*D[corrLevel,lag,k]
+                stress_corr /= MULTI_STRESS
+            else:
+                stress_corr = D[corrLevel,head,0]*D[corrLevel,lag,0] #new correlation value
+            C[corrLevel,j] += stress_corr                  #update running sum
+        if corrtype == 2:
+            msd = (D[corrLevel,head,0]-D[corrLevel,lag,0])**2 + (D[corrLevel,head,1]-D[corrLevel,lag,1])**2 + (D[corrLevel,head,2]-D[corrLevel,lag,2])**2
+            C[corrLevel,j] += msd
+
+    if (corrtype == 1) or (corrtype == 2 and M[corrLevel]==0): #add data to accumulator
+        for k in range(0,A.shape[1]): #only updating accumulator if counter is 0 (non-averaging method) for MSD calc
+            A[corrLevel,k] += data[k]
+
+    #update counter
+    M[corrLevel] += 1
+
+    return
+
+
+@njit(parallel=True)
+def update_correlator(n,result_array,D,H,C,N,A,M,corrtype):
+    '''
+    Update the RSVL correlator with new stress values from the result_array. C and N hold the sums of each chain, or ensemble sums
+    split between worker threads (shape (nworkers, S_corr, p), each worker adds a contiguous block of chains).
+    '''
+    S_corr = D.shape[1]
+    nchains = result_array.shape[0]
+    nparts = C.shape[0]
+
+    for w in prange(nparts):
+        for i in range(w*nchains//nparts,(w+1)*nchains//nparts):
+            for j in range(0,n): #search through result array and find stress values that need to be added
+                if result_array[i,j,result_array.shape[2]-1] == 1.0: #if last value in results array is 1, add to correlator
+                    add_to_correlator(result_array[i,j],0,D[i],H[i],C[w],N[w],A[i],M[i],corrtype[0])
+
+                for corrLevel in range(0,S_corr): #check if accumulator needs to be sent to next level
+                    if M[i,corrLevel] == m:
+                        if corrtype[0] == 1:
+                            for k in range(0,A.shape[2]):
+                                A[i,corrLevel,k] /= m
+                        add_to_correlator(A[i,corrLevel],corrLevel+1,D[i],H[i],C[w],N[w],A[i],M[i],corrtype[0])
+                        for k in range(0,A.shape[2]):
+                            A[i,corrLevel,k] = 0.0
+                        M[i,corrLevel] = 0
+    return
+
+
+@njit(parallel=True)
+def coarse_result_array(data,g,calc_type):
+    '''
+    Keep every other stress value and store them in the first half of the data array (see correlation.coarse_result_array)
+    '''
+    for i in prange(data.shape[0]):
+        for j in range(1,p*g+1):
+            for k in range(0,data.shape[2]): #stress (one or MULTI_STRESS components) or CoM (x, y, z)
+                data[i,j,k]=data[i,j*m,k]
+    return
+
+
+@njit(parallel=True, error_model='numpy')
+def calc_corr(rawdata, calc_type, num_time_syncs, corrLevel, data_corr, corr_array, array_index, last_index, time_res, sim_time):
+    '''
+    Apply the block transformation using the MUnCH algorithm and calculate time autocorrelations (see correlation.calc_corr).
+    data_corr holds the values of each chain, or ensemble sums split between worker threads (shape (nworkers, number of time lags, 2),
+    each worker adds a contiguous block of chains and uses row w of corr_array).
+    '''
+    nchains = rawdata.shape[0]
+    nparts = data_corr.shape[0]
+
+    for w in prange(nparts):
+        corr = corr_array[w,:] #store correlation values for time t and t+lag
+
+        for i in range(w*nchains//nparts,(w+1)*nchains//nparts):
+            data = rawdata[i,0:last_index,:] #raw data for chain i
+
+            if corrLevel == 0: #if first correlator level
+                for j in range(0,p*m):
+                    array_index[i] += 1
+                    time_lag = j
+                    corr_block(w, data, time_lag, data_corr, array_index[i], corr, calc_type[0]) #get the average correlation and error for time lag
+            else:
+                for j in range(p*m**corrLevel,p*m**(corrLevel+1),m**corrLevel):
+                    if j*time_res[0] <= sim_time:
+                        array_index[i] += 1
+                        if corrLevel >= num_time_syncs: #if correlator is above last time sync
+                            time_lag = int(j/m**(num_time_syncs-1))
+                        else:
+                            time_lag = int(j/m**corrLevel)
+                        corr_block(w, data, time_lag, data_corr, array_index[i], corr, calc_type[0]) #get the average correlation and error for time lag
+    return
+
+
+@jit(nopython=True, error_model='numpy')
+def corr_block(chainIdx, chainData, tj, corr, arr_index, xV, calc_type):
+    '''
+    Apply the block transformation to the stress or MSD values (see correlation.corr_block)
+    '''
+
+    #number of correlations
+    n = int(len(chainData[:,0])-tj)
+
+    #begin correlation averaging for timelag tj
+    xav = 0.0
+    for r in range(0,n):
+        if calc_type==1 and chainData.shape[1] == MULTI_STRESS: #average correlation of the independent stress components
+            xV[r] = 0.0
+            for k in range(0,MULTI_STRESS):
+                xV[r] += chainData[r,k]*chainData[int(r+tj),k]
+            xV[r] /= MULTI_STRESS
+        elif calc_type==1:
+            xV[r] = chainData[r,0]*chainData[int(r+tj),0] #correlation between time and time + lag
+        elif calc_type == 2:
+            xV[r] = (chainData[r,0]-chainData[int(r+tj),0])**2+(chainData[r,1]-chainData[int(r+tj),1])**2+(chainData[r,2]-chainData[int(r+tj),2])**2
+        xav+=xV[r]/n  #calculate average
+
+    corr[chainIdx,arr_index,0] += xav #add average correlation value of the chain (data_corr starts at zero)
+    corr[chainIdx,arr_index,1] += block_error(xV, n, xav) #add error of average correlation value of the chain
+
+
+@jit(nopython=True, error_model='numpy')
+def block_error(xV, n, xav):
+    '''
+    Error of the average xav of the n correlation values in xV from the blocking transformation (xV is overwritten)
+    '''
+    c0=(xV[0]-xav)**2
+    for r in range(1,n):
+        c0+=(xV[r]-xav)**2/n
+    sa=math.sqrt(c0/(n-1))
+    sb=sa/math.sqrt(2*(n-1))
+    n=int(math.floor(n/2))
+    for r in range(0,n):
+        xV[r]=(xV[2*r+1]+xV[2*r])/2
+    c0=(xV[0]-xav)**2
+    for r in range(1,n):
+        c0=c0+(xV[r]-xav)**2
+    c0=c0/n
+    sap=math.sqrt(c0/(n-1))
+    sbp=sap/math.sqrt(2*(n-1))
+    while (math.fabs(sa-sap) > sbp+sb) and (n > 4):
+        sa=sap
+        sb=sbp
+        n=int(math.floor(n/2))
+        for r in range(0,n):
+            xV[r]=(xV[2*r+1]+xV[2*r])/2
+        c0=(xV[0]-xav)**2
+        for r in range(1,n):
+            c0=c0+(xV[r]-xav)**2
+        c0=c0/n
+        sap=math.sqrt(c0/(n-1))
+        sbp=sap/math.sqrt(2*(n-1))
+
+    return sap
@@ -0,0 +1,144 @@
+import numpy as np
+from numba import njit, prange
+
+import core.chain_kernel as chain_kernel
+
+#CPU versions of the ensemble kernels. Chains are split into contiguous blocks, one block per worker thread, and each
+#worker advances its chains one after another using the single-chain functions in chain_kernel.
+
+@njit(parallel=True)
+def reset_chain_flag(reach_flag, reach_count):
+    '''
+    Reset the chain flag after the chain time has reached the sync time (CPU version of ensemble_kernel.reset_chain_flag)
+    '''
+    for i in prange(reach_flag.shape[0]):
+        reach_flag[i] = 0
+
+    reach_count[0] = 0
+    reach_count[1] = -1
+
+    return
+
+
+@njit(parallel=True)
+def reset_chain_time(chain_time,write_time,flow_time):
+    '''
+    Reset the chain times after flow is stopped (CPU version of ensemble_kernel.reset_chain_time)
+    '''
+    for i in prange(chain_time.shape[0]):
+        chain_time[i] -= flow_time
+        write_time[i] = 0
+
+    return
+
+
+@njit(parallel=True, error_model='numpy')
+def calc_flow_stress(Z,QN,QN_head,stress):
+    '''
+    Calculate the flow stress tensor of each chain (CPU version of ensemble_kernel.calc_flow_stress)
+    '''
+    for i in prange(QN.shape[0]):
+        chain_kernel.flow_stress(i,Z,QN,QN_head,stress)
+
+    return
+
+
+@njit(parallel=True, error_model='numpy')
+def advance_chains(nworkers, nsteps, Z, QN, QN_head, QN_first, NK, flow, flow_off, kappa, tau_CD, shift_probs, rate_tree, obs, CD_flag, CD_create_prefact, beta,
+                   sum_W_sorted, uniform_rand, rand_used, found_index, found_shift, add_rand, new_Q, chain_time, time_compensation, tdt,
+                   t_cr, f_t, tau_CD_used_SD, tau_CD_used_CD, tau_CD_gauss_rand_SD, tau_CD_gauss_rand_CD, rng_step, seed, chain_offset, discrete, pcd_array,
+                   pcd_table_eq, pcd_table_cr, pcd_table_tau, res, flow_sums, calc_type, reach_flag, reach_count,
+                   next_sync_time, max_sync_time, write_time, time_res, munch, corrLevel, p, g, m, result_index, record_ft,
+                   ft_log, ft_scale, enttime_bins, chain_steps):
+    '''
+    Advance every chain by up to nsteps jump processes on the host CPU. Each step applies the same sequence as one iteration of
+    the GPU loop in main.py (calc_strand_prob, calc_chainends_prob, time control, choose_step_kernel, track_newQ, apply_step_kernel).
+
+    Args:
+        nworkers - number of worker threads (chains are split into nworkers contiguous blocks)
+        nsteps - maximum number of steps for each chain (steps left before the random number arrays are refilled)
+        munch - True if time_control_munch is used to record results, otherwise time_control is used
+        rate_tree - rate tree of each chain (array with no columns if not used), rebuilt for every chain at the start of the call
+        obs - running stress and center of mass of each chain (array with no columns if not used), summed again for every chain at the start of the call
+        rng_step, seed, chain_offset - counter-based random numbers (rng_step has no entries if the random number arrays are used, see chain_kernel.step)
+        flow_sums - flow accumulators of each worker, shape (nworkers, rows, 17) with no rows if not used (see chain_kernel.add_flow_sample)
+        reach_count - counter of chains that reached the sync time, increased by the chains that reached it during the call
+        result_index - row of the RSVL result array used by the first step
+        record_ft - if True, entanglement lifetimes are binned after every step (same as the GPU loop in main.py)
+        ft_log, ft_scale - spacing of the lifetime bins (see chain_kernel.ft_bin)
+        enttime_bins - per-worker bins for the entanglement lifetime distribution, shape (nworkers, number of bins)
+        chain_steps - array to store the number of steps made by each chain before it reached the sync time
+        remaining arguments - see ensemble_kernel
+    Returns:
+        number of steps the GPU loop would have made (largest chain_steps in flow, nsteps otherwise)
+    '''
+    nchains = QN.shape[0]
+    nbins = enttime_bins.shape[1]
+    sync_each_step = flow[0] or flow_off[0]
+    apply_deformation = bool(flow[0])
+    flow_accum = flow_sums.shape[1] > 0 #the flow stress tensor is only recorded at each write time for the flow accumulators
+    use_tree = rate_tree.shape[1] > 0
+    use_obs = obs.shape[1] > 0
+    reached = np.zeros(nworkers,dtype=np.int64) #chains of each worker that reached the sync time during the call
+
+    for w in prange(nworkers):
+        for i in range(w*nchains//nworkers,(w+1)*nchains//nworkers):
+
+            was_reached = reach_flag[i] != 0
+            if use_tree and not was_reached:
+                chain_kernel.calc_rates(i,Z,QN,QN_head,tau_CD,shift_probs,rate_tree,CD_flag[0],CD_create_prefact[0],beta[0],NK[0])
+            if use_obs and not was_reached:
+                chain_kernel.calc_observables(i,Z,QN,QN_head,QN_first,NK[0],obs)
+
+            steps = 0
+            for k in range(0,nsteps):
+
+                #chains that reached the sync time are frozen, but the RSVL result rows still need to be cleared
+                if reach_flag[i] != 0:
+                    if munch or sync_each_step:
+                        break
+                    chain_kernel.time_control(i,Z,QN,QN_head,new_Q,QN_first,NK[0],obs,chain_time,tdt,res,calc_type[0],apply_deformation,flow_off[0],flow_accum,reach_flag,
+                                              next_sync_time,max_sync_time,write_time,time_res[0],result_index+k)
+                    continue
+
+                steps += 1
+                wt = write_time[i]
+
+                chain_kernel.step(i,Z,QN,QN_head,QN_first,NK[0],apply_deformation,flow_off[0],flow_accum,kappa,tau_CD,shift_probs,rate_tree,obs,CD_flag[0],CD_create_prefact[0],beta[0],
+                                  sum_W_sorted,uniform_rand,rand_used,found_index,found_shift,add_rand,new_Q,chain_time,time_compensation,tdt,
+                                  t_cr,f_t,tau_CD_used_SD,tau_CD_used_CD,tau_CD_gauss_rand_SD,tau_CD_gauss_rand_CD,rng_step,seed,chain_offset,discrete,pcd_array,
+                                  pcd_table_eq,pcd_table_cr,pcd_table_tau,res,calc_type[0],reach_flag,
+                                  next_sync_time,max_sync_time,write_time,time_res[0],munch,corrLevel,p,g,m,result_index+k)
+
+                #the step recorded the flow stress tensor of write time wt in res (see chain_kernel.time_control)
+                if apply_deformation and flow_accum and write_time[i] != wt and wt > 0:
+                    chain_kernel.add_flow_sample(i,res,flow_sums[w],wt)
+
+                if record_ft:
+                    ft_idx = chain_kernel.ft_bin(f_t[i],nbins,ft_log,ft_scale)
+                    if ft_idx >= 0:
+                        enttime_bins[w,ft_idx]+=1
+
+            chain_steps[i] = steps
+            if not was_reached and reach_flag[i] != 0:
+                reached[w] += 1
+
+    reach_count[0] += np.sum(reached)
+
+    #number of loop iterations made for the whole ensemble
+    if sync_each_step:
+        niter = 0
+        for i in range(0,nchains):
+            niter = max(niter,chain_steps[i])
+    else:
+        niter = nsteps
+
+    #the GPU loop bins the lifetime of every chain at every iteration, including chains that already reached the sync time
+    if record_ft:
+        for w in prange(nworkers):
+            for i in range(w*nchains//nworkers,(w+1)*nchains//nworkers):
+                ft_idx = chain_kernel.ft_bin(f_t[i],nbins,ft_log,ft_scale)
+                if ft_idx >= 0:
+                    enttime_bins[w,ft_idx]+=niter-chain_steps[i]
+
+    return niter
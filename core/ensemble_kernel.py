@@ -1,6 +1,8 @@
 import math
 from numba import cuda, float32, int32
 
+import core.chain_kernel as chain_kernel
+
 @cuda.jit(device=True)
 def apply_flow(Q,dt,kappa):
     '''
@@ -15,14 +17,15 @@ def apply_flow(Q,dt,kappa):
     return Q[0] + dt*kappa[0]*Q[0] + dt*kappa[1]*Q[1] + dt*kappa[2]*Q[2], Q[1] + dt*kappa[3]*Q[0] + dt*kappa[4]*Q[1] + dt*kappa[5]*Q[2], Q[2] + dt*kappa[6]*Q[0] + dt*kappa[7]*Q[1] + dt*kappa[8]*Q[2], Q[3]
 
 @cuda.jit
-def reset_chain_flag(reach_flag):
+def reset_chain_flag(reach_flag, reach_count):
     '''
     GPU kernel to reset the chain flag after the chain time has reached the sync time
     
     Args: 
         reach_flag - array of binary values (0 or 1) indicating whether a chain has reached the sync time
+        reach_count - number of chains that reached the sync time and the loop iteration in which the last chain reached it (-1 if not reached)
     Returns: 
-        None (updates reach_flag device array)
+        None (updates reach_flag and reach_count device arrays)
     '''
     i = cuda.blockIdx.x*cuda.blockDim.x + cuda.threadIdx.x #chain index
     
@@ -31,6 +34,10 @@ def reset_chain_flag(reach_flag):
 
     reach_flag[i] = 0
 
+    if i == 0:
+        reach_count[0] = 0
+        reach_count[1] = -1
+
     return 
 
 @cuda.jit
@@ -50,14 +57,14 @@ def reset_chain_time(chain_time,write_time,flow_time):
     return
 
 @cuda.jit
-def track_newQ(Z,new_Q,temp_Q,found_shift,found_index,reach_flag):
+def track_newQ(Z,new_Q,QN_head,found_shift,found_index,reach_flag):
     '''
     GPU kernel to track fraction of new entanglements after cessation of flow.
 
     Args: 
         Z - number of entangled strands for each chain
-        new_Q - new entanglements created by SD or CD for each chain
-        temp_Q - array to hold newly created entanglements
+        new_Q - new entanglements created by SD or CD for each chain (stored in the same slots as the strands)
+        QN_head - slot of the first strand of each chain (see chain_kernel.ring_index)
         found_shift - array of jump processes for each chain
         found_index - array of index values where jump process occurs for each chain
         reach_flag - flag to determine whether chain has reached the sync time or not (0 or 1)
@@ -71,44 +78,20 @@ def track_newQ(Z,new_Q,temp_Q,found_shift,found_index,reach_flag):
     if reach_flag[i]!=0:
         return
     
-    jumpIdx = int(found_index[i])
-    jumpType = int(found_shift[i])
-    tz = int(Z[i])
-    
-    if jumpType == 4 or jumpType == 6:
-        for j in range(1,tz):
-            temp_Q[i,j] = new_Q[i,j-1]
-
-    if jumpType == 4 or jumpType == 6:
-        #shift other entanglements
-        for entIdx in range(jumpIdx+1,tz):
-            new_Q[i,entIdx] = temp_Q[i,entIdx]
-        new_Q[i,jumpIdx] = 1
-    
-    elif jumpType == 3:
-        new_Q[i,jumpIdx+1] = 0
-        new_Q[i,jumpIdx] = 1
-
-    elif jumpType == 2 or jumpType == 5:
-        if jumpIdx < tz-2:
-            new_Q[i,jumpIdx] = new_Q[i,jumpIdx+1]
-            #shift all strands -1 in array for deleted strand
-            for entIdx in range(jumpIdx+1,tz-1):
-                new_Q[i,entIdx] = new_Q[i,entIdx+1]
-        elif jumpIdx == tz-2:
-            new_Q[i,jumpIdx] = 0
-            new_Q[i,jumpIdx+1] = 0
-    else:
-        return   
+    #entanglements are moved the same way as the strands by apply_step_kernel
+    chain_kernel.track_newQ(i,Z,new_Q,QN_head,found_shift,found_index)
+
+    return
 
 @cuda.jit
-def calc_flow_stress(Z,QN,stress):
+def calc_flow_stress(Z,QN,QN_head,stress):
     '''
     GPU kernel that calculates the flow stress tensor (only used when EQ_calc is set to 'msd')
     
     Args: 
         Z - number of entangled strands (including dangling ends)
         QN - chain conformations and number of Kuhn steps in each strand
+        QN_head - slot of the first strand of each chain (see chain_kernel.ring_index)
         stress - array to hold stress values
     Returns: 
         None (updates stress device array)
@@ -120,12 +103,13 @@ def calc_flow_stress(Z,QN,stress):
     
     stress_xx = stress_yy = stress_zz = stress_xy = stress_yz = stress_xz = 0.0
     for j in range(0,int(Z[i])):
-        stress_xx -= (3.0*QN[i,j,0]*QN[i,j,0] / QN[i,j,3]) #tau_xx
-        stress_yy -= (3.0*QN[i,j,1]*QN[i,j,1] / QN[i,j,3]) #tau_yy
-        stress_zz -= (3.0*QN[i,j,2]*QN[i,j,2] / QN[i,j,3]) #tau_zz
-        stress_xy -= (3.0*QN[i,j,0]*QN[i,j,1] / QN[i,j,3]) #tau_xy
-        stress_yz -= (3.0*QN[i,j,1]*QN[i,j,2] / QN[i,j,3]) #tau_yz
-        stress_xz -= (3.0*QN[i,j,0]*QN[i,j,2] / QN[i,j,3]) #tau_xz
+        s = chain_kernel.ring_index(QN_head[i],j,QN.shape[1])
+        stress_xx -= (3.0*QN[i,s,0]*QN[i,s,0] / QN[i,s,3]) #tau_xx
+        stress_yy -= (3.0*QN[i,s,1]*QN[i,s,1] / QN[i,s,3]) #tau_yy
+        stress_zz -= (3.0*QN[i,s,2]*QN[i,s,2] / QN[i,s,3]) #tau_zz
+        stress_xy -= (3.0*QN[i,s,0]*QN[i,s,1] / QN[i,s,3]) #tau_xy
+        stress_yz -= (3.0*QN[i,s,1]*QN[i,s,2] / QN[i,s,3]) #tau_yz
+        stress_xz -= (3.0*QN[i,s,0]*QN[i,s,2] / QN[i,s,3]) #tau_xz
     
     stress[i,0,0] = stress_xx
     stress[i,0,1] = stress_yy
@@ -139,13 +123,14 @@ def calc_flow_stress(Z,QN,stress):
 
         
 @cuda.jit
-def calc_strand_prob(Z,QN,flow,tdt,kappa,tau_CD,shift_probs,CD_flag,CD_create_prefact,beta,NK):
+def calc_strand_prob(Z,QN,QN_head,flow,tdt,kappa,tau_CD,shift_probs,CD_flag,CD_create_prefact,beta,NK):
     '''
     GPU kernel to calculate probabilities for Kuhn step shuffling, entanglement creation or destruction
     
     Args: 
         Z - number of entangled strands for each chain
         QN - chain conformations and number of Kuhn steps in each strand
+        QN_head - slot of the first strand of each chain (see chain_kernel.ring_index)
         flow - boolean variable to determine whether to apply deformation
         tdt - time steps of each chain
         kappa - strain tensor (if flow = True, kappa contains non-zero values)
@@ -171,18 +156,20 @@ def calc_strand_prob(Z,QN,flow,tdt,kappa,tau_CD,shift_probs,CD_flag,CD_create_pr
     shift_probs[i,tz,0] = shift_probs[i,tz,1] = shift_probs[i,tz,2] = shift_probs[i,tz,3] = 0.0
     shift_probs[i,tz-1,0] = shift_probs[i,tz-1,1] = shift_probs[i,tz-1,2] = shift_probs[i,tz-1,3] = 0.0
 
-    tcd = tau_CD[i,j]
+    s = chain_kernel.ring_index(QN_head[i],j,QN.shape[1])
+
+    tcd = tau_CD[i,s]
     
-    QN_i = QN[i, j, :]
+    QN_i = QN[i, s, :]
     
     if bool(flow[0]):
         dt = tdt[i]
-        QN[i,j,:] = apply_flow(QN_i,dt,kappa)
+        QN[i,s,:] = apply_flow(QN_i,dt,kappa)
         cuda.syncthreads()
     
     if j<tz-1:
         
-        QN_ip1 = QN[i, j+1, :]
+        QN_ip1 = QN[i, chain_kernel.ring_index(QN_head[i],j+1,QN.shape[1]), :]
             
         Q_i = QN_i[0]**2 + QN_i[1]**2 + QN_i[2]**2
         Q_ip1 = QN_ip1[0]**2 + QN_ip1[1]**2 + QN_ip1[2]**2
@@ -234,13 +221,14 @@ def calc_strand_prob(Z,QN,flow,tdt,kappa,tau_CD,shift_probs,CD_flag,CD_create_pr
 
 
 @cuda.jit
-def calc_chainends_prob(Z, QN, shift_probs, CD_flag, CD_create_prefact, beta, Nk):
+def calc_chainends_prob(Z, QN, QN_head, shift_probs, CD_flag, CD_create_prefact, beta, Nk):
     '''
     GPU kernel to calculate probabilities for Kuhn step shuffling, entanglement creation or destruction at chain ends
     
     Args: 
         Z - number of entangled strands for each chain
         QN - chain conformations and number of Kuhn steps in each strand
+        QN_head - slot of the first strand of each chain (see chain_kernel.ring_index)
         shift_probs - array to store probabilities for chain entanglement process (shuffle, creation, destroy, etc)
         CD_flag - binary flag for determining whether constraint dynamics are implemented (0 - off, 1 - on)
         CD_create_prefact - variable used to calculate probability to create entanglement
@@ -256,8 +244,8 @@ def calc_chainends_prob(Z, QN, shift_probs, CD_flag, CD_create_prefact, beta, Nk
 
     tz = int(Z[i])
     
-    QNfirst = QN[i,0]
-    QNlast = QN[i,tz-1]
+    QNfirst = QN[i,QN_head[i]]
+    QNlast = QN[i,chain_kernel.ring_index(QN_head[i],tz-1,QN.shape[1])]
     
     shift_probs[i,tz,0] = shift_probs[i,tz,1] = shift_probs[i,tz,2] = shift_probs[i,tz,3] = 0.0
     shift_probs[i,tz-1,0] = shift_probs[i,tz-1,1] = shift_probs[i,tz-1,2] = shift_probs[i,tz-1,3] = 0.0
@@ -268,7 +256,7 @@ def calc_chainends_prob(Z, QN, shift_probs, CD_flag, CD_create_prefact, beta, Nk
 
     else:
         if QNfirst[3] == 1.0: #destruction by SD at the beginning
-            QNfirst_n = QN[i,1]
+            QNfirst_n = QN[i,chain_kernel.ring_index(QN_head[i],1,QN.shape[1])]
             if tz == 2:
                 c = QNfirst_n[3] + 0.25
             else:
@@ -281,7 +269,7 @@ def calc_chainends_prob(Z, QN, shift_probs, CD_flag, CD_create_prefact, beta, Nk
 
         if QNlast[3] == 1.0: #destruction by SD at the end
 
-            QNlast_p = QN[i,tz-2]
+            QNlast_p = QN[i,chain_kernel.ring_index(QN_head[i],tz-2,QN.shape[1])]
             if tz == 2:
                 c = QNlast_p[3] + 0.25
             else:
@@ -491,14 +479,50 @@ def choose_step_kernel(Z,shift_probs,sum_W_sorted,uniform_rand,rand_used,found_i
 
     return
 
+@cuda.jit(device=True)
+def count_reached(reach_count, nchains, sync_step):
+    '''
+    Add a chain that reached the sync time to the device counter of synced chains (the host polls reach_count instead of copying reach_flag)
+
+    Args:
+        reach_count - number of chains that reached the sync time and the loop iteration in which the last chain reached it
+        nchains - number of chains
+        sync_step - loop iteration of the host since the last sync
+    '''
+    if cuda.atomic.add(reach_count,0,1) == nchains-1:
+        reach_count[1] = sync_step
+
+    return
+
+
+@cuda.jit(device=True)
+def add_flow_sample(i, stress, flow_sums, w):
+    '''
+    Add the flow stress tensor of chain i recorded at write time w to the flow accumulators of the ensemble
+
+    Args:
+        stress - flow stress tensor, Z and f_newQ of each chain (see chain_kernel.flow_stress)
+        flow_sums - accumulators for each write time, shape (1, rows, 17), see chain_kernel.add_flow_sample
+        w - write time of the sample
+    '''
+    row = w % flow_sums.shape[1]
+    for k in range(0,8):
+        cuda.atomic.add(flow_sums,(0,row,k),stress[i,0,k])
+        cuda.atomic.add(flow_sums,(0,row,8+k),stress[i,0,k]*stress[i,0,k])
+    cuda.atomic.add(flow_sums,(0,row,16),1.0)
+
+    return
+
+
 @cuda.jit
-def time_control_munch_kernel(Z,QN,QN_first,NK,chain_time,tdt,result,calc_type,reach_flag,next_sync_time,write_time,time_res,corrLevel,p,g,m):
+def time_control_munch_kernel(Z,QN,QN_head,QN_first,NK,chain_time,tdt,result,calc_type,reach_flag,reach_count,next_sync_time,write_time,time_res,corrLevel,p,g,m,sync_step):
     '''
     GPU kernel to control chain times and record stress/MSD values at specific write_time to be used with on-the-fly MUnCH correlator
 
     Args:
         Z - number of entangled strands
         QN - slip-link orientations and Kuhn steps in each entangled strand
+        QN_head - slot of the first strand of each chain (see chain_kernel.ring_index)
         QN_first - QN for the first slip-link for MSD calculation
         NK - total number of Kuhn steps for chain center-of-mass calculation (MSD only)
         chain_time - array holding time values of each chain during the simulation
@@ -506,6 +530,7 @@ def time_control_munch_kernel(Z,QN,QN_first,NK,chain_time,tdt,result,calc_type,r
         result - stress or MSD recorded during the simulation
         calc_type - stress or MSD (0 or 1)
         reach_flag - flag to determine if chain has reached the next sync time
+        reach_count - device counter of chains that reached the sync time (see count_reached)
         next_sync_time - time at which all chains will reach before correlator is applied
         write_time - array of integer values for when stress/MSD values are recorded during the simulation
         time_res - time resolution to record stress/MSD values
@@ -513,6 +538,7 @@ def time_control_munch_kernel(Z,QN,QN_first,NK,chain_time,tdt,result,calc_type,r
         p - correlator parameter (see main.py)
         g - correlator parameter (see main.py)
         m - correlator parameter (see main.py)
+        sync_step - loop iteration of the host since the last sync
     '''
     i = cuda.blockIdx.x*cuda.blockDim.x + cuda.threadIdx.x #chain index
     
@@ -522,13 +548,16 @@ def time_control_munch_kernel(Z,QN,QN_first,NK,chain_time,tdt,result,calc_type,r
     if reach_flag[i] != 0:
         return
 
-    if (chain_time[i] >= next_sync_time) and chain_time[i] <= (write_time[i]*time_res[0]*m**corrLevel):
+    #the next write time may also lie beyond the sync time if the last jump passed both
+    next_write = write_time[i]*time_res[0]*m**corrLevel
+    if (chain_time[i] >= next_sync_time) and (chain_time[i] <= next_write or next_write > next_sync_time):
         
         #if sync time is reached and stress was recorded, set reach flag to 1
         reach_flag[i] = 1
         tdt[i] = 0.0
         write_time[i] = 1
         chain_time[i] -= next_sync_time
+        count_reached(reach_count,QN.shape[0],sync_step)
         
         return
         
@@ -536,20 +565,14 @@ def time_control_munch_kernel(Z,QN,QN_first,NK,chain_time,tdt,result,calc_type,r
             
         tz = int(Z[i])
         
+        #row of write time write_time (after a jump over several write times, the missed ones are recorded in the following steps)
         if corrLevel == 0:
-            arr_index = int(math.floor(chain_time[i]/time_res[0])/(m**corrLevel))
+            arr_index = write_time[i]
         else:
-            arr_index = int(math.floor((chain_time[i]+p*g*m**corrLevel*time_res[0])/time_res[0])/(m**corrLevel))
+            arr_index = write_time[i] + p*g
 
         if calc_type[0] == 1:
-            stress_xy = stress_yz = stress_xz = 0.0 
-
-            for j in range(0,tz):
-                stress_xy -= (3.0*QN[i,j,0]*QN[i,j,1] / QN[i,j,3]) #tau_xy
-                stress_yz -= (3.0*QN[i,j,1]*QN[i,j,2] / QN[i,j,3]) #tau_yz
-                stress_xz -= (3.0*QN[i,j,0]*QN[i,j,2] / QN[i,j,3]) #tau_xz
-            
-            result[i,arr_index,0] = stress_xy
+            chain_kernel.equilibrium_stress(i,Z,QN,QN_head,result,arr_index,result.shape[2]) #tau_xy (or all independent components with multi-component G(t))
         
         elif calc_type[0] == 2:
             QN_1 = QN_first[i,:] #need fixed frame of reference, choosing first entanglement which is tracked during simulation
@@ -562,7 +585,7 @@ def time_control_munch_kernel(Z,QN,QN_first,NK,chain_time,tdt,result,calc_type,r
             prev_QN[0] = prev_QN[1] = prev_QN[2] = 0.0
             
             for j in range(0,tz):
-                QN_i = QN[i,j,:]
+                QN_i = QN[i,chain_kernel.ring_index(QN_head[i],j,QN.shape[1]),:]
                 term = cuda.local.array(3,float32)
                 term[0] = term[1] = term[2] = 0.0
                 for k in range(0,3):
@@ -582,7 +605,7 @@ def time_control_munch_kernel(Z,QN,QN_first,NK,chain_time,tdt,result,calc_type,r
 
 
 @cuda.jit
-def time_control_kernel(Z,QN,new_Q,QN_first,NK,chain_time,tdt,result,calc_type,flow,flow_off,reach_flag,next_sync_time,max_sync_time,write_time,time_res,result_index):
+def time_control_kernel(Z,QN,QN_head,new_Q,QN_first,NK,chain_time,tdt,result,flow_sums,calc_type,flow,flow_off,reach_flag,reach_count,next_sync_time,max_sync_time,write_time,time_res,result_index,sync_step):
     '''
     GPU kernel to control chain times and record stress/MSD values at specific write_time to be used with on-the-fly RSVL correlator (similar to the above kernel)
     '''
@@ -592,7 +615,8 @@ def time_control_kernel(Z,QN,new_Q,QN_first,NK,chain_time,tdt,result,calc_type,f
         return
 
     if not bool(flow[0]) and not bool(flow_off[0]):
-        result[i,result_index,0] = result[i,result_index,1] = result[i,result_index,2] = result[i,result_index,3] = 0.0
+        for k in range(0,result.shape[2]):
+            result[i,result_index,k] = 0.0
             
     if reach_flag[i] != 0:
         return
@@ -602,29 +626,28 @@ def time_control_kernel(Z,QN,new_Q,QN_first,NK,chain_time,tdt,result,calc_type,f
         #if sync time is reached and stress was recorded, set reach flag to 1
         reach_flag[i] = 1
         tdt[i] = 0.0
+        count_reached(reach_count,QN.shape[0],sync_step)
         
         return
         
     if (chain_time[i] > write_time[i]*time_res[0]): #if chain time reaches next time to record stress/CoM (every time_res)
         
+        #with flow accumulators, add the flow stress tensor of each write time (except t=0) to the ensemble sums
+        if bool(flow[0]) and flow_sums.shape[1] > 0:
+            chain_kernel.flow_stress(i,Z,QN,QN_head,result)
+            if write_time[i] > 0:
+                add_flow_sample(i,result,flow_sums,write_time[i])
+        
         if not bool(flow[0]) and not bool(flow_off[0]):
             
             tz = int(Z[i])
             
             arr_index = result_index 
 
+            #the last value of each row flags a recorded value (used by the RSVL correlator)
             if calc_type[0] == 1:
-                stress_xy = stress_yz = stress_xz = 0.0 
-
-                for j in range(0,tz):
-                    stress_xy -= (3.0*QN[i,j,0]*QN[i,j,1] / QN[i,j,3]) #tau_xy
-                    stress_yz -= (3.0*QN[i,j,1]*QN[i,j,2] / QN[i,j,3]) #tau_yz
-                    stress_xz -= (3.0*QN[i,j,0]*QN[i,j,2] / QN[i,j,3]) #tau_xz
-                
-                result[i,arr_index,0] = stress_xy
-                result[i,arr_index,1] = stress_yz
-                result[i,arr_index,2] = stress_xz
-                result[i,arr_index,3] = 1.0
+                chain_kernel.equilibrium_stress(i,Z,QN,QN_head,result,arr_index,result.shape[2]-1)
+                result[i,arr_index,result.shape[2]-1] = 1.0
             
             elif calc_type[0] == 2:
                 QN_1 = QN_first[i,:] #need fixed frame of reference, choosing first entanglement which is tracked during simulation
@@ -637,7 +660,7 @@ def time_control_kernel(Z,QN,new_Q,QN_first,NK,chain_time,tdt,result,calc_type,f
                 prev_QN[0] = prev_QN[1] = prev_QN[2] = 0.0
                 
                 for j in range(0,tz):
-                    QN_i = QN[i,j,:]
+                    QN_i = QN[i,chain_kernel.ring_index(QN_head[i],j,QN.shape[1]),:]
                     term = cuda.local.array(3,float32)
                     term[0] = term[1] = term[2] = 0.0
                     for k in range(0,3):
@@ -650,7 +673,7 @@ def time_control_kernel(Z,QN,new_Q,QN_first,NK,chain_time,tdt,result,calc_type,f
                 result[i,arr_index,0] = chain_com[0] + QN_1[0]
                 result[i,arr_index,1] = chain_com[1] + QN_1[1]
                 result[i,arr_index,2] = chain_com[2] + QN_1[2]
-                result[i,arr_index,3] = 1.0
+                result[i,arr_index,result.shape[2]-1] = 1.0
         
         if not bool(flow[0]) and bool(flow_off[0]): #track equilibrium variables after cessation of flow
             
@@ -664,14 +687,15 @@ def time_control_kernel(Z,QN,new_Q,QN_first,NK,chain_time,tdt,result,calc_type,f
             stress_xx = stress_yy = stress_zz = stress_xy = stress_yz = stress_xz = 0.0
             count_new_Q = 0
             for j in range(0,int(Z[i])):
-                stress_xx -= (3.0*QN[i,j,0]*QN[i,j,0] / QN[i,j,3]) #tau_xx
-                stress_yy -= (3.0*QN[i,j,1]*QN[i,j,1] / QN[i,j,3]) #tau_yy
-                stress_zz -= (3.0*QN[i,j,2]*QN[i,j,2] / QN[i,j,3]) #tau_zz
-                stress_xy -= (3.0*QN[i,j,0]*QN[i,j,1] / QN[i,j,3]) #tau_xy
-                stress_yz -= (3.0*QN[i,j,1]*QN[i,j,2] / QN[i,j,3]) #tau_yz
-                stress_xz -= (3.0*QN[i,j,0]*QN[i,j,2] / QN[i,j,3]) #tau_xz
+                s = chain_kernel.ring_index(QN_head[i],j,QN.shape[1])
+                stress_xx -= (3.0*QN[i,s,0]*QN[i,s,0] / QN[i,s,3]) #tau_xx
+                stress_yy -= (3.0*QN[i,s,1]*QN[i,s,1] / QN[i,s,3]) #tau_yy
+                stress_zz -= (3.0*QN[i,s,2]*QN[i,s,2] / QN[i,s,3]) #tau_zz
+                stress_xy -= (3.0*QN[i,s,0]*QN[i,s,1] / QN[i,s,3]) #tau_xy
+                stress_yz -= (3.0*QN[i,s,1]*QN[i,s,2] / QN[i,s,3]) #tau_yz
+                stress_xz -= (3.0*QN[i,s,0]*QN[i,s,2] / QN[i,s,3]) #tau_xz
                 if j < int(Z[i]) - 1:
-                    if new_Q[i,j] == 1:
+                    if new_Q[i,s] == 1:
                         count_new_Q+=1
             
             result[i,arr_index,0] = stress_xx
@@ -691,9 +715,136 @@ def time_control_kernel(Z,QN,new_Q,QN_first,NK,chain_time,tdt,result,calc_type,f
         
     
 @cuda.jit
-def apply_step_kernel(Z, QN, QN_first, QN_create_SDCD, chain_time, time_compensation, sum_W_sorted,
+def fused_step_kernel(nsteps, Z, QN, QN_head, QN_first, NK, flow, flow_off, kappa, tau_CD, shift_probs, rate_tree, obs, CD_flag, CD_create_prefact, beta,
+                      sum_W_sorted, uniform_rand, rand_used, found_index, found_shift, add_rand, new_Q, chain_time, time_compensation, tdt,
+                      t_cr, f_t, tau_CD_used_SD, tau_CD_used_CD, tau_CD_gauss_rand_SD, tau_CD_gauss_rand_CD, rng_step, seed, chain_offset, discrete, pcd_array,
+                      pcd_table_eq, pcd_table_cr, pcd_table_tau, res, flow_sums, calc_type, reach_flag, reach_count,
+                      next_sync_time, max_sync_time, write_time, time_res, munch, corrLevel, p, g, m, result_index, record_ft,
+                      ft_log, ft_scale, enttime_bins, chain_steps, max_steps):
+    '''
+    GPU kernel that advances each chain by up to nsteps jump processes in a single launch (fused version of calc_strand_prob, 
+    calc_chainends_prob, time control, choose_step_kernel, track_newQ and apply_step_kernel). A chain stops early when it reaches
+    the sync time, so the host only needs to act when the random number arrays are used up or all chains are synced.
+
+    Args:
+        nsteps - maximum number of steps for each chain (steps left before the random number arrays are refilled)
+        munch - True if time_control_munch_kernel is used to record results, otherwise time_control_kernel is used
+        rate_tree - rate tree of each chain (array with no columns if not used), rebuilt at the start of each launch
+        obs - running stress and center of mass of each chain (array with no columns if not used), summed again at the start of each launch
+        rng_step, seed, chain_offset - counter-based random numbers (rng_step has no entries if the random number arrays are used, see chain_kernel.step)
+        flow_sums - flow accumulators (no rows if not used), the flow stress tensor is added at each write time (see add_flow_sample)
+        reach_count - device counter of chains that reached the sync time, increased by the chains that reached it during the launch
+        result_index - row of the RSVL result array used by the first step
+        record_ft - if True, entanglement lifetimes are binned in enttime_bins after every step
+        ft_log, ft_scale - spacing of the lifetime bins (see chain_kernel.ft_bin)
+        enttime_bins - device array of bins for the entanglement lifetime distribution
+        chain_steps - number of steps made by each chain before it reached the sync time
+        max_steps - single value array to store the largest chain_steps (number of steps of the unfused loop)
+        remaining arguments - see kernels above
+    '''
+    i = cuda.blockIdx.x*cuda.blockDim.x + cuda.threadIdx.x #chain index
+    
+    if i >= QN.shape[0]:
+        return
+
+    sync_each_step = flow[0] or flow_off[0]
+    apply_deformation = bool(flow[0])
+    flow_accum = flow_sums.shape[1] > 0 #the flow stress tensor is only recorded at each write time for the flow accumulators
+    was_reached = reach_flag[i] != 0
+
+    if rate_tree.shape[1] > 0 and not was_reached:
+        chain_kernel.calc_rates(i,Z,QN,QN_head,tau_CD,shift_probs,rate_tree,CD_flag[0],CD_create_prefact[0],beta[0],NK[0])
+    if obs.shape[1] > 0 and not was_reached:
+        chain_kernel.calc_observables(i,Z,QN,QN_head,QN_first,NK[0],obs)
+
+    steps = 0
+    for k in range(0,nsteps):
+
+        #chains that reached the sync time are frozen, but the RSVL result rows still need to be cleared
+        if reach_flag[i] != 0:
+            if munch or sync_each_step:
+                break
+            chain_kernel.time_control(i,Z,QN,QN_head,new_Q,QN_first,NK[0],obs,chain_time,tdt,res,calc_type[0],apply_deformation,flow_off[0],flow_accum,reach_flag,
+                                      next_sync_time,max_sync_time,write_time,time_res[0],result_index+k)
+            continue
+
+        steps += 1
+        wt = write_time[i]
+
+        chain_kernel.step(i,Z,QN,QN_head,QN_first,NK[0],apply_deformation,flow_off[0],flow_accum,kappa,tau_CD,shift_probs,rate_tree,obs,CD_flag[0],CD_create_prefact[0],beta[0],
+                          sum_W_sorted,uniform_rand,rand_used,found_index,found_shift,add_rand,new_Q,chain_time,time_compensation,tdt,
+                          t_cr,f_t,tau_CD_used_SD,tau_CD_used_CD,tau_CD_gauss_rand_SD,tau_CD_gauss_rand_CD,rng_step,seed,chain_offset,discrete,pcd_array,
+                          pcd_table_eq,pcd_table_cr,pcd_table_tau,res,calc_type[0],reach_flag,
+                          next_sync_time,max_sync_time,write_time,time_res[0],munch,corrLevel,p,g,m,result_index+k)
+
+        #the step recorded the flow stress tensor of write time wt in res (see chain_kernel.time_control)
+        if apply_deformation and flow_accum and write_time[i] != wt and wt > 0:
+            add_flow_sample(i,res,flow_sums,wt)
+
+        if record_ft:
+            ft_idx = chain_kernel.ft_bin(f_t[i],enttime_bins.shape[0],ft_log,ft_scale)
+            if ft_idx >= 0:
+                cuda.atomic.add(enttime_bins,ft_idx,1)
+
+    chain_steps[i] = steps
+    cuda.atomic.max(max_steps,0,steps)
+    if not was_reached and reach_flag[i] != 0:
+        cuda.atomic.add(reach_count,0,1)
+
+    return
+
+
+@cuda.jit
+def bin_remaining_ft(niter, f_t, chain_steps, ft_log, ft_scale, enttime_bins):
+    '''
+    GPU kernel to bin the entanglement lifetime of chains that stopped before the last step of fused_step_kernel 
+    (the unfused loop bins the lifetime of every chain at every step)
+    '''
+    i = cuda.blockIdx.x*cuda.blockDim.x + cuda.threadIdx.x #chain index
+    
+    if i >= f_t.shape[0]:
+        return
+
+    if niter > chain_steps[i]:
+        ft_idx = chain_kernel.ft_bin(f_t[i],enttime_bins.shape[0],ft_log,ft_scale)
+        if ft_idx >= 0:
+            cuda.atomic.add(enttime_bins,ft_idx,niter-chain_steps[i])
+
+    return
+
+
+@cuda.jit
+def bin_ft_kernel(f_t, ft_log, ft_scale, enttime_bins, reach_count, sync_step):
+    '''
+    GPU kernel to add the entanglement lifetime of each chain to the lifetime histogram (replaces copying f_t to the host every step)
+
+    Args:
+        f_t - entanglement lifetimes of each chain when an entanglement is destroyed
+        ft_log, ft_scale - spacing of the lifetime bins (see chain_kernel.ft_bin)
+        enttime_bins - device array of bins for the entanglement lifetime distribution
+        reach_count - device counter of chains that reached the sync time (see count_reached)
+        sync_step - loop iteration of the host since the last sync, or -1 to bin at every iteration
+    '''
+    i = cuda.blockIdx.x*cuda.blockDim.x + cuda.threadIdx.x #chain index
+    
+    if i >= f_t.shape[0]:
+        return
+
+    #skip iterations made after the last chain reached the sync time (before the host polled reach_count)
+    if sync_step >= 0 and reach_count[1] >= 0 and sync_step > reach_count[1]:
+        return
+
+    ft_idx = chain_kernel.ft_bin(f_t[i],enttime_bins.shape[0],ft_log,ft_scale)
+    if ft_idx >= 0:
+        cuda.atomic.add(enttime_bins,ft_idx,1)
+
+    return
+
+    
+@cuda.jit
+def apply_step_kernel(Z, QN, QN_head, QN_first, chain_time, time_compensation, sum_W_sorted,
                  found_shift, found_index, reach_flag, tdt,
-                 t_cr, new_t_cr, f_t, tau_CD, new_tau_CD, rand_used, add_rand, tau_CD_used_SD, tau_CD_used_CD, tau_CD_gauss_rand_SD, tau_CD_gauss_rand_CD):
+                 t_cr, f_t, tau_CD, rand_used, add_rand, tau_CD_used_SD, tau_CD_used_CD, tau_CD_gauss_rand_SD, tau_CD_gauss_rand_CD):
    
     '''
     GPU kernel to apply the transition between chain states (Kuhn step shuffle, create/destroy slip-link, etc.) and update the chain time after the transition occurs.
@@ -701,8 +852,8 @@ def apply_step_kernel(Z, QN, QN_first, QN_create_SDCD, chain_time, time_compensa
     Args:
         Z - total number of entangled strands for each chain
         QN - strand orientations and Kuhn steps in each entangled strand for each chain
+        QN_head - slot of the first strand of each chain, moved by creation and destruction (see chain_kernel.ring_index)
         QN_first - orientation of the first strand (MSD only)
-        QN_create_SDCD - array to hold shifted strand orientations due to creation of a slip-link due to SD or CD
         chain_time - time that each chain has reached
         time_compensation - array for Kahan summation to update chain time
         sum_W_sorted - the total probability of all chain jump processes for each chain
@@ -711,10 +862,8 @@ def apply_step_kernel(Z, QN, QN_first, QN_create_SDCD, chain_time, time_compensa
         reach_flag - array to store whether chain has reached the next sync time or not (if sync time is reached, stop all jump processes)
         tdt - time step of each chain
         t_cr - array to store creation times of slip-links during the simulation (used in calculating entanglement lifetimes)
-        new_t_cr - array to store shifted t_cr values when new slip-links are created by SD or CD
         f_t - entanglement lifetimes of each chain when an entanglement is destroyed
         tau_CD - characteristic CD lifetime for each slip-link in each chain
-        new_tau_CD - array to hold shifted tau_CD values when a new entanglement is created
         rand_used - index values for accessing random number arrays (updated by 1 each time a jump process is selected)
         add_rand - fraction of remaining probability for determining number of Kuhn steps during creation of a strand
         tau_CD_used_SD - index for tau_CD_gauss_rand_SD to access random numbers from guassian distribution for strand orientation Q 
@@ -734,14 +883,6 @@ def apply_step_kernel(Z, QN, QN_first, QN_create_SDCD, chain_time, time_compensa
     #chosen process and location along chain
     jumpIdx = int(found_index[i])
     jumpType = int(found_shift[i])
-    
-    if jumpType == 4 or jumpType == 6:
-        for j in range(1,tz+1):
-            for m in range(0,4):
-                QN_create_SDCD[i,j,m] = QN[i,j-1,m]
-
-            new_t_cr[i,j] = t_cr[i,j-1]
-            new_tau_CD[i,j] = tau_CD[i,j-1]
 
     # if sum_W_sorted[i] == 0:
     #     print('Error: timestep size is infinity for chain',i)
@@ -759,130 +900,113 @@ def apply_step_kernel(Z, QN, QN_first, QN_create_SDCD, chain_time, time_compensa
 
     #apply jump processes to each chain
     if jumpType == 0 or jumpType == 1:
-        apply_shuffle(i, jumpIdx, jumpType, QN)
+        apply_shuffle(i, jumpIdx, jumpType, QN, QN_head)
 
     if jumpType == 2 or jumpType == 5:
-        apply_destroy(i, jumpIdx, jumpType, QN, QN_first, Z, t_cr, tau_CD, f_t, chain_time)
+        apply_destroy(i, jumpIdx, jumpType, QN, QN_head, QN_first, Z, t_cr, tau_CD, f_t, chain_time)
         
     if jumpType == 3 or jumpType == 6:
-        apply_create_SD(i, jumpIdx, jumpType, QN, QN_first, QN_create_SDCD[i], Z, t_cr, new_t_cr[i], tau_CD, new_tau_CD[i], chain_time, tau_CD_used_SD, tau_CD_gauss_rand_SD)
+        apply_create_SD(i, jumpIdx, jumpType, QN, QN_head, QN_first, Z, t_cr, tau_CD, chain_time, tau_CD_used_SD, tau_CD_gauss_rand_SD)
 
     if jumpType == 4:
-        apply_create_CD(i, jumpIdx, QN, QN_first, QN_create_SDCD[i], Z, t_cr, new_t_cr[i], tau_CD, new_tau_CD[i], tau_CD_used_CD, tau_CD_gauss_rand_CD, add_rand[i])
+        apply_create_CD(i, jumpIdx, QN, QN_head, QN_first, Z, t_cr, tau_CD, tau_CD_used_CD, tau_CD_gauss_rand_CD, add_rand[i])
         
     return
     
 
 
 @cuda.jit(device=True)
-def apply_shuffle(chainIdx, jumpIdx, jumpType, QN):
+def apply_shuffle(chainIdx, jumpIdx, jumpType, QN, QN_head):
     '''
     Device function to shift Kuhn step left/right through slip-link
     '''
+    s = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx,QN.shape[1])
+    s1 = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx+1,QN.shape[1])
     if jumpType == 0: #shuffling left
-        QN[chainIdx,jumpIdx,3] += 1
-        QN[chainIdx,jumpIdx+1,3] -= 1
+        QN[chainIdx,s,3] += 1
+        QN[chainIdx,s1,3] -= 1
     elif jumpType == 1: #shuffling right
-        QN[chainIdx,jumpIdx,3] -= 1
-        QN[chainIdx,jumpIdx+1,3] += 1
+        QN[chainIdx,s,3] -= 1
+        QN[chainIdx,s1,3] += 1
     return
 
 
 @cuda.jit(device=True)
-def apply_destroy(chainIdx, jumpIdx, jumpType, QN, QN_first, Z, t_cr, tau_CD, f_t, chain_time):
+def apply_destroy(chainIdx, jumpIdx, jumpType, QN, QN_head, QN_first, Z, t_cr, tau_CD, f_t, chain_time):
     '''
     Device function to destroy a slip-link along the chain
     '''
-    
+
     tz = int(Z[chainIdx])
+    s = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx,QN.shape[1])
+    s1 = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx+1,QN.shape[1])
+
+    cr_time = t_cr[chainIdx,s]
 
-    cr_time = t_cr[chainIdx,jumpIdx]
-    
     Z[chainIdx]-=1
 
     if cr_time != 0:
         f_t[chainIdx] = math.log10(chain_time[chainIdx]- cr_time) + 10
-        
+
     if jumpIdx == 0:
         #destroy entanglement at beginning of chain
-        
+
         #update change to first entanglement location
         for k in range(0,3):
-            QN_first[chainIdx,k] += QN[chainIdx,jumpIdx+1,k]
-            
-        #destroy first strand and set N
-        QN[chainIdx,jumpIdx,0] = QN[chainIdx,jumpIdx,1] = QN[chainIdx,jumpIdx,2] = 0.0
-        QN[chainIdx,jumpIdx,3] += QN[chainIdx,jumpIdx+1,3]
+            QN_first[chainIdx,k] += QN[chainIdx,s1,k]
 
-        t_cr[chainIdx,jumpIdx] = t_cr[chainIdx,jumpIdx+1]
-        tau_CD[chainIdx,jumpIdx] = tau_CD[chainIdx,jumpIdx+1]
+        #join the first two strands in the slot of the second strand, which keeps its slip-link
+        QN[chainIdx,s1,3] += QN[chainIdx,s,3]
+        QN[chainIdx,s1,0] = QN[chainIdx,s1,1] = QN[chainIdx,s1,2] = 0.0
 
-        #shift all strands -1 in array for deleted strand
-        for threadIdx in range(jumpIdx+1,tz-1):
-            for m in range(0,4):
-                QN[chainIdx,threadIdx,m] = QN[chainIdx,threadIdx+1,m]
-
-            t_cr[chainIdx,threadIdx] = t_cr[chainIdx,threadIdx+1]
-            tau_CD[chainIdx,threadIdx] = tau_CD[chainIdx,threadIdx+1]
-        
-        QN[chainIdx,tz-1,0] = QN[chainIdx,tz-1,1] = QN[chainIdx,tz-1,2] = QN[chainIdx,tz-1,3] = 0.0 
+        #remove the first strand (moves the head of the chain)
+        chain_kernel.remove_strand(chainIdx, jumpIdx, tz, QN, QN_head, t_cr, tau_CD)
 
 
     elif jumpIdx == tz-2:
         #destroy entanglement at end of chain
-        
-        QN[chainIdx,jumpIdx,3] = QN[chainIdx,jumpIdx,3] + QN[chainIdx,jumpIdx+1,3]
-        QN[chainIdx,jumpIdx,0] = QN[chainIdx,jumpIdx,1] = QN[chainIdx,jumpIdx,2] = 0.0
 
-        t_cr[chainIdx,jumpIdx] = 0.0
-        tau_CD[chainIdx,jumpIdx] = 0.0
+        QN[chainIdx,s,3] = QN[chainIdx,s,3] + QN[chainIdx,s1,3]
+        QN[chainIdx,s,0] = QN[chainIdx,s,1] = QN[chainIdx,s,2] = 0.0
 
-        QN[chainIdx,jumpIdx+1,3] = 0.0
-        QN[chainIdx,jumpIdx+1,0] = QN[chainIdx,jumpIdx+1,1] = QN[chainIdx,jumpIdx+1,2] = 0.0
+        t_cr[chainIdx,s] = 0.0
+        tau_CD[chainIdx,s] = 0.0
 
-        t_cr[chainIdx,jumpIdx+1] = 0.0
-        tau_CD[chainIdx,jumpIdx+1] = 0.0
+        QN[chainIdx,s1,3] = 0.0
+        QN[chainIdx,s1,0] = QN[chainIdx,s1,1] = QN[chainIdx,s1,2] = 0.0
 
-    else: 
+        t_cr[chainIdx,s1] = 0.0
+        tau_CD[chainIdx,s1] = 0.0
 
-        #destroy entanglement at jumpIdx
+    else:
+
+        #destroy entanglement at jumpIdx, the joined strand is set in the slot of strand jumpIdx+1 which keeps its slip-link
         for m in range(0,4):
-            QN[chainIdx,jumpIdx,m] = QN[chainIdx,jumpIdx,m] + QN[chainIdx,jumpIdx+1,m]
-        
-        t_cr[chainIdx,jumpIdx] = t_cr[chainIdx,jumpIdx+1]
-        tau_CD[chainIdx,jumpIdx] = tau_CD[chainIdx,jumpIdx+1]
+            QN[chainIdx,s1,m] = QN[chainIdx,s,m] + QN[chainIdx,s1,m]
 
-        #shift all other strands to the strand+1 value in array (shifting -1 in array)
-        for threadIdx in range(jumpIdx+1,tz-1):
-            for m in range(0,4):
-                QN[chainIdx,threadIdx,m] = QN[chainIdx,threadIdx+1,m]
+        #remove strand jumpIdx by moving the strands on the shorter side
+        chain_kernel.remove_strand(chainIdx, jumpIdx, tz, QN, QN_head, t_cr, tau_CD)
 
-            t_cr[chainIdx,threadIdx] = t_cr[chainIdx,threadIdx+1]
-            tau_CD[chainIdx,threadIdx] = tau_CD[chainIdx,threadIdx+1]
-        
-        #set last strand in old array to 0s
-        QN[chainIdx,tz-1,0] = QN[chainIdx,tz-1,1] = QN[chainIdx,tz-1,2] = QN[chainIdx,tz-1,3] = 0.0  
-    
-    return 
+    return
 
 
 @cuda.jit(device=True)
-def apply_create_SD(chainIdx, jumpIdx, jumpType, QN, QN_first, QN_create_SDCD, Z, t_cr, new_t_cr, tau_CD, new_tau_CD, chain_time, tau_CD_used_SD, tau_CD_gauss_rand_SD):
+def apply_create_SD(chainIdx, jumpIdx, jumpType, QN, QN_head, QN_first, Z, t_cr, tau_CD, chain_time, tau_CD_used_SD, tau_CD_gauss_rand_SD):
     '''
     Device function to create a slip-link due to sliding dynamics (SD)
     '''
     tz = int(Z[chainIdx])
-    
+
     Z[chainIdx]+=1
-    
-    QN1 = QN[chainIdx,jumpIdx,:]
-    
+
+    QN1 = QN[chainIdx,chain_kernel.ring_index(QN_head[chainIdx],jumpIdx,QN.shape[1]),:]
+
     #pull random gaussian and tau_CD for sliding dynamics
     temp = tau_CD_gauss_rand_SD[chainIdx,int(tau_CD_used_SD[chainIdx]),:]
-    
+
     #if random numbers are used, add 1 to counter to shift random number array
     tau_CD_used_SD[chainIdx]+=1
-    
+
     #set tau_CD and new N for new strand
     tCD = temp[3]
     new_N = QN1[3] - 1.0
@@ -896,147 +1020,139 @@ def apply_create_SD(chainIdx, jumpIdx, jumpType, QN, QN_first, QN_create_SDCD, Z
     temp[0]*=sigma
     temp[1]*=sigma
     temp[2]*=sigma
-    
-    
+
+
     if jumpType == 3.0:
         #create new strand at end of chain from sliding dynamics
-        
+        s = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx,QN.shape[1])
+        s1 = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx+1,QN.shape[1])
+
         #set strand at end
-        QN[chainIdx,jumpIdx+1,0] = QN[chainIdx,jumpIdx+1,1] = QN[chainIdx,jumpIdx+1,2] = 0.0
-        QN[chainIdx,jumpIdx+1,3] = 1.0
+        QN[chainIdx,s1,0] = QN[chainIdx,s1,1] = QN[chainIdx,s1,2] = 0.0
+        QN[chainIdx,s1,3] = 1.0
 
-        t_cr[chainIdx,jumpIdx+1] = 0.0
-        tau_CD[chainIdx,jumpIdx+1] = 0.0
+        t_cr[chainIdx,s1] = 0.0
+        tau_CD[chainIdx,s1] = 0.0
 
-        #set new strand at tz-1 
+        #set new strand at tz-1
         for m in range(0,3):
-            QN[chainIdx,jumpIdx,m] = temp[m]
-        QN[chainIdx,jumpIdx,3] = new_N
-        
-        tau_CD[chainIdx,jumpIdx] = tCD
-        t_cr[chainIdx,jumpIdx] = chain_time[chainIdx]
+            QN[chainIdx,s,m] = temp[m]
+        QN[chainIdx,s,3] = new_N
+
+        tau_CD[chainIdx,s] = tCD
+        t_cr[chainIdx,s] = chain_time[chainIdx]
 
 
     elif jumpType == 6.0:
         #create new strand at beginning of chain from sliding dynamics
-        
-        #shift all indices of other strands in array +1 to create new strand
-        for entIdx in range(jumpIdx+1,tz+1):
-            for m in range(0,4):
-                QN[chainIdx,entIdx,m] = QN_create_SDCD[entIdx,m]
-        
-            t_cr[chainIdx,entIdx] = new_t_cr[entIdx]
-            tau_CD[chainIdx,entIdx] = new_tau_CD[entIdx]
-        
+
+        #move the head of the chain one slot back to create new strand
+        chain_kernel.insert_strand(chainIdx, jumpIdx, tz, QN, QN_head, t_cr, tau_CD)
+        s = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx,QN.shape[1])
+        s1 = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx+1,QN.shape[1])
+
         #create new strand Q and N
         for m in range(0,3):
-            QN[chainIdx,jumpIdx+1,m] = temp[m]
-        QN[chainIdx,jumpIdx+1,3] = new_N
-        
+            QN[chainIdx,s1,m] = temp[m]
+        QN[chainIdx,s1,3] = new_N
+
         #update free end at beginning
-        QN[chainIdx,jumpIdx,3] = 1.0
-        QN[chainIdx,jumpIdx,0] = QN[chainIdx,jumpIdx,1] = QN[chainIdx,jumpIdx,2] = 0.0
-        
-        t_cr[chainIdx,jumpIdx] = chain_time[chainIdx]
-        tau_CD[chainIdx,jumpIdx] = tCD
-        
+        QN[chainIdx,s,3] = 1.0
+        QN[chainIdx,s,0] = QN[chainIdx,s,1] = QN[chainIdx,s,2] = 0.0
+
+        t_cr[chainIdx,s] = chain_time[chainIdx]
+        tau_CD[chainIdx,s] = tCD
+
         for k in range(0,3):
             QN_first[chainIdx,k] -= temp[k]
-        
-            
+
+
     else:
         return
 
 
 @cuda.jit(device=True)
-def apply_create_CD(chainIdx, jumpIdx, QN, QN_first, QN_create_SDCD, Z, t_cr, new_t_cr, tau_CD, new_tau_CD, tau_CD_used_CD, tau_CD_gauss_rand_CD, add_rand):
+def apply_create_CD(chainIdx, jumpIdx, QN, QN_head, QN_first, Z, t_cr, tau_CD, tau_CD_used_CD, tau_CD_gauss_rand_CD, add_rand):
     '''
     Device function to create a slip-link due to constraint dynamics (e.g. sliding dynamics of surrounding chains)
     '''
     tz = int(Z[chainIdx])
-    
+
     Z[chainIdx]+=1
-    
-    QN1 = QN[chainIdx,jumpIdx,:]
+
+    #strand that is split, its slot keeps the strand when the other strands are moved (see chain_kernel.insert_strand)
+    QN1 = QN[chainIdx,chain_kernel.ring_index(QN_head[chainIdx],jumpIdx,QN.shape[1]),:]
 
     temp = tau_CD_gauss_rand_CD[chainIdx,int(tau_CD_used_CD[chainIdx]),:]
 
     tau_CD_used_CD[chainIdx]+=1
 
     tCD = temp[3]
-    
+
     new_N = math.floor(0.5 + add_rand * (QN1[3] - 2.0)) + 1.0
-    
+
     temp[3] = new_N
-    
+
     sigma = math.sqrt(float(new_N * (QN1[3] - new_N)) / float(3.0 * QN1[3]))
-    
+
     if jumpIdx == tz-1:
-        sigma = math.sqrt(new_N / 3.0) 
-    
+        sigma = math.sqrt(new_N / 3.0)
+
     ratio_N = new_N / QN1[3]
-        
+
     if jumpIdx == 0:
-        
-        #calculate Q and N for new and previous strand 
+
+        #calculate Q and N for new and previous strand
         temp[3] = QN1[3] - new_N
         sigma = math.sqrt(temp[3] / 3.0)
         temp[0] *= sigma
         temp[1] *= sigma
         temp[2] *= sigma
-        
-        #shift other entanglements
-        for entIdx in range(jumpIdx+1,tz+1):
-            for m in range(0,4):
-                QN[chainIdx,entIdx,m] = QN_create_SDCD[entIdx,m]
-        
-            t_cr[chainIdx,entIdx] = new_t_cr[entIdx]
-            tau_CD[chainIdx,entIdx] = new_tau_CD[entIdx]
-            
+
+        #move the head of the chain one slot back for the new strand
+        chain_kernel.insert_strand(chainIdx, jumpIdx, tz, QN, QN_head, t_cr, tau_CD)
+        s = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx,QN.shape[1])
+        s1 = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx+1,QN.shape[1])
+
         #set tau_CD t_cr (creation time of entanglement is 0 for constraint dynamics)
-        tau_CD[chainIdx,jumpIdx] = tCD
-        t_cr[chainIdx,jumpIdx] = 0.0
-    
+        tau_CD[chainIdx,s] = tCD
+        t_cr[chainIdx,s] = 0.0
+
         #previous strand is updated
         for m in range(0,4):
-            QN[chainIdx,jumpIdx+1,m] = temp[m]
+            QN[chainIdx,s1,m] = temp[m]
 
         #at jump index, create new strand Q and N
-        QN[chainIdx,jumpIdx,3] = new_N
-        QN[chainIdx,jumpIdx,0] = QN[chainIdx,jumpIdx,1] = QN[chainIdx,jumpIdx,2] = 0.0
-        
+        QN[chainIdx,s,3] = new_N
+        QN[chainIdx,s,0] = QN[chainIdx,s,1] = QN[chainIdx,s,2] = 0.0
+
         for k in range(0,3):
             QN_first[chainIdx,k] -= temp[k]
-            
-        return 
-    
+
+        return
+
     temp[0] *= sigma
     temp[1] *= sigma
     temp[2] *= sigma
     temp[0] += (QN1[0] * ratio_N)
     temp[1] += (QN1[1] * ratio_N)
-    temp[2] += (QN1[2] * ratio_N) 
-        
-    #shift all strands in front of new entanglement
-    for entIdx in range(jumpIdx+1,tz+1):
-        for m in range(0,4):
-            QN[chainIdx,entIdx,m] = QN_create_SDCD[entIdx,m]
+    temp[2] += (QN1[2] * ratio_N)
 
-        t_cr[chainIdx,entIdx] = new_t_cr[entIdx]
-        tau_CD[chainIdx,entIdx] = new_tau_CD[entIdx]
-        
-    #create new strands Q and N at jumpIdx and jumpIdx+1
+    #make room for the new strand by moving the strands on the shorter side
+    chain_kernel.insert_strand(chainIdx, jumpIdx, tz, QN, QN_head, t_cr, tau_CD)
+    s = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx,QN.shape[1])
+    s1 = chain_kernel.ring_index(QN_head[chainIdx],jumpIdx+1,QN.shape[1])
+
+    #create new strands Q and N at jumpIdx and jumpIdx+1 (QN1 is read before its slot is set)
     for m in range(0,4):
-        QN[chainIdx,jumpIdx+1,m] = QN1[m] - temp[m]   
-        QN[chainIdx,jumpIdx,m] = temp[m]
-    
+        QN[chainIdx,s1,m] = QN1[m] - temp[m]
+        QN[chainIdx,s,m] = temp[m]
+
     #if create by CD at end of chain, set jumpIdx+1 to free end
     if jumpIdx == tz-1:
-        QN[chainIdx,jumpIdx+1,0] = QN[chainIdx,jumpIdx+1,1] = QN[chainIdx,jumpIdx+1,2] = 0.0
-        
+        QN[chainIdx,s1,0] = QN[chainIdx,s1,1] = QN[chainIdx,s1,2] = 0.0
+
     #set tau_CD and creation time of new entanglement
-    tau_CD[chainIdx,jumpIdx] = tCD
-    t_cr[chainIdx,jumpIdx] = 0
-        
-        
-    return
\ No newline at end of file
+    tau_CD[chainIdx,s] = tCD
+    t_cr[chainIdx,s] = 0
+
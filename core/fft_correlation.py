@@ -0,0 +1,113 @@
+import numpy as np
+
+from core.correlation import p, m, MULTI_STRESS
+import core.blocking as blocking
+
+#MUnCH correlation engine on the host. The averages of all time lags of a result block are calculated at once from the FFT of the
+#values of each chain (Wiener-Khinchin theorem, O(n log n) per chain instead of O(n) per lag). The errors use the same blocking
+#transformation as correlation.corr_block, applied to the correlation values of all chains of a time lag at once with NumPy
+#reductions (blocking.lag_errors), which is still O(n) per lag but runs without a scalar loop over chains and lags.
+
+def block_lags(corrLevel, num_time_syncs, time_res, sim_time):
+    '''
+    Time lags (in rows of the result array) used for correlator level corrLevel, in the order of correlation.calc_corr
+
+    Args:
+        corrLevel - correlation level
+        num_time_syncs - total number of chain time syncs during the simulation
+        time_res - time resolution of the recorded stress/MSD values
+        sim_time - total simulation time
+    Returns:
+        array of time lags
+    '''
+    if corrLevel == 0:
+        return np.arange(0,p*m)
+
+    lags = []
+    for j in range(p*m**corrLevel,p*m**(corrLevel+1),m**corrLevel):
+        if j*time_res <= sim_time:
+            if corrLevel >= num_time_syncs: #if correlator is above last time sync
+                lags.append(int(j/m**(num_time_syncs-1)))
+            else:
+                lags.append(int(j/m**corrLevel))
+
+    return np.array(lags,dtype=np.int64)
+
+
+def lag_averages(data, lags, calc_type):
+    '''
+    Average stress correlation (calc_type 1) or squared displacement (calc_type 2) of each chain for all time lags
+
+    Args:
+        data - stress (column 0, or MULTI_STRESS columns averaged over components) or CoM (columns 0-2) values of each chain, shape (Nchains, n, columns)
+        lags - time lags in rows of data
+        calc_type - 1 or 2 for stress or MSD, respectively
+    Returns:
+        averages over the n-lag pairs of rows of each chain, shape (Nchains, len(lags)) (0 for lags without pairs, same as corr_block)
+    '''
+    n = data.shape[1]
+    averages = np.zeros(shape=(data.shape[0],len(lags)),dtype=float)
+    valid = lags < n
+    lags = lags[valid]
+    if n == 0 or len(lags) == 0:
+        return averages
+    if calc_type == 1:
+        ncomp = MULTI_STRESS if data.shape[2] == MULTI_STRESS else 1
+    else:
+        ncomp = 3
+    x = data[:,:,0:ncomp]
+
+    #sums of x[r]*x[r+lag] over r from the power spectrum (zero padded to avoid circular correlation)
+    nfft = 1 << int(2*n-1).bit_length()
+    x_fft = np.fft.rfft(x,n=nfft,axis=1)
+    acf = np.sum(np.fft.irfft(x_fft.real**2 + x_fft.imag**2,n=nfft,axis=1)[:,0:n,:],axis=2)
+
+    if calc_type == 1:
+        sums = acf[:,lags]/ncomp
+    else:
+        #sum of (x[r+lag]-x[r])**2 = sum of x[r]**2 for r < n-lag + sum of x[r]**2 for r >= lag - 2*acf[lag]
+        sq_sum = np.zeros(shape=(x.shape[0],n+1),dtype=float)
+        sq_sum[:,1:] = np.cumsum(np.sum(x**2,axis=2),axis=1)
+        sums = np.maximum(sq_sum[:,n-lags] + (sq_sum[:,n:n+1] - sq_sum[:,lags]) - 2.0*acf[:,lags],0.0) #(no negative rounding errors)
+
+    averages[:,valid] = sums/(n-lags)
+
+    return averages
+
+
+def calc_corr(rawdata, calc_type, num_time_syncs, corrLevel, data_corr, array_index, last_index, time_res, sim_time):
+    '''
+    Calculate time autocorrelations of all time lags of correlator level corrLevel on the host (same results as correlation.calc_corr)
+
+    Args:
+        rawdata - raw stress/MSD values stored for each chain (host array)
+        calc_type - 1 or 2 for stress or MSD, respectively
+        num_time_syncs - total number of chain time syncs during the simulation
+        corrLevel - correlation level
+        data_corr - host array to store the final correlation value and error at each time lag of each chain, or ensemble sums
+                    (fewer rows than chains, the sums are added to row 0)
+        array_index - host array with the last index of data_corr used by each chain
+        last_index - last index of the stress/MSD value to be used
+        time_res - time resolution of the recorded stress/MSD values
+        sim_time - total simulation time
+    '''
+    lags = block_lags(corrLevel, num_time_syncs, time_res, sim_time)
+    if len(lags) == 0:
+        return
+
+    data = np.ascontiguousarray(rawdata[:,0:last_index,:])
+    xav = lag_averages(data, lags, calc_type)
+    errors = blocking.lag_errors(data, lags, xav, calc_type)
+
+    if data_corr.shape[0] == data.shape[0]:
+        index = array_index[:,np.newaxis] + 1 + np.arange(len(lags))
+        chains = np.arange(data_corr.shape[0])[:,np.newaxis]
+        data_corr[chains,index,0] = xav
+        data_corr[chains,index,1] = errors
+    else: #ensemble sums (all chains use the same indices)
+        index = array_index[0] + 1 + np.arange(len(lags))
+        data_corr[0,index,0] += np.sum(xav,axis=0)
+        data_corr[0,index,1] += np.sum(errors,axis=0)
+    array_index += len(lags)
+
+    return
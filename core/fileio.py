@@ -1,6 +1,20 @@
 import numpy as np
 import os
-import pickle
+import sys
+
+from core.correlation import m
+
+#binary raw data files start with a 64 byte header: magic string, then int64 format version, number of chains, number of values
+#per chain (ncomp), calc_type and block factor m of the time grid, then float64 time resolution. The header is followed by one
+#segment per time sync, each holding a 24 byte header (int64 sync level, first row and number of points of the sync) and the float64
+#values of the sync stored chain by chain, shape (nchains, points, ncomp). Point k of a segment is at time (first row + k)*m**level*time_res.
+#Values are tau_xy (calc_type 1, ncomp 1), the MULTI_STRESS components of chain_kernel.equilibrium_stress (calc_type 1, ncomp 5)
+#or the center of mass x, y, z (calc_type 2, ncomp 3).
+RAWDATA_MAGIC = b'PYDSMCHN'
+RAWDATA_OLD_MAGIC = b'PYDSMRAW' #time-major files of earlier versions
+RAWDATA_VERSION = 2
+RAWDATA_HEADER_SIZE = 64
+RAWDATA_SEGMENT_HEADER_SIZE = 24
 
 
 def save_distributions(input_data,distr,QN,Z,output_dir,sim_ID):
@@ -56,6 +70,7 @@ def write_stress(input_data,flow,turn_flow_off,num_sync,time,stress_array,output
     
     Returns: 
         stress over time for each chain in stress.txt file
+        rows written to the file (in flow: time, averages and standard errors of the stress tensor, Z and f_newQ)
     '''
     global old_sync_time
 
@@ -114,95 +129,232 @@ def write_stress(input_data,flow,turn_flow_off,num_sync,time,stress_array,output
     else:
         old_sync_time = time
     
-    return 
+    return combined
 
 
-def write_com(input_data,num_sync,time,com_array,output_dir,sim_ID):
+def write_flow_stress(input_data,num_sync,time,time_array,flow_sums,output_dir,sim_ID):
     '''
-    Write the CoM of all chains in ensemble
-    
-    Inputs: 
+    Write the ensemble flow stress from the flow accumulators (same format as write_stress in flow)
+
+    Args:
         input_data - input parameters from yaml file
         num_sync - sync number for simulation
-        time - simulation time
-        com_array - array of center of mass (CoM) values to write
+        time - simulation time of the sync
+        time_array - write times of the rows
+        flow_sums - sums (columns 0-7), sums of squares (columns 8-15) and number of samples (column 16) of the
+                    flow stress tensor, Z and f_newQ over all chains for each write time
         output_dir - path to output directory
-        sim_ID - simulation ID number 
-    
-    Returns: 
-        Center-of-mass over time for each chain and dimension (x,y,z) in CoM.txt file
+        sim_ID - simulation ID number
+
+    Returns:
+        average stress over time in stress.txt file
+        rows written to the file (same columns as write_stress in flow)
+    '''
+    global old_sync_time
+
+    stress_output = os.path.join(output_dir,'stress_%d.txt'%sim_ID)
+
+    #mean and standard error over chains (np.std of the chain values divided by sqrt(Nchains))
+    nsamples = flow_sums[:,16:17]
+    stress = flow_sums[:,0:8]/nsamples
+    error = np.sqrt(np.maximum(flow_sums[:,8:16]/nsamples - stress**2,0.0))/np.sqrt(input_data['Nchains'])
+    combined = np.hstack((np.reshape(time_array,(len(time_array),1)), stress, error))
+
+    #write stress to file
+    if num_sync == 1:
+        with open(stress_output,'w') as f:
+            f.write('time, tau_xx, tau_yy, tau_zz, tau_xy, tau_yz, tau_xz, Z, f_newQ, stderr_xx, stderr_yy, stderr_zz, stderr_xy, stderr_yz, stderr_xz, stderr_Z, stderr_f_newQ\n')
+            np.savetxt(f, combined, delimiter=',', fmt='%.8f')
+    else:
+        with open(stress_output,'a') as f:
+            np.savetxt(f, combined, delimiter=',', fmt='%.8f')
+
+    #keeping track of the last simulation time for beginning of next array (stress after cessation of flow)
+    old_sync_time = time
+
+    return combined
+
+
+def write_rawdata(filename,num_sync,first_row,data,calc_type,time_res):
     '''
+    Append results of all chains at the points of a time sync to a binary raw data file (the file is created at the first sync)
     
-    if num_sync == 1: #if first time sync, need to include 0 and initialize file path
-        com_output_x = os.path.join(output_dir, 'CoM_%d_x.dat'%sim_ID)
-        com_output_y = os.path.join(output_dir, 'CoM_%d_y.dat'%sim_ID)
-        com_output_z = os.path.join(output_dir, 'CoM_%d_z.dat'%sim_ID)
-        old_sync_time = 0
-        time_index = 0
+    Args: 
+        filename - path of the raw data file
+        num_sync - sync number for simulation (the points of sync num_sync are spaced by m**(num_sync-1)*time_res)
+        first_row - row of the result array of the first new point
+        data - values of all chains at the new points, shape (Nchains, points, values per chain)
+        calc_type - 1 for stress, 2 for center of mass values
+        time_res - time between the points of the first sync
     
+    Returns: 
+        segment of the values of all chains (chain by chain) appended to filename
+    '''
+    nchains, npoints, ncomp = data.shape
+    segment = np.array([num_sync-1,first_row,npoints],dtype=np.int64).tobytes()
+
+    if num_sync == 1:
+        with open(filename,'wb') as f:
+            header = (RAWDATA_MAGIC + np.array([RAWDATA_VERSION,nchains,ncomp,calc_type,m],dtype=np.int64).tobytes()
+                      + np.array([time_res],dtype=np.float64).tobytes())
+            f.write(header + bytes(RAWDATA_HEADER_SIZE-len(header)))
+            f.write(segment)
+            np.ascontiguousarray(data,dtype=np.float64).tofile(f)
     else:
-        time_index = 1
+        with open(filename,'ab') as f:
+            f.write(segment)
+            np.ascontiguousarray(data,dtype=np.float64).tofile(f)
+
+    return
+
+
+def load_rawdata(filename):
+    '''
+    Memory-map a binary raw data file written by write_rawdata
     
-    #set time array depending on num_sync
-    time_resolution = input_data['tau_K']
-    time_array = np.arange(old_sync_time,time+time_resolution/2.0,time_resolution)
-    time_array = np.reshape(time_array[time_index:],(1,len(time_array[time_index:])))
-    len_array = len(time_array[0])+1
+    Args: 
+        filename - path of the raw data file
+    
+    Returns: 
+        info - dictionary of the header values (nchains, ncomp, calc_type, m and time_res)
+        time - times of all points
+        segments - values of each time sync, shape (Nchains, points, values per chain), values are only read from the file
+                   when accessed (see rawdata_chains)
+    '''
+    with open(filename,'rb') as f:
+        header = f.read(RAWDATA_HEADER_SIZE)
+    if header[0:len(RAWDATA_MAGIC)] == RAWDATA_OLD_MAGIC:
+        sys.exit("%s was written in the time-major raw data format of an earlier version."%(filename))
+    if header[0:len(RAWDATA_MAGIC)] != RAWDATA_MAGIC:
+        sys.exit("%s is not a pyDSM raw data file."%(filename))
+    version, nchains, ncomp, calc_type, block_m = [int(x) for x in np.frombuffer(header[8:48],dtype=np.int64)]
+    if version != RAWDATA_VERSION:
+        sys.exit("%s has raw data format version %d, version %d is supported."%(filename,version,RAWDATA_VERSION))
+    time_res = float(np.frombuffer(header[48:56],dtype=np.float64)[0])
+    info = {'nchains': nchains, 'ncomp': ncomp, 'calc_type': calc_type, 'm': block_m, 'time_res': time_res}
+
+    #walk the segments (a segment that was not completely written, for example when the run was killed, is ignored)
+    size = os.path.getsize(filename)
+    offset = RAWDATA_HEADER_SIZE
+    times = []
+    segments = []
+    while offset + RAWDATA_SEGMENT_HEADER_SIZE <= size:
+        level, first_row, npoints = [int(x) for x in np.fromfile(filename,dtype=np.int64,count=3,offset=offset)]
+        offset += RAWDATA_SEGMENT_HEADER_SIZE
+        nbytes = 8*nchains*npoints*ncomp
+        if offset + nbytes > size:
+            break
+        if npoints > 0:
+            segments.append(np.memmap(filename,dtype=np.float64,mode='r',offset=offset,shape=(nchains,npoints,ncomp)))
+            times.append((first_row + np.arange(npoints))*float(block_m)**level*time_res)
+        offset += nbytes
+
+    time_array = np.concatenate(times) if len(times) > 0 else np.zeros(shape=0)
+
+    return info, time_array, segments
+
+
+def rawdata_chains(segments,first,last,npoints=None):
+    '''
+    Read the values of a block of chains from the segments of a raw data file (each chain is stored contiguously in each segment)
+
+    Args:
+        segments - segments returned by load_rawdata
+        first, last - chains first to last-1 are read
+        npoints - number of leading points to read (defaults to all points)
+    Returns:
+        values of the chains at each point, shape (last-first, points, values per chain)
+    '''
+    blocks = []
+    count = 0
+    for segment in segments:
+        if npoints is not None and count >= npoints:
+            break
+        n = segment.shape[1] if npoints is None else min(segment.shape[1],npoints-count)
+        blocks.append(np.array(segment[first:last,0:n,:]))
+        count += n
+    if len(blocks) == 0: #no points
+        return np.zeros(shape=(0,0,0)) if len(segments) == 0 else np.array(segments[0][first:last,0:0,:])
+
+    return np.concatenate(blocks,axis=1)
+
+
+def stress_rawdata_to_text(filename,output,block_size=10000):
+    '''
+    Convert a binary stress raw data file to text (same format as the tau_xy output of write_stress)
     
-    #reshape arrays
-    com_x = np.reshape(com_array[:,time_index:len_array,0],(input_data['Nchains'],len(com_array[0,time_index:len_array,0])))    
-    com_y = np.reshape(com_array[:,time_index:len_array,1],(input_data['Nchains'],len(com_array[0,time_index:len_array,1])))    
-    com_z = np.reshape(com_array[:,time_index:len_array,2],(input_data['Nchains'],len(com_array[0,time_index:len_array,2])))    
-    
-    #combine time and CoM for each dimension
-    combined_x = np.hstack((time_array.T, com_x.T))
-    combined_y = np.hstack((time_array.T, com_y.T))
-    combined_z = np.hstack((time_array.T, com_z.T))
-    
-    if num_sync == 1: #write data to files and overwrite if file exists
-        with open(com_output_x,"wb") as f:
-            pickle.dump(combined_x,f)
-        with open(com_output_y,"wb") as f:
-            pickle.dump(combined_y,f)
-        with open(com_output_z,"wb") as f:
-            pickle.dump(combined_z,f)
-    else: #append file for num_sync > 1
-        with open(com_output_x,"ab") as f:
-            pickle.dump(combined_x,f)
-        with open(com_output_y,"ab") as f:
-            pickle.dump(combined_y,f)
-        with open(com_output_z,"ab") as f:
-            pickle.dump(combined_z,f)
+    Args: 
+        filename - path of the raw data file
+        output - path of the text file
+        block_size - number of time points converted at once
     
-    #keeping track of the last simulation time for beginning of next array
-    old_sync_time = time
+    Returns: 
+        tau_xy over time for each chain in the output file
+    '''
+    info, time_array, segments = load_rawdata(filename)
+
+    with open(output,'w') as f:
+        f.write('time, tau_xy_chain0, tau_xy_chain1, ... , tau_xy_Nchains\n')
+        start_time = 0
+        for segment in segments:
+            for start in range(0,segment.shape[1],block_size):
+                stop = min(start+block_size,segment.shape[1])
+                combined = np.hstack((np.reshape(time_array[start_time+start:start_time+stop],(-1,1)), np.transpose(segment[:,start:stop,0])))
+                np.savetxt(f, combined, delimiter=',', fmt='%.8f')
+            start_time += segment.shape[1]
+
+    return
+
+
+def save_checkpoint(filename,arrays):
+    '''
+    Write a simulation checkpoint (uncompressed .npz, every array is stored as a raw .npy member)
+
+    Args:
+        filename - path of the checkpoint file
+        arrays - dictionary of host arrays (and scalars) holding the simulation state
+
+    Returns:
+        checkpoint file, the previous checkpoint is only replaced once the new one is complete
+    '''
+    tmp_file = filename + '.tmp'
+    with open(tmp_file,'wb') as f:
+        np.savez(f,**arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file,filename)
+
+    return
+
+
+def load_checkpoint(filename):
+    '''
+    Load a simulation checkpoint written by save_checkpoint
+
+    Args:
+        filename - path of the checkpoint file
+
+    Returns:
+        dictionary of the saved arrays (and scalars)
+    '''
+    with np.load(filename) as data:
+        arrays = {name: data[name] for name in data.files}
+
+    return arrays
 
 
 def load_results(filename,block_num,block_size,num_chains):
     '''
-    Load in part of the binary .dat file into the result array
+    Load the values of a block of chains from a binary raw data file (only this block is read from the file)
     
     Args: 
-        filename - filename of the data file
+        filename - path of the raw data file
         block_num - chain block number (total chains split into n blocks of size block_size)
-        num_chains - block_num*block_size
+        num_chains - last chain of the block (block_num*block_size + size of the block)
     
     Returns: 
-        an array of data read from filename
+        array of the values of chains block_num*block_size to num_chains, shape (time points, chains in block, values per chain)
     '''
-    result_array = []
-    with open(filename,'rb') as f:
-        try:
-            while True:
-                data = pickle.load(f)
-                for j in data:
-                    if block_num == 0:
-                        first_idx = 1
-                    else:
-                        first_idx = block_num*block_size + 1
-                    last_idx = num_chains+1
-                    result_array.append(j[first_idx:last_idx])
-        except EOFError:
-            pass
-
-    return result_array
\ No newline at end of file
+    time_array, data = load_rawdata(filename)
+
+    return np.array(data[:,block_num*block_size:num_chains,:])
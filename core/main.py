@@ -1,9 +1,13 @@
 import os
 import sys
 import time
+import contextlib
+import signal
+import threading
 import warnings
 import psutil
 import numpy as np
+import numba
 from numba import cuda
 from numba.cuda.random import create_xoroshiro128p_states
 from alive_progress import alive_bar 
@@ -12,26 +16,112 @@ import math
 import random as rng
 import GPUtil as GPU
 
-from core.chain import ensemble_chains
+from core.chain import ensemble_chains, chain_order, batch_init_memory
 from core.pcd_tau import p_cd, p_cd_linear
 import core.ensemble_kernel as ensemble_kernel
 import core.gpu_random as gpu_rand 
 import core.correlation as correlation
+import core.cpu_kernel as cpu_kernel
+import core.cpu_random as cpu_rand
+import core.cpu_correlation as cpu_correlation
 from core.fit import CURVE_FIT
 import core.fileio as fileio
+import core.msd as msd
+import core.steady_state as steady_state
+import core.fft_correlation as fft_correlation
+import core.warm_start as warm_start
+import core.shards as shards
 
 warnings.filterwarnings('ignore')
 
 class FSM_LINEAR(object):
 
-    def __init__(self,sim_ID,device_ID,output_dir,correlator,save_rawdata=False,fit=False,distr=False,load_file=None,save_file=None):
+    def __init__(self,sim_ID,device_ID,output_dir,correlator,save_rawdata=False,fit=False,distr=False,load_file=None,save_file=None,backend='gpu',fused=False,rate_tree=False,rng_type='xoroshiro',flow_accum=False,checkpoint_interval=60,fft_corr=False,ensemble_corr=False,multi_stress=False,conv_error=None,conv_time=None,steady_window=None,steady_tol=2.0,steady_stop=False,incremental_obs=False,init_type='serial',init_workers=None,table_cache=None,warm_start=None,warm_save=None,shard=None,max_mem=None):
         
         #simulation ID from run argument (>>python gpu_dsm sim_ID)
         self.sim_ID = sim_ID
 
+        #run the simulation on a GPU ('gpu') or on the host CPU cores ('cpu')
+        self.backend = backend
+
+        #if True, GPU chains are advanced by many steps per kernel launch (CPU backend always advances chains this way)
+        self.fused = fused
+
+        #if True, jump rates of each chain are kept in a tree and only updated near the chosen jump (faster for long chains)
+        self.rate_tree = rate_tree
+        if self.rate_tree and backend == 'gpu' and not self.fused:
+            print("Rate tree requires fused GPU steps, using --fused.")
+            self.fused = True
+
+        #random number generator, 'xoroshiro' fills arrays of 250 random numbers per chain, 'philox' draws counter-based random 
+        #numbers keyed by (seed, chain, step) inside the step functions
+        self.rng_type = rng_type
+        if self.rng_type not in ['xoroshiro','philox']:
+            sys.exit("Unknown random number generator %s. Please choose xoroshiro or philox."%(rng_type))
+        if self.rng_type == 'philox' and backend == 'gpu' and not self.fused:
+            print("Philox random numbers require fused GPU steps, using --fused.")
+            self.fused = True
+
+        #if True, the stress tensor and center of mass of each chain are updated by each jump instead of summed over all strands at each write time
+        self.incremental_obs = incremental_obs
+        if self.incremental_obs and backend == 'gpu' and not self.fused:
+            print("Incremental observables require fused GPU steps, using --fused.")
+            self.fused = True
+
+        #chain initialization, 'serial' draws the chains one at a time from the global random module, 'batch' draws all chains at once 
+        #with a NumPy random number generator, 'parallel' draws each chain from its own random number stream on init_workers processes
+        #(same distributions, different conformations)
+        self.init_type = init_type
+        if self.init_type not in ['serial','batch','parallel']:
+            sys.exit("Unknown chain initialization %s. Please choose serial, batch or parallel."%(init_type))
+        self.init_workers = init_workers
+
+        #directory where the distribution tables used by serial chain initialization are saved and reused (None only keeps them in memory)
+        self.table_cache = table_cache
+
+        #stores of equilibrated ensembles, initial conformations are drawn from warm_start (if it has enough chains with the same NK, beta and CD),
+        #the final conformations of equilibrium runs started from new conformations are added to warm_save
+        self.warm_start = warm_start
+        self.warm_save = warm_save
+
+        #if True, the flow stress tensor is added to ensemble sums on the device at each write time and chains in flow are synced every 250*tau_K
+        self.flow_accum = flow_accum
+
+        #checkpoint to resume from (a directory, such as the default './', means the simulation starts from new conformations)
+        if load_file is not None and not os.path.isdir(load_file):
+            if not os.path.isfile(load_file):
+                sys.exit("Checkpoint file %s not found."%(load_file))
+            self.load_file = load_file
+        else:
+            self.load_file = None
+
+        #checkpoint file (written to the output directory) and wall time in minutes between checkpoints (0 only writes one on SIGTERM)
+        self.save_file = save_file
+        self.checkpoint_interval = checkpoint_interval
+        self.stop_requested = False
+
         #determine correlator (on-the-fly or MUnCH)
         self.correlator = correlator
 
+        #if True, MUnCH correlations of all time lags are calculated at once with FFTs on the host instead of one lag at a time
+        self.fft_corr = fft_corr
+
+        #if True, correlator sums of all chains are added to ensemble sums (correlator memory no longer grows with Nchains x time lags)
+        self.ensemble_corr = ensemble_corr
+
+        #if True, G(t) is averaged over the autocorrelations of all independent components of the stress tensor instead of using only tau_xy
+        self.multi_stress = multi_stress
+
+        #if set, equilibrium runs stop once every time lag up to conv_time (default sim_time) has a relative error below conv_error
+        self.conv_error = conv_error
+        self.conv_time = conv_time
+
+        #if set, flow runs check for steady state of the ensemble stress tensor and Z over windows of steady_window time (drift below steady_tol 
+        #standard errors), with steady_stop, flow is stopped (or turned off if flow_time < sim_time) once steady state is reached
+        self.steady_window = steady_window
+        self.steady_tol = steady_tol
+        self.steady_stop = steady_stop
+
         #save raw results to file
         self.postprocess = save_rawdata
 
@@ -54,29 +144,50 @@ class FSM_LINEAR(object):
         else:
             sys.exit("No input file found.")
 
-        #check for GPU device
-        num_devices = len(cuda.gpus)
-        if num_devices == 0:
-            sys.exit("No GPU found.")
+        #with shard = (index, count), only the index-th of count contiguous parts of the ensemble is simulated and the correlator sums
+        #are saved for merging (see core/shards.py)
+        self.shard = shard
+        self.total_chains = self.input_data['Nchains']
+        first_chain, last_chain = 0, self.total_chains
+        if self.shard is not None:
+            index, count = self.shard
+            if count < 1 or count > self.total_chains or index < 0 or index >= count:
+                sys.exit("Invalid shard %d of %d for %d chains."%(index,count,self.total_chains))
+            first_chain, last_chain = shards.shard_ranges(self.total_chains,count)[index]
+            print("Shard %d of %d: chains %d to %d of %d."%(index,count,first_chain,last_chain-1,self.total_chains))
 
-        #select gpu device
-        get_device = GPU.getGPUs()
-        self.device = get_device[device_ID]
-        print("Using device: %s"%(self.device.name))
-        cuda.select_device(device_ID)
-
-        #get minimum available memory for determining correlator type
-        self.device_mem = self.device.memoryFree
         self.RAM_mem = psutil.virtual_memory().free/1024/1024
+
+        if self.backend == 'gpu':
+            #check for GPU device
+            num_devices = len(cuda.gpus)
+            if num_devices == 0:
+                sys.exit("No GPU found.")
+
+            #select gpu device
+            get_device = GPU.getGPUs()
+            self.device = get_device[device_ID]
+            print("Using device: %s"%(self.device.name))
+            cuda.select_device(device_ID)
+
+            #get minimum available memory for determining correlator type
+            self.device_mem = self.device.memoryFree
+        
+        elif self.backend == 'cpu':
+            #chains are split between worker threads (set NUMBA_NUM_THREADS to change the number of threads)
+            self.nworkers = numba.get_num_threads()
+            print("Using device: CPU (%d threads)"%(self.nworkers))
+            self.device_mem = self.RAM_mem
+
+        else:
+            sys.exit("Unknown backend %s. Please choose gpu or cpu."%(backend))
+
         self.min_mem = min([self.device_mem,self.RAM_mem]) #only used to check size of read/write arrays during postprocessing
 
-        #set seed number based on num argument
-        SEED = sim_ID*self.input_data['Nchains']
-        self.seed = SEED
+        #set seed number based on num argument (shards keep the seed of the whole ensemble and draw the random numbers of their chains)
         print("Simulation ID: %d"%(sim_ID))
         print("Using %d*Nchains as a seed for the random number generator."%(sim_ID))
-        
-        rng.seed(self.seed)
+        self.set_chains(first_chain,last_chain)
 
         #checks for input data
         if self.input_data['tau_K'] < 1:
@@ -85,10 +196,225 @@ class FSM_LINEAR(object):
         else:
             self.input_data['tau_K'] = round(self.input_data['tau_K'])
 
+        #chains that do not fit in the free device memory at once are simulated in sequential batches, merged like shards
+        #(max_mem in MB, default 80% of the free device memory)
+        self.max_mem = max_mem if max_mem is not None else 0.8*self.device_mem
+        self.batch = None
+        self.serial_state = None #(next chain, state of the random module) after a serial initialization
+        self.warm_ensembles = None #chains of the warm start store, loaded by the first chain batch
+        self.chain_batches = self.count_batches(self.input_data['Nchains'])
+
+        return
+
+    def set_chains(self,first,last):
+        '''
+        Simulate chains first to last-1 of the ensemble (a shard or a batch), each chain keeps the random numbers of a run of all chains
+
+        Args:
+            first - index of the first chain in the ensemble
+            last - index of the last chain + 1
+        '''
+        self.chain_offset = first
+        self.input_data['Nchains'] = last - first
+        self.seed = self.sim_ID*self.total_chains
+
         return
 
+    def seek_serial_init(self,pcd):
+        '''
+        Seed the random module for the serial initialization of chains from chain_offset on. The conformations of all chains are
+        drawn from one random stream seeded with sim_ID*Nchains, so the conformations of the chains before chain_offset are
+        drawn first and discarded, unless the previous chain batch ended at chain_offset (its random state is continued).
+
+        Args:
+            pcd - p_cd statistics for tau_CD of the initial slip-links (None if CD_flag is 0)
+        '''
+        if self.serial_state is not None and self.serial_state[0] == self.chain_offset:
+            rng.setstate(self.serial_state[1])
+            return
+
+        rng.seed(self.seed)
+        skipped = ensemble_chains(dict(self.input_data,Nchains=1),table_cache=self.table_cache)
+        for m in range(0,self.chain_offset):
+            skipped.chain_init(0,self.input_data['NK'],z_max=self.input_data['NK'],pcd=pcd)
+
+        return
+
+    def chain_memory(self):
+        '''
+        Estimate the device memory used by the arrays of each chain (bytes, same shapes as in run_chains)
+        '''
+        NK = self.input_data['NK']
+        flow = np.any(np.array(self.input_data['kappa'])!=0.0)
+        turn_flow_off = flow and self.input_data['flow_time']>0 and self.input_data['flow_time']<self.input_data['sim_time']
+        calc_type = 1 if flow or self.input_data['EQ_calc']=='stress' else 2
+        multi_stress = self.multi_stress and calc_type == 1 and not flow
+
+        #conformation arrays (QN, shift_probs, tau_CD and t_cr, new_Q if flow is turned off) and random number arrays
+        nvalues = 4*NK + 4*(NK+1) + 2*NK + (NK if turn_flow_off else 0)
+        rand_depth = 1 if self.rng_type == 'philox' else 250
+        nvalues += 9*rand_depth
+        #scalars of each chain (Z, jump index, rates, random number counters, times, flags, QN_first, QN_head and generator state)
+        nvalues += 25
+        if self.rate_tree:
+            nvalues += 2*(1 << int(NK).bit_length())
+        if self.incremental_obs and not flow:
+            nvalues += 9
+
+        #result and correlator arrays
+        p = correlation.p
+        m = correlation.m
+        dataLength = max(math.floor(self.input_data['sim_time']/self.input_data['tau_K']),p*m)
+        if flow:
+            nvalues += 8
+        elif self.correlator == 'rsvl':
+            S_corr = math.ceil(np.log(dataLength/p)/np.log(m)) + 1
+            ncomp = correlation.MULTI_STRESS if multi_stress else 3
+            nvalues += 250*(ncomp+1) + S_corr*(p*ncomp + ncomp + 2)
+            if not self.ensemble_corr:
+                nvalues += 2*S_corr*p
+        else:
+            S_corr = math.floor(np.log(dataLength/p)/np.log(m)) + 1
+            arrayLength = p*math.floor(min(dataLength,2048)/(p*m))*m
+            nvalues += (arrayLength+1)*(3 if calc_type == 2 else (correlation.MULTI_STRESS if multi_stress else 1)) + 1
+            if self.backend == 'gpu':
+                nvalues += arrayLength
+            if not self.ensemble_corr:
+                nvalues += 2*(p*m + S_corr*p)
+
+        return 8*nvalues
+
+    def count_batches(self,nchains):
+        '''
+        Number of sequential batches of nchains chains that fit in max_mem MB of device memory
+        '''
+        chain_mem = self.chain_memory()
+        #batch initialization also needs the temporary arrays of at least one chain (it uses the memory left by the chains of a batch)
+        init_mem = batch_init_memory(self.input_data['NK']) if self.init_type == 'batch' else 0
+        max_chains = int((self.max_mem*1024*1024-init_mem)//chain_mem)
+        if max_chains < 1:
+            sys.exit("A chain needs about %.2f MB of device memory, but only %.2f MB are available."%((chain_mem+init_mem)/1024/1024,self.max_mem))
+
+        batches = (nchains + max_chains - 1)//max_chains
+        if batches > 1:
+            print("The %d chains need about %.1f MB of device memory (%.1f MB available), simulating them in %d batches."%(
+                  nchains,nchains*chain_mem/1024/1024,self.max_mem,batches))
+
+        return batches
+
+
+    def to_device(self,array):
+        #copy array to GPU memory (or to a new host array for the CPU backend)
+        if self.backend == 'cpu':
+            return np.array(array)
+        return cuda.to_device(array)
+
+
+    def to_host(self,d_array):
+        #copy device array to host memory
+        if self.backend == 'cpu':
+            return np.copy(d_array)
+        return d_array.copy_to_host()
+
+
+    def request_stop(self,signum,frame):
+        #SIGTERM handler, a final checkpoint is written the next time the random number arrays are refilled
+        print("")
+        print("Received signal %d, writing checkpoint and stopping."%(signum))
+        self.stop_requested = True
+
+
+    def copy_to_array(self,d_array,array):
+        #copy host array into an existing device array (or host array for the CPU backend)
+        if array.size == 0:
+            return
+        if self.backend == 'cpu':
+            d_array[...] = array
+        else:
+            d_array.copy_to_device(np.ascontiguousarray(array))
+
+
+    def rsvl_average(self,C,N):
+        #average correlation of a time lag from the rsvl sums of each chain, or from ensemble sums (an average over all values, chains that
+        #reached an extra write time weigh slightly more)
+        if self.ensemble_corr:
+            return np.sum(C)/np.sum(N)
+        return np.sum(C/N)/self.input_data['Nchains']
+
+
+    def munch_average(self,data_corr):
+        #average correlation and error of each time lag over all chains from the munch averages and errors of each chain (or their ensemble sums)
+        corr_aver = np.sum(data_corr[:,:,0],axis=0)/self.input_data['Nchains']
+        corr_error = np.sum(data_corr[:,:,1],axis=0)/(self.input_data['Nchains']*np.sqrt(self.input_data['Nchains']))
+        return corr_aver, corr_error
+
+
+    def corr_converged(self,corr_time,corr_aver,corr_error):
+        #True if every time lag up to conv_time was calculated and has a relative error below conv_error (the zero lag is skipped)
+        corr_time = np.asarray(corr_time)
+        if len(corr_time) == 0 or corr_time[-1] < self.conv_time:
+            return False
+        lags = (corr_time > 0) & (corr_time <= self.conv_time)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            rel_error = corr_error[lags]/np.abs(corr_aver[lags])
+        return bool(np.all(rel_error <= self.conv_error))
+
+
+    def calc_fft_corr(self,d_res,calc_type,num_time_syncs,corrLevel,d_data_corr,d_corr_index,last_index,time_res):
+        #MUnCH correlations of all time lags of a result block at once with FFTs on the host (see fft_correlation.calc_corr)
+        data_corr = self.to_host(d_data_corr)
+        corr_index = self.to_host(d_corr_index)
+        fft_correlation.calc_corr(self.to_host(d_res),calc_type,num_time_syncs,corrLevel,data_corr,corr_index,last_index,time_res,self.input_data['sim_time'])
+        self.copy_to_array(d_data_corr,data_corr)
+        self.copy_to_array(d_corr_index,corr_index)
+
 
     def run(self):
+        #simulate all chains at once, or in sequential batches that fit in device memory (results are merged like shards, see core/shards.py)
+        if self.chain_batches == 1:
+            self.run_chains()
+            return
+
+        first_chain = self.chain_offset
+        output_dir = self.output_dir
+        load_file = self.load_file
+        fit = self.fit
+        self.fit = False
+        batch_dirs = []
+        for index, (first, last) in enumerate(shards.shard_ranges(self.input_data['Nchains'],self.chain_batches)):
+            self.output_dir = os.path.join(output_dir,'batch_%d'%index)
+            batch_dirs.append(self.output_dir)
+            if not os.path.exists(self.output_dir):
+                os.mkdir(self.output_dir)
+
+            #when resuming from a checkpoint, batches that were finished before are not simulated again
+            if load_file is not None and os.path.isfile(os.path.join(self.output_dir,'shard_%d.npz'%self.sim_ID)):
+                print("Batch %d of %d was already simulated."%(index+1,self.chain_batches))
+                continue
+
+            print("")
+            print("Batch %d of %d: chains %d to %d."%(index+1,self.chain_batches,first_chain+first,first_chain+last-1))
+            self.batch = (index,self.chain_batches)
+            self.set_chains(first_chain+first,first_chain+last)
+            self.run_chains()
+            self.load_file = None
+
+        print("")
+        print("Merging the results of %d batches..."%(self.chain_batches))
+        self.output_dir = output_dir
+        shards.merge_shards(batch_dirs,self.sim_ID,self.output_dir,shard=self.shard)
+
+        if fit and os.path.isfile(os.path.join(self.output_dir,'Gt_result_%d.txt'%self.sim_ID)):
+            print("")
+            print("Fitting G(t)...")
+            gt_fit = CURVE_FIT(os.path.join(self.output_dir,'Gt_result_%d.txt'%self.sim_ID),os.path.join(self.output_dir,'fit_results'))
+            gt_fit.fit()
+            print("")
+            print("G* predictions saved to file.")
+
+        return
+
+    def run_chains(self):
         #set variables and start simulation (also any post-processing after simulation is completed)
 
         #set cuda  grid dimensions
@@ -108,7 +434,7 @@ class FSM_LINEAR(object):
             
             #initialize constants for constraint dynamics probability calculation
             pcd = p_cd_linear(self.input_data['NK'],self.input_data['beta'])
-            d_CD_create_prefact = cuda.to_device([pcd.W_CD_destroy_aver()/self.input_data['beta']])
+            d_CD_create_prefact = self.to_device([pcd.W_CD_destroy_aver()/self.input_data['beta']])
             
             #array of constants used for tau_CD probability calculation
             pcd_array = np.array([pcd.g,                            #0
@@ -150,7 +476,7 @@ class FSM_LINEAR(object):
             
             #initialize modes and time constants
             pcd = p_cd(tauArr, gArr, nmodes)
-            d_CD_create_prefact = cuda.to_device([pcd.W_CD_destroy_aver()/self.input_data['beta']])
+            d_CD_create_prefact = self.to_device([pcd.W_CD_destroy_aver()/self.input_data['beta']])
 
             pcd_table_cr = np.zeros(pcd.nmodes,dtype=float)
             pcd_table_eq = np.zeros(pcd.nmodes,dtype=float)
@@ -179,42 +505,74 @@ class FSM_LINEAR(object):
             pcd_table_cr = np.zeros(1)
             pcd_table_eq = np.zeros(1)
             pcd_array = np.zeros(1)
-            d_CD_create_prefact = cuda.to_device([0.0])
+            d_CD_create_prefact = self.to_device([0.0])
 
             
+        #equilibrated ensembles with the same physics parameters in the warm start store
+        warm_key = warm_start.store_key(self.input_data,"pcd_MMM.txt" if discrete else None)
+        warm_t_cr = None
+        warm_ensembles = None
+        if self.warm_start is not None:
+            #chain batches sample the store as loaded by the first batch (chains added in the background are not used)
+            if self.warm_ensembles is None:
+                self.warm_ensembles = warm_start.load_ensembles(self.warm_start,warm_key)
+            warm_ensembles = self.warm_ensembles
+            #the chains are drawn from a permutation of the store for the whole ensemble, which needs as many chains
+            nstored = 0 if warm_ensembles is None else len(warm_ensembles['Z'])
+            if nstored < self.total_chains:
+                print("Warm start store %s has %d of %d chains with NK = %d, beta = %g, CD_flag = %d, starting from new conformations."%(
+                      self.warm_start,nstored,self.total_chains,self.input_data['NK'],self.input_data['beta'],self.input_data['CD_flag']))
+                print("Run python warm_store.py %s in this directory to add equilibrated chains in the background."%(self.warm_start))
+                warm_ensembles = None
+
         #generate initial chain conformations on host CPU
         print('Generating initial chain conformations on host...',end="",flush=True)
-        chain = ensemble_chains(self.input_data)
+        chain = ensemble_chains(self.input_data,table_cache=self.table_cache)
         
         #initialize chains
-        for m in range(0,self.input_data['Nchains']):
-            chain.chain_init(m,self.input_data['NK'],z_max=self.input_data['NK'],pcd=pcd)
+        if warm_ensembles is not None:
+            chain.QN, chain.Z, chain.tau_CD, warm_t_cr = warm_start.sample_chains(warm_ensembles,self.chain_offset,self.input_data['Nchains'],self.seed)
+        elif self.init_type == 'batch':
+            #the batched draws depend on the number of chains, shards and chain batches get their own seed, and the chains are drawn in
+            #chunks that fit in the memory left by the chains of the batch
+            chain.batch_init(self.input_data['NK'],z_max=self.input_data['NK'],seed=self.seed+self.chain_offset,pcd=pcd,
+                             max_mem=self.max_mem*1024*1024-self.input_data['Nchains']*self.chain_memory())
+        elif self.init_type == 'parallel':
+            chain.parallel_init(self.input_data['NK'],z_max=self.input_data['NK'],seed=self.seed,pcd=pcd,workers=self.init_workers,
+                                first=self.chain_offset)
+        else:
+            self.seek_serial_init(pcd)
+            for m in range(0,self.input_data['Nchains']):
+                chain.chain_init(m,self.input_data['NK'],z_max=self.input_data['NK'],pcd=pcd)
+            self.serial_state = (self.chain_offset+self.input_data['Nchains'],rng.getstate()) #continued by the next chain batch
         
         print('Done.')
+        if warm_ensembles is not None:
+            print("Initial conformations drawn from %d equilibrated chains in %s."%(len(warm_ensembles['Z']),self.warm_start))
         
         #simulation in flow if kappa strain tensor is set
         if np.any(np.array(self.input_data['kappa'])!=0.0):
             print("")
             print("Strain tensor is non-zero. Simulating polymers in flow...")
-            d_kappa = cuda.to_device(np.array(self.input_data['kappa'],dtype=float))
+            d_kappa = self.to_device(np.array(self.input_data['kappa'],dtype=float))
             self.flow = True
             calc_type = 1
             self.fit = False  
             if self.input_data['flow_time']>0 and self.input_data['flow_time']<self.input_data['sim_time']:
                 self.turn_flow_off = True
                 new_Q = np.zeros(shape=(chain.QN.shape[0],chain.QN.shape[1]),dtype=int)
-                d_new_Q = cuda.to_device(new_Q)
+                d_new_Q = self.to_device(new_Q)
             else:
                 self.turn_flow_off = False
                 new_Q = np.array([[]])
-                d_new_Q = cuda.to_device(new_Q)
+                d_new_Q = self.to_device(new_Q)
         else:
             self.flow = False
             self.turn_flow_off = False
             new_Q = np.array([[]])
-            d_new_Q = cuda.to_device(new_Q)
+            d_new_Q = self.to_device(new_Q)
             #determine system size for post-processing
-            d_kappa = cuda.to_device(np.array(self.input_data['kappa'],dtype=float))
+            d_kappa = self.to_device(np.array(self.input_data['kappa'],dtype=float))
 
         #if not flow, check for equilibrium calculation type (G(t) or MSD)
         if not self.flow:
@@ -230,6 +588,35 @@ class FSM_LINEAR(object):
             else:
                 sys.exit('Incorrect EQ_calc specified in input file. Please choose "stress" or "msd" for G(t) or MSD for the equilibrium calculation.')
 
+        if self.multi_stress and (self.flow or calc_type != 1):
+            print("Multi-component G(t) is only used for equilibrium G(t) calculations.")
+            self.multi_stress = False
+        elif self.multi_stress:
+            print("Averaging G(t) over the %d independent components of the stress tensor."%(correlation.MULTI_STRESS))
+
+        if self.conv_error is not None and (self.flow or self.turn_flow_off):
+            print("Convergence checks are only used for equilibrium G(t) or MSD calculations.")
+            self.conv_error = None
+        elif self.conv_error is not None and self.correlator == 'rsvl' and self.ensemble_corr:
+            print("Convergence checks need the rsvl correlator sums of each chain, --ensemble_corr is not used.")
+            self.ensemble_corr = False
+        if self.conv_error is not None:
+            if self.conv_time is None:
+                self.conv_time = self.input_data['sim_time']
+            print("Stopping the simulation once every time lag up to %g has a relative error below %g (at most sim_time = %g)."%(self.conv_time,self.conv_error,self.input_data['sim_time']))
+        converged = False
+
+        if self.incremental_obs and (self.flow or self.turn_flow_off):
+            print("Incremental observables are only used for equilibrium G(t) or MSD calculations.")
+            self.incremental_obs = False
+
+        if self.steady_window is not None and not self.flow:
+            print("Steady state detection is only used in flow.")
+            self.steady_window = None
+        elif self.steady_window is not None:
+            print("Checking for steady state over windows of %g time units%s."%(self.steady_window,
+                  (", flow is turned off at steady state" if self.turn_flow_off else ", the simulation stops at steady state") if self.steady_stop else ""))
+
         #keep track of first entanglement for MSD
         QN_first = np.zeros(shape=(chain.QN.shape[0],3)) 
 
@@ -249,34 +636,58 @@ class FSM_LINEAR(object):
         rand_used = np.zeros(shape=chain.QN.shape[0],dtype=int)
         tau_CD_used_SD = np.zeros(shape=chain.QN.shape[0],dtype=int)
         tau_CD_used_CD = np.zeros(shape=chain.QN.shape[0],dtype=int)
-        tau_CD_gauss_rand_SD = np.zeros(shape=(chain.QN.shape[0],250,4),dtype=float)
-        tau_CD_gauss_rand_CD = np.zeros(shape=(chain.QN.shape[0],250,4),dtype=float)
-        uniform_rand = np.zeros(shape=(chain.QN.shape[0],250),dtype=float)
+        rand_depth = 1 if self.rng_type == 'philox' else 250 #counter-based random numbers are drawn for each step into the first entry
+        tau_CD_gauss_rand_SD = np.zeros(shape=(chain.QN.shape[0],rand_depth,4),dtype=float)
+        tau_CD_gauss_rand_CD = np.zeros(shape=(chain.QN.shape[0],rand_depth,4),dtype=float)
+        uniform_rand = np.zeros(shape=(chain.QN.shape[0],rand_depth),dtype=float)
         add_rand = np.zeros(shape=(chain.QN.shape[0]),dtype=float)
         
         #move random number arrays and pcd statistics to device
-        d_tau_CD_gauss_rand_SD=cuda.to_device(tau_CD_gauss_rand_SD)
-        d_tau_CD_gauss_rand_CD=cuda.to_device(tau_CD_gauss_rand_CD)
-        d_uniform_rand=cuda.to_device(uniform_rand)
-        d_pcd_array = cuda.to_device(pcd_array)
-        d_pcd_table_eq = cuda.to_device(pcd_table_eq)
-        d_pcd_table_cr = cuda.to_device(pcd_table_cr)
-        d_pcd_table_tau = cuda.to_device(pcd_table_tau)
+        d_tau_CD_gauss_rand_SD=self.to_device(tau_CD_gauss_rand_SD)
+        d_tau_CD_gauss_rand_CD=self.to_device(tau_CD_gauss_rand_CD)
+        d_uniform_rand=self.to_device(uniform_rand)
+        d_pcd_array = self.to_device(pcd_array)
+        d_pcd_table_eq = self.to_device(pcd_table_eq)
+        d_pcd_table_cr = self.to_device(pcd_table_cr)
+        d_pcd_table_tau = self.to_device(pcd_table_tau)
         
-        #initialize random state and fill random variable arrays
+        #initialize random state and fill random variable arrays (the generator states of a shard continue the subsequences of
+        #the chains before it, so each chain gets the same random numbers as in a single run of all chains)
         random_state = self.seed
-        self.rng_states = create_xoroshiro128p_states(threadsperblock*blockspergrid,seed=random_state)
-        
-        gpu_rand.fill_gauss_rand_tauCD[blockspergrid,threadsperblock](self.rng_states, discrete, self.input_data['Nchains'], 250, True, self.input_data['CD_flag'],d_tau_CD_gauss_rand_SD, d_pcd_array, d_pcd_table_eq, 
-                                      d_pcd_table_cr,d_pcd_table_tau)
-        
-        #if CD flag is 1 (constraint dynamics is on), fill random gaussian array for new strands created by CD
-        if self.input_data['CD_flag'] == 1:
-            gpu_rand.fill_gauss_rand_tauCD[blockspergrid,threadsperblock](self.rng_states, discrete, self.input_data['Nchains'], 250, False, 
-                                                                         self.input_data['CD_flag'],d_tau_CD_gauss_rand_CD, d_pcd_array, 
-                                                                         d_pcd_table_eq, d_pcd_table_cr,d_pcd_table_tau)
+        if self.rng_type == 'philox':
+            #no generator states or random number arrays to fill, only the number of steps made by each chain
+            d_rng_step = self.to_device(np.zeros(shape=self.input_data['Nchains'],dtype=np.int64))
+
+        elif self.backend == 'gpu':
+            self.rng_states = create_xoroshiro128p_states(threadsperblock*blockspergrid,seed=random_state,subsequence_start=self.chain_offset)
+            
+            gpu_rand.fill_gauss_rand_tauCD[blockspergrid,threadsperblock](self.rng_states, discrete, self.input_data['Nchains'], 250, True, self.input_data['CD_flag'],d_tau_CD_gauss_rand_SD, d_pcd_array, d_pcd_table_eq, 
+                                          d_pcd_table_cr,d_pcd_table_tau)
+            
+            #if CD flag is 1 (constraint dynamics is on), fill random gaussian array for new strands created by CD
+            if self.input_data['CD_flag'] == 1:
+                gpu_rand.fill_gauss_rand_tauCD[blockspergrid,threadsperblock](self.rng_states, discrete, self.input_data['Nchains'], 250, False, 
+                                                                             self.input_data['CD_flag'],d_tau_CD_gauss_rand_CD, d_pcd_array, 
+                                                                             d_pcd_table_eq, d_pcd_table_cr,d_pcd_table_tau)
+            
+            gpu_rand.fill_uniform_rand[blockspergrid,threadsperblock](self.rng_states, self.input_data['Nchains'], 250, d_uniform_rand)
         
-        gpu_rand.fill_uniform_rand[blockspergrid,threadsperblock](self.rng_states, self.input_data['Nchains'], 250, d_uniform_rand)
+        else:
+            #host states are initialized like the GPU states, so each chain gets the same random numbers on both backends
+            self.rng_states = cpu_rand.create_xoroshiro128p_states_cpu(threadsperblock*blockspergrid,seed=random_state,subsequence_start=self.chain_offset)
+
+            cpu_rand.fill_gauss_rand_tauCD(self.rng_states, discrete, self.input_data['Nchains'], 250, True, self.input_data['CD_flag'],d_tau_CD_gauss_rand_SD, d_pcd_array, d_pcd_table_eq, 
+                                           d_pcd_table_cr,d_pcd_table_tau)
+            
+            if self.input_data['CD_flag'] == 1:
+                cpu_rand.fill_gauss_rand_tauCD(self.rng_states, discrete, self.input_data['Nchains'], 250, False, 
+                                               self.input_data['CD_flag'],d_tau_CD_gauss_rand_CD, d_pcd_array, 
+                                               d_pcd_table_eq, d_pcd_table_cr,d_pcd_table_tau)
+            
+            cpu_rand.fill_uniform_rand(self.rng_states, self.input_data['Nchains'], 250, d_uniform_rand)
+
+        if self.rng_type != 'philox':
+            d_rng_step = self.to_device(np.zeros(shape=0,dtype=np.int64))
 
         #initialize arrays for chain time and entanglement lifetime
         chain_time = np.zeros(shape=self.input_data['Nchains'],dtype=float)
@@ -284,14 +695,11 @@ class FSM_LINEAR(object):
         time_compensation = np.zeros(shape=self.input_data['Nchains'],dtype=float)
         tdt = np.zeros(shape=self.input_data['Nchains'],dtype=float)
         t_cr = np.zeros(shape=(chain.QN.shape[0],chain.QN.shape[1]),dtype=float)
+        if warm_t_cr is not None: #creation times of the warm started entanglements (before time 0)
+            t_cr = warm_t_cr
         f_t = np.zeros(shape=self.input_data['Nchains'],dtype=float)
         write_time = np.zeros(shape=self.input_data['Nchains'],dtype=int)
         reach_flag = np.zeros(shape=self.input_data['Nchains'],dtype=int)
-                
-        #initialize arrays for which chains create a slip link from sliding and/or constraint dynamics
-        QN_create_SDCD = np.zeros(shape=(chain.QN.shape[0],chain.QN.shape[1]+1,4),dtype=float)
-        new_t_cr = np.zeros(shape=(chain.QN.shape[0],chain.QN.shape[1]+1),dtype=float)
-        new_tau_CD = np.zeros(shape=(chain.QN.shape[0],chain.QN.shape[1]+1),dtype=float)
 
         #correlator parameters for both block transformation or on-the-fly
         p = correlation.p
@@ -304,6 +712,9 @@ class FSM_LINEAR(object):
         #sync time is the time for a chain to sync with other chains
         if self.flow: #if flow, set chain sync time to tau_K
             max_sync_time = self.input_data['tau_K']
+            if self.flow_accum: #with flow accumulators, the ensemble stress is summed on the device and chains are synced every 250 write times
+                print("Accumulating flow stress on the device, syncing chains every 250*tau_K.")
+                max_sync_time = 250*time_resolution
             res = np.zeros(shape=(chain.QN.shape[0],1,8),dtype=float) #initialize result array (stress or CoM)
             num_time_syncs = int(math.ceil(self.input_data['sim_time'] / max_sync_time))
             if self.turn_flow_off:
@@ -316,7 +727,8 @@ class FSM_LINEAR(object):
             if self.correlator=='rsvl':
                 S_corr = math.ceil(np.log(dataLength/p)/np.log(m)) + 1 #number of correlator levels
                 num_time_syncs = 1
-                res = np.zeros(shape=(chain.QN.shape[0],250,4),dtype=float) 
+                #values (tau_xy, tau_yz, tau_xz or the multi-component stress, or CoM) and a flag for recorded values
+                res = np.zeros(shape=(chain.QN.shape[0],250,correlation.MULTI_STRESS+1 if self.multi_stress else 4),dtype=float) 
             else:
                 S_corr= math.floor(np.log(dataLength/p)/np.log(m)) + 1 #number of correlator levels
                 if dataLength < 2048: #max result array size of 10000
@@ -329,67 +741,130 @@ class FSM_LINEAR(object):
                 last_index = -1 #if all data in arrayLength is used, set last index to entire array
 
                 if calc_type == 1: #result array (G(t) or MSD) dimensions are set based on EQ_calc
-                    res = np.zeros(shape=(chain.QN.shape[0],arrayLength+1,1),dtype=float) #initialize result array (stress or CoM) to always hold 250 stress values per chain
+                    res = np.zeros(shape=(chain.QN.shape[0],arrayLength+1,correlation.MULTI_STRESS if self.multi_stress else 1),dtype=float) #initialize result array (stress or CoM) to always hold 250 stress values per chain
                 elif calc_type == 2:
                     res = np.zeros(shape=(chain.QN.shape[0],arrayLength+1,3),dtype=float) 
         
+        #correlator sums of each chain, or ensemble sums (one set per CPU worker)
+        if self.ensemble_corr:
+            corr_parts = self.nworkers if self.backend == 'cpu' else 1
+            print("Adding correlator sums of all chains to ensemble sums.")
+            if self.correlator == 'rsvl' and not self.flow and S_corr > correlation.MAX_LEVELS:
+                sys.exit("Ensemble correlator sums support at most %d correlator levels."%(correlation.MAX_LEVELS))
+        else:
+            corr_parts = chain.QN.shape[0]
+
         if self.correlator=='rsvl':
             print("Using on the fly correlator for equilibrium calculation. Uncertainty in the correlation values will not be reported.")
             #initialize arrays for correlator
-            D_array = np.zeros(shape=(chain.QN.shape[0],S_corr,p,3),dtype=float)
-            D_shift_array = np.zeros(shape=(chain.QN.shape[0],S_corr,p,3),dtype=float)
-            C_array = np.zeros(shape=(chain.QN.shape[0],S_corr,p),dtype=float)
-            N_array = np.zeros(shape=(chain.QN.shape[0],S_corr,p),dtype=float)
-            A_array = np.zeros(shape=(chain.QN.shape[0],S_corr,3),dtype=float)
+            ncomp = correlation.MULTI_STRESS if self.multi_stress else 3 #values stored for each correlator entry
+            D_array = np.zeros(shape=(chain.QN.shape[0],S_corr,p,ncomp),dtype=float)
+            H_array = np.zeros(shape=(chain.QN.shape[0],S_corr),dtype=int) #index of the newest value in each circular buffer of D_array
+            C_array = np.zeros(shape=(corr_parts,S_corr,p),dtype=float)
+            N_array = np.zeros(shape=(corr_parts,S_corr,p),dtype=float)
+            A_array = np.zeros(shape=(chain.QN.shape[0],S_corr,ncomp),dtype=float)
             M_array = np.zeros(shape=(chain.QN.shape[0],S_corr),dtype=int)
 
             #move correlator arrays to device
-            d_D = cuda.to_device(D_array)
-            d_D_shift = cuda.to_device(D_shift_array)
-            d_C = cuda.to_device(C_array)
-            d_N = cuda.to_device(N_array)
-            d_A = cuda.to_device(A_array)
-            d_M = cuda.to_device(M_array)
+            d_D = self.to_device(D_array)
+            d_H = self.to_device(H_array)
+            d_C = self.to_device(C_array)
+            d_N = self.to_device(N_array)
+            d_A = self.to_device(A_array)
+            d_M = self.to_device(M_array)
+
+            #correlator level, index and time of each reported time lag
+            rsvl_level = []
+            rsvl_index = []
+            for corrLevel in range(0,S_corr):
+                for j in range(0 if corrLevel == 0 else int(p/m),p):
+                    if corrLevel == 0 or j*(m**corrLevel)*self.input_data['tau_K'] <= self.input_data['sim_time']:
+                        rsvl_level.append(corrLevel)
+                        rsvl_index.append(j)
+            rsvl_level = np.array(rsvl_level,dtype=int)
+            rsvl_index = np.array(rsvl_index,dtype=int)
+            rsvl_time = rsvl_index*(m**rsvl_level)*self.input_data['tau_K']
 
         #move arrays to device
-        d_QN_create_SDCD = cuda.to_device(QN_create_SDCD)
-        d_reach_flag = cuda.to_device(reach_flag) 
-        d_new_t_cr = cuda.to_device(new_t_cr)
-        d_new_tau_CD = cuda.to_device(new_tau_CD)
+        d_reach_flag = self.to_device(reach_flag) 
+        d_reach_count = self.to_device(np.zeros(shape=2,dtype=int)) #number of synced chains and loop iteration in which the last chain was synced
 
         #move arrays to device
-        d_QN = cuda.to_device(chain.QN)
-        d_NK = cuda.to_device([self.input_data['NK']])
-        d_CDflag = cuda.to_device([self.input_data['CD_flag']])
-        d_beta = cuda.to_device([self.input_data['beta']])
-        d_QN_first = cuda.to_device(QN_first)
-        d_tau_CD = cuda.to_device(chain.tau_CD)
-        d_Z = cuda.to_device(chain.Z)
-        d_found_shift = cuda.to_device(found_shift)
-        d_found_index = cuda.to_device(found_index)
-        d_shift_probs = cuda.to_device(shift_probs)
-        d_sum_W_sorted = cuda.to_device(sum_W_sorted)
-        d_add_rand = cuda.to_device(add_rand)
-        d_t_cr = cuda.to_device(t_cr)
-        d_f_t = cuda.to_device(f_t)
-        d_chain_time = cuda.to_device(chain_time)
-        d_time_compensation = cuda.to_device(time_compensation)
-        d_time_resolution = cuda.to_device([time_resolution])
-        d_write_time = cuda.to_device(write_time)
-        d_tdt = cuda.to_device(tdt)
-        d_rand_used = cuda.to_device(rand_used)
-        d_tau_CD_used_SD=cuda.to_device(tau_CD_used_SD)
-        d_tau_CD_used_CD=cuda.to_device(tau_CD_used_CD)
+        d_QN = self.to_device(chain.QN)
+        d_QN_head = self.to_device(np.zeros(shape=self.input_data['Nchains'],dtype=int)) #slot of the first strand of each chain (see chain_kernel.ring_index)
+        d_NK = self.to_device([self.input_data['NK']])
+        d_CDflag = self.to_device([self.input_data['CD_flag']])
+        d_beta = self.to_device([self.input_data['beta']])
+        d_QN_first = self.to_device(QN_first)
+        d_tau_CD = self.to_device(chain.tau_CD)
+        d_Z = self.to_device(chain.Z)
+        d_found_shift = self.to_device(found_shift)
+        d_found_index = self.to_device(found_index)
+        d_shift_probs = self.to_device(shift_probs)
+        if self.rate_tree:
+            #leaves for strands 0..NK (the most strands a chain can have + chain end row) rounded up to a power of 2
+            tree_leaves = 1 << int(self.input_data['NK']).bit_length()
+            d_rate_tree = self.to_device(np.zeros(shape=(self.input_data['Nchains'],2*tree_leaves),dtype=float))
+        else:
+            d_rate_tree = self.to_device(np.zeros(shape=(self.input_data['Nchains'],0),dtype=float))
+        #running stress tensor (tau_xx, tau_yy, tau_zz, tau_xy, tau_yz, tau_xz) and center of mass of each chain, summed at each launch
+        d_obs = self.to_device(np.zeros(shape=(self.input_data['Nchains'],9 if self.incremental_obs else 0),dtype=float))
+        d_sum_W_sorted = self.to_device(sum_W_sorted)
+        d_add_rand = self.to_device(add_rand)
+        d_t_cr = self.to_device(t_cr)
+        d_f_t = self.to_device(f_t)
+        d_chain_time = self.to_device(chain_time)
+        d_time_compensation = self.to_device(time_compensation)
+        d_time_resolution = self.to_device([time_resolution])
+
+        #ensemble stress rows of the last two steady state windows, time and sync at which steady state was reached (-1 before)
+        if self.steady_window is not None:
+            steady_points = max(int(round(self.steady_window/time_resolution)),2)
+            steady_rows = np.zeros(shape=(0,17),dtype=float)
+            steady_time = -1.0
+            steady_sync = -1
+        steady_applied = False
+        d_write_time = self.to_device(write_time)
+        d_tdt = self.to_device(tdt)
+        d_rand_used = self.to_device(rand_used)
+        d_tau_CD_used_SD=self.to_device(tau_CD_used_SD)
+        d_tau_CD_used_CD=self.to_device(tau_CD_used_CD)
         
         #set simulation time and entanglement lifetime array
         self.step_count = 0                              #used to calculate number of jump processes for checking random number arrays
-        enttime_bins = np.zeros(shape=(20000),dtype=int) #bins to hold entanglement lifetime distributions
+        
+        #entanglement lifetime histogram, bins are evenly spaced in f_t = log10(t)+10 over (0,20) by default (optional ft_bins and ft_scale inputs)
+        ft_nbins = int(self.input_data.get('ft_bins',20000))
+        if self.input_data.get('ft_scale','log') not in ['log','linear']:
+            sys.exit("ft_scale must be log or linear.")
+        ft_log = self.input_data.get('ft_scale','log') == 'log'
+        if ft_log:
+            ft_scale = ft_nbins/20.0
+        else:
+            ft_scale = ft_nbins/float(self.input_data['sim_time'])
+        enttime_bins = np.zeros(shape=(ft_nbins),dtype=int) #bins to hold entanglement lifetime distributions
+        if self.backend == 'cpu':
+            cpu_enttime_bins = np.zeros(shape=(self.nworkers,ft_nbins),dtype=int) #bins for each CPU worker, summed after the simulation
+            chain_steps = np.zeros(shape=self.input_data['Nchains'],dtype=int) #number of steps made by each chain in advance_chains
+        else:
+            d_enttime_bins = self.to_device(enttime_bins)                      #lifetime bins filled on the device, copied to host at the end
+        if self.backend == 'gpu' and self.fused:
+            d_chain_steps = self.to_device(np.zeros(shape=self.input_data['Nchains'],dtype=int)) #number of steps made by each chain in fused_step_kernel
+            d_max_steps = self.to_device(np.zeros(shape=1,dtype=int))                          #largest number of steps made by a chain
         
         #move result array, calc_type, and flow variables to device
-        d_res = cuda.to_device(res) 
-        d_calc_type = cuda.to_device([calc_type])
-        d_flow = cuda.to_device([self.flow])
-        d_flow_off = cuda.to_device([self.turn_flow_off])
+        d_res = self.to_device(res) 
+        
+        #flow accumulators (sums, sums of squares and number of samples of the flow stress tensor for each write time, one set per CPU worker)
+        flow_parts = self.nworkers if self.backend == 'cpu' else 1
+        last_write = 0 #last write time of the flow stress written to file
+        if self.flow and self.flow_accum:
+            d_flow_sums = self.to_device(np.zeros(shape=(flow_parts,2*int(round(max_sync_time/time_resolution)),17),dtype=float))
+        else:
+            d_flow_sums = self.to_device(np.zeros(shape=(flow_parts,0,17),dtype=float))
+        d_calc_type = self.to_device([calc_type])
+        d_flow = self.to_device([self.flow])
+        d_flow_off = self.to_device([self.turn_flow_off])
 
         #calculate number of time syncs based on max_sync_time for flow
         if self.turn_flow_off:
@@ -414,14 +889,46 @@ class FSM_LINEAR(object):
                             count+=1
                             corr_time.append(j*self.input_data['tau_K'])
 
-            data_corr = np.zeros(shape=(self.input_data['Nchains'],count,2),dtype=float) #hold average chain stress/com correlations 
-            corr_array = np.zeros(shape=(self.input_data['Nchains'],p*g*m),dtype=float) #array to store correlation values for averaging each chain inside kernel
+            data_corr = np.zeros(shape=(corr_parts,count,2),dtype=float) #hold average chain stress/com correlations (or their ensemble sums)
+            #array to store correlation values for averaging each chain inside kernel (one row per GPU thread or CPU worker)
+            corr_array = np.zeros(shape=(corr_parts if self.backend == 'cpu' else self.input_data['Nchains'],p*g*m),dtype=float)
             corr_index = np.ones(shape=(self.input_data['Nchains']),dtype=int)*-1
 
             #transfer to device
-            d_corr_index = cuda.to_device(corr_index)
-            d_data_corr = cuda.to_device(data_corr)
-            d_corr_array = cuda.to_device(corr_array)
+            d_corr_index = self.to_device(corr_index)
+            d_data_corr = self.to_device(data_corr)
+            d_corr_array = self.to_device(corr_array)
+        
+        #load checkpoint, the state is restored after the sync it was written in has been set up
+        if self.load_file is not None:
+            print("Resuming simulation from checkpoint %s."%(self.load_file))
+            checkpoint = fileio.load_checkpoint(self.load_file)
+            first_sync = int(checkpoint['x_sync'])
+            if self.steady_window is not None:
+                if 'steady_rows' not in checkpoint:
+                    sys.exit("Checkpoint %s was written without steady state detection."%(self.load_file))
+                steady_rows = checkpoint['steady_rows']
+                steady_time = float(checkpoint['steady_time'])
+                steady_sync = int(checkpoint['steady_sync'])
+        else:
+            checkpoint = None
+            first_sync = 0
+
+        #checkpoints are written in a background thread, SIGTERM writes a final checkpoint and stops the simulation
+        if self.save_file is not None:
+            checkpoint_file = os.path.join(self.output_dir,self.save_file)
+            signal.signal(signal.SIGTERM,self.request_stop)
+        checkpoint_thread = None
+        last_checkpoint = time.time()
+
+        #raw tau_xy (G(t)) or CoM (MSD) values of all chains are written to a binary file (see fileio.load_rawdata)
+        rawdata_file = os.path.join(self.output_dir,('stress_%d.dat' if calc_type == 1 else 'CoM_%d.dat')%self.sim_ID)
+        rawdata_thread = None
+        if self.postprocess:
+            if self.correlator == 'munch' and not self.flow and not self.turn_flow_off:
+                print("Raw results of all chains are written to %s."%(os.path.basename(rawdata_file)))
+            else:
+                print("Raw data is only saved for equilibrium calculations with the munch correlator.")
         
         #SIMULATION STARTS -------------------------------------------------------------------------------------------------------------------------------
         
@@ -432,43 +939,66 @@ class FSM_LINEAR(object):
         with alive_bar(**progress_bar) as bar:
 
             #defer memory deallocation until after simulation is done
-            with cuda.defer_cleanup():
+            with (cuda.defer_cleanup() if self.backend == 'gpu' else contextlib.nullcontext()):
                 
                 #start loop over number of times chains are synced
-                for x_sync in range(0,num_time_syncs):
+                for x_sync in range(first_sync,num_time_syncs):
+
+                    #at steady state, flow is turned off after the current sync (the time after flow is kept) or the simulation stops
+                    if self.steady_window is not None and self.steady_stop and steady_sync >= 0 and not steady_applied:
+                        if self.turn_flow_off:
+                            self.input_data['sim_time'] = steady_time + (self.input_data['sim_time'] - self.input_data['flow_time'])
+                            self.input_data['flow_time'] = steady_time
+                            num_time_syncs_flow = steady_sync+1
+                            num_time_syncs = num_time_syncs_flow + num_time_syncs_afterflow
+                        else:
+                            self.input_data['sim_time'] = steady_time
+                            num_time_syncs = steady_sync+1
+                        steady_applied = True
+                    if x_sync >= num_time_syncs:
+                        break
 
                     if x_sync == 0:
                         if self.correlator=='rsvl' or num_time_syncs==1:
                             next_sync_time = self.input_data['sim_time']
                         else:
                             if self.flow:
-                                next_sync_time = self.input_data['tau_K']
+                                next_sync_time = max_sync_time
                             else:
                                 next_sync_time = p*g*m*self.input_data['tau_K']
                     else:
                         if self.flow:
-                            next_sync_time = (x_sync+1)*self.input_data['tau_K']
+                            next_sync_time = (x_sync+1)*max_sync_time
                         else:
                             if not self.turn_flow_off:
-                                correlation.coarse_result_array[blockspergrid,threadsperblock](d_res,g,d_calc_type) #keep half of result array values for block transformation
+                                #keep half of result array values for block transformation
+                                if self.backend == 'gpu':
+                                    correlation.coarse_result_array[blockspergrid,threadsperblock](d_res,g,d_calc_type)
+                                else:
+                                    cpu_correlation.coarse_result_array(d_res,g,d_calc_type)
                                 if x_sync == (num_time_syncs-1):
                                     next_sync_time = self.input_data['sim_time'] - p*g*m**(x_sync)*self.input_data['tau_K']
                                     last_index = int(math.floor((self.input_data['sim_time'])/self.input_data['tau_K'])/(m**(num_time_syncs-1)))
                                 else:
                                     next_sync_time = (p*g*m**(x_sync+1) - p*g*m**(x_sync))*self.input_data['tau_K']
                     
+                    #with flow accumulators, the last sync in flow is at flow_time (if flow is turned off) or at sim_time
+                    if self.flow and self.flow_accum:
+                        next_sync_time = min(next_sync_time,self.input_data['flow_time'] if self.turn_flow_off else self.input_data['sim_time'])
+                    
                     #if simulating shear flow and flow time is less than total simulation time, turn off flow when flow time is reached
                     if self.flow and self.turn_flow_off:
-                        if next_sync_time>self.input_data['flow_time'] and self.flow:
+                        if (next_sync_time>self.input_data['flow_time'] or x_sync>=num_time_syncs_flow) and self.flow:
                             print('Turning off flow, equilibrium variables will now be tracked.')
                             self.flow=False
                             max_sync_time = max_sync_time_afterflow
-                            d_flow = cuda.to_device([self.flow])
+                            d_flow = self.to_device([self.flow])
                             res = np.zeros(shape=(chain.QN.shape[0],251,8),dtype=float)
-                            d_res = cuda.to_device(res)
-                            ensemble_kernel.reset_chain_time[blockspergrid, threadsperblock](d_chain_time,d_write_time,self.input_data['flow_time'])
-                            temp_Q = np.zeros(shape=(chain.QN.shape[0],chain.QN.shape[1]+1),dtype=int)
-                            d_temp_Q = cuda.to_device(temp_Q)
+                            d_res = self.to_device(res)
+                            if self.backend == 'gpu':
+                                ensemble_kernel.reset_chain_time[blockspergrid, threadsperblock](d_chain_time,d_write_time,self.input_data['flow_time'])
+                            else:
+                                cpu_kernel.reset_chain_time(d_chain_time,d_write_time,self.input_data['flow_time'])
                     
                     if not self.flow and self.turn_flow_off:
                         if (x_sync+1)==num_time_syncs:
@@ -479,90 +1009,264 @@ class FSM_LINEAR(object):
                     #initialize flags for chain sync (if chain times reach the sync time, flag goes up)
                     reach_flag_all = False
                     sum_reach_flags = 0
-                    ensemble_kernel.reset_chain_flag[blockspergrid,threadsperblock](d_reach_flag)
+                    if self.backend == 'gpu':
+                        ensemble_kernel.reset_chain_flag[blockspergrid,threadsperblock](d_reach_flag,d_reach_count)
+                    else:
+                        cpu_kernel.reset_chain_flag(d_reach_flag,d_reach_count)
+                    
+                    #loop iterations since the sync, the unfused GPU loop in flow only polls the number of synced chains at iteration next_poll
+                    sync_step = 0
+                    next_poll = 1
+                    last_poll = 0
+
+                    #simulation state saved in checkpoints (lifetime bins and flow accumulators are split between CPU workers)
+                    state = {'QN': d_QN, 'QN_head': d_QN_head, 'Z': d_Z, 'QN_first': d_QN_first, 'tau_CD': d_tau_CD, 't_cr': d_t_cr, 'f_t': d_f_t, 'chain_time': d_chain_time,
+                             'time_compensation': d_time_compensation, 'tdt': d_tdt, 'write_time': d_write_time, 'reach_flag': d_reach_flag,
+                             'reach_count': d_reach_count, 'new_Q': d_new_Q, 'res': d_res, 'uniform_rand': d_uniform_rand, 'rand_used': d_rand_used,
+                             'tau_CD_used_SD': d_tau_CD_used_SD, 'tau_CD_used_CD': d_tau_CD_used_CD, 'tau_CD_gauss_rand_SD': d_tau_CD_gauss_rand_SD,
+                             'tau_CD_gauss_rand_CD': d_tau_CD_gauss_rand_CD, 'rng_step': d_rng_step, 'flow_sums': d_flow_sums,
+                             'enttime_bins': cpu_enttime_bins if self.backend == 'cpu' else d_enttime_bins}
+                    part_shape = {'flow_sums': d_flow_sums.shape[1:], 'enttime_bins': (ft_nbins,)}
+                    if self.rng_type == 'xoroshiro':
+                        state['rng_states'] = self.rng_states
+                    if self.correlator == 'rsvl':
+                        state.update({'D': d_D, 'H': d_H, 'C': d_C, 'N': d_N, 'A': d_A, 'M': d_M})
+                    elif not self.flow and not self.turn_flow_off:
+                        state.update({'data_corr': d_data_corr, 'corr_index': d_corr_index})
+                    if self.ensemble_corr: #ensemble correlator sums can be folded like the flow accumulators
+                        part_shape.update({'C': (S_corr,p), 'N': (S_corr,p)} if self.correlator == 'rsvl' else {'data_corr': (count,2)})
+
+                    #restore the state from the checkpoint
+                    if checkpoint is not None:
+                        for name in state:
+                            if name not in checkpoint:
+                                sys.exit("Checkpoint %s has no %s array, it was written with different simulation settings."%(self.load_file,name))
+                            if name in part_shape:
+                                if checkpoint[name].shape[-len(part_shape[name]):] != part_shape[name]:
+                                    sys.exit("Checkpoint %s does not match the simulation (%s array)."%(self.load_file,name))
+                                if checkpoint[name].shape == state[name].shape:
+                                    self.copy_to_array(state[name],checkpoint[name])
+                                elif state[name].size > 0:
+                                    #fold the parts into the first part if the number of CPU workers (or the backend) changed
+                                    restored = np.zeros(shape=(state[name].size//int(np.prod(part_shape[name])),)+part_shape[name],dtype=checkpoint[name].dtype)
+                                    restored[0] = np.sum(checkpoint[name].reshape((-1,)+part_shape[name]),axis=0)
+                                    self.copy_to_array(state[name],restored.reshape(state[name].shape))
+                            elif checkpoint[name].shape != state[name].shape:
+                                sys.exit("Checkpoint %s does not match the simulation (%s array)."%(self.load_file,name))
+                            else:
+                                self.copy_to_array(state[name],checkpoint[name])
+
+                        self.step_count = int(checkpoint['step_count'])
+                        sync_step = int(checkpoint['sync_step'])
+                        next_poll = int(checkpoint['next_poll'])
+                        last_poll = int(checkpoint['last_poll'])
+                        sum_reach_flags = int(checkpoint['sum_reach_flags'])
+                        last_write = int(checkpoint['last_write'])
+                        fileio.old_sync_time = float(checkpoint['old_sync_time'])
+
+                        #remove stress written after the checkpoint
+                        stress_file = os.path.join(self.output_dir,'stress_%d.txt'%self.sim_ID)
+                        if (self.flow or self.turn_flow_off) and os.path.isfile(stress_file):
+                            with open(stress_file,'r+') as f:
+                                f.truncate(int(checkpoint['stress_size']))
+                        if self.postprocess and os.path.isfile(rawdata_file):
+                            with open(rawdata_file,'r+') as f:
+                                f.truncate(int(checkpoint['rawdata_size']))
+                        checkpoint = None
                     
                     while not reach_flag_all:
+
+                        #write a checkpoint right after the random number arrays were refilled (every checkpoint_interval minutes, or after SIGTERM)
+                        if self.save_file is not None and self.step_count == 0 and (self.stop_requested or converged or
+                           (self.checkpoint_interval > 0 and time.time()-last_checkpoint >= 60*self.checkpoint_interval)):
+                            if checkpoint_thread is not None:
+                                checkpoint_thread.join()
+                            if rawdata_thread is not None:
+                                rawdata_thread.join()
+                            arrays = {name: self.to_host(d_array) for name, d_array in state.items()}
+                            stress_file = os.path.join(self.output_dir,'stress_%d.txt'%self.sim_ID)
+                            arrays.update({'x_sync': x_sync, 'step_count': self.step_count, 'sync_step': sync_step, 'next_poll': next_poll, 'last_poll': last_poll,
+                                           'sum_reach_flags': sum_reach_flags, 'last_write': last_write, 'old_sync_time': getattr(fileio,'old_sync_time',0.0),
+                                           'stress_size': os.path.getsize(stress_file) if os.path.isfile(stress_file) else 0,
+                                           'rawdata_size': os.path.getsize(rawdata_file) if os.path.isfile(rawdata_file) else 0})
+                            if self.steady_window is not None:
+                                arrays.update({'steady_rows': steady_rows, 'steady_time': steady_time, 'steady_sync': steady_sync})
+                            checkpoint_thread = threading.Thread(target=fileio.save_checkpoint,args=(checkpoint_file,arrays))
+                            checkpoint_thread.start()
+                            last_checkpoint = time.time()
+                            if self.stop_requested:
+                                checkpoint_thread.join()
+                                sys.exit("Checkpoint written to %s, resume the simulation with -l %s."%(checkpoint_file,checkpoint_file))
+                            if converged:
+                                print("")
+                                print("Checkpoint written to %s, the simulation can be continued with -l %s."%(checkpoint_file,checkpoint_file))
+
+                        #stop once the correlations converged (right after the random number arrays were refilled, so the checkpoint can be resumed)
+                        if converged and self.step_count == 0:
+                            break
                         
-                        #calculate probabilities for entangled strand of a chain (create, destroy, or shuffle)
-                        ensemble_kernel.calc_strand_prob[dimGrid, dimBlock](d_Z,d_QN,d_flow,d_tdt,d_kappa,d_tau_CD,d_shift_probs,
-                                                                              d_CDflag,d_CD_create_prefact,d_beta,d_NK)
+                        if self.backend == 'gpu' and not self.fused:
 
-                        ensemble_kernel.calc_chainends_prob[blockspergrid, threadsperblock](d_Z, d_QN, d_shift_probs, d_CDflag, d_CD_create_prefact, d_beta, d_NK)
+                            #calculate probabilities for entangled strand of a chain (create, destroy, or shuffle)
+                            ensemble_kernel.calc_strand_prob[dimGrid, dimBlock](d_Z,d_QN,d_QN_head,d_flow,d_tdt,d_kappa,d_tau_CD,d_shift_probs,
+                                                                                  d_CDflag,d_CD_create_prefact,d_beta,d_NK)
 
+                            ensemble_kernel.calc_chainends_prob[blockspergrid, threadsperblock](d_Z, d_QN, d_QN_head, d_shift_probs, d_CDflag, d_CD_create_prefact, d_beta, d_NK)
 
 
-                        #control chain time and stress calculation
-                        if self.correlator =='munch' and not self.flow and not self.turn_flow_off:
-                            ensemble_kernel.time_control_munch_kernel[blockspergrid,threadsperblock](d_Z,d_QN,d_QN_first,d_NK,d_chain_time,
-                                                                    d_tdt,d_res,d_calc_type,d_reach_flag,next_sync_time,
-                                                                    d_write_time,d_time_resolution,x_sync,p,g,m)
 
-                        else:
-                            ensemble_kernel.time_control_kernel[blockspergrid, threadsperblock](d_Z,d_QN,d_new_Q,d_QN_first,d_NK,d_chain_time,
-                                                                                            d_tdt,d_res,d_calc_type,d_flow,d_flow_off,d_reach_flag,next_sync_time,
-                                                                                            max_sync_time,d_write_time,d_time_resolution,self.step_count%250)
+                            #control chain time and stress calculation
+                            if self.correlator =='munch' and not self.flow and not self.turn_flow_off:
+                                ensemble_kernel.time_control_munch_kernel[blockspergrid,threadsperblock](d_Z,d_QN,d_QN_head,d_QN_first,d_NK,d_chain_time,
+                                                                        d_tdt,d_res,d_calc_type,d_reach_flag,d_reach_count,next_sync_time,
+                                                                        d_write_time,d_time_resolution,x_sync,p,g,m,sync_step)
+
+                            else:
+                                ensemble_kernel.time_control_kernel[blockspergrid, threadsperblock](d_Z,d_QN,d_QN_head,d_new_Q,d_QN_first,d_NK,d_chain_time,
+                                                                                                d_tdt,d_res,d_flow_sums,d_calc_type,d_flow,d_flow_off,d_reach_flag,d_reach_count,next_sync_time,
+                                                                                                max_sync_time,d_write_time,d_time_resolution,self.step_count%250,sync_step)
                         
-                        #find jump type and location
-                        ensemble_kernel.choose_step_kernel[blockspergrid, threadsperblock](d_Z, d_shift_probs, d_sum_W_sorted, d_uniform_rand, d_rand_used, 
-                                                                                            d_found_index, d_found_shift,d_add_rand, d_CDflag)
+                            #find jump type and location
+                            ensemble_kernel.choose_step_kernel[blockspergrid, threadsperblock](d_Z, d_shift_probs, d_sum_W_sorted, d_uniform_rand, d_rand_used, 
+                                                                                                d_found_index, d_found_shift,d_add_rand, d_CDflag)
                         
-                        # ensemble_kernel.choose_kernel[blockspergrid, threadsperblock](d_Z, d_shift_probs, d_sum_W_sorted, d_uniform_rand, d_rand_used, 
-                        #                                                                     d_found_index, d_found_shift,d_add_rand, d_CDflag, d_NK)
+                            # ensemble_kernel.choose_kernel[blockspergrid, threadsperblock](d_Z, d_shift_probs, d_sum_W_sorted, d_uniform_rand, d_rand_used, 
+                            #                                                                     d_found_index, d_found_shift,d_add_rand, d_CDflag, d_NK)
 
-                        #if flow is turned off, track fraction of new entanglements
-                        if not self.flow and self.turn_flow_off:
-                            ensemble_kernel.track_newQ[blockspergrid,threadsperblock](d_Z,d_new_Q,d_temp_Q,d_found_shift,d_found_index,d_reach_flag)
+                            #if flow is turned off, track fraction of new entanglements
+                            if not self.flow and self.turn_flow_off:
+                                ensemble_kernel.track_newQ[blockspergrid,threadsperblock](d_Z,d_new_Q,d_QN_head,d_found_shift,d_found_index,d_reach_flag)
 
                             
-                        #apply jump move for each chain and update time of chain
-                        ensemble_kernel.apply_step_kernel[blockspergrid,threadsperblock](d_Z, d_QN, d_QN_first, d_QN_create_SDCD,
-                                                                                            d_chain_time,d_time_compensation,d_sum_W_sorted,
-                                                                                            d_found_shift,d_found_index,d_reach_flag, d_tdt,
-                                                                                            d_t_cr, d_new_t_cr, d_f_t, d_tau_CD, d_new_tau_CD,
-                                                                                            d_rand_used, d_add_rand, d_tau_CD_used_SD,
-                                                                                            d_tau_CD_used_CD,d_tau_CD_gauss_rand_SD,
-                                                                                            d_tau_CD_gauss_rand_CD)
+                            #apply jump move for each chain and update time of chain
+                            ensemble_kernel.apply_step_kernel[blockspergrid,threadsperblock](d_Z, d_QN, d_QN_head, d_QN_first,
+                                                                                                d_chain_time,d_time_compensation,d_sum_W_sorted,
+                                                                                                d_found_shift,d_found_index,d_reach_flag, d_tdt,
+                                                                                                d_t_cr, d_f_t, d_tau_CD,
+                                                                                                d_rand_used, d_add_rand, d_tau_CD_used_SD,
+                                                                                                d_tau_CD_used_CD,d_tau_CD_gauss_rand_SD,
+                                                                                                d_tau_CD_gauss_rand_CD)
                         
-                        #update step counter for arrays and array positions
-                        self.step_count+=1
-                    
-                        #record entanglement lifetime distribution
-                        if analytic==False:
-                            ft = d_f_t.copy_to_host()
-                            for k in range(0,self.input_data['Nchains']):
-                                if ft[k] > 0.0 and ft[k] < 20:
-                                    enttime_bins[math.floor(ft[k]*1000)]+=1
+                            #record entanglement lifetime distribution (in flow, not for iterations after all chains were synced)
+                            if analytic==False:
+                                ensemble_kernel.bin_ft_kernel[blockspergrid,threadsperblock](d_f_t, ft_log, ft_scale, d_enttime_bins, d_reach_count,
+                                                                                            sync_step if (self.flow or self.turn_flow_off) else -1)
+                        
+                            #update step counter for arrays and array positions
+                            self.step_count+=1
+                            sync_step+=1
+                            
+                            #in flow, poll the number of synced chains at iteration next_poll and always before the random numbers are refilled
+                            if (self.flow or self.turn_flow_off) and (sync_step >= next_poll or self.step_count % 250 == 0):
+                                reach_count_host = self.to_host(d_reach_count)
+                                new_reach_flags = int(reach_count_host[0])
+                                if new_reach_flags == int(self.input_data['Nchains']):
+                                    #iterations made after the last chain was synced did not change any chain, remove them from the step count
+                                    #so the random numbers are refilled after the same steps as with a poll at every iteration
+                                    self.step_count -= sync_step - 1 - int(reach_count_host[1])
+                                else:
+                                    #predict the iterations left until all chains are synced from the chains synced since the last poll,
+                                    #extra iterations are cheap (synced chains are frozen and are not binned) but each poll waits for the device
+                                    if new_reach_flags > sum_reach_flags:
+                                        poll_interval = int(0.5*(int(self.input_data['Nchains'])-new_reach_flags)*(sync_step-last_poll)/(new_reach_flags-sum_reach_flags))
+                                    else:
+                                        poll_interval = 2*(sync_step-last_poll)
+                                    next_poll = sync_step + min(max(poll_interval,1),32)
+                                    last_poll = sync_step
+                                sum_reach_flags = new_reach_flags
+
+                        elif self.backend == 'gpu':
+                            #advance all chains in a single launch until the random number arrays are used up (or all chains reach the sync time)
+                            use_munch = self.correlator =='munch' and not self.flow and not self.turn_flow_off
+                            d_max_steps.copy_to_device(np.zeros(shape=1,dtype=int))
+                            ensemble_kernel.fused_step_kernel[blockspergrid,threadsperblock](250-self.step_count, d_Z, d_QN, d_QN_head, d_QN_first, d_NK, d_flow, d_flow_off, d_kappa,
+                                                                                            d_tau_CD, d_shift_probs, d_rate_tree, d_obs, d_CDflag, d_CD_create_prefact, d_beta, d_sum_W_sorted, d_uniform_rand,
+                                                                                            d_rand_used, d_found_index, d_found_shift, d_add_rand, d_new_Q, d_chain_time, d_time_compensation,
+                                                                                            d_tdt, d_t_cr, d_f_t, d_tau_CD_used_SD, d_tau_CD_used_CD, d_tau_CD_gauss_rand_SD,
+                                                                                            d_tau_CD_gauss_rand_CD, d_rng_step, self.seed, self.chain_offset, discrete, d_pcd_array, d_pcd_table_eq, d_pcd_table_cr, d_pcd_table_tau,
+                                                                                            d_res, d_flow_sums, d_calc_type, d_reach_flag, d_reach_count, float(next_sync_time),
+                                                                                            float(max_sync_time), d_write_time, d_time_resolution, use_munch, x_sync, p,
+                                                                                            g if use_munch else 0, m, self.step_count%250, not analytic, ft_log, ft_scale, d_enttime_bins, 
+                                                                                            d_chain_steps, d_max_steps)
+                            
+                            #number of steps made by the unfused loop (in flow, the loop stops as soon as all chains reach the sync time)
+                            if self.flow or self.turn_flow_off:
+                                n_iter = int(self.to_host(d_max_steps)[0])
+                            else:
+                                n_iter = 250-self.step_count
+                            
+                            if analytic==False:
+                                ensemble_kernel.bin_remaining_ft[blockspergrid,threadsperblock](n_iter, d_f_t, d_chain_steps, ft_log, ft_scale, d_enttime_bins)
+                            
+                            self.step_count += n_iter
+
+                        else:
+                            #advance all chains on the host until the random number arrays are used up (or all chains reach the sync time)
+                            use_munch = self.correlator =='munch' and not self.flow and not self.turn_flow_off
+                            self.step_count += cpu_kernel.advance_chains(self.nworkers, 250-self.step_count, d_Z, d_QN, d_QN_head, d_QN_first, d_NK, d_flow, d_flow_off, d_kappa,
+                                                                         d_tau_CD, d_shift_probs, d_rate_tree, d_obs, d_CDflag, d_CD_create_prefact, d_beta, d_sum_W_sorted, d_uniform_rand,
+                                                                         d_rand_used, d_found_index, d_found_shift, d_add_rand, d_new_Q, d_chain_time, d_time_compensation,
+                                                                         d_tdt, d_t_cr, d_f_t, d_tau_CD_used_SD, d_tau_CD_used_CD, d_tau_CD_gauss_rand_SD,
+                                                                         d_tau_CD_gauss_rand_CD, d_rng_step, self.seed, self.chain_offset, discrete, d_pcd_array, d_pcd_table_eq, d_pcd_table_cr, d_pcd_table_tau,
+                                                                         d_res, d_flow_sums, d_calc_type, d_reach_flag, d_reach_count, float(next_sync_time),
+                                                                         float(max_sync_time), d_write_time, d_time_resolution, use_munch, x_sync, p,
+                                                                         g if use_munch else 0, m, self.step_count%250, not analytic, ft_log, ft_scale, cpu_enttime_bins, chain_steps)
+
+                        #in flow, the random numbers are also refilled once all chains reached the sync time, so the numbers drawn by a chain do not
+                        #depend on how many steps the other chains made (chain batches and shards draw the numbers of a run of all chains)
+                        if (self.flow or self.turn_flow_off) and (self.backend == 'cpu' or self.fused):
+                            sum_reach_flags = int(self.to_host(d_reach_count)[0])
+                        flow_synced = (self.flow or self.turn_flow_off) and (sum_reach_flags == int(self.input_data['Nchains']))
 
-                       
                         #if random numbers are used (max array size is 250), change out the used values with new random numbers and advance the random seed number
-                        if self.step_count % 250 == 0:
-                            gpu_rand.refill_gauss_rand_tauCD[blockspergrid,threadsperblock](self.rng_states, discrete, self.input_data['Nchains'], d_tau_CD_used_SD, True, self.input_data['CD_flag'], 
-                                                                                            d_tau_CD_gauss_rand_SD, d_pcd_array,d_pcd_table_eq,d_pcd_table_cr, d_pcd_table_tau)
-                            if self.input_data['CD_flag'] == 1:
-                                gpu_rand.refill_gauss_rand_tauCD[blockspergrid,threadsperblock](self.rng_states, discrete, self.input_data['Nchains'], d_tau_CD_used_CD, False, self.input_data['CD_flag'], 
-                                                                                            d_tau_CD_gauss_rand_CD, d_pcd_array,d_pcd_table_eq,d_pcd_table_cr, d_pcd_table_tau)
-                           
-                            gpu_rand.refill_uniform_rand[blockspergrid,threadsperblock](self.rng_states, self.input_data['Nchains'], d_rand_used, d_uniform_rand)
-                        
+                        if self.step_count % 250 == 0 or flow_synced:
+                            #(counter-based random numbers are drawn inside the step functions and are not refilled)
+                            if self.rng_type == 'xoroshiro' and self.backend == 'gpu':
+                                gpu_rand.refill_gauss_rand_tauCD[blockspergrid,threadsperblock](self.rng_states, discrete, self.input_data['Nchains'], d_tau_CD_used_SD, True, self.input_data['CD_flag'], 
+                                                                                                d_tau_CD_gauss_rand_SD, d_pcd_array,d_pcd_table_eq,d_pcd_table_cr, d_pcd_table_tau)
+                                if self.input_data['CD_flag'] == 1:
+                                    gpu_rand.refill_gauss_rand_tauCD[blockspergrid,threadsperblock](self.rng_states, discrete, self.input_data['Nchains'], d_tau_CD_used_CD, False, self.input_data['CD_flag'], 
+                                                                                                d_tau_CD_gauss_rand_CD, d_pcd_array,d_pcd_table_eq,d_pcd_table_cr, d_pcd_table_tau)
+                               
+                                gpu_rand.refill_uniform_rand[blockspergrid,threadsperblock](self.rng_states, self.input_data['Nchains'], d_rand_used, d_uniform_rand)
+                            elif self.rng_type == 'xoroshiro':
+                                cpu_rand.refill_gauss_rand_tauCD(self.rng_states, discrete, self.input_data['Nchains'], d_tau_CD_used_SD, True, self.input_data['CD_flag'], 
+                                                                 d_tau_CD_gauss_rand_SD, d_pcd_array,d_pcd_table_eq,d_pcd_table_cr, d_pcd_table_tau)
+                                if self.input_data['CD_flag'] == 1:
+                                    cpu_rand.refill_gauss_rand_tauCD(self.rng_states, discrete, self.input_data['Nchains'], d_tau_CD_used_CD, False, self.input_data['CD_flag'], 
+                                                                     d_tau_CD_gauss_rand_CD, d_pcd_array,d_pcd_table_eq,d_pcd_table_cr, d_pcd_table_tau)
+                               
+                                cpu_rand.refill_uniform_rand(self.rng_states, self.input_data['Nchains'], d_rand_used, d_uniform_rand)
+                            
                             if (self.correlator=='rsvl') and (not self.flow) and (not self.turn_flow_off):
-                                correlation.update_correlator[blockspergrid,threadsperblock](250,d_res,d_D,d_D_shift,d_C,d_N,d_A,d_M,d_calc_type)
+                                if self.backend == 'gpu' and self.ensemble_corr:
+                                    correlation.update_correlator_ensemble[blockspergrid,threadsperblock](250,d_res,d_D,d_H,d_C,d_N,d_A,d_M,d_calc_type)
+                                elif self.backend == 'gpu':
+                                    correlation.update_correlator[blockspergrid,threadsperblock](250,d_res,d_D,d_H,d_C,d_N,d_A,d_M,d_calc_type)
+                                else:
+                                    cpu_correlation.update_correlator(250,d_res,d_D,d_H,d_C,d_N,d_A,d_M,d_calc_type)
+
+                                if self.conv_error is not None:
+                                    #standard error over chains of the average correlation of each chain, for the time lags reached by every chain
+                                    lags = rsvl_time <= np.min(self.to_host(d_chain_time))
+                                    C_host = self.to_host(d_C)[:,rsvl_level[lags],rsvl_index[lags]]
+                                    N_host = self.to_host(d_N)[:,rsvl_level[lags],rsvl_index[lags]]
+                                    with np.errstate(divide='ignore',invalid='ignore'):
+                                        chain_aver = C_host/N_host
+                                    converged = self.corr_converged(rsvl_time[lags],np.mean(chain_aver,axis=0),np.std(chain_aver,axis=0)/np.sqrt(self.input_data['Nchains']))
                             
                             self.step_count = 0
                         
-                        #check if chains have reached sim_time or time_sync
-                        if self.flow or self.turn_flow_off:
-                            reach_flag_host = d_reach_flag.copy_to_host()
-                            sum_reach_flags = int(np.sum(reach_flag_host)) 
-                        elif (not self.flow) and (not self.turn_flow_off) and (self.step_count==0):
-                            reach_flag_host = d_reach_flag.copy_to_host()
-                            sum_reach_flags = int(np.sum(reach_flag_host))
+                        #check if chains have reached sim_time or time_sync (only the device counter of synced chains is copied to the host, in flow before the refill)
+                        if (not self.flow) and (not self.turn_flow_off) and (self.step_count==0):
+                            sum_reach_flags = int(self.to_host(d_reach_count)[0])
 
                         #if all reach_flags are 1, sum should equal number of chains and all chains are synced
                         reach_flag_all = (sum_reach_flags == int(self.input_data['Nchains'])) 
                        
                         #update progress bar based on chain times
                         if (self.step_count==0):
-                            check_time = d_chain_time.copy_to_host()
+                            check_time = self.to_host(d_chain_time)
                             sum_time = 0
                             if self.correlator == 'rsvl' or self.flow or self.turn_flow_off:
                                 if self.turn_flow_off and not self.flow:
@@ -571,6 +1275,7 @@ class FSM_LINEAR(object):
                                     sum_time = int(np.sum(np.floor(check_time)))
                                 total_progress = round(sum_time/self.input_data['Nchains']/self.input_data['sim_time'],2)
                             else:
+                                reach_flag_host = self.to_host(d_reach_flag)
                                 reach_flag1 = np.argwhere(reach_flag_host==1)
                                 reach_flag0 = np.argwhere(reach_flag_host==0)
                                 if x_sync == 0:
@@ -584,44 +1289,113 @@ class FSM_LINEAR(object):
                                 total_progress = round(sum_time/self.input_data['Nchains']/(self.input_data['sim_time']),2)
                             bar(total_progress)
 
+                    if converged and not reach_flag_all: #stopped before the chains were synced
+                        print("Every time lag up to %g has a relative error below %g, stopping the simulation."%(self.conv_time,self.conv_error))
+                        break
                 
-                    if self.flow or self.turn_flow_off: #if flow, calculate flow stress tensor for each chain
-                        if self.flow:
-                            ensemble_kernel.calc_flow_stress[blockspergrid,threadsperblock](d_Z,d_QN,d_res)
-                        res_host = d_res.copy_to_host()
-                        fileio.write_stress(self.input_data,self.flow,self.turn_flow_off,x_sync+1,next_sync_time,res_host,self.output_dir,self.sim_ID)
+                    if self.flow and self.flow_accum: #write the ensemble flow stress of each write time up to the sync time
+                        flow_sums_host = self.to_host(d_flow_sums)
+                        writes = np.arange(last_write+1,int(math.floor(next_sync_time/time_resolution+1e-9))+1)
+                        rows = writes % flow_sums_host.shape[1]
+                        stress_rows = fileio.write_flow_stress(self.input_data,x_sync+1,next_sync_time,writes*time_resolution,np.sum(flow_sums_host[:,rows,:],axis=0),
+                                                               self.output_dir,self.sim_ID)
+                        #clear the rows for reuse (chains that passed the sync time may have added samples to the following rows)
+                        flow_sums_host[:,rows,:] = 0.0
+                        d_flow_sums = self.to_device(flow_sums_host)
+                        if len(writes) > 0:
+                            last_write = writes[-1]
                     
-                    # if self.postprocess and not self.flow:
-                    #     #write result of all chains to file if postprocess correlator is used
-                    #     res_host = d_res.copy_to_host()
-                    #     if calc_type == 1: #if G(t), write tau_xy
-                    #         print(self.flow,self.turn_flow_off)
-                    #         fileio.write_stress(self.input_data,self.flow,self.turn_flow_off,x_sync+1,next_sync_time,res_host,self.output_dir,self.sim_ID)
-                    #     elif calc_type == 2: #if MSD, write CoM 
-                    #         fileio.write_com(self.input_data,x_sync+1,next_sync_time,res_host,self.output_dir,self.sim_ID)
+                    elif self.flow or self.turn_flow_off: #if flow, calculate flow stress tensor for each chain
+                        if self.flow:
+                            if self.backend == 'gpu':
+                                ensemble_kernel.calc_flow_stress[blockspergrid,threadsperblock](d_Z,d_QN,d_QN_head,d_res)
+                            else:
+                                cpu_kernel.calc_flow_stress(d_Z,d_QN,d_QN_head,d_res)
+                        res_host = self.to_host(d_res)
+                        stress_rows = fileio.write_stress(self.input_data,self.flow,self.turn_flow_off,x_sync+1,next_sync_time,res_host,self.output_dir,self.sim_ID)
 
                     #if not using OTF correlator, update correlations
                     elif self.correlator=='munch':
+                        if self.postprocess:
+                            #write the new tau_xy or CoM values of all chains in the background (row j of the result array is the value at time j*m**x_sync*tau_K,
+                            #the rows before p*g were written in earlier syncs)
+                            raw_rows = np.arange(d_res.shape[1])[(0 if x_sync == 0 else p*g):last_index]
+                            raw_data = self.to_host(d_res)[:,raw_rows,:]
+                            if rawdata_thread is not None:
+                                rawdata_thread.join()
+                            rawdata_thread = threading.Thread(target=fileio.write_rawdata,args=(rawdata_file,x_sync+1,int(raw_rows[0]) if len(raw_rows) > 0 else 0,
+                                                                                              raw_data,calc_type,time_resolution))
+                            rawdata_thread.start()
+
                         #run the block transformation and calculate correlation with error
-                        correlation.calc_corr[blockspergrid,threadsperblock](d_res,d_calc_type,num_time_syncs,x_sync,d_data_corr,d_corr_array,d_corr_index,last_index, d_time_resolution, self.input_data['sim_time'])
+                        if self.fft_corr:
+                            self.calc_fft_corr(d_res,calc_type,num_time_syncs,x_sync,d_data_corr,d_corr_index,last_index,time_resolution)
+                        elif self.backend == 'gpu' and self.ensemble_corr:
+                            correlation.calc_corr_ensemble[blockspergrid,threadsperblock](d_res,d_calc_type,num_time_syncs,x_sync,d_data_corr,d_corr_array,d_corr_index,last_index, d_time_resolution, self.input_data['sim_time'])
+                        elif self.backend == 'gpu':
+                            correlation.calc_corr[blockspergrid,threadsperblock](d_res,d_calc_type,num_time_syncs,x_sync,d_data_corr,d_corr_array,d_corr_index,last_index, d_time_resolution, self.input_data['sim_time'])
+                        else:
+                            cpu_correlation.calc_corr(d_res,d_calc_type,num_time_syncs,x_sync,d_data_corr,d_corr_array,d_corr_index,last_index, d_time_resolution, self.input_data['sim_time'])
+
+                        #check the time lags calculated so far (the simulation stops in the next sync)
+                        if self.conv_error is not None and x_sync+1 < num_time_syncs:
+                            calculated = int(self.to_host(d_corr_index)[0])+1
+                            corr_aver, corr_error = self.munch_average(self.to_host(d_data_corr)[:,0:calculated,:])
+                            converged = self.corr_converged(corr_time[0:calculated],corr_aver,corr_error)
+
+                    #drift test of the ensemble stress tensor and Z written in flow
+                    if self.steady_window is not None and self.flow and steady_sync < 0:
+                        steady_rows = np.vstack((steady_rows,stress_rows))[-2*steady_points:]
+                        if steady_state.is_steady(steady_rows,steady_points,self.steady_tol):
+                            steady_time = next_sync_time
+                            steady_sync = x_sync
+                            print("")
+                            print("Steady state reached at t = %g (tau_xy = %.4f +/- %.4f, Z = %.4f +/- %.4f over the last window)."%(steady_time,
+                                  np.mean(steady_rows[-steady_points:,4]),np.mean(steady_rows[-steady_points:,12]),
+                                  np.mean(steady_rows[-steady_points:,7]),np.mean(steady_rows[-steady_points:,15])))
         
-        if self.correlator=='munch' and not self.flow and not self.turn_flow_off:
+        if self.correlator=='munch' and not self.flow and not self.turn_flow_off and not converged:
             #finish last few correlations
             for i in range(num_time_syncs,S_corr):
-                correlation.calc_corr[blockspergrid,threadsperblock](d_res,d_calc_type,num_time_syncs,i,d_data_corr,d_corr_array,d_corr_index,last_index,d_time_resolution, self.input_data['sim_time'])
+                if self.fft_corr:
+                    self.calc_fft_corr(d_res,calc_type,num_time_syncs,i,d_data_corr,d_corr_index,last_index,time_resolution)
+                elif self.backend == 'gpu' and self.ensemble_corr:
+                    correlation.calc_corr_ensemble[blockspergrid,threadsperblock](d_res,d_calc_type,num_time_syncs,i,d_data_corr,d_corr_array,d_corr_index,last_index,d_time_resolution, self.input_data['sim_time'])
+                elif self.backend == 'gpu':
+                    correlation.calc_corr[blockspergrid,threadsperblock](d_res,d_calc_type,num_time_syncs,i,d_data_corr,d_corr_array,d_corr_index,last_index,d_time_resolution, self.input_data['sim_time'])
+                else:
+                    cpu_correlation.calc_corr(d_res,d_calc_type,num_time_syncs,i,d_data_corr,d_corr_array,d_corr_index,last_index,d_time_resolution, self.input_data['sim_time'])
 
         #SIMULATION ENDS---------------------------------------------------------------------------------------------------------------------------
 
+        if checkpoint_thread is not None:
+            checkpoint_thread.join()
+        if rawdata_thread is not None:
+            rawdata_thread.join()
+
         t1 = time.time()
         print('')
         print("Total simulation time: %.2f minutes."%((t1-t0)/60.0))
         
-        #copy final chain conformations and entanglement numbers from device to host
-        QN_final = d_QN.copy_to_host()
-        Z_final = d_Z.copy_to_host()
+        #copy final chain conformations and entanglement numbers from device to host (strands in chain order)
+        QN_head_final = self.to_host(d_QN_head)
+        QN_final = chain_order(self.to_host(d_QN),QN_head_final)
+        Z_final = self.to_host(d_Z)
         
+        #add the equilibrated chains to the warm start store (chains drawn from a store are not added again)
+        if self.warm_save is not None and not self.flow and not self.turn_flow_off and warm_ensembles is None:
+            #the munch correlator restarts the chain time at each sync, so creation times are only kept with rsvl (0 marks an unknown creation time)
+            t_cr_final = chain_order(self.to_host(d_t_cr),QN_head_final) if self.correlator == 'rsvl' else np.zeros(shape=QN_final.shape[0:2],dtype=float)
+            tau_CD_final = chain_order(self.to_host(d_tau_CD),QN_head_final)
+            filename = warm_start.save_ensemble(self.warm_save,warm_key,QN_final,Z_final,tau_CD_final,t_cr_final,self.to_host(d_chain_time))
+            print("Final conformations added to the warm start store (%s)."%(filename))
+
         #calculate entanglement lifetime distribution
         if analytic == False:
+            if self.backend == 'cpu':
+                enttime_bins += np.sum(cpu_enttime_bins,axis=0)
+            else:
+                enttime_bins += self.to_host(d_enttime_bins)
             enttime_run_sum = 0
             filename = os.path.join(self.output_dir,'./f_dt_%d.txt'%self.sim_ID)
             with open(filename, 'w') as f:
@@ -639,34 +1413,35 @@ class FSM_LINEAR(object):
         if not self.flow and not self.turn_flow_off:
             if self.correlator == 'rsvl':
                 #get OTF correlator results
-                C_array = d_C.copy_to_host()
-                N_array = d_N.copy_to_host()
-
-                corr_time = []
-                corr_aver = []
-                
-                for corrLevel in range(0,S_corr):
-                    if corrLevel == 0:
-                        for j in range(0,p):
-                            corr_time.append(j*(m**corrLevel)*self.input_data['tau_K'])
-                            corr_aver.append(np.sum(C_array[:,corrLevel,j]/N_array[:,corrLevel,j])/self.input_data['Nchains'])
-                    else:
-                        for j in range(int(p/m),p):
-                            if j*(m**corrLevel)*self.input_data['tau_K'] <= self.input_data['sim_time']:
-                                corr_time.append(j*(m**corrLevel)*self.input_data['tau_K'])
-                                corr_aver.append(np.sum(C_array[:,corrLevel,j]/N_array[:,corrLevel,j])/self.input_data['Nchains'])
+                C_array = self.to_host(d_C)
+                N_array = self.to_host(d_N)
+
+                lags = range(0,len(rsvl_time))
+                if converged: #the simulation stopped early, only report time lags reached by every chain
+                    lags = [k for k in lags if rsvl_time[k] <= np.min(self.to_host(d_chain_time))]
+                corr_time = [rsvl_time[k] for k in lags]
+                corr_aver = [self.rsvl_average(C_array[:,rsvl_level[k],rsvl_index[k]],N_array[:,rsvl_level[k],rsvl_index[k]]) for k in lags]
+                if self.shard is not None or self.batch is not None:
+                    shard_sums = {'aver_sum': np.array(corr_aver)*self.input_data['Nchains']}
+                    if self.ensemble_corr:
+                        shard_sums['C_sum'] = np.array([np.sum(C_array[:,rsvl_level[k],rsvl_index[k]]) for k in lags])
+                        shard_sums['N_sum'] = np.array([np.sum(N_array[:,rsvl_level[k],rsvl_index[k]]) for k in lags])
 
             else:
                 #copy results to host and calculate average over all chains 
-                data_corr_host = d_data_corr.copy_to_host()
+                data_corr_host = self.to_host(d_data_corr)
                 
-                #running sum of time correlation averages for chains in block
-                average_corr = np.sum(data_corr_host[:,:,0],axis=0)
-                average_error = np.sum(data_corr_host[:,:,1],axis=0)
-
-                #divide running sum by number of chains
-                corr_aver = average_corr/self.input_data['Nchains']  #average correlation
-                corr_error = average_error/(self.input_data['Nchains']*np.sqrt(self.input_data['Nchains'])) #average error from correlation
+                #average correlation and error over all chains
+                corr_aver, corr_error = self.munch_average(data_corr_host)
+                if converged: #the simulation stopped early, only report the time lags calculated so far
+                    corr_time = corr_time[0:int(self.to_host(d_corr_index)[0])+1]
+                if self.shard is not None or self.batch is not None:
+                    shard_sums = {'aver_sum': np.sum(data_corr_host[:,0:len(corr_time),0],axis=0),
+                                  'error_sum': np.sum(data_corr_host[:,0:len(corr_time),1],axis=0)}
+
+            if self.shard is not None or self.batch is not None:
+                shard_sums['corr_time'] = np.array(corr_time)
+                shard_sums['calc_type'] = calc_type
             
             #write equilibrium calculation results to file
             if calc_type == 1:
@@ -697,6 +1472,20 @@ class FSM_LINEAR(object):
 
                 print('MSD results written to MSD_result_%d.txt'%self.sim_ID)
             
+        #correlator sums of the shard (or batch) for merging with the other shards
+        if self.shard is not None or self.batch is not None:
+            if self.flow or self.turn_flow_off:
+                shard_sums = {}
+            shard_sums.update({'nchains': self.input_data['Nchains'], 'flow': self.flow or self.turn_flow_off,
+                               'shard': np.array(self.shard if self.batch is None else self.batch)})
+            shards.save_shard(self.output_dir,self.sim_ID,shard_sums)
+
+        if rawdata_thread is not None and calc_type == 2:
+            #MSD from the raw CoM trajectories, chains are read from the file in blocks that fit in half of the free memory
+            print("Calculating MSD from raw CoM data...")
+            msd.write_msd(rawdata_file,os.path.join(self.output_dir,'MSD_rawdata_%d.txt'%self.sim_ID),max_mem=0.5*self.min_mem*1024*1024)
+            print('MSD of raw CoM data written to MSD_rawdata_%d.txt'%self.sim_ID)
+
         if self.fit:
             print("")
             print("Fitting G(t)...")
@@ -0,0 +1,121 @@
+import numpy as np
+import psutil
+
+import core.fileio as fileio
+
+#Mean squared displacement of the chain centers of mass from a binary raw data file (see fileio.write_rawdata). The file is
+#memory-mapped and read one block of chains at a time (each chain is stored contiguously in each time sync), so the trajectories
+#of the whole ensemble never have to fit in memory.
+
+def msd_lags(time_array,nlags=200):
+    '''
+    Default lag times, about nlags lags spaced evenly in log scale from the time points of the trajectories
+
+    Args:
+        time_array - times of the trajectory points
+        nlags - largest number of lags
+    Returns:
+        lag times (the first is 0)
+    '''
+    npoints = len(time_array)
+    if npoints < 2:
+        return np.zeros(shape=1)
+    index = np.unique(np.round(np.geomspace(1,npoints-1,nlags)).astype(int))
+
+    return np.concatenate(([0.0],np.asarray(time_array[index])-time_array[0]))
+
+
+def lag_pairs(time_array,lag):
+    '''
+    Indices of all pairs of time points (i,j) with time_array[j]-time_array[i] equal to lag
+
+    Args:
+        time_array - times of the trajectory points (increasing)
+        lag - lag time
+    Returns:
+        first and second index of each pair
+    '''
+    first = np.arange(len(time_array))
+    second = np.searchsorted(time_array,time_array+lag-1e-9*max(1.0,lag))
+    valid = second < len(time_array)
+    first = first[valid]
+    second = second[valid]
+    valid = np.abs(time_array[second]-time_array[first]-lag) <= 1e-9*max(1.0,lag)
+
+    return first[valid], second[valid]
+
+
+def calc_msd(filename,lags=None,max_mem=None):
+    '''
+    Calculate the MSD of the chain centers of mass over all pairs of time points of each lag, averaged over all chains
+
+    Args:
+        filename - binary CoM raw data file (values x, y, z of each chain)
+        lags - lag times (defaults to msd_lags of the file time points)
+        max_mem - memory in bytes used for a block of chains (defaults to half of the available memory)
+    Returns:
+        lags - lag times
+        msd - MSD for each lag averaged over chains
+        error - standard error of the MSD of each lag over chains
+    '''
+    info, time_array, segments = fileio.load_rawdata(filename)
+    npoints = len(time_array)
+    nchains = info['nchains']
+    ncomp = info['ncomp']
+
+    if lags is None:
+        lags = msd_lags(time_array)
+    lags = np.asarray(lags,dtype=float)
+    pairs = [lag_pairs(time_array,lag) for lag in lags]
+
+    #each chain in the block needs its trajectory (read one segment at a time and joined, so twice while it is read), and for
+    #each lag the displacements, the gathered earlier points subtracted from them and the squared displacements (at most one
+    #copy of the trajectory each), so at most 4 copies of its trajectory
+    if max_mem is None:
+        max_mem = 0.5*psutil.virtual_memory().available
+    block_size = int(min(max(max_mem//(4*npoints*ncomp*8),1),max(nchains,1)))
+
+    msd_sum = np.zeros(shape=len(lags),dtype=float)
+    msd_sum2 = np.zeros(shape=len(lags),dtype=float)
+    for first_chain in range(0,nchains,block_size):
+        block = fileio.rawdata_chains(segments,first_chain,first_chain+block_size)
+
+        for k in range(0,len(lags)):
+            first, second = pairs[k]
+            if len(first) == 0:
+                continue
+            disp = block[:,second]
+            disp -= block[:,first]
+            chain_msd = np.mean(np.sum(disp**2,axis=2),axis=1) #MSD of each chain in the block
+            msd_sum[k] += np.sum(chain_msd)
+            msd_sum2[k] += np.sum(chain_msd**2)
+
+    msd = msd_sum/nchains
+    error = np.sqrt(np.maximum(msd_sum2/nchains - msd**2,0.0))/np.sqrt(nchains)
+    no_pairs = np.array([len(pair[0]) == 0 for pair in pairs],dtype=bool)
+    msd[no_pairs] = np.nan
+    error[no_pairs] = np.nan
+
+    return lags, msd, error
+
+
+def write_msd(filename,output,lags=None,max_mem=None):
+    '''
+    Calculate the MSD from a binary CoM raw data file and write it to a text file (same format as MSD_result)
+
+    Args:
+        filename - binary CoM raw data file
+        output - path of the text file
+        lags, max_mem - see calc_msd
+    Returns:
+        MSD and error over time in the output file
+    '''
+    lags, msd, error = calc_msd(filename,lags,max_mem)
+
+    with open(output,'w') as f:
+        f.write('Time, MSD, Error\n')
+        for k in range(0,len(lags)):
+            if not np.isnan(msd[k]):
+                f.write("%d, %.4f, %.4f \n"%(lags[k],msd[k],error[k]))
+
+    return
@@ -36,6 +36,16 @@ class p_cd(object):
         return self.tau[i-1]
 
 
+    def tau_CD_f_t_batch(self, p):
+        '''
+        Lifetimes drawn by tau_CD_f_t for an array of uniform random numbers p
+        '''
+        cum = np.cumsum(np.array(self.g[0:self.nmodes])*np.array(self.tau[0:self.nmodes])/self.ptau_sum)
+        index = np.minimum(np.searchsorted(cum, p, side='right'), self.nmodes-1)
+
+        return np.array(self.tau[0:self.nmodes])[index]
+
+
     def W_CD_destroy_aver(self):
 
         return 1.0/self.ptau_sum
@@ -95,6 +105,17 @@ class p_cd_linear(object):
             return self.tau_D
 
 
+    def tau_CD_f_t_batch(self, p):
+        '''
+        Lifetimes drawn by tau_CD_f_t for an array of uniform random numbers p
+        '''
+        tau = np.full(np.shape(p), self.tau_D)
+        power_law = p < (1.0 - self.g)
+        tau[power_law] = np.power(p[power_law] * self.tau_alpha / self.At + math.pow(self.tau_0, self.alpha), 1.0 / self.alpha)
+
+        return tau
+
+
     def W_CD_destroy_aver(self):
         return self.normdt 
 
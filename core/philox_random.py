@@ -0,0 +1,111 @@
+import math
+import numpy as np
+from numba import jit
+
+from core.cpu_random import tau_CD_eq, tau_CD_cr, tau_CD_f_t, tau_CD_f_d_t
+
+#Counter-based random numbers (Philox4x32-10). Each value is a function of (seed, chain index, chain step, draw number) only,
+#where the chain index is the index of the chain in the whole ensemble (not in a shard or batch of it),
+#so random numbers are drawn inside the step functions without random number arrays, refills, or generator states, and a chain
+#gets the same random numbers on every backend and for any split of the ensemble between threads, blocks or devices.
+#Draw 0 of a step is the uniform random number used to choose the jump, draws 1-3 are used when a slip-link is created.
+
+PHILOX_M0 = np.uint64(0xD2511F53)
+PHILOX_M1 = np.uint64(0xCD9E8D57)
+PHILOX_W0 = np.uint64(0x9E3779B9)
+PHILOX_W1 = np.uint64(0xBB67AE85)
+MASK32 = np.uint64(0xFFFFFFFF)
+SHIFT32 = np.uint64(32)
+
+
+@jit(nopython=True)
+def philox4x32(c0, c1, c2, c3, k0, k1):
+    '''
+    Philox4x32 block with 10 rounds (Salmon et al., SC11)
+
+    Args:
+        c0, c1, c2, c3 - 32 bit counter words
+        k0, k1 - 32 bit key words
+    Returns:
+        four 32 bit random words
+    '''
+    c0 = np.uint64(c0) & MASK32
+    c1 = np.uint64(c1) & MASK32
+    c2 = np.uint64(c2) & MASK32
+    c3 = np.uint64(c3) & MASK32
+    k0 = np.uint64(k0) & MASK32
+    k1 = np.uint64(k1) & MASK32
+
+    for r in range(0,10):
+        p0 = PHILOX_M0*c0
+        p1 = PHILOX_M1*c2
+        n0 = ((p1 >> SHIFT32) ^ c1 ^ k0) & MASK32
+        n2 = ((p0 >> SHIFT32) ^ c3 ^ k1) & MASK32
+        c1 = p1 & MASK32
+        c3 = p0 & MASK32
+        c0 = n0
+        c2 = n2
+        k0 = (k0 + PHILOX_W0) & MASK32
+        k1 = (k1 + PHILOX_W1) & MASK32
+
+    return c0, c1, c2, c3
+
+
+@jit(nopython=True)
+def philox_uniform2(seed, i, n, draw):
+    '''
+    Two uniform random numbers in (0,1] with 53 bit resolution for draw number 'draw' of step n of chain i
+    '''
+    x0, x1, x2, x3 = philox4x32(np.uint64(n) & MASK32, np.uint64(n) >> SHIFT32, i, draw,
+                                np.uint64(seed) & MASK32, np.uint64(seed) >> SHIFT32)
+
+    u0 = (float(x0 >> np.uint64(5))*67108864.0 + float(x1 >> np.uint64(6)) + 1.0) / 9007199254740992.0
+    u1 = (float(x2 >> np.uint64(5))*67108864.0 + float(x3 >> np.uint64(6)) + 1.0) / 9007199254740992.0
+
+    return u0, u1
+
+
+@jit(nopython=True)
+def philox_uniform(seed, i, n):
+    '''
+    Uniform random number in (0,1] used to choose the jump process in step n of chain i
+    '''
+    u0, u1 = philox_uniform2(seed, i, n, 0)
+
+    return u0
+
+
+@jit(nopython=True, error_model='numpy')
+def philox_gauss_tauCD(seed, i, chain, n, discrete, SDtoggle, CD_flag, gauss_rand, pcd_array, pcd_table_eq, pcd_table_cr, pcd_table_tau):
+    '''
+    Draw tau_CD and the three gaussian values for a slip-link created in step n of chain i and store them in gauss_rand[i,0]
+    (same values as gpu_random.fill_gauss_rand_tauCD, gaussian values use the Box-Muller transform). chain is the index of
+    chain i in the whole ensemble, which keys its random numbers
+    '''
+    x, u1 = philox_uniform2(seed, chain, n, 1)
+    u2, u3 = philox_uniform2(seed, chain, n, 2)
+    u4, u5 = philox_uniform2(seed, chain, n, 3)
+
+    if CD_flag == 1 and discrete==True:
+
+        if SDtoggle==True:
+            gauss_rand[i,0,3] = tau_CD_eq(x, pcd_table_eq, pcd_table_tau)
+        else:
+            gauss_rand[i,0,3] = tau_CD_cr(x, pcd_table_cr, pcd_table_tau)
+
+    elif CD_flag == 1 and discrete == False:
+
+        if SDtoggle==True:
+            gauss_rand[i,0,3] = tau_CD_f_t(x,pcd_array[6],pcd_array[8],pcd_array[7],pcd_array[5],pcd_array[0])
+        else:
+            gauss_rand[i,0,3] = tau_CD_f_d_t(x,pcd_array[9],pcd_array[10],pcd_array[11],pcd_array[12],pcd_array[5])
+
+    else:
+        gauss_rand[i,0,3] = 0.0
+
+    r = math.sqrt(-2.0*math.log(u1))
+    gauss_rand[i,0,0] = r*math.cos(2.0*math.pi*u2)
+    gauss_rand[i,0,1] = r*math.sin(2.0*math.pi*u2)
+    gauss_rand[i,0,2] = math.sqrt(-2.0*math.log(u3))*math.cos(2.0*math.pi*u4)
+
+    return
@@ -0,0 +1,189 @@
+import os
+import sys
+import numpy as np
+
+#Merging of sharded simulations. A shard simulates a contiguous part of the ensemble (see FSM_LINEAR shard argument, chain batches
+#of a run are merged in the same way) and writes the sums over its chains of the per-chain correlator averages (and munch errors)
+#to shard_<sim_ID>.npz next to its usual output.
+#The merged results use the same formulas as a single run over all chains: sums are added and divided by the total number of
+#chains, so the munch error of G(t)/MSD is sum(errors)/(Nchains*sqrt(Nchains)) and the flow stress error is the standard
+#deviation over all chains divided by sqrt(Nchains).
+
+def save_shard(output_dir, sim_ID, arrays):
+    '''
+    Write the correlator sums and settings of a shard
+
+    Args:
+        output_dir - output directory of the shard
+        sim_ID - simulation ID number
+        arrays - dictionary of sums and settings (nchains, flow, calc_type, correlator, corr_time, aver_sum, error_sum, C_sum, N_sum)
+    Returns:
+        shard_<sim_ID>.npz in the output directory
+    '''
+    with open(os.path.join(output_dir,'shard_%d.npz'%sim_ID),'wb') as f:
+        np.savez(f,**arrays)
+
+    return
+
+
+def shard_ranges(nchains, count):
+    '''
+    Chains simulated by each of count shards (first chain, last chain + 1)
+    '''
+    return [(index*nchains//count, (index+1)*nchains//count) for index in range(0,count)]
+
+
+def add_shards(shards):
+    '''
+    Add the correlator sums of all shards (time lags calculated by every shard). All shards must have been run with the same
+    settings (flow, G(t) or MSD, --correlator and --ensemble_corr), otherwise their sums cannot be added.
+
+    Args:
+        shards - contents of the shard files
+    Returns:
+        contents of a shard file of all chains
+    '''
+    for name in ('flow','calc_type'):
+        values = set([str(s[name]) if name in s else 'none' for s in shards])
+        if len(values) > 1:
+            sys.exit("Shards were simulated with different %s settings (%s), they cannot be merged."%(name,', '.join(sorted(values))))
+    sum_names = set(['/'.join([name for name in ('aver_sum','error_sum','C_sum','N_sum') if name in s]) for s in shards])
+    if len(sum_names) > 1:
+        sys.exit("Shards have different correlator sums (%s), they were simulated with different --correlator or --ensemble_corr settings and cannot be merged."%(
+                 ', '.join(sorted(sum_names))))
+
+    total = {'nchains': sum([int(s['nchains']) for s in shards]), 'flow': bool(shards[0]['flow'])}
+    if 'corr_time' in shards[0]:
+        nlags = min([len(s['corr_time']) for s in shards])
+        total['corr_time'] = shards[0]['corr_time'][0:nlags]
+        total['calc_type'] = int(shards[0]['calc_type'])
+        for name in ('aver_sum','error_sum','C_sum','N_sum'):
+            if name in shards[0]:
+                total[name] = np.sum([s[name][0:nlags] for s in shards],axis=0)
+
+    return total
+
+
+def merge_corr(sums):
+    '''
+    G(t)/MSD correlations of the added shards (see add_shards)
+
+    Args:
+        sums - correlator sums of all chains
+    Returns:
+        lag times, averages and errors (None for rsvl)
+    '''
+    total = sums['nchains']
+    if 'C_sum' in sums: #rsvl ensemble sums
+        corr_aver = sums['C_sum']/sums['N_sum']
+    else:
+        corr_aver = sums['aver_sum']/total
+
+    corr_error = None
+    if 'error_sum' in sums:
+        corr_error = sums['error_sum']/(total*np.sqrt(total))
+
+    return sums['corr_time'], corr_aver, corr_error
+
+
+def merge_stress(filenames, nchains):
+    '''
+    Merge the ensemble flow stress files of all shards (write times reached by every shard)
+
+    Args:
+        filenames - stress files written by fileio.write_stress or fileio.write_flow_stress in flow
+        nchains - number of chains of each shard
+    Returns:
+        rows of time, averages and standard errors over all chains (same columns as the shard files)
+    '''
+    rows = [np.loadtxt(filename,delimiter=',',skiprows=1,ndmin=2) for filename in filenames]
+    nrows = min([r.shape[0] for r in rows])
+    n = np.reshape(np.array(nchains,dtype=float),(-1,1,1))
+    total = np.sum(n)
+
+    mean = np.array([r[0:nrows,1:9] for r in rows])
+    error = np.array([r[0:nrows,9:17] for r in rows])
+
+    #sums and sums of squares of each shard from its mean and standard error (np.std over the chains of the shard)
+    sums = np.sum(n*mean,axis=0)
+    squares = np.sum(n*((error*np.sqrt(n))**2 + mean**2),axis=0)
+    stress = sums/total
+    stress_error = np.sqrt(np.maximum(squares/total - stress**2,0.0))/np.sqrt(total)
+
+    return np.hstack((rows[0][0:nrows,0:1], stress, stress_error))
+
+
+def merge_ft(filenames):
+    '''
+    Add the entanglement lifetime histograms of all shards
+
+    Args:
+        filenames - f_dt files of the shards (bin and count of the non-empty bins)
+    Returns:
+        dictionary of bin counts
+    '''
+    bins = {}
+    for filename in filenames:
+        for k, count in np.loadtxt(filename,dtype=np.int64,ndmin=2):
+            bins[int(k)] = bins.get(int(k),0) + int(count)
+
+    return bins
+
+
+def merge_shards(shard_dirs, sim_ID, output_dir, shard=None):
+    '''
+    Merge the results of sharded simulations into the files a single simulation of all chains writes
+
+    Args:
+        shard_dirs - output directories of the shards
+        sim_ID - simulation ID number
+        output_dir - directory of the merged results
+        shard - (index, count) if the merged chains are themselves a shard (its shard file is written with the added sums)
+    Returns:
+        Gt_result/MSD_result, stress and f_dt files of all chains in output_dir
+    '''
+    shards = []
+    for shard_dir in shard_dirs:
+        with np.load(os.path.join(shard_dir,'shard_%d.npz'%sim_ID)) as data:
+            shards.append({name: data[name] for name in data.files})
+    nchains = [int(s['nchains']) for s in shards]
+    sums = add_shards(shards)
+    total = sums['nchains']
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    if 'corr_time' in sums:
+        corr_time, corr_aver, corr_error = merge_corr(sums)
+        name = 'Gt' if sums['calc_type'] == 1 else 'MSD'
+        with open(os.path.join(output_dir,'%s_result_%d.txt'%(name,sim_ID)), "w") as f:
+            if corr_error is None:
+                f.write('Time, %s\n'%('G(t)' if name == 'Gt' else name))
+                for m in range(0,len(corr_time)):
+                    f.write("%d, %.4f \n"%(corr_time[m],corr_aver[m]))
+            else:
+                f.write('Time, %s, Error\n'%('G(t)' if name == 'Gt' else name))
+                for m in range(0,len(corr_time)):
+                    f.write("%d, %.4f, %.4f \n"%(corr_time[m],corr_aver[m],corr_error[m]))
+        print('%s results of %d chains written to %s_result_%d.txt'%(name,total,name,sim_ID))
+
+    stress_files = [os.path.join(shard_dir,'stress_%d.txt'%sim_ID) for shard_dir in shard_dirs]
+    if sums['flow'] and all([os.path.isfile(filename) for filename in stress_files]):
+        combined = merge_stress(stress_files,nchains)
+        with open(os.path.join(output_dir,'stress_%d.txt'%sim_ID),'w') as f:
+            f.write('time, tau_xx, tau_yy, tau_zz, tau_xy, tau_yz, tau_xz, Z, f_newQ, stderr_xx, stderr_yy, stderr_zz, stderr_xy, stderr_yz, stderr_xz, stderr_Z, stderr_f_newQ\n')
+            np.savetxt(f, combined, delimiter=',', fmt='%.8f')
+        print('Flow stress of %d chains written to stress_%d.txt'%(total,sim_ID))
+
+    ft_files = [os.path.join(shard_dir,'f_dt_%d.txt'%sim_ID) for shard_dir in shard_dirs]
+    if all([os.path.isfile(filename) for filename in ft_files]):
+        bins = merge_ft(ft_files)
+        with open(os.path.join(output_dir,'f_dt_%d.txt'%sim_ID), 'w') as f:
+            for k in sorted(bins):
+                if bins[k] != 0:
+                    f.write('%d  %d\n'%(k,bins[k]))
+
+    if shard is not None:
+        sums['shard'] = np.array(shard)
+        save_shard(output_dir,sim_ID,sums)
+
+    return
@@ -0,0 +1,49 @@
+import numpy as np
+
+#Online steady state detection for flow runs. The ensemble averages and standard errors of the stress tensor and Z written to
+#stress.txt at every write time (see fileio.write_stress) are kept for the last two windows. Steady state is reached when the
+#averages no longer drift within either window and the two window averages agree, both within tol standard errors.
+
+#columns of the rows written by fileio.write_stress in flow (time, averages and standard errors of tau_xx, ..., tau_xz, Z, f_newQ)
+#f_newQ (columns 8 and 16) is not tested: it is the fraction of slip links created after flow was turned off, which is zero in flow
+MEAN_COLUMNS = np.arange(1,8) #tau_xx, tau_yy, tau_zz, tau_xy, tau_yz, tau_xz, Z
+ERROR_COLUMNS = np.arange(9,16)
+
+def window_drift(times, values):
+    '''
+    Change of each value over a window from a least squares line
+
+    Args:
+        times - times of the window points
+        values - values at the window points, shape (len(times), columns)
+    Returns:
+        slope of each column times the length of the window
+    '''
+    t = times - np.mean(times)
+    slope = np.sum(t[:,np.newaxis]*(values-np.mean(values,axis=0)),axis=0)/np.sum(t**2)
+
+    return slope*(times[-1]-times[0])
+
+
+def is_steady(rows, npoints, tol):
+    '''
+    Windowed drift test of the ensemble stress tensor and Z (f_newQ is excluded, see MEAN_COLUMNS)
+
+    Args:
+        rows - rows written by fileio.write_stress in flow (time, averages and standard errors), the last 2*npoints are used
+        npoints - number of write times in a window (at least 2)
+        tol - largest drift in units of the average standard error of the two windows
+    Returns:
+        True if the averages of all columns reached a plateau
+    '''
+    if rows.shape[0] < 2*npoints:
+        return False
+    first = rows[-2*npoints:-npoints]
+    last = rows[-npoints:]
+
+    error = tol*np.mean(rows[-2*npoints:,ERROR_COLUMNS],axis=0)
+    drift_first = np.abs(window_drift(first[:,0],first[:,MEAN_COLUMNS]))
+    drift_last = np.abs(window_drift(last[:,0],last[:,MEAN_COLUMNS]))
+    step = np.abs(np.mean(last[:,MEAN_COLUMNS],axis=0) - np.mean(first[:,MEAN_COLUMNS],axis=0))
+
+    return bool(np.all(drift_first <= error) and np.all(drift_last <= error) and np.all(step <= error))
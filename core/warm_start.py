@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import zipfile
+import numpy as np
+
+#Store of equilibrated ensembles used as initial conformations (warm start). Ensembles are kept in a directory for each set of
+#physics parameters that determines the equilibrium state (NK, beta, CD_flag and the CD statistics), one file per ensemble named
+#by the hash of its arrays. Creation times of the entanglements are stored relative to the chain time, so a warm started chain
+#at time 0 keeps the age of its entanglements (0 marks an unknown creation time, same as in new conformations).
+
+def store_key(input_data, pcd_file=None):
+    '''
+    Physics parameters that identify an equilibrated ensemble
+
+    Args:
+        input_data - input parameters from yaml file
+        pcd_file - multi-mode fit of the entanglement lifetime distribution (used with CD for architectures other than linear)
+    Returns:
+        dictionary of parameters
+    '''
+    key = {'NK': int(input_data['NK']), 'beta': float(input_data['beta']), 'CD_flag': int(input_data['CD_flag']),
+           'architecture': str(input_data['architecture'])}
+    if key['CD_flag'] != 0 and key['architecture'] != 'linear' and pcd_file is not None:
+        with open(pcd_file,'rb') as f:
+            key['pcd'] = hashlib.sha256(f.read()).hexdigest()
+
+    return key
+
+
+def key_dir(store, key):
+    '''
+    Directory of the ensembles with parameters key in the store
+    '''
+    name = hashlib.sha256(json.dumps(key,sort_keys=True).encode()).hexdigest()[0:16]
+
+    return os.path.join(store,'NK%d_beta%s_CD%d_%s'%(key['NK'],repr(key['beta']),key['CD_flag'],name))
+
+
+def content_hash(QN, Z, tau_CD, t_cr):
+    '''
+    Hash of the arrays of an ensemble (file name of the ensemble in the store)
+    '''
+    h = hashlib.sha256()
+    for array in (QN, Z, tau_CD, t_cr):
+        h.update(np.ascontiguousarray(array,dtype=float).tobytes())
+
+    return h.hexdigest()[0:32]
+
+
+def save_ensemble(store, key, QN, Z, tau_CD, t_cr, chain_time):
+    '''
+    Add an equilibrated ensemble to the store
+
+    Args:
+        store - path of the store
+        key - physics parameters of the ensemble (see store_key)
+        QN, Z, tau_CD, t_cr - final state of the chains
+        chain_time - final time of each chain
+    Returns:
+        path of the ensemble file (an ensemble already in the store is not written again)
+    '''
+    path = key_dir(store, key)
+    if not os.path.exists(path):
+        os.makedirs(path)
+        with open(os.path.join(path,'key.json'),'w') as f:
+            json.dump(key,f,sort_keys=True)
+
+    #creation times relative to the chain time (0 is kept for entanglements created by CD, see chain_kernel.apply_destroy)
+    t_rel = np.where(t_cr != 0.0, t_cr - np.reshape(chain_time,(-1,1)), 0.0)
+
+    filename = os.path.join(path,'%s.npz'%content_hash(QN,Z,tau_CD,t_rel))
+    if not os.path.isfile(filename):
+        tmp_file = filename + '.tmp'
+        with open(tmp_file,'wb') as f:
+            np.savez(f,QN=QN,Z=Z,tau_CD=tau_CD,t_cr=t_rel)
+        os.replace(tmp_file,filename)
+
+    return filename
+
+
+def load_ensembles(store, key):
+    '''
+    Load all ensembles with parameters key from the store (files that do not match their hash are skipped)
+
+    Args:
+        store - path of the store
+        key - physics parameters of the ensembles (see store_key)
+    Returns:
+        dictionary of the QN, Z, tau_CD and t_cr arrays of all chains (None if the store has no chains for key)
+    '''
+    path = key_dir(store, key)
+    if not os.path.isdir(path):
+        return None
+
+    arrays = {'QN': [], 'Z': [], 'tau_CD': [], 't_cr': []}
+    for name in sorted(os.listdir(path)):
+        if not name.endswith('.npz'):
+            continue
+        try:
+            with np.load(os.path.join(path,name)) as data:
+                ensemble = {k: data[k] for k in arrays}
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            print("Skipping %s, it is not an ensemble file."%(os.path.join(path,name)))
+            continue
+        if content_hash(ensemble['QN'],ensemble['Z'],ensemble['tau_CD'],ensemble['t_cr']) != name[0:-4]:
+            print("Skipping %s, its arrays do not match its hash."%(os.path.join(path,name)))
+            continue
+        for k in arrays:
+            arrays[k].append(ensemble[k])
+
+    if len(arrays['Z']) == 0:
+        return None
+
+    return {k: np.concatenate(arrays[k]) for k in arrays}
+
+
+def sample_chains(ensembles, first, nchains, seed):
+    '''
+    Draw chains first to first+nchains-1 of an ensemble of different chains from the ensembles of the store. The ensemble is a
+    single random permutation of the stored chains, so shards and chain batches of a run draw the chains of a run of all chains.
+
+    Args:
+        ensembles - arrays of all chains (see load_ensembles)
+        first - index of the first chain in the ensemble
+        nchains - number of chains to draw (first+nchains is at most the number of stored chains)
+        seed - seed of the NumPy random number generator (same for all shards and chain batches of a run)
+    Returns:
+        QN, Z, tau_CD and t_cr of the drawn chains
+    '''
+    index = np.random.default_rng(seed).permutation(len(ensembles['Z']))[first:first+nchains]
+
+    return ensembles['QN'][index], ensembles['Z'][index], ensembles['tau_CD'][index], ensembles['t_cr'][index]
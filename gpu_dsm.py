@@ -23,6 +23,52 @@ def gpu_dsm():
 					help='Load in checkpoint file.')
 	parser.add_argument('-s','--save',metavar='filename',type=str,default='checkpoint.dat',
 					help='Save simulation checkpoint to file.')
+	parser.add_argument('--checkpoint_interval',metavar='minutes',type=float,default=60,
+					help='Wall time in minutes between checkpoints (0 only writes a checkpoint on SIGTERM). Checkpoints are only written '
+					'right after the random number arrays are refilled (every 250 steps of the simulation loop), so a checkpoint '
+					'(also on SIGTERM) is written at the first refill after the interval has elapsed.')
+	parser.add_argument('-b','--backend',type=str,default='gpu',choices=['gpu','cpu'],
+					help='Run the simulation on a GPU (gpu) or on the host CPU cores (cpu).')
+	parser.add_argument('--fused',action="store_true",
+					help='Advance chains by many steps per GPU kernel launch.')
+	parser.add_argument('--rate_tree',action="store_true",
+					help='Keep jump rates in a tree for faster jump selection in long chains (implies --fused on GPU).')
+	parser.add_argument('--rng',type=str,default='xoroshiro',choices=['xoroshiro','philox'],
+					help='Random number generator, philox draws counter-based random numbers inside the step functions (implies --fused on GPU).')
+	parser.add_argument('--flow_accum',action="store_true",
+					help='In flow, add the stress tensor of each chain to ensemble sums on the device and sync chains every 250*tau_K.')
+	parser.add_argument('--fft_corr',action="store_true",
+					help='Calculate the munch correlations of all time lags at once with FFTs on the host.')
+	parser.add_argument('--ensemble_corr',action="store_true",
+					help='Add the correlator sums of all chains to ensemble sums (correlator memory independent of Nchains).')
+	parser.add_argument('--multi_stress',action="store_true",
+					help='Average G(t) over the autocorrelations of the five independent components of the traceless stress tensor.')
+	parser.add_argument('--conv_error',metavar='rel_error',type=float,default=None,
+					help='Stop equilibrium runs once every time lag up to --conv_time has a relative error below rel_error.')
+	parser.add_argument('--conv_time',metavar='time',type=float,default=None,
+					help='Largest time lag checked for convergence (default sim_time).')
+	parser.add_argument('--steady_window',metavar='time',type=float,default=None,
+					help='In flow, check for steady state of the ensemble stress tensor and Z over windows of this length.')
+	parser.add_argument('--steady_tol',metavar='n_errors',type=float,default=2.0,
+					help='Largest drift of the stress tensor and Z at steady state in units of their standard errors (default 2).')
+	parser.add_argument('--steady_stop',action="store_true",
+					help='Stop flow at steady state (flow is turned off if flow_time < sim_time, otherwise the simulation stops).')
+	parser.add_argument('--init',type=str,default='serial',choices=['serial','batch','parallel'],
+					help='Chain initialization, batch draws all initial conformations at once with NumPy random number generators, parallel draws each chain from its own random number stream on a pool of processes.')
+	parser.add_argument('--init_workers',metavar='n',type=int,default=None,
+					help='Number of processes used by --init parallel (default number of CPU cores).')
+	parser.add_argument('--table_cache',metavar='/path/to/cache',type=str,default=None,
+					help='Directory where the Z distribution and log factorial tables of serial chain initialization are saved and reused.')
+	parser.add_argument('--warm_start',metavar='/path/to/store',type=str,default=None,
+					help='Draw the initial conformations from the equilibrated ensembles with the same NK, beta and CD in a warm start store.')
+	parser.add_argument('--warm_save',metavar='/path/to/store',type=str,default=None,
+					help='Add the final conformations of an equilibrium run to a warm start store.')
+	parser.add_argument('--shard',metavar=('index','count'),type=int,nargs=2,default=None,
+					help='Only simulate the index-th of count parts of the ensemble and save the correlator sums for merging (see shard_dsm.py).')
+	parser.add_argument('--max_mem',metavar='MB',type=float,default=None,
+					help='Device memory available to the chains in MB (default 80%% of the free device memory). Larger ensembles are simulated in sequential batches of chains.')
+	parser.add_argument('--incremental_obs',action="store_true",
+					help='Update the stress tensor and center of mass of each chain with each jump instead of summing over all strands at each write time (equilibrium only, implies --fused on GPU).')
 
 	args = parser.parse_args()
 
@@ -35,7 +81,14 @@ def gpu_dsm():
 	if args.load == None:
 		args.load = './'
 
-	run_dsm = FSM_LINEAR(args.ID,args.d,args.o,args.c,args.rawdata,args.fit,args.distr,args.load,args.save)
+	run_dsm = FSM_LINEAR(args.ID,args.d,args.o,args.c,args.rawdata,args.fit,args.distr,args.load,args.save,
+						 backend=args.backend,fused=args.fused,rate_tree=args.rate_tree,rng_type=args.rng,flow_accum=args.flow_accum,
+						 checkpoint_interval=args.checkpoint_interval,fft_corr=args.fft_corr,ensemble_corr=args.ensemble_corr,
+						 multi_stress=args.multi_stress,conv_error=args.conv_error,conv_time=args.conv_time,
+						 steady_window=args.steady_window,steady_tol=args.steady_tol,steady_stop=args.steady_stop,
+						 incremental_obs=args.incremental_obs,init_type=args.init,init_workers=args.init_workers,
+						 table_cache=args.table_cache,warm_start=args.warm_start,warm_save=args.warm_save,shard=args.shard,
+						 max_mem=args.max_mem)
 	run_dsm.run()
 
 	return
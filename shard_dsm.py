@@ -0,0 +1,66 @@
+import argparse
+import os
+import subprocess
+import sys
+
+import core.shards as shards
+
+#Run the ensemble in input.yaml as several shards (contiguous parts of the chains) at once, one process per shard on its own
+#device (or its share of the CPU cores), and merge their results into the files of a single run of all chains. Arguments not
+#listed below are passed to every gpu_dsm.py process.
+
+def shard_dsm():
+
+	parser = argparse.ArgumentParser(description='Run the ensemble in input.yaml as shards on several devices or processes and merge the results.')
+
+	parser.add_argument('ID', type=int, nargs='?', default=0,
+					help='An integer for the simulation ID.')
+	parser.add_argument('-n','--shards', type=int, default=None,
+					help='Number of shards (default number of devices).')
+	parser.add_argument('--devices', metavar='device_num', type=int, nargs='+', default=[0],
+					help='Device IDs, shards are assigned to them in turn.')
+	parser.add_argument('-b','--backend', type=str, default='gpu', choices=['gpu','cpu'],
+					help='Backend of the shards (on the CPU, the cores are divided between the shards).')
+	parser.add_argument('-o', metavar='path/to/output/', type=str, default='./DSM_results',
+					help='Output directory of the merged results (shard results are in shard_<index> subdirectories).')
+	parser.add_argument('--merge_only', action="store_true",
+					help='Only merge the results of shards that were already run.')
+
+	args, dsm_args = parser.parse_known_args()
+
+	count = args.shards if args.shards is not None else len(args.devices)
+	if count < 1:
+		sys.exit("Number of shards must be at least 1.")
+	shard_dirs = [os.path.join(args.o,'shard_%d'%index) for index in range(0,count)]
+
+	if not args.merge_only:
+		env = dict(os.environ)
+		if args.backend == 'cpu' and 'NUMBA_NUM_THREADS' not in env:
+			env['NUMBA_NUM_THREADS'] = str(max((os.cpu_count() or 1)//count,1))
+
+		processes = []
+		for index in range(0,count):
+			if not os.path.exists(shard_dirs[index]):
+				os.makedirs(shard_dirs[index])
+			command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),'gpu_dsm.py'), str(args.ID),
+					   '-d', str(args.devices[index%len(args.devices)]), '-b', args.backend, '-o', shard_dirs[index],
+					   '--shard', str(index), str(count)] + dsm_args
+			log = open(os.path.join(shard_dirs[index],'log.txt'),'w')
+			processes.append((subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=env), log))
+		print("Started %d shards, output in %s."%(count,os.path.join(args.o,'shard_<index>')))
+
+		failed = []
+		for index, (process, log) in enumerate(processes):
+			process.wait()
+			log.close()
+			if process.returncode != 0:
+				failed.append(index)
+		if len(failed) > 0:
+			sys.exit("Shards %s failed, see log.txt in their output directories."%(', '.join([str(index) for index in failed])))
+
+	shards.merge_shards(shard_dirs, args.ID, args.o)
+
+	return
+
+if __name__ == "__main__":
+	shard_dsm()
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+from core.main import FSM_LINEAR
+
+#Small CPU simulations run in the test process (numba compiles the kernels once per session, so the first run is slow)
+
+INPUT = {'beta': 1, 'architecture': 'linear', 'NK': 10, 'Nchains': 8, 'kappa': [0.0]*9, 'CD_flag': 0, 'PD_flag': 0,
+         'EQ_calc': 'stress', 'tau_K': 1, 'flow_time': 0, 'sim_time': 300}
+
+
+def read_result(path):
+    '''
+    Columns of a result file written by the simulation (comma separated with one header line)
+    '''
+    return np.loadtxt(path,delimiter=',',skiprows=1,ndmin=2)
+
+
+@pytest.fixture
+def run_cpu(tmp_path, monkeypatch):
+    '''
+    Run a CPU simulation of INPUT updated with input_data in tmp_path (FSM_LINEAR reads input.yaml from the working directory)
+    and return the output directory. Keyword arguments are passed to FSM_LINEAR.
+    '''
+    monkeypatch.chdir(tmp_path)
+
+    def run(input_data=None, output='results', sim_ID=1, correlator='munch', **kwargs):
+        data = dict(INPUT)
+        data.update(input_data or {})
+        with open('input.yaml','w') as f:
+            yaml.dump(data,f)
+        output_dir = os.path.join(str(tmp_path),output)
+        FSM_LINEAR(sim_ID,0,output_dir,correlator,backend='cpu',**kwargs).run()
+        return output_dir
+
+    return run
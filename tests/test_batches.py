@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+from conftest import INPUT, read_result
+from core.main import FSM_LINEAR
+
+#If the chains do not fit in max_mem, they are simulated in sequential batches whose results are merged. Each chain draws the
+#initial conformation and random numbers of a run without batches, so the merged results are those of the unbatched run.
+
+FLOW = {'kappa': [0.0,0.01,0.0,0.0,0.0,0.0,0.0,0.0,0.0], 'flow_time': 300}
+
+
+def batch_mem(nchains, input_data=None, correlator='munch', **kwargs):
+    '''
+    max_mem (in MB) of batches of nchains chains of INPUT updated with input_data
+    '''
+    with open('input.yaml','w') as f:
+        yaml.dump(dict(INPUT,**(input_data or {})),f)
+    return nchains*FSM_LINEAR(1,0,'sim',correlator,backend='cpu',**kwargs).chain_memory()/1024/1024
+
+
+@pytest.mark.parametrize('init_type, rng_type, correlator', [('serial', 'xoroshiro', 'munch'), ('parallel', 'xoroshiro', 'rsvl'),
+                                                             ('serial', 'philox', 'munch')])
+def test_batched_run_matches_unbatched(run_cpu, init_type, rng_type, correlator):
+    kwargs = {'init_type': init_type, 'rng_type': rng_type, 'correlator': correlator}
+    expected = read_result(os.path.join(run_cpu(output='whole',**kwargs),'Gt_result_1.txt'))
+    batched_dir = run_cpu(output='batched',max_mem=batch_mem(3,**kwargs),**kwargs)
+
+    #batches of 3, 3 and 2 chains
+    assert sorted(name for name in os.listdir(batched_dir) if name.startswith('batch_')) == ['batch_0', 'batch_1', 'batch_2']
+    result = read_result(os.path.join(batched_dir,'Gt_result_1.txt'))
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, rtol=0.0, atol=2e-4)
+
+
+@pytest.mark.parametrize('CD_flag', [0, 1])
+def test_batched_flow_matches_unbatched(run_cpu, CD_flag):
+    #chains that reach a sync time before the others must not change when the random numbers are refilled
+    flow = dict(FLOW,CD_flag=CD_flag)
+    expected = read_result(os.path.join(run_cpu(flow,output='whole'),'stress_1.txt'))
+    result = read_result(os.path.join(run_cpu(flow,output='batched',max_mem=batch_mem(3,flow)),'stress_1.txt'))
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, rtol=0.0, atol=2e-4)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import core.blocking as blocking
+import core.cpu_correlation as cpu_correlation
+
+#The batched blocking transformation must give the errors of the per-series blocking transformation of the munch correlator
+#(cpu_correlation.block_error) for any series length, including lengths that are not powers of two and short series.
+
+LENGTHS = [2, 3, 4, 5, 6, 7, 8, 9, 13, 16, 31, 100, 257, 1000]
+
+
+def random_series(n, shape=(4,3), seed=11):
+    '''
+    Uncorrelated and correlated (AR(1)) random series of length n, so the blocking stops at different levels
+    '''
+    gen = np.random.default_rng(seed+n)
+    noise = gen.normal(1.0,2.0,size=shape+(n,))
+    x = np.copy(noise)
+    for r in range(1,n):
+        x[...,1,r] = 0.9*x[...,1,r-1] + noise[...,1,r]
+    return x
+
+
+def reference_errors(x, xav):
+    '''
+    Errors of block_error for each series (block_error overwrites its values, so it gets a copy)
+    '''
+    error = np.zeros(shape=x.shape[:-1])
+    for index in np.ndindex(*x.shape[:-1]):
+        error[index] = cpu_correlation.block_error(np.copy(x[index]),x.shape[-1],xav[index])
+    return error
+
+
+@pytest.mark.parametrize('n', LENGTHS)
+def test_block_errors_match_block_error(n):
+    x = random_series(n)
+    xav = np.mean(x,axis=-1)
+    np.testing.assert_allclose(blocking.block_errors(x,xav), reference_errors(x,xav), rtol=1e-12)
+
+
+@pytest.mark.parametrize('n', [5, 64, 99])
+def test_block_errors_other_average(n):
+    #the average is passed separately (for example the running average of the correlator), not recomputed
+    x = random_series(n)
+    xav = np.mean(x,axis=-1) + 0.25
+    np.testing.assert_allclose(blocking.block_errors(x,xav), reference_errors(x,xav), rtol=1e-12)
+
+
+def test_block_errors_keeps_values():
+    x = random_series(37)
+    values = np.copy(x)
+    blocking.block_errors(x,np.mean(x,axis=-1))
+    np.testing.assert_array_equal(x, values)
+
+
+def test_block_errors_single_value():
+    x = random_series(1)
+    assert np.all(np.isnan(blocking.block_errors(x,np.mean(x,axis=-1))))
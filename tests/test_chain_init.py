@@ -0,0 +1,173 @@
+import random as rng
+
+import numpy as np
+import pytest
+import yaml
+from scipy import stats
+
+import core.chain as chain
+from conftest import INPUT
+from core.chain import ensemble_chains, chain_stream
+from core.main import FSM_LINEAR
+from core.pcd_tau import p_cd_linear
+
+#The batch initialization draws all chains (or chunks of chains that fit in the memory left by the chain arrays) at once and must
+#give the equilibrium distributions of Z, the Kuhn steps of the strands, Q and the CD lifetimes that stream_init draws chain by chain.
+#The parallel initialization draws each chain from its own stream, so it gives the same chains for any number of workers.
+
+NK = 12
+NCHAINS = 20000
+SEED = 7
+
+
+def new_ensemble(CD_flag, nchains=NCHAINS):
+    return ensemble_chains({'beta': 1.0, 'CD_flag': CD_flag, 'Nchains': nchains, 'NK': NK})
+
+
+def stream_chains(CD_flag, z_max, pcd):
+    chains = new_ensemble(CD_flag)
+    for i in range(0,NCHAINS):
+        chains.stream_init(i,NK,z_max,chain_stream(SEED,i),pcd)
+    return chains
+
+
+def check_chains(chains, CD_flag, z_max):
+    Z = chains.Z.astype(int)
+    assert np.all((Z >= 1) & (Z <= z_max))
+    for i in range(0,chains.Z.shape[0]):
+        tz = Z[i]
+        assert np.sum(chains.QN[i,0:tz,3]) == NK and np.all(chains.QN[i,0:tz,3] >= 1)
+        assert not np.any(chains.QN[i,tz:]) and not np.any(chains.tau_CD[i,tz-1:])
+        #dangling ends are not oriented
+        assert not np.any(chains.QN[i,0,0:3]) and not np.any(chains.QN[i,tz-1,0:3])
+        assert np.all(np.isfinite(chains.tau_CD[i,0:tz-1]) == bool(CD_flag))
+
+
+def samples(chains):
+    '''
+    Z, Kuhn steps of the first strand, Kuhn steps and Q_x/sqrt(N/3) of the entangled strands and the inverse CD lifetimes
+    '''
+    Z = chains.Z.astype(int)
+    inside = (np.arange(NK)[np.newaxis,:] >= 1) & (np.arange(NK)[np.newaxis,:] < (Z-1)[:,np.newaxis])
+    strands = np.arange(NK)[np.newaxis,:] < (Z-1)[:,np.newaxis]
+    return {'Z': Z, 'N_first': chains.QN[:,0,3].astype(int), 'N': chains.QN[:,:,3][inside].astype(int),
+            'Q': chains.QN[:,:,0][inside]/np.sqrt(chains.QN[:,:,3][inside]/3.0), 'tau_CD': chains.tau_CD[strands]}
+
+
+def same_counts(a, b):
+    #chi-square test of the counts of each value of two samples of integers
+    values = np.union1d(a,b)
+    table = np.array([[np.count_nonzero(a == v) for v in values], [np.count_nonzero(b == v) for v in values]])
+    table = table[:,np.sum(table,axis=0) >= 10]
+    return stats.chi2_contingency(table)[1] > 1e-3
+
+
+@pytest.mark.parametrize('CD_flag, z_max', [(0, NK), (1, NK), (0, 6)])
+def test_batch_init_matches_stream_init(CD_flag, z_max):
+    pcd = p_cd_linear(NK,1.0) if CD_flag else None
+    batch = new_ensemble(CD_flag)
+    batch.batch_init(NK,z_max,SEED,pcd)
+    check_chains(batch,CD_flag,z_max)
+
+    expected = samples(stream_chains(CD_flag,z_max,pcd))
+    result = samples(batch)
+    for name in ['Z', 'N_first', 'N']:
+        assert same_counts(result[name],expected[name]), name
+    assert stats.ks_2samp(result['Q'],expected['Q']).pvalue > 1e-3
+    assert stats.kstest(result['Q'],'norm').pvalue > 1e-3
+    if CD_flag:
+        assert stats.ks_2samp(result['tau_CD'],expected['tau_CD']).pvalue > 1e-3
+
+
+def test_batch_init_chunks(monkeypatch):
+    #chunks of chains that fit in max_mem, each drawn with the seed plus its first chain
+    chunks = spy_chunks(monkeypatch)
+    whole = new_ensemble(0,nchains=10)
+    whole.batch_init(NK,NK,SEED,max_mem=1e12)
+    assert chunks == [(0, 10)]
+
+    chunks.clear()
+    chunked = new_ensemble(0,nchains=10)
+    chunked.batch_init(NK,NK,SEED,max_mem=4*chain.batch_init_memory(NK)+1)
+    assert chunks == [(0, 4), (4, 8), (8, 10)]
+    check_chains(chunked,0,NK)
+    for first, last in list(chunks):
+        part = new_ensemble(0,nchains=last-first)
+        part.batch_init(NK,NK,SEED+first)
+        np.testing.assert_array_equal(chunked.QN[first:last], part.QN)
+        np.testing.assert_array_equal(chunked.Z[first:last], part.Z)
+
+
+def spy_chunks(monkeypatch):
+    chunks = []
+    batch_init_chains = ensemble_chains.batch_init_chains
+
+    def init_chunk(self, first, last, *args):
+        chunks.append((first, last))
+        return batch_init_chains(self,first,last,*args)
+
+    monkeypatch.setattr(ensemble_chains,'batch_init_chains',init_chunk)
+    return chunks
+
+
+@pytest.mark.parametrize('init_type, batches', [('serial', 1), ('batch', 2)])
+def test_batches_leave_memory_for_batch_init(run_cpu, init_type, batches):
+    with open('input.yaml','w') as f:
+        yaml.dump(INPUT,f)
+    sim = FSM_LINEAR(1,0,'sim','munch',backend='cpu',init_type=init_type)
+    sim.max_mem = 8*sim.chain_memory()/1024/1024
+    assert sim.count_batches(8) == batches
+
+
+def test_run_initializes_chunks_in_free_memory(run_cpu, monkeypatch):
+    with open('input.yaml','w') as f:
+        yaml.dump(INPUT,f)
+    chain_mem = FSM_LINEAR(1,0,'sim','munch',backend='cpu',init_type='batch').chain_memory()
+    chunks = spy_chunks(monkeypatch)
+    run_cpu(init_type='batch',max_mem=(8*chain_mem+3*chain.batch_init_memory(INPUT['NK']))/1024/1024)
+    #one batch of all chains, initialized three chains at a time
+    assert chunks == [(0, 3), (3, 6), (6, 8)]
+
+
+def serial_chains(CD_flag, z_max, pcd):
+    chains = new_ensemble(CD_flag)
+    rng.seed(SEED)
+    for i in range(0,NCHAINS):
+        chains.chain_init(i,NK,z_max,pcd)
+    return chains
+
+
+@pytest.mark.parametrize('CD_flag, z_max', [(0, NK), (1, NK), (0, 6)])
+def test_parallel_init_matches_chain_init(CD_flag, z_max):
+    #parallel_init draws the chains of stream_init, their distributions are those of the serial chain_init
+    pcd = p_cd_linear(NK,1.0) if CD_flag else None
+    parallel = new_ensemble(CD_flag)
+    parallel.parallel_init(NK,z_max,SEED,pcd,workers=4)
+    check_chains(parallel,CD_flag,z_max)
+
+    expected = samples(serial_chains(CD_flag,z_max,pcd))
+    result = samples(parallel)
+    for name in ['Z', 'N_first', 'N']:
+        assert same_counts(result[name],expected[name]), name
+    assert stats.ks_2samp(result['Q'],expected['Q']).pvalue > 1e-3
+    if CD_flag:
+        assert stats.ks_2samp(result['tau_CD'],expected['tau_CD']).pvalue > 1e-3
+
+
+def test_parallel_init_does_not_depend_on_workers():
+    pcd = p_cd_linear(NK,1.0)
+    runs = []
+    for workers in [1, 2, 3]:
+        chains = new_ensemble(1,nchains=10)
+        chains.parallel_init(NK,NK,SEED,pcd,workers=workers)
+        runs.append(chains)
+    for chains in runs[1:]:
+        np.testing.assert_array_equal(chains.QN, runs[0].QN)
+        np.testing.assert_array_equal(chains.Z, runs[0].Z)
+        np.testing.assert_array_equal(chains.tau_CD, runs[0].tau_CD)
+
+    #chains of a shard are the chains of the whole ensemble with their ensemble index
+    shard = new_ensemble(1,nchains=4)
+    shard.parallel_init(NK,NK,SEED,pcd,workers=2,first=6)
+    np.testing.assert_array_equal(shard.QN, runs[0].QN[6:10])
+    np.testing.assert_array_equal(shard.tau_CD, runs[0].tau_CD[6:10])
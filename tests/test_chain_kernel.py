@@ -0,0 +1,131 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+import core.chain_kernel as chain_kernel
+from core.chain import ensemble_chains, chain_order
+from core.pcd_tau import p_cd_linear
+
+#chain_kernel.step must keep every chain valid: NK Kuhn steps in 1 <= Z <= NK strands of at least one Kuhn step, free slots of the
+#ring set to 0s, and new_Q flagging the slip-links created since flow was turned off (in chain order, see track_newQ).
+
+NK = 12
+NCHAINS = 6
+MAX_SYNC_TIME = 50.0
+
+
+def init_chains(CD_flag, seed=4):
+    '''
+    Chains of the serial initialization and the arguments of chain_kernel.step for them (counter-based random numbers)
+    '''
+    pcd = p_cd_linear(NK,1.0) if CD_flag else None
+    chains = ensemble_chains({'beta': 1.0, 'CD_flag': CD_flag, 'Nchains': NCHAINS, 'NK': NK})
+    random.seed(seed)
+    for i in range(0,NCHAINS):
+        chains.chain_init(i,NK,z_max=NK,pcd=pcd)
+
+    if CD_flag:
+        pcd_array = np.array([pcd.g, pcd.alpha, pcd.tau_0, pcd.tau_max, pcd.tau_D, 1.0/pcd.tau_D, 1.0*pcd.tau_alpha/pcd.At,
+                              math.pow(pcd.tau_0,pcd.alpha), -1.0/pcd.alpha, pcd.normdt*pcd.tau_alpha/pcd.Adt, pcd.Bdt/pcd.normdt,
+                              -1.0/(pcd.alpha - 1.0), pcd.tau_0**(pcd.alpha - 1.0)],dtype=float)
+        CD_create_prefact = pcd.W_CD_destroy_aver()
+    else:
+        pcd_array = np.zeros(1)
+        CD_create_prefact = 0.0
+
+    size = chains.QN.shape[1]
+    return {'Z': chains.Z, 'QN': chains.QN, 'QN_head': np.zeros(shape=NCHAINS,dtype=np.int64), 'QN_first': np.zeros(shape=(NCHAINS,3)),
+            'tau_CD': chains.tau_CD, 'shift_probs': np.zeros(shape=(NCHAINS,size+1,4)), 'rate_tree': np.zeros(shape=(NCHAINS,0)),
+            'obs': np.zeros(shape=(NCHAINS,0)), 'CD_flag': CD_flag, 'CD_create_prefact': CD_create_prefact,
+            'sum_W_sorted': np.zeros(shape=NCHAINS), 'uniform_rand': np.zeros(shape=(NCHAINS,1)), 'rand_used': np.zeros(shape=NCHAINS,dtype=int),
+            'found_index': np.zeros(shape=NCHAINS,dtype=int), 'found_shift': np.zeros(shape=NCHAINS,dtype=int), 'add_rand': np.zeros(shape=NCHAINS),
+            'new_Q': np.zeros(shape=(NCHAINS,size),dtype=int), 'chain_time': np.zeros(shape=NCHAINS), 'time_compensation': np.zeros(shape=NCHAINS),
+            'tdt': np.zeros(shape=NCHAINS), 't_cr': np.zeros(shape=(NCHAINS,size)), 'f_t': np.zeros(shape=NCHAINS),
+            'tau_CD_used_SD': np.zeros(shape=NCHAINS,dtype=int), 'tau_CD_used_CD': np.zeros(shape=NCHAINS,dtype=int),
+            'tau_CD_gauss_rand_SD': np.zeros(shape=(NCHAINS,1,4)), 'tau_CD_gauss_rand_CD': np.zeros(shape=(NCHAINS,1,4)),
+            'rng_step': np.zeros(shape=NCHAINS,dtype=np.int64), 'pcd_array': pcd_array,
+            'res': np.zeros(shape=(NCHAINS,int(MAX_SYNC_TIME)+1,8)), 'reach_flag': np.zeros(shape=NCHAINS,dtype=int),
+            'write_time': np.zeros(shape=NCHAINS,dtype=int)}
+
+
+def step(c, i, flow_off):
+    chain_kernel.step(i,c['Z'],c['QN'],c['QN_head'],c['QN_first'],NK,False,flow_off,False,np.zeros(9),c['tau_CD'],c['shift_probs'],c['rate_tree'],
+                      c['obs'],c['CD_flag'],c['CD_create_prefact'],1.0,c['sum_W_sorted'],c['uniform_rand'],c['rand_used'],c['found_index'],
+                      c['found_shift'],c['add_rand'],c['new_Q'],c['chain_time'],c['time_compensation'],c['tdt'],c['t_cr'],c['f_t'],
+                      c['tau_CD_used_SD'],c['tau_CD_used_CD'],c['tau_CD_gauss_rand_SD'],c['tau_CD_gauss_rand_CD'],c['rng_step'],17,0,False,
+                      c['pcd_array'],np.zeros(1),np.zeros(1),np.zeros(1),c['res'],1,c['reach_flag'],1e12,MAX_SYNC_TIME,c['write_time'],1.0,
+                      False,0,16,0,2,0)
+
+
+def check_chains(c):
+    QN = chain_order(c['QN'],c['QN_head'])
+    for i in range(0,NCHAINS):
+        tz = int(c['Z'][i])
+        assert 1 <= tz <= NK
+        assert 0 <= c['QN_head'][i] < QN.shape[1]
+        assert np.sum(QN[i,0:tz,3]) == NK
+        assert np.all(QN[i,0:tz,3] >= 1)
+        assert not np.any(QN[i,tz:,:])
+
+
+@pytest.mark.parametrize('CD_flag', [0, 1])
+def test_step_keeps_chains_valid(CD_flag):
+    c = init_chains(CD_flag)
+    jumps = set()
+    check_chains(c)
+    for n in range(0,3000):
+        for i in range(0,NCHAINS):
+            step(c,i,False)
+            jumps.add(int(c['found_shift'][i]))
+        check_chains(c)
+
+    #shuffles, destroys and creates by SD were made (and by CD with CD_flag)
+    assert {0, 1, 3, 5, 6}.issubset(jumps)
+    assert (2 in jumps and 4 in jumps) == bool(CD_flag)
+    assert np.all(c['rng_step'] == 3000)
+    assert np.all(c['chain_time'] > 0.0)
+
+
+@pytest.mark.parametrize('CD_flag', [0, 1])
+def test_step_tracks_new_slip_links(CD_flag):
+    c = init_chains(CD_flag,seed=8)
+    #flags of slip-links 0..Z-2 of each chain, updated with the jump chosen by each step
+    model = [[0]*(int(c['Z'][i])-1) for i in range(0,NCHAINS)]
+    for n in range(0,2000):
+        for i in range(0,NCHAINS):
+            tz = int(c['Z'][i])
+            step(c,i,True)
+            jumpIdx = int(c['found_index'][i])
+            jumpType = int(c['found_shift'][i])
+            if jumpType == 2 or jumpType == 5:
+                model[i].pop(jumpIdx)
+            elif jumpType == 3 or jumpType == 4 or jumpType == 6:
+                model[i].insert(jumpIdx,1)
+            assert int(c['Z'][i])-1 == len(model[i])
+            if jumpType == 3:
+                assert jumpIdx == tz-1
+
+        new_Q = chain_order(c['new_Q'],c['QN_head'])
+        for i in range(0,NCHAINS):
+            assert list(new_Q[i,0:int(c['Z'][i])-1]) == model[i]
+
+    #slip-links were created after flow was turned off
+    assert sum([sum(flags) for flags in model]) > 0
+
+
+@pytest.mark.parametrize('flow_accum', [False, True])
+def test_flow_stress_only_with_flow_accum(flow_accum):
+    #in flow, the stress tensor of each write time is only needed for the flow accumulators
+    c = init_chains(0)
+    c['chain_time'][:] = 0.5
+    for i in range(0,NCHAINS):
+        chain_kernel.time_control(i,c['Z'],c['QN'],c['QN_head'],c['new_Q'],c['QN_first'],NK,c['obs'],c['chain_time'],c['tdt'],c['res'],1,
+                                  True,False,flow_accum,c['reach_flag'],1e12,MAX_SYNC_TIME,c['write_time'],1.0,0)
+
+    assert np.all(c['write_time'] == 1)
+    if flow_accum:
+        np.testing.assert_array_equal(c['res'][:,0,6], c['Z'])
+    else:
+        assert not np.any(c['res'])
@@ -0,0 +1,99 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+import core.chain_tables as chain_tables
+from core.chain import ensemble_chains
+
+#The log-space tables must draw the same Z and strand lengths as the original serial initialization for the same uniform
+#random numbers, and must not overflow for long chains.
+
+def baseline_z(p, beta, tNk):
+    '''
+    Z drawn by ensemble_chains.z_dist of the original serial initialization for the uniform random number p
+    '''
+    y = p/(1+beta)*math.pow(1+(1/beta),tNk)
+    z = 1
+    sum1 = 0.0
+    si = float(1.0/beta)
+    while sum1 < y:
+        sum1 += si
+        si = si/beta*(tNk-z)/z
+        z += 1
+
+    return z-1
+
+
+def baseline_ratio(A, n, i):
+    '''
+    Ratio of binomial coefficients of the original ensemble_chains.ratio
+    '''
+    r = float(i-1)/float(A-n+1)
+    if n > 1:
+        for j in range(0, n-1):
+            r *= (float(A - i + 1 - j) / float(A - j))
+
+    return r
+
+
+def baseline_strand(p, A, i):
+    '''
+    Kuhn steps of strand i drawn by ensemble_chains.N_dist of the original serial initialization for the uniform random number p
+    '''
+    Ntmp = 0
+    sumres = 0.0
+    while (p>=sumres) and (Ntmp != (A-i+2)):
+        Ntmp+=1
+        sumres += baseline_ratio(A, Ntmp, i)
+
+    return Ntmp
+
+
+@pytest.mark.parametrize('Nk', [2, 3, 5, 10, 20, 40])
+@pytest.mark.parametrize('beta', [0.3, 1.0, 3.0])
+def test_sample_z_matches_baseline(Nk, beta):
+    z_cdf, log_fact = chain_tables.build_tables(Nk,beta)
+    for p in np.random.default_rng(Nk).uniform(size=2000):
+        assert chain_tables.sample_z(p,z_cdf,Nk) == baseline_z(p,beta,Nk)
+
+
+@pytest.mark.parametrize('Nk', [2, 5, 12, 25])
+def test_sample_strand_matches_baseline(Nk):
+    z_cdf, log_fact = chain_tables.build_tables(Nk,1.0)
+    log_fact = log_fact.tolist()
+    gen = np.random.default_rng(Nk)
+    for A in range(1,Nk):
+        for i in range(2,A+2):
+            for p in gen.uniform(size=50):
+                assert chain_tables.sample_strand(p,A,i,log_fact) == baseline_strand(p,A,i)
+
+
+def test_sample_z_truncated():
+    z_cdf, log_fact = chain_tables.build_tables(30,0.5)
+    for p in np.random.default_rng(5).uniform(size=500):
+        assert 1 <= chain_tables.sample_z(p,z_cdf,8) <= 8
+
+
+def test_long_chain_tables():
+    #the original z_dist overflows for NK = 5000 and beta = 1 (2**5000)
+    with pytest.raises(OverflowError):
+        baseline_z(0.5,1.0,5000)
+
+    Nk = 5000
+    z_cdf, log_fact = chain_tables.build_tables(Nk,1.0)
+    assert np.all(np.isfinite(z_cdf)) and np.all(np.isfinite(log_fact))
+    assert np.all(np.diff(z_cdf) >= 0.0) and z_cdf[-1] == pytest.approx(1.0)
+
+    #P(Z) ~ binomial(Nk-1,Z-1) for beta = 1, so Z is close to (Nk+1)/2
+    assert abs(chain_tables.sample_z(0.5,z_cdf,Nk) - (Nk+1)/2) < 5
+
+    chains = ensemble_chains({'beta': 1.0, 'CD_flag': 0, 'Nchains': 3, 'NK': Nk})
+    random.seed(7)
+    for m in range(0,3):
+        chains.chain_init(m,Nk,z_max=Nk)
+        tz = int(chains.Z[m])
+        assert 1 <= tz <= Nk
+        assert np.sum(chains.QN[m,0:tz,3]) == Nk
+        assert np.all(chains.QN[m,0:tz,3] >= 1)
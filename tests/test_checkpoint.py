@@ -0,0 +1,57 @@
+import os
+import signal
+
+import pytest
+
+import core.cpu_kernel as cpu_kernel
+
+#A CPU run stopped by SIGTERM writes a checkpoint the next time the random number arrays are refilled. Resumed from the
+#checkpoint, it must write the same results as a run that was not interrupted.
+
+FLOW = {'kappa': [0.0,0.01,0.0,0.0,0.0,0.0,0.0,0.0,0.0], 'flow_time': 300}
+
+
+def read_text(path):
+    with open(path) as f:
+        return f.read()
+
+
+def interrupt_after(patch, ncalls):
+    '''
+    Send SIGTERM to the test process after ncalls calls of cpu_kernel.advance_chains
+    '''
+    advance_chains = cpu_kernel.advance_chains
+    calls = [0]
+
+    def advance(*args):
+        calls[0] += 1
+        if calls[0] == ncalls:
+            os.kill(os.getpid(),signal.SIGTERM)
+        return advance_chains(*args)
+
+    patch.setattr(cpu_kernel,'advance_chains',advance)
+
+
+@pytest.mark.parametrize('input_data, filename, ncalls', [({}, 'Gt_result_1.txt', 3), ({'CD_flag': 1}, 'Gt_result_1.txt', 3),
+                                                         (FLOW, 'stress_1.txt', 100)])
+def test_resumed_run_matches_uninterrupted_run(run_cpu, monkeypatch, input_data, filename, ncalls):
+    expected = run_cpu(input_data,output='full')
+
+    handler = signal.getsignal(signal.SIGTERM)
+    try:
+        #a separate context, undoing the fixture's monkeypatch would leave the temporary directory
+        with monkeypatch.context() as patch:
+            interrupt_after(patch,ncalls)
+            with pytest.raises(SystemExit, match='Checkpoint written'):
+                run_cpu(input_data,output='resumed',save_file='checkpoint.dat')
+
+        checkpoint = os.path.join(os.path.dirname(expected),'resumed','checkpoint.dat')
+        assert os.path.isfile(checkpoint)
+        resumed = run_cpu(input_data,output='resumed',load_file=checkpoint,save_file='checkpoint.dat')
+    finally:
+        signal.signal(signal.SIGTERM,handler)
+
+    assert read_text(os.path.join(resumed,filename)) == read_text(os.path.join(expected,filename))
+    #lifetime distributions are only saved without CD
+    if not input_data.get('CD_flag',0):
+        assert read_text(os.path.join(resumed,'f_dt_1.txt')) == read_text(os.path.join(expected,'f_dt_1.txt'))
@@ -0,0 +1,50 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from conftest import INPUT, read_result
+from core.main import FSM_LINEAR
+
+#With --conv_error, equilibrium runs stop once every time lag up to conv_time has a relative error below conv_error. A stopped
+#run reports the time lags calculated so far (munch: the values of the full run), and a run that never converges writes the
+#results of a run without the convergence check.
+
+LONG = dict(INPUT,sim_time=3000)
+CONV_TIME = 20
+
+
+def test_corr_converged():
+    sim = SimpleNamespace(conv_time=20.0,conv_error=0.1)
+    corr_time = np.array([0.0, 1.0, 10.0, 20.0, 40.0])
+    corr_aver = np.array([0.0, 2.0, 1.0, 0.5, 0.1])
+    corr_error = np.array([1.0, 0.1, 0.05, 0.05, 1.0])
+
+    #the zero lag and lags beyond conv_time are not checked
+    assert FSM_LINEAR.corr_converged(sim,corr_time,corr_aver,corr_error)
+    assert not FSM_LINEAR.corr_converged(sim,corr_time,corr_aver,corr_error*1.5)
+    #every lag up to conv_time must have been calculated
+    assert not FSM_LINEAR.corr_converged(sim,corr_time[0:3],corr_aver[0:3],corr_error[0:3])
+    assert not FSM_LINEAR.corr_converged(sim,corr_time[0:0],corr_aver[0:0],corr_error[0:0])
+
+
+@pytest.mark.parametrize('correlator', ['munch', 'rsvl'])
+def test_run_stops_once_converged(run_cpu, correlator):
+    full = read_result(os.path.join(run_cpu(LONG,output='full',correlator=correlator),'Gt_result_1.txt'))
+    stopped = read_result(os.path.join(run_cpu(LONG,output='stopped',correlator=correlator,conv_error=0.2,conv_time=CONV_TIME),'Gt_result_1.txt'))
+
+    assert stopped[-1,0] >= CONV_TIME and len(stopped) < len(full)
+    np.testing.assert_array_equal(stopped[:,0], full[0:len(stopped),0])
+    if correlator == 'munch':
+        np.testing.assert_array_equal(stopped, full[0:len(stopped)])
+        lags = (stopped[:,0] > 0) & (stopped[:,0] <= CONV_TIME)
+        assert np.all(stopped[lags,2] <= 0.2*np.abs(stopped[lags,1]) + 1e-4)
+
+
+@pytest.mark.parametrize('correlator', ['munch', 'rsvl'])
+def test_run_without_convergence_is_complete(run_cpu, correlator):
+    full = run_cpu(LONG,output='full',correlator=correlator)
+    checked = run_cpu(LONG,output='checked',correlator=correlator,conv_error=1e-9,conv_time=CONV_TIME)
+    with open(os.path.join(full,'Gt_result_1.txt')) as f, open(os.path.join(checked,'Gt_result_1.txt')) as g:
+        assert f.read() == g.read()
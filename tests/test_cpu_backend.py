@@ -0,0 +1,21 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import read_result
+
+#A small CPU run (NK = 10, 8 chains, sim_time = 300, sim_ID 1, MUnCH correlator) is deterministic for a given seed and must
+#reproduce the stored G(t) (tests/data/Gt_reference_CD*.txt, written by the same run with 4 decimals).
+
+DATA = os.path.join(os.path.dirname(__file__),'data')
+
+
+@pytest.mark.parametrize('CD_flag', [0, 1])
+def test_cpu_run_matches_reference(run_cpu, CD_flag):
+    output_dir = run_cpu({'CD_flag': CD_flag})
+    result = read_result(os.path.join(output_dir,'Gt_result_1.txt'))
+    reference = read_result(os.path.join(DATA,'Gt_reference_CD%d.txt'%CD_flag))
+
+    assert result.shape == reference.shape
+    np.testing.assert_allclose(result, reference, rtol=0.0, atol=2e-4)
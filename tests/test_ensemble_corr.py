@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from core.main import FSM_LINEAR
+
+#With --ensemble_corr, the correlator sums of all chains are added to ensemble sums during the run. The ensemble sums must be
+#the sums over chains of the correlator sums of a run without it.
+
+
+def correlator_sums(run_cpu, monkeypatch, correlator, EQ_calc, ensemble_corr):
+    '''
+    Arrays passed to the rsvl (C, N of each time lag) or munch (data_corr) averages at the end of a run
+    '''
+    sums = []
+    rsvl_average = FSM_LINEAR.rsvl_average
+    munch_average = FSM_LINEAR.munch_average
+
+    def rsvl(self, C, N):
+        sums.append(np.stack([np.array(C),np.array(N)]))
+        return rsvl_average(self,C,N)
+
+    def munch(self, data_corr):
+        sums.append(np.array(data_corr))
+        return munch_average(self,data_corr)
+
+    #a separate context, undoing the fixture's monkeypatch would leave the temporary directory
+    with monkeypatch.context() as patch:
+        patch.setattr(FSM_LINEAR,'rsvl_average',rsvl)
+        patch.setattr(FSM_LINEAR,'munch_average',munch)
+        run_cpu({'EQ_calc': EQ_calc},output='ensemble' if ensemble_corr else 'chains',correlator=correlator,ensemble_corr=ensemble_corr)
+    if correlator == 'rsvl':
+        return np.stack(sums) #(time lags, C/N, parts)
+    return sums[0] #(parts, time lags, aver/error)
+
+
+@pytest.mark.parametrize('correlator', ['munch', 'rsvl'])
+@pytest.mark.parametrize('EQ_calc', ['stress', 'msd'])
+def test_ensemble_sums_match_chain_sums(run_cpu, monkeypatch, correlator, EQ_calc):
+    chains = correlator_sums(run_cpu,monkeypatch,correlator,EQ_calc,False)
+    ensemble = correlator_sums(run_cpu,monkeypatch,correlator,EQ_calc,True)
+
+    axis = 2 if correlator == 'rsvl' else 0
+    assert chains.shape[axis] == 8
+    expected = np.sum(chains,axis=axis)
+    result = np.sum(ensemble,axis=axis) #one set of sums per CPU worker
+    assert result.shape == expected.shape and np.count_nonzero(expected) > expected.size//2
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=0.0)
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import core.cpu_correlation as cpu_correlation
+import core.fft_correlation as fft_correlation
+from core.correlation import p, m, MULTI_STRESS
+
+#The FFT correlation engine (--fft_corr) must give the averages and errors of the MUnCH correlator of the CPU backend for the same
+#result block, for G(t) from tau_xy or from the MULTI_STRESS components and for the MSD.
+
+NCHAINS = 5
+NUM_TIME_SYNCS = 3
+SIM_TIME = 1e6
+
+
+def raw_block(ncols, nrows=300, seed=2):
+    '''
+    Result block of NCHAINS chains with correlated values (stress components or CoM random walks)
+    '''
+    gen = np.random.default_rng(seed)
+    noise = gen.normal(0.0,1.0,size=(NCHAINS,nrows,ncols))
+    data = np.copy(noise)
+    for r in range(1,nrows):
+        data[:,r,:] = 0.8*data[:,r-1,:] + noise[:,r,:]
+    return data
+
+
+def cpu_corr(rawdata, calc_type, corrLevel, last_index, nparts):
+    '''
+    Averages and errors of cpu_correlation.calc_corr (nparts rows of ensemble sums, or one row per chain)
+    '''
+    count = 200
+    data_corr = np.zeros(shape=(nparts,count,2),dtype=float)
+    corr_array = np.zeros(shape=(nparts,rawdata.shape[1]),dtype=float)
+    array_index = np.ones(shape=NCHAINS,dtype=np.int64)*-1
+    cpu_correlation.calc_corr(rawdata,np.array([calc_type]),NUM_TIME_SYNCS,corrLevel,data_corr,corr_array,array_index,last_index,
+                              np.array([1.0]),SIM_TIME)
+    return data_corr[:,0:array_index[0]+1,:]
+
+
+def fft_corr(rawdata, calc_type, corrLevel, last_index, nrows):
+    '''
+    Averages and errors of fft_correlation.calc_corr (nrows = 1 for ensemble sums)
+    '''
+    count = 200
+    data_corr = np.zeros(shape=(nrows,count,2),dtype=float)
+    array_index = np.ones(shape=NCHAINS,dtype=np.int64)*-1
+    fft_correlation.calc_corr(rawdata,calc_type,NUM_TIME_SYNCS,corrLevel,data_corr,array_index,last_index,1.0,SIM_TIME)
+    return data_corr[:,0:array_index[0]+1,:]
+
+
+@pytest.mark.parametrize('calc_type, ncols', [(1, 1), (1, MULTI_STRESS), (2, 3)])
+@pytest.mark.parametrize('corrLevel', [0, 1, 2])
+@pytest.mark.parametrize('last_index', [256, 200])
+def test_fft_corr_matches_cpu_corr(calc_type, ncols, corrLevel, last_index):
+    rawdata = raw_block(ncols)
+    expected = cpu_corr(rawdata,calc_type,corrLevel,last_index,NCHAINS)
+    result = fft_corr(rawdata,calc_type,corrLevel,last_index,NCHAINS)
+
+    assert result.shape == expected.shape and result.shape[1] > 0
+    np.testing.assert_allclose(result[:,:,0], expected[:,:,0], rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(result[:,:,1], expected[:,:,1], rtol=1e-7, atol=1e-9)
+
+
+@pytest.mark.parametrize('calc_type, ncols', [(1, 1), (2, 3)])
+def test_fft_corr_ensemble_sums(calc_type, ncols):
+    rawdata = raw_block(ncols)
+    expected = cpu_corr(rawdata,calc_type,1,256,NCHAINS)
+    sums = fft_corr(rawdata,calc_type,1,256,1)
+
+    np.testing.assert_allclose(sums[0], np.sum(expected,axis=0), rtol=1e-7, atol=1e-9)
+
+
+def test_block_lags_order():
+    #lags of each level in the order of cpu_correlation.calc_corr
+    assert list(fft_correlation.block_lags(0,NUM_TIME_SYNCS,1.0,SIM_TIME)) == list(range(0,p*m))
+    assert list(fft_correlation.block_lags(1,NUM_TIME_SYNCS,1.0,SIM_TIME)) == list(range(p,p*m,1))
+    assert list(fft_correlation.block_lags(3,NUM_TIME_SYNCS,1.0,SIM_TIME)) == [int(j/m**(NUM_TIME_SYNCS-1)) for j in range(p*m**3,p*m**4,m**3)]
@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pytest
+
+import core.chain_kernel as chain_kernel
+from conftest import read_result
+from test_chain_kernel import init_chains, step, NCHAINS, NK
+
+#With --incremental_obs, the stress tensor and center of mass of each chain are summed once per kernel call and then updated by
+#each jump. After any number of jumps they must equal a sum over all strands, and runs must record the same G(t) and MSD.
+
+
+def recomputed(c):
+    obs = np.zeros(shape=(NCHAINS,9),dtype=float)
+    for i in range(0,NCHAINS):
+        chain_kernel.calc_observables(i,c['Z'],c['QN'],c['QN_head'],c['QN_first'],NK,obs)
+    return obs
+
+
+@pytest.mark.parametrize('CD_flag', [0, 1])
+def test_incremental_observables_match_recompute(CD_flag):
+    c = init_chains(CD_flag,seed=5)
+    c['obs'] = recomputed(c)
+    jumps = set()
+    for n in range(0,3000):
+        for i in range(0,NCHAINS):
+            step(c,i,False)
+            jumps.add(int(c['found_shift'][i]))
+        if n % 100 == 99:
+            np.testing.assert_allclose(c['obs'], recomputed(c), rtol=1e-9, atol=1e-9)
+
+    #all jump types changed the observables
+    assert {0, 1, 3, 5, 6}.issubset(jumps)
+    #the center of mass columns are those of chain_com
+    for i in range(0,NCHAINS):
+        np.testing.assert_allclose(c['obs'][i,6:9], chain_kernel.chain_com(i,c['Z'],c['QN'],c['QN_head'],c['QN_first'],NK), rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize('correlator', ['munch', 'rsvl'])
+@pytest.mark.parametrize('EQ_calc, filename', [('stress', 'Gt_result_1.txt'), ('msd', 'MSD_result_1.txt')])
+def test_incremental_run_matches_recompute(run_cpu, correlator, EQ_calc, filename):
+    expected = read_result(os.path.join(run_cpu({'EQ_calc': EQ_calc},output='sums',correlator=correlator),filename))
+    result = read_result(os.path.join(run_cpu({'EQ_calc': EQ_calc},output='incremental',correlator=correlator,incremental_obs=True),filename))
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, rtol=0.0, atol=2e-4)
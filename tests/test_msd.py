@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import core.fileio as fileio
+import core.msd as msd
+
+#calc_msd reads blocks of chains that fit in max_mem from a CoM raw data file and must give the MSD over all pairs of time
+#points of each lag, averaged over chains, for any block size.
+
+NCHAINS = 9
+
+
+def com_file(path, seed=12):
+    '''
+    CoM random walks of NCHAINS chains written as two time syncs (rows 0-63 spaced by 1, rows 32-47 of the next sync spaced by 2)
+    '''
+    gen = np.random.default_rng(seed)
+    walk = np.cumsum(gen.normal(size=(NCHAINS,96,3)),axis=1)
+    fileio.write_rawdata(path,1,0,walk[:,0:64],2,1.0)
+    fileio.write_rawdata(path,2,32,walk[:,64:80],2,1.0)
+    return path
+
+
+def numpy_msd(time_array, com, lag):
+    '''
+    MSD of each chain over all pairs of points lag apart (com has shape (nchains, points, 3))
+    '''
+    pairs = [(i, j) for i in range(0,len(time_array)) for j in range(i,len(time_array)) if abs(time_array[j]-time_array[i]-lag) < 1e-9]
+    if len(pairs) == 0:
+        return None
+    return np.mean([np.sum((com[:,j]-com[:,i])**2,axis=1) for i, j in pairs],axis=0)
+
+
+@pytest.mark.parametrize('max_mem', [None, 1, 4*80*3*8*4])
+def test_calc_msd_matches_numpy(tmp_path, max_mem):
+    path = com_file(str(tmp_path/'CoM_1.dat'))
+    info, time_array, segments = fileio.load_rawdata(path)
+    com = fileio.rawdata_chains(segments,0,NCHAINS)
+
+    lags, result, error = msd.calc_msd(path,max_mem=max_mem)
+    assert len(lags) > 10 and lags[0] == 0.0
+    for k in range(0,len(lags)):
+        chain_msd = numpy_msd(time_array,com,lags[k])
+        np.testing.assert_allclose(result[k], np.mean(chain_msd), rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(error[k], np.std(chain_msd)/np.sqrt(NCHAINS), rtol=1e-9, atol=1e-12)
+
+    #lags without pairs are nan
+    lags, result, error = msd.calc_msd(path,lags=[1.0,3.5,200.0])
+    assert not np.isnan(result[0]) and np.isnan(result[1]) and np.isnan(result[2])
+
+
+@pytest.mark.parametrize('max_mem, block_size', [(1, 1), (4*80*3*8*4, 4), (4*80*3*8*4+1, 4), (1e12, NCHAINS)])
+def test_calc_msd_block_size(tmp_path, monkeypatch, max_mem, block_size):
+    #blocks hold at most max_mem/(4 copies of a trajectory) chains
+    path = com_file(str(tmp_path/'CoM_1.dat'))
+    rawdata_chains = fileio.rawdata_chains
+    blocks = []
+
+    def read_block(segments, first, last, npoints=None):
+        values = rawdata_chains(segments,first,last,npoints)
+        blocks.append(values.shape[0])
+        return values
+
+    monkeypatch.setattr(fileio,'rawdata_chains',read_block)
+    msd.calc_msd(path,max_mem=max_mem)
+
+    assert max(blocks) == block_size and sum(blocks) == NCHAINS
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+import core.chain_kernel as chain_kernel
+import core.cpu_correlation as cpu_correlation
+from core.correlation import p, MULTI_STRESS
+
+#With --multi_stress, G(t) is the average autocorrelation of the five independent components of the traceless stress tensor.
+#For an isotropic ensemble each of them has the autocorrelation of tau_xy, so their average must equal the tau_xy
+#correlation averaged over all orientations of the chains, and the correlators must average the per-component correlations.
+
+NCHAINS = 3
+SIZE = 12
+Z = 9
+
+
+def chain_conformations(seed=4):
+    '''
+    Strand vectors of NCHAINS chains at two times (the second one correlated with the first) in ring storage with QN_head > 0
+    '''
+    gen = np.random.default_rng(seed)
+    N = gen.integers(1,6,size=(NCHAINS,Z)).astype(float)
+    Q = gen.normal(size=(NCHAINS,Z,3))*np.sqrt(N/3.0)[:,:,None]
+    Q_lag = 0.9*Q + 0.3*gen.normal(size=(NCHAINS,Z,3))*np.sqrt(N/3.0)[:,:,None]
+    QN_head = np.array([0, 5, SIZE-1],dtype=np.int64)
+    conformations = []
+    for vectors in [Q, Q_lag]:
+        QN = np.zeros(shape=(NCHAINS,SIZE,4),dtype=float)
+        for i in range(0,NCHAINS):
+            for j in range(0,Z):
+                s = (QN_head[i]+j)%SIZE
+                QN[i,s,0:3] = vectors[i,j]
+                QN[i,s,3] = N[i,j]
+        conformations.append(QN)
+    return N, [Q, Q_lag], conformations, QN_head
+
+
+def recorded_stress(QN, QN_head, ncomp):
+    result = np.zeros(shape=(NCHAINS,1,ncomp),dtype=float)
+    for i in range(0,NCHAINS):
+        chain_kernel.equilibrium_stress(i,np.full(NCHAINS,Z),QN,QN_head,result,0,ncomp)
+    return result[:,0,:]
+
+
+def random_rotations(n, seed=9):
+    '''
+    Rotation matrices uniformly distributed over SO(3) (QR decomposition of Gaussian matrices with the sign convention fixed)
+    '''
+    gen = np.random.default_rng(seed)
+    q, r = np.linalg.qr(gen.normal(size=(n,3,3)))
+    q = q*np.sign(np.diagonal(r,axis1=1,axis2=2))[:,None,:]
+    q[np.linalg.det(q) < 0,:,0] *= -1.0
+    return q
+
+
+def test_component_average_matches_isotropic_tau_xy():
+    N, vectors, conformations, QN_head = chain_conformations()
+    stress = [recorded_stress(QN,QN_head,MULTI_STRESS) for QN in conformations]
+    multi = np.mean(stress[0]*stress[1],axis=1)
+
+    #tau_xy correlation of the chains rotated by random rotations
+    R = random_rotations(200000)
+    xy = []
+    for Q in vectors:
+        rotated = np.einsum('rab,izb->riza',R,Q)
+        xy.append(-np.sum(3.0*rotated[:,:,:,0]*rotated[:,:,:,1]/N[None,:,:],axis=2))
+    isotropic = np.mean(xy[0]*xy[1],axis=0)
+
+    assert np.all(np.abs(multi) > 1.0)
+    np.testing.assert_allclose(multi, isotropic, rtol=0.02)
+
+
+@pytest.mark.parametrize('ncomp', [1, 3])
+def test_first_component_is_tau_xy(ncomp):
+    N, vectors, conformations, QN_head = chain_conformations()
+    stress = recorded_stress(conformations[0],QN_head,MULTI_STRESS)
+    np.testing.assert_allclose(recorded_stress(conformations[0],QN_head,ncomp), stress[:,0:ncomp], rtol=1e-12)
+    np.testing.assert_allclose(stress[:,0], -np.sum(3.0*vectors[0][:,:,0]*vectors[0][:,:,1]/N,axis=1), rtol=1e-12)
+
+
+def stress_stream(nrows, seed=2):
+    '''
+    Correlated values of the MULTI_STRESS components of each chain, all flagged for the correlator
+    '''
+    gen = np.random.default_rng(seed)
+    values = gen.normal(size=(NCHAINS,nrows,MULTI_STRESS))
+    for r in range(1,nrows):
+        values[:,r,:] += 0.7*values[:,r-1,:]
+    return np.concatenate((values,np.ones(shape=(NCHAINS,nrows,1))),axis=2)
+
+
+def rsvl_sums(stream, ncomp):
+    S_corr = 5
+    D = np.zeros(shape=(NCHAINS,S_corr,p,ncomp),dtype=float)
+    H = np.zeros(shape=(NCHAINS,S_corr),dtype=np.int64)
+    C = np.zeros(shape=(NCHAINS,S_corr,p),dtype=float)
+    N = np.zeros(shape=(NCHAINS,S_corr,p),dtype=float)
+    A = np.zeros(shape=(NCHAINS,S_corr,ncomp),dtype=float)
+    M = np.zeros(shape=(NCHAINS,S_corr),dtype=np.int64)
+    for b in range(0,stream.shape[1]//250):
+        cpu_correlation.update_correlator(250,np.ascontiguousarray(stream[:,b*250:(b+1)*250]),D,H,C,N,A,M,np.array([1]))
+    return C, N
+
+
+def test_rsvl_averages_component_correlations():
+    stream = stress_stream(1000)
+    C, N = rsvl_sums(stream,MULTI_STRESS)
+    components = [rsvl_sums(stream[:,:,[k,MULTI_STRESS]],1) for k in range(0,MULTI_STRESS)]
+
+    for C_k, N_k in components:
+        np.testing.assert_array_equal(N_k, N)
+    np.testing.assert_allclose(C, np.mean([C_k for C_k, N_k in components],axis=0), rtol=1e-12, atol=1e-12)
+
+
+def test_munch_averages_component_correlations():
+    stream = stress_stream(300)[:,:,0:MULTI_STRESS]
+    lags = [0, 1, 5, 40]
+
+    def munch(data):
+        corr = np.zeros(shape=(NCHAINS,len(lags),2),dtype=float)
+        for i in range(0,NCHAINS):
+            for k in range(0,len(lags)):
+                cpu_correlation.corr_block(i,np.ascontiguousarray(data[i]),lags[k],corr,k,np.zeros(data.shape[1]),1)
+        return corr[:,:,0]
+
+    components = [munch(stream[:,:,[k]]) for k in range(0,MULTI_STRESS)]
+    np.testing.assert_allclose(munch(stream), np.mean(components,axis=0), rtol=1e-12, atol=1e-12)
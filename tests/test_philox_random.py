@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import core.philox_random as philox_random
+
+#philox4x32 must give the Philox4x32-10 known-answer vectors of Random123 (kat_vectors), and random numbers keyed on
+#(seed, chain_offset+i, step) must not depend on how the ensemble is split into shards, batches or worker blocks.
+
+KAT = [((0x00000000,0x00000000,0x00000000,0x00000000), (0x00000000,0x00000000), (0x6627e8d5,0xe169c58d,0xbc57ac4c,0x9b00dbd8)),
+       ((0xffffffff,0xffffffff,0xffffffff,0xffffffff), (0xffffffff,0xffffffff), (0x408f276d,0x41c83b0e,0xa20bc7c6,0x6d5451fd)),
+       ((0x243f6a88,0x85a308d3,0x13198a2e,0x03707344), (0xa4093822,0x299f31d0), (0xd16cfe09,0x94fdcceb,0x5001e420,0x24126ea1))]
+
+NCHAINS = 10
+NSTEPS = 40
+SEED = 3*NCHAINS
+
+
+@pytest.mark.parametrize('counter, key, expected', KAT)
+def test_philox4x32_known_answers(counter, key, expected):
+    result = philox_random.philox4x32(counter[0],counter[1],counter[2],counter[3],key[0],key[1])
+    assert tuple([int(x) for x in result]) == expected
+
+
+def draws(first, last):
+    '''
+    Jump and slip-link random numbers of chains first to last-1 of the ensemble, drawn as chains 0 to last-first-1 of a part
+    starting at chain_offset = first
+    '''
+    nchains = last-first
+    uniform = np.zeros(shape=(nchains,NSTEPS))
+    gauss = np.zeros(shape=(nchains,NSTEPS,4))
+    gauss_rand = np.zeros(shape=(nchains,1,4))
+    for i in range(0,nchains):
+        for n in range(0,NSTEPS):
+            uniform[i,n] = philox_random.philox_uniform(SEED,first+i,n)
+            philox_random.philox_gauss_tauCD(SEED,i,first+i,n,False,True,0,gauss_rand,np.zeros(1),np.zeros(1),np.zeros(1),np.zeros(1))
+            gauss[i,n] = gauss_rand[i,0]
+    return uniform, gauss
+
+
+@pytest.mark.parametrize('bounds', [[0, 10], [0, 3, 10], [0, 1, 2, 7, 10], [0, 5, 6, 10]])
+def test_draws_do_not_depend_on_partition(bounds):
+    uniform, gauss = draws(0,NCHAINS)
+    parts = [draws(bounds[k],bounds[k+1]) for k in range(0,len(bounds)-1)]
+
+    np.testing.assert_array_equal(np.concatenate([part[0] for part in parts],axis=0), uniform)
+    np.testing.assert_array_equal(np.concatenate([part[1] for part in parts],axis=0), gauss)
+
+
+def test_draws_are_distinct():
+    uniform, gauss = draws(0,NCHAINS)
+    assert np.all(uniform > 0.0) and np.all(uniform <= 1.0)
+    assert len(np.unique(uniform)) == uniform.size
+    assert len(np.unique(gauss[:,:,0:3])) == gauss[:,:,0:3].size
+
+    #the step counter uses 64 bits (two counter words)
+    assert philox_random.philox_uniform(SEED,0,1) != philox_random.philox_uniform(SEED,0,1+(1 << 32))
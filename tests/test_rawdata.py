@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pytest
+
+import core.fileio as fileio
+from core.correlation import m
+
+#Raw data files hold one segment per time sync with the values stored chain by chain, and the header gives the number of chains,
+#the values per chain and the time grid. Memory-mapped blocks of chains must return the values that were written.
+
+NCHAINS = 7
+TIME_RES = 2.0
+
+
+def sync_values(ncomp, seed=5):
+    '''
+    Values of the first three syncs (first rows 0, 32 and 32, as written by main.py with p*g = 32)
+    '''
+    gen = np.random.default_rng(seed)
+    return [(0, gen.normal(size=(NCHAINS,64,ncomp))), (32, gen.normal(size=(NCHAINS,32,ncomp))), (32, gen.normal(size=(NCHAINS,20,ncomp)))]
+
+
+def write_file(path, syncs, calc_type):
+    for num_sync, (first_row, data) in enumerate(syncs):
+        fileio.write_rawdata(path,num_sync+1,first_row,data,calc_type,TIME_RES)
+    return path
+
+
+@pytest.mark.parametrize('calc_type, ncomp', [(1, 1), (1, 5), (2, 3)])
+def test_rawdata_round_trip(tmp_path, calc_type, ncomp):
+    syncs = sync_values(ncomp)
+    path = write_file(str(tmp_path/'raw.dat'),syncs,calc_type)
+    info, time_array, segments = fileio.load_rawdata(path)
+
+    assert info == {'nchains': NCHAINS, 'ncomp': ncomp, 'calc_type': calc_type, 'm': m, 'time_res': TIME_RES}
+    expected_time = np.concatenate([(first_row+np.arange(data.shape[1]))*m**level*TIME_RES for level, (first_row, data) in enumerate(syncs)])
+    np.testing.assert_array_equal(time_array, expected_time)
+
+    values = np.concatenate([data for first_row, data in syncs],axis=1)
+    assert all([isinstance(segment,np.memmap) for segment in segments])
+    np.testing.assert_array_equal(fileio.rawdata_chains(segments,0,NCHAINS), values)
+    np.testing.assert_array_equal(fileio.rawdata_chains(segments,2,5), values[2:5])
+    np.testing.assert_array_equal(fileio.rawdata_chains(segments,5,NCHAINS+3), values[5:])
+    np.testing.assert_array_equal(fileio.rawdata_chains(segments,1,4,npoints=70), values[1:4,0:70])
+    assert fileio.rawdata_chains(segments,1,4,npoints=0).shape == (3,0,ncomp)
+
+
+def test_rawdata_chains_are_contiguous(tmp_path):
+    #in each segment, the values of a chain follow each other in the file
+    syncs = sync_values(3)
+    path = write_file(str(tmp_path/'raw.dat'),syncs,2)
+    info, time_array, segments = fileio.load_rawdata(path)
+
+    first = segments[0]
+    assert first.offset == fileio.RAWDATA_HEADER_SIZE + fileio.RAWDATA_SEGMENT_HEADER_SIZE
+    assert first.strides == (64*3*8, 3*8, 8)
+    raw = np.fromfile(path,dtype=np.float64,count=64*3,offset=first.offset + 64*3*8)
+    np.testing.assert_array_equal(raw.reshape(64,3), syncs[0][1][1])
+
+
+def test_rawdata_truncated_segment_is_ignored(tmp_path):
+    #a sync that was not completely written (or written after a checkpoint) is not read
+    syncs = sync_values(1)
+    path = write_file(str(tmp_path/'raw.dat'),syncs,1)
+    size = os.path.getsize(path)
+    with open(path,'r+') as f:
+        f.truncate(size-8)
+    info, time_array, segments = fileio.load_rawdata(path)
+
+    assert len(segments) == 2 and len(time_array) == 96
+    np.testing.assert_array_equal(fileio.rawdata_chains(segments,0,NCHAINS), np.concatenate([syncs[0][1],syncs[1][1]],axis=1))
+
+
+def test_stress_rawdata_to_text(tmp_path):
+    syncs = sync_values(1)
+    path = write_file(str(tmp_path/'raw.dat'),syncs,1)
+    fileio.stress_rawdata_to_text(path,str(tmp_path/'raw.txt'),block_size=10)
+    text = np.loadtxt(str(tmp_path/'raw.txt'),delimiter=',',skiprows=1)
+
+    info, time_array, segments = fileio.load_rawdata(path)
+    np.testing.assert_allclose(text[:,0], time_array)
+    np.testing.assert_allclose(text[:,1:], np.transpose(fileio.rawdata_chains(segments,0,NCHAINS)[:,:,0]), atol=1e-8)
+
+
+def test_old_rawdata_format_is_rejected(tmp_path):
+    path = str(tmp_path/'old.dat')
+    with open(path,'wb') as f:
+        f.write(fileio.RAWDATA_OLD_MAGIC + bytes(fileio.RAWDATA_HEADER_SIZE-8))
+    with pytest.raises(SystemExit, match='time-major'):
+        fileio.load_rawdata(path)
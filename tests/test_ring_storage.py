@@ -0,0 +1,230 @@
+import math
+
+import numpy as np
+import pytest
+
+import core.chain_kernel as chain_kernel
+from core.chain import chain_order
+
+#The strands of a chain are stored in a ring of slots starting at QN_head (see chain_kernel.ring_index). For any sequence of jumps,
+#the ring must hold the strands, slip-links and creation times of the original storage, where strand j is in slot j and strands
+#are shifted through the array when a slip-link is created or destroyed (shift_* functions below).
+
+NK = 12
+SIZE = NK+1
+
+
+def shift_apply_shuffle(jumpIdx, jumpType, QN):
+    if jumpType == 0:
+        QN[jumpIdx,3] += 1
+        QN[jumpIdx+1,3] -= 1
+    elif jumpType == 1:
+        QN[jumpIdx,3] -= 1
+        QN[jumpIdx+1,3] += 1
+
+
+def shift_strands_left(start, tz, QN, t_cr, tau_CD):
+    for j in range(start,tz-1):
+        QN[j,:] = QN[j+1,:]
+        t_cr[j] = t_cr[j+1]
+        tau_CD[j] = tau_CD[j+1]
+
+
+def shift_strands_right(start, tz, QN, t_cr, tau_CD):
+    for j in range(tz,start,-1):
+        QN[j,:] = QN[j-1,:]
+        t_cr[j] = t_cr[j-1]
+        tau_CD[j] = tau_CD[j-1]
+
+
+def shift_apply_destroy(jumpIdx, QN, QN_first, state, t_cr, tau_CD, chain_time):
+    '''
+    apply_destroy of the shift-based storage (state holds Z and f_t of the chain)
+    '''
+    tz = state['Z']
+    cr_time = t_cr[jumpIdx]
+    state['Z'] -= 1
+    if cr_time != 0:
+        state['f_t'] = math.log10(chain_time - cr_time) + 10
+
+    if jumpIdx == 0:
+        QN_first[0:3] += QN[jumpIdx+1,0:3]
+        N = QN[jumpIdx,3] + QN[jumpIdx+1,3]
+        shift_strands_left(jumpIdx, tz, QN, t_cr, tau_CD)
+        QN[jumpIdx,0:3] = 0.0
+        QN[jumpIdx,3] = N
+        QN[tz-1,:] = 0.0
+    elif jumpIdx == tz-2:
+        QN[jumpIdx,3] = QN[jumpIdx,3] + QN[jumpIdx+1,3]
+        QN[jumpIdx,0:3] = 0.0
+        t_cr[jumpIdx] = tau_CD[jumpIdx] = 0.0
+        QN[jumpIdx+1,:] = 0.0
+        t_cr[jumpIdx+1] = tau_CD[jumpIdx+1] = 0.0
+    else:
+        Q = QN[jumpIdx,:] + QN[jumpIdx+1,:]
+        shift_strands_left(jumpIdx, tz, QN, t_cr, tau_CD)
+        QN[jumpIdx,:] = Q
+        QN[tz-1,:] = 0.0
+
+
+def shift_apply_create_SD(jumpIdx, jumpType, QN, QN_first, state, t_cr, tau_CD, chain_time, gauss, tCD):
+    tz = state['Z']
+    state['Z'] += 1
+    new_N = QN[jumpIdx,3] - 1.0
+    sigma = 0.0 if tz == 1 else math.sqrt(new_N / 3.0)
+    Q = np.array(gauss)*sigma
+
+    if jumpType == 3:
+        QN[jumpIdx+1,0:3] = 0.0
+        QN[jumpIdx+1,3] = 1.0
+        t_cr[jumpIdx+1] = tau_CD[jumpIdx+1] = 0.0
+        QN[jumpIdx,0:3] = Q
+        QN[jumpIdx,3] = new_N
+        tau_CD[jumpIdx] = tCD
+        t_cr[jumpIdx] = chain_time
+    elif jumpType == 6:
+        shift_strands_right(jumpIdx, tz, QN, t_cr, tau_CD)
+        QN[jumpIdx+1,0:3] = Q
+        QN[jumpIdx+1,3] = new_N
+        QN[jumpIdx,3] = 1.0
+        QN[jumpIdx,0:3] = 0.0
+        t_cr[jumpIdx] = chain_time
+        tau_CD[jumpIdx] = tCD
+        QN_first[0:3] -= Q
+
+
+def shift_apply_create_CD(jumpIdx, QN, QN_first, state, t_cr, tau_CD, add_rand, gauss, tCD):
+    tz = state['Z']
+    state['Z'] += 1
+    Q1 = np.copy(QN[jumpIdx,0:3])
+    N1 = QN[jumpIdx,3]
+    new_N = math.floor(0.5 + add_rand * (N1 - 2.0)) + 1.0
+    sigma = math.sqrt(float(new_N * (N1 - new_N)) / float(3.0 * N1))
+    if jumpIdx == tz-1:
+        sigma = math.sqrt(new_N / 3.0)
+    ratio_N = new_N / N1
+
+    shift_strands_right(jumpIdx, tz, QN, t_cr, tau_CD)
+
+    if jumpIdx == 0:
+        N2 = N1 - new_N
+        sigma = math.sqrt(N2 / 3.0)
+        QN[jumpIdx+1,0:3] = np.array(gauss)*sigma
+        QN[jumpIdx+1,3] = N2
+        QN[jumpIdx,3] = new_N
+        QN[jumpIdx,0:3] = 0.0
+        tau_CD[jumpIdx] = tCD
+        t_cr[jumpIdx] = 0.0
+        QN_first[0:3] -= QN[jumpIdx+1,0:3]
+        return
+
+    #same operation order as the kernel, so both storages round the same way
+    Q = np.array([gauss[k]*sigma + Q1[k]*ratio_N for k in range(0,3)])
+    QN[jumpIdx+1,0:3] = Q1 - Q
+    QN[jumpIdx+1,3] = N1 - new_N
+    QN[jumpIdx,0:3] = Q
+    QN[jumpIdx,3] = new_N
+    if jumpIdx == tz-1:
+        QN[jumpIdx+1,0:3] = 0.0
+    tau_CD[jumpIdx] = tCD
+    t_cr[jumpIdx] = 0
+
+
+def random_jump(gen, QN, tz):
+    '''
+    Jump type and index that keep the chain valid (strands of at least one Kuhn step, at most NK strands)
+    '''
+    while True:
+        jumpType = int(gen.integers(0,7))
+        if jumpType <= 1 and tz > 1:
+            jumpIdx = int(gen.integers(0,tz-1))
+            if QN[jumpIdx+1-jumpType,3] > 1:
+                return jumpType, jumpIdx
+        elif (jumpType == 2 or jumpType == 5) and tz > 1:
+            return jumpType, int(gen.integers(0,tz-1))
+        elif jumpType == 3 and tz < NK and QN[tz-1,3] > 1:
+            return jumpType, tz-1
+        elif jumpType == 6 and tz < NK and QN[0,3] > 1:
+            return jumpType, 0
+        elif jumpType == 4 and tz < NK:
+            jumpIdx = int(gen.integers(0,tz))
+            if QN[jumpIdx,3] > 1:
+                return jumpType, jumpIdx
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3, 4])
+@pytest.mark.parametrize('head', [0, 5, SIZE-1])
+def test_ring_matches_shift_storage(seed, head):
+    gen = np.random.default_rng(seed)
+
+    #shift-based chain: 4 strands with random Q, NK Kuhn steps
+    QN_shift = np.zeros(shape=(SIZE,4),dtype=float)
+    QN_shift[0:4,3] = [3.0, 4.0, 2.0, 3.0]
+    QN_shift[1:3,0:3] = gen.normal(0.0,1.0,size=(2,3))
+    t_cr_shift = np.zeros(shape=SIZE,dtype=float)
+    tau_CD_shift = np.zeros(shape=SIZE,dtype=float)
+    tau_CD_shift[0:3] = gen.uniform(size=3)
+    QN_first_shift = np.zeros(shape=3,dtype=float)
+    state = {'Z': 4, 'f_t': 0.0}
+
+    #ring chain (chain 1 of 2) with the same strands starting at slot head
+    QN = np.zeros(shape=(2,SIZE,4),dtype=float)
+    t_cr = np.zeros(shape=(2,SIZE),dtype=float)
+    tau_CD = np.zeros(shape=(2,SIZE),dtype=float)
+    QN_head = np.array([0,head],dtype=np.int64)
+    for j in range(0,SIZE):
+        s = chain_kernel.ring_index(head,j,SIZE)
+        QN[1,s,:] = QN_shift[j,:]
+        tau_CD[1,s] = tau_CD_shift[j]
+    QN_first = np.zeros(shape=(2,3),dtype=float)
+    Z = np.array([1.0,4.0])
+    f_t = np.zeros(shape=2,dtype=float)
+    chain_time = np.zeros(shape=2,dtype=float)
+
+    for n in range(0,2000):
+        chain_time[1] += gen.uniform(0.1,1.0)
+        tz = state['Z']
+        jumpType, jumpIdx = random_jump(gen,QN_shift,tz)
+        gauss = tuple(gen.normal(0.0,1.0,size=3))
+        tCD = gen.uniform()
+        add_rand = gen.uniform()
+
+        if jumpType <= 1:
+            shift_apply_shuffle(jumpIdx,jumpType,QN_shift)
+            chain_kernel.apply_shuffle(1,jumpIdx,jumpType,QN,QN_head)
+        elif jumpType == 2 or jumpType == 5:
+            shift_apply_destroy(jumpIdx,QN_shift,QN_first_shift,state,t_cr_shift,tau_CD_shift,chain_time[1])
+            chain_kernel.apply_destroy(1,jumpIdx,QN,QN_head,QN_first,Z,t_cr,tau_CD,f_t,chain_time)
+        elif jumpType == 3 or jumpType == 6:
+            shift_apply_create_SD(jumpIdx,jumpType,QN_shift,QN_first_shift,state,t_cr_shift,tau_CD_shift,chain_time[1],gauss,tCD)
+            chain_kernel.apply_create_SD(1,jumpIdx,jumpType,QN,QN_head,QN_first,Z,t_cr,tau_CD,chain_time,gauss[0],gauss[1],gauss[2],tCD)
+        else:
+            shift_apply_create_CD(jumpIdx,QN_shift,QN_first_shift,state,t_cr_shift,tau_CD_shift,add_rand,gauss,tCD)
+            chain_kernel.apply_create_CD(1,jumpIdx,QN,QN_head,QN_first,Z,t_cr,tau_CD,add_rand,gauss[0],gauss[1],gauss[2],tCD)
+
+        tz = state['Z']
+        assert Z[1] == tz
+        assert 0 <= QN_head[1] < SIZE
+        np.testing.assert_array_equal(chain_order(QN,QN_head)[1,0:tz,:], QN_shift[0:tz,:])
+        np.testing.assert_array_equal(chain_order(t_cr,QN_head)[1,0:tz-1], t_cr_shift[0:tz-1])
+        np.testing.assert_array_equal(chain_order(tau_CD,QN_head)[1,0:tz-1], tau_CD_shift[0:tz-1])
+        np.testing.assert_array_equal(QN_first[1], QN_first_shift)
+        assert f_t[1] == state['f_t']
+        assert np.sum(QN_shift[0:tz,3]) == NK
+
+    #chain 0 is not touched by the jumps of chain 1
+    assert QN_head[0] == 0 and Z[0] == 1.0
+    assert not np.any(QN[0]) and not np.any(t_cr[0]) and not np.any(tau_CD[0])
+
+
+def test_ring_index_and_chain_order():
+    size = 7
+    for head in range(0,size):
+        slots = [chain_kernel.ring_index(head,j,size) for j in range(0,size)]
+        assert slots == [(head+j) % size for j in range(0,size)]
+
+    array = np.arange(3*size).reshape(3,size)
+    ordered = chain_order(array,np.array([0,2,size-1]))
+    np.testing.assert_array_equal(ordered[0], array[0])
+    np.testing.assert_array_equal(ordered[1], np.roll(array[1],-2))
+    np.testing.assert_array_equal(ordered[2], np.roll(array[2],1))
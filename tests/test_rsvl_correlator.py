@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+import core.cpu_correlation as cpu_correlation
+from core.correlation import p, m, MULTI_STRESS
+
+#The rsvl correlator keeps the last p values of each level in a circular buffer with a head index H. It must give the sums of the
+#original correlator, where the values are shifted through the buffer and the newest value is always at index 0 (shift_* below).
+
+NCHAINS = 4
+S_CORR = 6
+ROWS = 250
+
+
+def shift_add_to_correlator(data, corrLevel, D, C, N, A, M, corrtype):
+    if corrLevel >= D.shape[0]:
+        return
+
+    for j in range(p-1,0,-1):
+        D[corrLevel,j,:] = D[corrLevel,j-1,:]
+    D[corrLevel,0,:] = data[0:D.shape[2]]
+
+    jstart = 0 if corrLevel == 0 else int(p/m)
+    for j in range(jstart,p):
+        N[corrLevel,j] += 1
+        if corrtype == 1:
+            if D.shape[2] == MULTI_STRESS:
+                stress_corr = 0.0
+                for k in range(0,MULTI_STRESS):
+                    stress_corr += D[corrLevel,0,k]*D[corrLevel,j,k]
+                C[corrLevel,j] += stress_corr/MULTI_STRESS
+            else:
+                C[corrLevel,j] += D[corrLevel,0,0]*D[corrLevel,j,0]
+        if corrtype == 2:
+            C[corrLevel,j] += (D[corrLevel,0,0]-D[corrLevel,j,0])**2 + (D[corrLevel,0,1]-D[corrLevel,j,1])**2 + (D[corrLevel,0,2]-D[corrLevel,j,2])**2
+
+    if corrtype == 1 or (corrtype == 2 and M[corrLevel] == 0):
+        for k in range(0,A.shape[1]):
+            A[corrLevel,k] += data[k]
+
+    M[corrLevel] += 1
+
+
+def shift_update_correlator(n, result_array, D, C, N, A, M, corrtype):
+    '''
+    update_correlator of the shift-based correlator (sums of each chain)
+    '''
+    for i in range(0,result_array.shape[0]):
+        for j in range(0,n):
+            if result_array[i,j,-1] == 1.0:
+                shift_add_to_correlator(result_array[i,j],0,D[i],C[i],N[i],A[i],M[i],corrtype)
+            for corrLevel in range(0,D.shape[1]):
+                if M[i,corrLevel] == m:
+                    if corrtype == 1:
+                        A[i,corrLevel,:] /= m
+                    shift_add_to_correlator(A[i,corrLevel],corrLevel+1,D[i],C[i],N[i],A[i],M[i],corrtype)
+                    A[i,corrLevel,:] = 0.0
+                    M[i,corrLevel] = 0
+
+
+def result_stream(ncomp, nblocks, calc_type, seed=6):
+    '''
+    Result arrays of nblocks launches: correlated stress values or CoM random walks, with a few rows not flagged for the correlator
+    '''
+    gen = np.random.default_rng(seed)
+    steps = gen.normal(0.0,1.0,size=(NCHAINS,nblocks*ROWS,ncomp))
+    if calc_type == 1:
+        values = np.copy(steps)
+        for r in range(1,values.shape[1]):
+            values[:,r,:] += 0.7*values[:,r-1,:]
+    else:
+        values = np.cumsum(steps,axis=1)
+    flags = (gen.uniform(size=(NCHAINS,nblocks*ROWS,1)) > 0.05).astype(float)
+    stream = np.concatenate((values,flags),axis=2)
+    return [stream[:,b*ROWS:(b+1)*ROWS,:] for b in range(0,nblocks)]
+
+
+def correlator_arrays(nparts, ncomp):
+    return {'D': np.zeros(shape=(NCHAINS,S_CORR,p,ncomp),dtype=float), 'H': np.zeros(shape=(NCHAINS,S_CORR),dtype=np.int64),
+            'C': np.zeros(shape=(nparts,S_CORR,p),dtype=float), 'N': np.zeros(shape=(nparts,S_CORR,p),dtype=float),
+            'A': np.zeros(shape=(NCHAINS,S_CORR,ncomp),dtype=float), 'M': np.zeros(shape=(NCHAINS,S_CORR),dtype=np.int64)}
+
+
+def ordered_buffers(D, H):
+    '''
+    Values of each circular buffer from the newest to the oldest (the order of the shift-based buffers)
+    '''
+    slots = (H[:,:,None] + np.arange(p)[None,None,:]) % p
+    return np.take_along_axis(D,slots[:,:,:,None],axis=2)
+
+
+@pytest.mark.parametrize('calc_type, ncomp', [(1, 3), (1, MULTI_STRESS), (2, 3)])
+def test_head_index_matches_shift_correlator(calc_type, ncomp):
+    blocks = result_stream(ncomp,12,calc_type)
+    head = correlator_arrays(NCHAINS,ncomp)
+    shift = correlator_arrays(NCHAINS,ncomp)
+    for block in blocks:
+        cpu_correlation.update_correlator(ROWS,block,head['D'],head['H'],head['C'],head['N'],head['A'],head['M'],np.array([calc_type]))
+        shift_update_correlator(ROWS,block,shift['D'],shift['C'],shift['N'],shift['A'],shift['M'],calc_type)
+
+        np.testing.assert_allclose(head['C'], shift['C'], rtol=1e-12, atol=1e-12)
+        np.testing.assert_array_equal(head['N'], shift['N'])
+        np.testing.assert_allclose(head['A'], shift['A'], rtol=1e-12, atol=1e-12)
+        np.testing.assert_array_equal(head['M'], shift['M'])
+        np.testing.assert_array_equal(ordered_buffers(head['D'],head['H']), shift['D'])
+
+    #the coarsest levels were reached
+    assert np.all(head['N'][:,S_CORR-1,int(p/m):] > 0)
+
+
+@pytest.mark.parametrize('calc_type', [1, 2])
+def test_ensemble_sums_match_shift_correlator(calc_type):
+    blocks = result_stream(3,8,calc_type,seed=9)
+    head = correlator_arrays(2,3)
+    shift = correlator_arrays(NCHAINS,3)
+    for block in blocks:
+        cpu_correlation.update_correlator(ROWS,block,head['D'],head['H'],head['C'],head['N'],head['A'],head['M'],np.array([calc_type]))
+        shift_update_correlator(ROWS,block,shift['D'],shift['C'],shift['N'],shift['A'],shift['M'],calc_type)
+
+    #worker w adds the sums of chains w*NCHAINS//2 to (w+1)*NCHAINS//2-1
+    for w in range(0,2):
+        chains = slice(w*NCHAINS//2,(w+1)*NCHAINS//2)
+        np.testing.assert_allclose(head['C'][w], np.sum(shift['C'][chains],axis=0), rtol=1e-12)
+        np.testing.assert_array_equal(head['N'][w], np.sum(shift['N'][chains],axis=0))
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+import core.shards as shards
+
+#Shards of uneven sizes (see shards.shard_ranges) merged with add_shards/merge_corr/merge_stress must give the results of a
+#single computation over all chains.
+
+NCHAINS = 23
+NLAGS = 12
+
+
+def synthetic_chains(seed=3):
+    '''
+    Per-chain correlator averages, munch errors, rsvl sums and flow stress rows of NCHAINS chains
+    '''
+    gen = np.random.default_rng(seed)
+    return {'aver': gen.normal(10.0,2.0,size=(NCHAINS,NLAGS)),
+            'error': gen.uniform(0.1,1.0,size=(NCHAINS,NLAGS)),
+            'C': gen.normal(5.0,1.0,size=(NCHAINS,NLAGS)),
+            'N': gen.integers(1,50,size=(NCHAINS,NLAGS)).astype(float),
+            'stress': gen.normal(0.0,1.0,size=(NCHAINS,6,8))}
+
+
+def shard_file(chains, first, last, nlags, ensemble_corr=False):
+    '''
+    Contents of the shard file of chains first to last-1 (first nlags time lags)
+    '''
+    sums = {'nchains': last-first, 'flow': False, 'calc_type': 1, 'corr_time': np.arange(nlags)*10.0,
+            'aver_sum': np.sum(chains['aver'][first:last,0:nlags],axis=0)}
+    if ensemble_corr:
+        sums['C_sum'] = np.sum(chains['C'][first:last,0:nlags],axis=0)
+        sums['N_sum'] = np.sum(chains['N'][first:last,0:nlags],axis=0)
+    else:
+        sums['error_sum'] = np.sum(chains['error'][first:last,0:nlags],axis=0)
+    return sums
+
+
+def stress_file(path, stress):
+    '''
+    Write a stress file of the chains in stress (same columns as fileio.write_stress)
+    '''
+    n = stress.shape[0]
+    rows = np.hstack((np.arange(stress.shape[1]).reshape(-1,1), np.mean(stress,axis=0), np.std(stress,axis=0)/np.sqrt(n)))
+    np.savetxt(path, rows, delimiter=',', fmt='%.12f', header='time, ...', comments='')
+    return str(path)
+
+
+def test_shard_ranges_cover_chains():
+    ranges = shards.shard_ranges(NCHAINS,4)
+    assert ranges[0][0] == 0 and ranges[-1][1] == NCHAINS
+    assert all([ranges[k][1] == ranges[k+1][0] for k in range(0,3)])
+    assert len(set([last-first for first, last in ranges])) > 1
+
+
+def test_merge_munch_matches_single_run():
+    chains = synthetic_chains()
+    ranges = shards.shard_ranges(NCHAINS,4)
+    nlags = [NLAGS, NLAGS-2, NLAGS-1, NLAGS]
+    sums = shards.add_shards([shard_file(chains,first,last,n) for (first, last), n in zip(ranges,nlags)])
+    corr_time, corr_aver, corr_error = shards.merge_corr(sums)
+
+    n = min(nlags)
+    assert sums['nchains'] == NCHAINS
+    np.testing.assert_allclose(corr_time, np.arange(n)*10.0)
+    np.testing.assert_allclose(corr_aver, np.mean(chains['aver'][:,0:n],axis=0))
+    np.testing.assert_allclose(corr_error, np.sum(chains['error'][:,0:n],axis=0)/(NCHAINS*np.sqrt(NCHAINS)))
+
+
+def test_merge_ensemble_corr_matches_single_run():
+    chains = synthetic_chains()
+    sums = shards.add_shards([shard_file(chains,first,last,NLAGS,ensemble_corr=True) for first, last in shards.shard_ranges(NCHAINS,3)])
+    corr_time, corr_aver, corr_error = shards.merge_corr(sums)
+
+    assert corr_error is None
+    np.testing.assert_allclose(corr_aver, np.sum(chains['C'],axis=0)/np.sum(chains['N'],axis=0))
+
+
+def test_merge_stress_matches_single_run(tmp_path):
+    chains = synthetic_chains()
+    ranges = shards.shard_ranges(NCHAINS,5)
+    filenames = [stress_file(tmp_path/('stress_%d.txt'%index),chains['stress'][first:last]) for index, (first, last) in enumerate(ranges)]
+    merged = shards.merge_stress(filenames,[last-first for first, last in ranges])
+
+    np.testing.assert_allclose(merged[:,1:9], np.mean(chains['stress'],axis=0), atol=1e-9)
+    np.testing.assert_allclose(merged[:,9:17], np.std(chains['stress'],axis=0)/np.sqrt(NCHAINS), atol=1e-9)
+
+
+def test_mixed_ensemble_corr_is_rejected():
+    chains = synthetic_chains()
+    (first0, last0), (first1, last1) = shards.shard_ranges(NCHAINS,2)
+    mixed = [shard_file(chains,first0,last0,NLAGS,ensemble_corr=True), shard_file(chains,first1,last1,NLAGS)]
+    with pytest.raises(SystemExit, match='ensemble_corr'):
+        shards.add_shards(mixed)
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import read_result
+import core.steady_state as steady_state
+
+#Steady state is reached when the ensemble stress tensor and Z no longer drift over two windows. With --steady_stop, the
+#flow stress of a run stops at the steady state time (or flow is turned off there), and the rows written up to it are the
+#rows of a run without the stop.
+
+NPOINTS = 50
+FLOW = {'kappa': [0.0,0.01,0.0,0.0,0.0,0.0,0.0,0.0,0.0], 'flow_time': 3000, 'sim_time': 3000}
+
+
+def stress_rows(npoints, seed=8):
+    '''
+    Rows of a noisy plateau in the format of fileio.write_stress (time, averages, standard errors), the averages fluctuate by
+    their standard errors
+    '''
+    gen = np.random.default_rng(seed)
+    rows = np.zeros(shape=(npoints,17),dtype=float)
+    rows[:,0] = np.arange(1,npoints+1)
+    error = np.array([0.5, 0.6, 0.9, 0.4, 0.5, 0.6, 0.3, 0.0])
+    rows[:,1:9] = np.array([-3.0, -3.5, -4.5, -1.0, 0.0, 0.0, 5.5, 0.0]) + gen.normal(size=(npoints,8))*error
+    rows[:,9:17] = error
+    return rows
+
+
+def test_is_steady_accepts_noisy_plateau():
+    rows = stress_rows(2*NPOINTS)
+    assert steady_state.is_steady(rows,NPOINTS,2.0)
+    #only the last two windows are used
+    ramp = np.vstack((stress_rows(NPOINTS,seed=3),rows))
+    ramp[0:NPOINTS,4] += np.linspace(-10.0,0.0,NPOINTS)
+    assert steady_state.is_steady(ramp,NPOINTS,2.0)
+    #f_newQ is not tested
+    rows[:,8] = np.linspace(0.0,1.0,2*NPOINTS)
+    assert steady_state.is_steady(rows,NPOINTS,2.0)
+
+
+@pytest.mark.parametrize('column', [4, 7])
+def test_is_steady_rejects_linear_ramp(column):
+    rows = stress_rows(2*NPOINTS)
+    #a ramp of four standard errors over the two windows
+    rows[:,column] += np.linspace(0.0,4.0*rows[0,column+8],2*NPOINTS)
+    assert not steady_state.is_steady(rows,NPOINTS,2.0)
+    #without noise, a small ramp is a drift for a small tolerance
+    plateau = stress_rows(2*NPOINTS)
+    plateau[:,1:9] = plateau[0,1:9]
+    assert steady_state.is_steady(plateau,NPOINTS,2.0)
+    plateau[:,column] += np.linspace(0.0,0.2*plateau[0,column+8],2*NPOINTS)
+    assert not steady_state.is_steady(plateau,NPOINTS,0.05)
+
+
+def test_is_steady_needs_two_windows():
+    rows = stress_rows(2*NPOINTS)
+    assert not steady_state.is_steady(rows[1:],NPOINTS,2.0)
+
+
+def read_lines(path):
+    with open(path) as f:
+        return f.readlines()
+
+
+def test_steady_stop_ends_flow_at_steady_state(run_cpu):
+    full = read_lines(os.path.join(run_cpu(FLOW,output='full',steady_window=NPOINTS),'stress_1.txt'))
+    stopped_dir = run_cpu(FLOW,output='stopped',steady_window=NPOINTS,steady_stop=True)
+    stopped = read_lines(os.path.join(stopped_dir,'stress_1.txt'))
+
+    #the stopped run wrote the rows of the full run up to the steady state time, and the ensemble was steady there
+    assert 2*NPOINTS < len(stopped)-1 < len(full)-1
+    assert stopped == full[0:len(stopped)]
+    rows = read_result(os.path.join(stopped_dir,'stress_1.txt'))
+    np.testing.assert_array_equal(rows[:,0], np.arange(1,len(rows)+1))
+    assert steady_state.is_steady(rows,NPOINTS,2.0)
+
+
+def test_steady_stop_turns_flow_off_at_steady_state(run_cpu):
+    stopped = read_result(os.path.join(run_cpu(FLOW,output='stopped',steady_window=NPOINTS,steady_stop=True),'stress_1.txt'))
+    relax = dict(FLOW,sim_time=FLOW['flow_time']+300)
+    rows = read_result(os.path.join(run_cpu(relax,output='relax',steady_window=NPOINTS,steady_stop=True),'stress_1.txt'))
+
+    #flow ends at the steady state time and the time after flow is kept
+    steady_time = stopped[-1,0]
+    np.testing.assert_array_equal(rows[:,0], np.arange(1,steady_time+301))
+    np.testing.assert_array_equal(rows[0:len(stopped)], stopped)
+    #new slip links are only counted after flow was turned off
+    assert np.all(rows[0:len(stopped),8] == 0.0) and rows[-1,8] > 0.5
@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+
+import core.warm_start as warm_start
+from conftest import INPUT
+from core.chain import ensemble_chains
+from core.pcd_tau import p_cd_linear
+
+#Equilibrated ensembles saved to a warm start store are loaded back unchanged (creation times relative to the chain time), files
+#that are not ensembles of the store are skipped, and the chain batches of a run draw different chains of one permutation.
+
+NK = 10
+KEY = warm_start.store_key(dict(INPUT,CD_flag=1))
+
+
+def ensemble(nchains, seed):
+    '''
+    QN, Z, tau_CD, t_cr and chain_time of nchains chains (creation times before the chain time, 0 for unknown ones)
+    '''
+    chains = ensemble_chains({'beta': 1.0, 'CD_flag': 1, 'Nchains': nchains, 'NK': NK})
+    chains.batch_init(NK,NK,seed,p_cd_linear(NK,1.0))
+    gen = np.random.default_rng(seed)
+    chain_time = gen.uniform(100.0,200.0,size=nchains)
+    t_cr = np.where(chains.tau_CD != 0.0, chain_time[:,np.newaxis] - gen.uniform(1.0,50.0,size=chains.tau_CD.shape), 0.0)
+    t_cr[:,0] = 0.0
+    return chains.QN, chains.Z, chains.tau_CD, t_cr, chain_time
+
+
+def test_store_round_trip(tmp_path):
+    store = str(tmp_path)
+    assert warm_start.load_ensembles(store,KEY) is None
+
+    QN, Z, tau_CD, t_cr, chain_time = ensemble(6,1)
+    filename = warm_start.save_ensemble(store,KEY,QN,Z,tau_CD,t_cr,chain_time)
+    #an ensemble already in the store is not written again
+    assert warm_start.save_ensemble(store,KEY,QN,Z,tau_CD,t_cr,chain_time) == filename
+    more = ensemble(4,2)
+    warm_start.save_ensemble(store,KEY,*more)
+    assert len(os.listdir(warm_start.key_dir(store,KEY))) == 3
+
+    loaded = warm_start.load_ensembles(store,KEY)
+    assert len(loaded['Z']) == 10
+    #files are loaded in the order of their names
+    names = sorted(name for name in os.listdir(warm_start.key_dir(store,KEY)) if name.endswith('.npz'))
+    rows = slice(0,6) if names[0] == os.path.basename(filename) else slice(4,10)
+    np.testing.assert_array_equal(loaded['QN'][rows], QN)
+    np.testing.assert_array_equal(loaded['Z'][rows], Z)
+    np.testing.assert_array_equal(loaded['tau_CD'][rows], tau_CD)
+    np.testing.assert_allclose(loaded['t_cr'][rows], np.where(t_cr != 0.0, t_cr - chain_time[:,np.newaxis], 0.0), rtol=0.0, atol=1e-12)
+    assert np.all(loaded['t_cr'] <= 0.0)
+
+    #other physics parameters have their own directory
+    assert warm_start.load_ensembles(store,dict(KEY,beta=2.0)) is None
+
+
+def test_load_skips_other_files(tmp_path):
+    store = str(tmp_path)
+    QN, Z, tau_CD, t_cr, chain_time = ensemble(6,1)
+    filename = warm_start.save_ensemble(store,KEY,QN,Z,tau_CD,t_cr,chain_time)
+    path = warm_start.key_dir(store,KEY)
+
+    with open(os.path.join(path,'broken.npz'),'w') as f:
+        f.write('not an ensemble')
+    #an ensemble whose arrays were changed after it was saved
+    with np.load(filename) as data:
+        changed = {k: data[k] for k in data.files}
+    changed['Z'] = changed['Z'] + 1
+    np.savez(os.path.join(path,'%s.npz'%('0'*32)),**changed)
+
+    loaded = warm_start.load_ensembles(store,KEY)
+    assert len(loaded['Z']) == 6
+    np.testing.assert_array_equal(loaded['Z'], Z)
+
+
+def test_batches_draw_different_chains():
+    QN, Z, tau_CD, t_cr, chain_time = ensemble(20,3)
+    stored = {'QN': QN, 'Z': Z, 'tau_CD': tau_CD, 't_cr': t_cr}
+    seed = 5*16
+
+    whole = warm_start.sample_chains(stored,0,16,seed)
+    batches = [warm_start.sample_chains(stored,first,nchains,seed) for first, nchains in [(0,7), (7,7), (14,2)]]
+    for k in range(0,4):
+        np.testing.assert_array_equal(np.concatenate([batch[k] for batch in batches]), whole[k])
+    #no stored chain is drawn twice
+    assert len({QN_i.tobytes() for QN_i in whole[0]}) == 16
+
+
+def test_run_starts_from_saved_chains(run_cpu, monkeypatch):
+    store = os.path.join(os.getcwd(),'store')
+    run_cpu(output='saved',correlator='rsvl',warm_save=store)
+    saved = warm_start.load_ensembles(store,warm_start.store_key(INPUT))
+    assert len(saved['Z']) == INPUT['Nchains']
+
+    drawn = []
+    sample_chains = warm_start.sample_chains
+
+    def spy(*args):
+        drawn.append(sample_chains(*args))
+        return drawn[-1]
+
+    monkeypatch.setattr(warm_start,'sample_chains',spy)
+    run_cpu(output='warm',warm_start=store)
+    #the initial conformations are the saved chains in the order of the run's permutation
+    index = np.random.default_rng(1*INPUT['Nchains']).permutation(INPUT['Nchains'])
+    assert len(drawn) == 1
+    np.testing.assert_array_equal(drawn[0][0], saved['QN'][index])
+    np.testing.assert_array_equal(drawn[0][1], saved['Z'][index])
+
+    #a store with fewer chains than the run is not used
+    drawn.clear()
+    run_cpu(dict(INPUT,Nchains=2*INPUT['Nchains']),output='new',warm_start=store)
+    assert drawn == []
@@ -0,0 +1,74 @@
+import argparse
+import os
+import subprocess
+import sys
+import yaml
+
+import core.warm_start as warm_start
+
+#Add equilibrated chains to a warm start store in the background. An equilibrium run of the ensemble in input.yaml (without
+#flow) is started in a new directory of the store, and its final conformations are added to the store when it is done.
+
+def warm_store():
+
+	parser = argparse.ArgumentParser(description='Add equilibrated chains for the parameters in input.yaml to a warm start store in the background.')
+
+	parser.add_argument('store', metavar='/path/to/store', type=str,
+					help='Path of the warm start store.')
+	parser.add_argument('ID', type=int, nargs='?', default=1,
+					help='Simulation ID of the equilibration run (sets its seed, use different IDs to add different chains).')
+	parser.add_argument('--sim_time', type=float, default=None,
+					help='Equilibration time (default sim_time of input.yaml).')
+	parser.add_argument('--Nchains', type=int, default=None,
+					help='Number of chains to add (default Nchains of input.yaml).')
+	parser.add_argument('-b','--backend', type=str, default='gpu', choices=['gpu','cpu'],
+					help='Backend of the equilibration run.')
+	parser.add_argument('-d', metavar='device_num', type=int, default=0,
+					help='An integer for the device ID.')
+	parser.add_argument('--missing', action="store_true",
+					help='Only start the run if the store has fewer chains than Nchains of input.yaml.')
+
+	args = parser.parse_args()
+
+	if not os.path.isfile('input.yaml'):
+		sys.exit("No input.yaml file found in this directory.")
+	with open('input.yaml') as f:
+		input_data = yaml.load(f, Loader=yaml.FullLoader)
+
+	key = warm_start.store_key(input_data, "pcd_MMM.txt" if input_data['CD_flag'] != 0 and input_data['architecture'] != 'linear' else None)
+	if args.missing:
+		ensembles = warm_start.load_ensembles(args.store, key)
+		if ensembles is not None and len(ensembles['Z']) >= input_data['Nchains']:
+			print("Warm start store %s already has %d chains for these parameters."%(args.store,len(ensembles['Z'])))
+			return
+
+	#equilibrium input file of the run (no flow, G(t) is calculated but not needed)
+	input_data['kappa'] = [0.0]*9
+	input_data['flow_time'] = 0
+	input_data['EQ_calc'] = 'stress'
+	if args.sim_time is not None:
+		input_data['sim_time'] = args.sim_time
+	if args.Nchains is not None:
+		input_data['Nchains'] = args.Nchains
+
+	run_dir = os.path.join(os.path.abspath(args.store),'runs','%s_%d'%(os.path.basename(warm_start.key_dir(args.store,key)),args.ID))
+	if not os.path.exists(run_dir):
+		os.makedirs(run_dir)
+	with open(os.path.join(run_dir,'input.yaml'),'w') as f:
+		yaml.dump(input_data, f)
+	if os.path.isfile('pcd_MMM.txt'):
+		with open('pcd_MMM.txt') as f_in, open(os.path.join(run_dir,'pcd_MMM.txt'),'w') as f_out:
+			f_out.write(f_in.read())
+
+	#detached run, it continues after this command returns (rsvl keeps the chain time, so the creation times of the entanglements are stored)
+	command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),'gpu_dsm.py'), str(args.ID), '-d', str(args.d),
+			   '-b', args.backend, '-c', 'rsvl', '-o', os.path.join(run_dir,'DSM_results'), '--warm_save', os.path.abspath(args.store)]
+	with open(os.path.join(run_dir,'log.txt'),'w') as log:
+		process = subprocess.Popen(command, cwd=run_dir, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+	print("Equilibration run started in the background (PID %d), output in %s."%(process.pid,run_dir))
+
+	return
+
+if __name__ == "__main__":
+	warm_store()